@@ -0,0 +1,82 @@
+"""
+Compares PyRP1210Bridge receive latency and CPU usage in "blocking" and "poll" receive modes.
+
+Uses the simulated adapter in RP1210.Simulator (no adapter needed), with a frame put on the bus
+every few milliseconds from another thread.
+
+Run from the repository root:
+    python Benchmarks/bridge_receive.py
+"""
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import RP1210
+from RP1210 import pyrp1210bridge
+from RP1210.Simulator import SIMULATOR_API_NAME, SimulatedDLL, simulatedClient
+
+FRAMES = 300
+FRAME_INTERVAL = 0.005 # seconds between injected frames (+/- 50% jitter)
+IDLE_TIME = 2.0 # seconds spent waiting on an idle bus for the CPU measurement
+
+def make_bus(dll : SimulatedDLL, **kwargs):
+    RP1210Client = RP1210.RP1210Client
+    pyrp1210bridge.RP1210.RP1210Client = lambda: simulatedClient(dll)
+    try:
+        return pyrp1210bridge.PyRP1210Bridge(f"{SIMULATOR_API_NAME}:1", **kwargs)
+    finally:
+        pyrp1210bridge.RP1210.RP1210Client = RP1210Client
+
+def measure_latency(dll : SimulatedDLL, bus) -> list[float]:
+    """Injects frames from another thread; returns inject -> recv() latency for each one, in ms."""
+    sent_at = {}
+    def producer():
+        for i in range(FRAMES):
+            time.sleep(FRAME_INTERVAL * random.uniform(0.5, 1.5))
+            sent_at[i] = time.perf_counter()
+            dll.bus.inject(b'\x01' + (0x18FEF100).to_bytes(4, 'big') + i.to_bytes(8, 'big'), "CAN")
+    thread = threading.Thread(target=producer)
+    thread.start()
+    latencies = []
+    while len(latencies) < FRAMES:
+        msg = bus.recv(timeout=1)
+        now = time.perf_counter()
+        if msg is not None:
+            latencies.append((now - sent_at[int.from_bytes(msg.data, 'big')]) * 1000)
+    thread.join()
+    return latencies
+
+def measure_idle_cpu(bus) -> float:
+    """Returns the process CPU usage (percent of one core) while waiting in recv() on an idle bus."""
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    deadline = wall_start + IDLE_TIME
+    while time.perf_counter() < deadline:
+        bus.recv(timeout=deadline - time.perf_counter())
+    return 100 * (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+
+def main():
+    modes = [
+        ("poll, 10 ms", dict(receive_mode="poll", poll_interval=0.01)),
+        ("poll, 1 ms", dict(receive_mode="poll", poll_interval=0.001)),
+        ("blocking", dict(receive_mode="blocking")),
+    ]
+    print(f"{'mode':<14}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'idle CPU %':>12}")
+    for name, kwargs in modes:
+        dll = SimulatedDLL()
+        bus = make_bus(dll, **kwargs)
+        try:
+            latencies = sorted(measure_latency(dll, bus))
+            cpu = measure_idle_cpu(bus)
+        finally:
+            bus.shutdown()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{name:<14}{statistics.mean(latencies):>10.3f}{statistics.median(latencies):>10.3f}"
+              f"{p99:>10.3f}{latencies[-1]:>10.3f}{cpu:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compares keeping an adapter's broadcast list up to date by rebuilding it on every change
+(DESTROY_LIST + ADD_LIST with every entry) against BroadcastListManager, which only sends the
+commands for what changed.
+
+Both apply the same changes (20 messages on the list, then one message's data changes at a time,
+like a test rig stepping through values) to the simulated adapter in RP1210.Simulator, counting the
+commands and bytes sent to it. The adapter's list, read back at the end, has to be the same. Host
+time includes the simulator's own overhead.
+
+Run from the repository root:
+    python Benchmarks/broadcast_list.py
+"""
+import random
+import sys
+import time
+from ctypes import create_string_buffer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210 import Commands
+from RP1210.Broadcast import BROADCAST_FOR_J1939, BroadcastListManager
+from RP1210.J1939 import toJ1939Message
+from RP1210.Simulator import simulatedClient
+
+MESSAGES = 20
+CHANGES = 5000
+
+class CountingAdapter:
+    """Sends commands to a simulated adapter (RP1210.Simulator), counting them and their bytes."""
+    def __init__(self):
+        self.client = simulatedClient()
+        self.client.connect(b"J1939:Baud=Auto")
+        self.commands = 0
+        self.bytes = 0
+
+    def __call__(self, command_number, client_command, size = 0) -> int:
+        self.commands += 1
+        self.bytes += len(bytes(client_command)[:size or len(client_command)])
+        return self.client.command(command_number, client_command, size)
+
+    def entries(self) -> list[bytes]:
+        """Reads the adapter's broadcast list back (LIST_LENGTH, then VIEW_B_LIST for each entry)."""
+        length = create_string_buffer(Commands.getBroadcastListLength(), 2)
+        assert self.client.command(BROADCAST_FOR_J1939, length, 2) == 0
+        entries = []
+        for i in range(length.raw[1]):
+            view = create_string_buffer(Commands.viewBroadcastList(i), 64)
+            assert self.client.command(BROADCAST_FOR_J1939, view, 2) == 0
+            size = int.from_bytes(view.raw[2:4], 'little')
+            entries.append(view.raw[8:8 + size])
+        return entries
+
+def changes() -> list[tuple[int, bytes]]:
+    rng = random.Random(1)
+    return [(rng.randrange(MESSAGES), rng.randbytes(8)) for _ in range(CHANGES)]
+
+def message(i : int, data : bytes) -> bytes:
+    return toJ1939Message(0xFF00 + i, 6, 0x00, 0xFF, data)
+
+def rebuild(adapter : CountingAdapter) -> dict:
+    current = {i: message(i, bytes(8)) for i in range(MESSAGES)}
+    def send():
+        adapter(BROADCAST_FOR_J1939, Commands.destroyBroadcastList())
+        adapter(BROADCAST_FOR_J1939, Commands.addBroadcastList([Commands.broadcastEntry(msg, 100) for msg in current.values()]))
+    send()
+    for i, data in changes():
+        current[i] = message(i, data)
+        send()
+    return current
+
+def managed(adapter : CountingAdapter) -> dict:
+    manager = BroadcastListManager(adapter, BROADCAST_FOR_J1939)
+    for i in range(MESSAGES):
+        manager.add(i, message(i, bytes(8)), 0.1)
+    manager.apply()
+    current = {}
+    for i, data in changes():
+        manager.update(i, message(i, data))
+        manager.apply()
+    for key, msg, _ in manager.entries:
+        current[key] = msg
+    return current
+
+def suiteCases() -> list[tuple]:
+    manager = BroadcastListManager(CountingAdapter(), BROADCAST_FOR_J1939)
+    for i in range(MESSAGES):
+        manager.add(i, message(i, bytes(8)), 0.1)
+    manager.apply()
+    updates = [(i, message(i, data)) for i, data in changes()[:256]]
+    count = [0]
+    def update():
+        count[0] += 1
+        manager.update(*updates[count[0] & 0xFF])
+        return manager.apply()
+    return [(f"BroadcastListManager.update + apply, {MESSAGES} messages", update)]
+
+def main():
+    results = []
+    for name, run in (("rebuild on every change", rebuild), ("BroadcastListManager", managed)):
+        adapter = CountingAdapter()
+        start = time.perf_counter()
+        current = run(adapter)
+        elapsed = time.perf_counter() - start
+        entries = sorted(adapter.entries())
+        assert entries == sorted(current.values())
+        results.append(entries)
+        print(f"{name:24}: {adapter.commands:6} commands, {adapter.bytes:8} bytes to the adapter, "
+              f"{elapsed * 1000:7.1f} ms host time for {CHANGES} changes")
+    assert results[0] == results[1]
+
+if __name__ == "__main__":
+    main()
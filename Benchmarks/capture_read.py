@@ -0,0 +1,73 @@
+"""
+Compares pulling one PGN out of a big capture by reading every message into a J1939Message (what
+you'd do with a pickled list of rx() bytes) against CaptureReader, which seeks with the file's index.
+
+Run from the repository root:
+    python Benchmarks/capture_read.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.Capture import CaptureReader, CaptureWriter, readCapture
+from RP1210.J1939 import J1939Message, toJ1939Message
+from suite import scratchPath
+
+MESSAGES = 1_000_000
+RARE_PGN = 0xFEE5 # engine hours; sent once in a while
+RARE_EVERY = 5000
+
+def write(path, count : int = MESSAGES):
+    rng = random.Random(1)
+    pgns = [0xF004, 0xF003, 0xFEF1, 0xFEEE, 0xFEF2, 0xF000, 0xFECA, 0xFEF6, 0xFEF5, 0xFEE9]
+    messages = [i.to_bytes(4, 'big') + toJ1939Message(RARE_PGN if i % RARE_EVERY == 0 else rng.choice(pgns), 6,
+                                                      rng.randrange(16), 0xFF, rng.randbytes(8))
+                for i in range(count)]
+    with CaptureWriter(path) as writer:
+        for i in range(0, count, 1000):
+            writer.writeMany(messages[i:i + 1000])
+            writer.poll()
+
+def everything(path) -> list[bytes]:
+    messages = [J1939Message(message) for _, _, _, message in readCapture(path)]
+    return [msg.msg for msg in messages if msg.pgn == RARE_PGN]
+
+def seek(path) -> list[bytes]:
+    with CaptureReader(path) as capture:
+        return [record.toJ1939Message().msg for record in capture.records(pgn=RARE_PGN)]
+
+def count_records(path) -> int:
+    with CaptureReader(path) as capture:
+        return sum(1 for _ in capture)
+
+def suiteCases() -> list[tuple]:
+    path = scratchPath("capture_read.rpl")
+    write(path, 20_000)
+    return [
+        ("readCapture, 20000 messages", lambda: sum(1 for _ in readCapture(path))),
+        ("CaptureReader iterate, 20000 messages", lambda: count_records(path)),
+        ("CaptureReader.records(pgn=), 20000 messages", lambda: seek(path)),
+    ]
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "capture.rpl")
+        write(path)
+        print(f"{MESSAGES} messages, {os.path.getsize(path) / 1e6:.0f} MB")
+        start = time.perf_counter()
+        expected = everything(path)
+        everything_time = time.perf_counter() - start
+        start = time.perf_counter()
+        found = seek(path)
+        seek_time = time.perf_counter() - start
+        assert found == expected and len(found) == MESSAGES // RARE_EVERY
+        print(f"Read everything, then filter: {everything_time * 1000:>8.1f} ms")
+        print(f"CaptureReader.records(pgn=):  {seek_time * 1000:>8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measures how many messages per second CaptureWriter can log (with its index), against pickling lists
+of rx() bytes (what you'd do without it, with no index), and how many fully loaded J1939 buses that is.
+
+Run from the repository root:
+    python Benchmarks/capture_write.py
+"""
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210 import Capture
+from RP1210.Capture import CaptureWriter, readCapture
+from RP1210.J1939 import toJ1939Message
+from suite import bestTime, scratchPath
+
+MESSAGES = 200_000
+BATCH = 64 # messages per rxMany() call
+BUS_LOAD = 1900 # messages/s on a 250k J1939 bus at 100% load
+REPEATS = 3
+
+def traffic(count : int = MESSAGES) -> list[bytes]:
+    rng = random.Random(1)
+    pgns = [0xF004, 0xF003, 0xFEF1, 0xFEEE, 0xFEF2, 0xF000, 0xFECA, 0xFEF6]
+    return [i.to_bytes(4, 'big') + toJ1939Message(rng.choice(pgns), 3, rng.randrange(8), 0xFF,
+                                                  rng.randbytes(8))
+            for i in range(count)]
+
+def pickled(messages, path):
+    with open(path, 'wb') as file:
+        for i in range(0, len(messages), BATCH):
+            pickle.dump((time.time(), messages[i:i + BATCH]), file)
+
+def captured(messages, path, compression):
+    with CaptureWriter(path, compression=compression) as writer:
+        for i in range(0, len(messages), BATCH):
+            writer.writeMany(messages[i:i + BATCH])
+            if i % 4096 == 0:
+                writer.poll()
+
+def suiteCases() -> list[tuple]:
+    messages = traffic(4096) # one block
+    path = scratchPath("capture_write.rpl")
+    return [("CaptureWriter, 4096 messages", lambda: captured(messages, path, None))]
+
+def main():
+    messages = traffic()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "capture")
+        elapsed, _ = bestTime(pickled, messages, path, repeats=REPEATS)
+        print(f"{MESSAGES} messages, {BATCH} per batch")
+        print(f"{'pickle:':<22} {MESSAGES / elapsed:>10.0f} msg/s  {os.path.getsize(path) / MESSAGES:>5.1f} bytes/msg")
+        for compression in Capture.COMPRESSION:
+            try:
+                elapsed, _ = bestTime(captured, messages, path, compression, repeats=REPEATS)
+            except ImportError:
+                continue
+            assert [record[3] for record in readCapture(path)] == messages
+            rate = MESSAGES / elapsed
+            print(f"{'CaptureWriter ' + str(compression) + ':':<22} {rate:>10.0f} msg/s  "
+                  f"{os.path.getsize(path) / MESSAGES:>5.1f} bytes/msg  ({rate / BUS_LOAD:.0f} full buses)")
+
+if __name__ == "__main__":
+    main()
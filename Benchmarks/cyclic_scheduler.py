@@ -0,0 +1,91 @@
+"""
+Compares sending cyclic messages from one thread per message (each one sleeping for its period
+between sends) against one CyclicScheduler sending all of them.
+
+Both send the same 40 messages (20 every 10 ms, 15 every 100 ms, 5 every 1 s) for a few seconds
+through a tx that records when it was called. Reported: how many threads it took, how late messages
+went out compared to when they were due (mean and worst), and how far the last send of each
+10 ms message drifted from where it should have been.
+
+Run from the repository root:
+    python Benchmarks/cyclic_scheduler.py
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.Scheduler import CyclicScheduler
+
+DURATION = 3.0
+PERIODS = [0.01] * 20 + [0.1] * 15 + [1.0] * 5
+
+def lateness(sends : dict, starts : dict) -> tuple[float, float, float]:
+    """Returns (mean lateness, worst lateness, worst drift of the 10 ms messages), in ms."""
+    late = []
+    drift = 0.0
+    for key, times in sends.items():
+        period = PERIODS[key]
+        for i, t in enumerate(times):
+            late.append(t - (starts[key] + i * period))
+        if period == 0.01 and times:
+            drift = max(drift, times[-1] - (starts[key] + (len(times) - 1) * period))
+    return sum(late) / len(late) * 1000, max(late) * 1000, drift * 1000
+
+def naive() -> tuple[int, dict, dict]:
+    """One thread per message, sleeping for the period after each send."""
+    sends = {key: [] for key in range(len(PERIODS))}
+    starts = {}
+    stop = threading.Event()
+    def cyclic(key, period):
+        starts[key] = time.monotonic()
+        while not stop.is_set():
+            sends[key].append(time.monotonic())
+            time.sleep(period)
+    threads = [threading.Thread(target=cyclic, args=(key, period), daemon=True) for key, period in enumerate(PERIODS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return len(threads), sends, starts
+
+def scheduled() -> tuple[int, dict, dict]:
+    sends = {key: [] for key in range(len(PERIODS))}
+    starts = {}
+    def tx(message):
+        sends[message[0]].append(time.monotonic())
+    scheduler = CyclicScheduler(tx)
+    before = threading.active_count()
+    scheduler.start()
+    threads = threading.active_count() - before
+    for key, period in enumerate(PERIODS):
+        starts[key] = scheduler.add(key, bytes([key]), period).due
+    time.sleep(DURATION)
+    scheduler.stop()
+    return threads, sends, starts
+
+def suiteCases() -> list[tuple]:
+    now = [0.0]
+    scheduler = CyclicScheduler(lambda message: None, clock=lambda: now[0])
+    for key, period in enumerate(PERIODS):
+        scheduler.add(key, bytes([key]), period)
+    def poll():
+        now[0] += 0.01
+        return scheduler.poll()
+    return [(f"CyclicScheduler.poll, {len(PERIODS)} messages, every 10 ms", poll)]
+
+def main():
+    for name, run in (("thread per message + time.sleep", naive), ("CyclicScheduler", scheduled)):
+        threads, sends, starts = run()
+        assert sum(len(times) for times in sends.values()) >= len(PERIODS) * 3
+        mean, worst, drift = lateness(sends, starts)
+        total = sum(len(times) for times in sends.values())
+        print(f"{name:32}: {threads:2} threads, {total:5} sends, late by {mean:7.2f} ms mean, "
+              f"{worst:7.2f} ms worst, 10 ms messages drifted {drift:7.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures DM1Tracker on a fleet gateway's DM1 traffic (every ECU repeating its DM1 once a second, with
+a fault changing now and then), against parsing every DM1 with DiagnosticMessage and diffing the DTCs.
+
+Run from the repository root:
+    python Benchmarks/dm1_tracking.py
+"""
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import DTC, DiagnosticMessage
+from RP1210.J1939Faults import DM1Tracker
+from suite import bestTime
+
+ECUS = 40
+SECONDS = 500
+CHANGE_CHANCE = 0.02 # chance an ECU's faults change in any given second
+REPEATS = 3
+
+def traffic() -> list[tuple[int, bytes]]:
+    """(sa, DM1 data) for every DM1 sent in SECONDS seconds."""
+    rng = random.Random(1)
+    faults = {sa: [(rng.randrange(1, 5000), rng.randrange(32), 1) for _ in range(rng.randrange(4))]
+              for sa in range(ECUS)}
+    messages = []
+    for _ in range(SECONDS):
+        for sa in range(ECUS):
+            if rng.random() < CHANGE_CHANCE:
+                faults[sa] = [(rng.randrange(1, 5000), rng.randrange(32), 1) for _ in range(rng.randrange(4))]
+            data = b'\x04\xFF' + b''.join(DTC.to_bytes(*dtc) for dtc in faults[sa])
+            messages.append((sa, data if faults[sa] else b'\x00\xFF' + bytes(4) + b'\xFF\xFF'))
+    return messages
+
+def parse_every_time(messages):
+    last = {}
+    events = 0
+    dm = DiagnosticMessage()
+    for sa, data in messages:
+        dm.data = data
+        codes = {(dtc.spn, dtc.fmi) for dtc in dm.codes if dtc}
+        old = last.get(sa, set())
+        events += len(codes - old) + len(old - codes)
+        last[sa] = codes
+    return events
+
+def tracker(messages):
+    dm1 = DM1Tracker()
+    update = dm1.update
+    events = 0
+    for sa, data in messages:
+        events += len(update(sa, data))
+    return events
+
+def suiteCases() -> list[tuple]:
+    messages = traffic()[:ECUS * 25] # 25 seconds of traffic
+    return [(f"DM1Tracker.update, {len(messages)} DM1s", lambda: tracker(messages))]
+
+def main():
+    messages = traffic()
+    parse_time, parse_events = bestTime(parse_every_time, messages, repeats=REPEATS)
+    tracker_time, tracker_events = bestTime(tracker, messages, repeats=REPEATS)
+    assert parse_events == tracker_events
+    print(f"{len(messages)} DM1s from {ECUS} ECUs, {tracker_events} faults appeared or cleared")
+    print(f"DiagnosticMessage every time: {len(messages) / parse_time:>10.0f} DM1/s")
+    print(f"DM1Tracker:                   {len(messages) / tracker_time:>10.0f} DM1/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares counting SPNs across a fleet's DM2 histories (lots of DTCs per message) with
+DiagnosticMessage.codes, which makes a DTC object for every DTC, against DiagnosticMessage.dtcs,
+which decodes them all at once from the message bytes.
+
+Run from the repository root:
+    python Benchmarks/dtc_array.py
+"""
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210 import J1939
+from RP1210.J1939 import DTC, DiagnosticMessage
+from suite import bestTime
+
+MESSAGES = 2000
+DTCS_PER_MESSAGE = 100
+REPEATS = 3
+
+def histories() -> list[bytes]:
+    rng = random.Random(1)
+    return [b'\x00\xFF' + b''.join(DTC.to_bytes(rng.randrange(1, 5000), rng.randrange(32), rng.randrange(1, 127))
+                                  for _ in range(DTCS_PER_MESSAGE))
+            for _ in range(MESSAGES)]
+
+def with_codes(messages) -> Counter:
+    spns = Counter()
+    dm2 = DiagnosticMessage()
+    for data in messages:
+        dm2.data = data
+        spns.update(dtc.spn for dtc in dm2.codes)
+    return spns
+
+def with_dtcs(messages, use_numpy) -> Counter:
+    spns = Counter()
+    dm2 = DiagnosticMessage()
+    for data in messages:
+        dm2.data = data
+        spns.update(dm2.dtcs.spns(use_numpy).tolist() if use_numpy else dm2.dtcs.spns(False))
+    return spns
+
+def suiteCases() -> list[tuple]:
+    dm1 = b'\x04\xFF' + b''.join(DTC.to_bytes(spn, fmi, 1) for spn, fmi in ((100, 1), (110, 0), (190, 2)))
+    dm2 = b'\x00\xFF' + b''.join(DTC.to_bytes(spn, spn % 32, spn % 127 + 1) for spn in range(1, 101))
+    return [
+        ("DiagnosticMessage parse DM1 (3 DTCs)", lambda: DiagnosticMessage(dm1).codes),
+        ("DiagnosticMessage parse DM2 (100 DTCs)", lambda: DiagnosticMessage(dm2).codes),
+        ("DiagnosticMessage parse DM2 (100 DTCs) .dtcs", lambda: DiagnosticMessage(dm2).dtcs),
+    ]
+
+def main():
+    messages = histories()
+    total = MESSAGES * DTCS_PER_MESSAGE
+    codes_time, expected = bestTime(with_codes, messages, repeats=REPEATS)
+    print(f"{MESSAGES} DM2s, {total} DTCs")
+    print(f"DiagnosticMessage.codes:         {total / codes_time:>12.0f} DTC/s")
+    dtcs_time, spns = bestTime(with_dtcs, messages, False, repeats=REPEATS)
+    assert spns == expected
+    print(f"DiagnosticMessage.dtcs:          {total / dtcs_time:>12.0f} DTC/s")
+    if J1939.numpy is not None:
+        numpy_time, spns = bestTime(with_dtcs, messages, True, repeats=REPEATS)
+        assert spns == expected
+        print(f"DiagnosticMessage.dtcs (NumPy):  {total / numpy_time:>12.0f} DTC/s")
+
+if __name__ == "__main__":
+    main()
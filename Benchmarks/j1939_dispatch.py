@@ -0,0 +1,82 @@
+"""
+Compares routing received J1939 messages with J1939Dispatcher against the usual approach of building
+a J1939Message for every message and checking its PGN in an if/elif chain.
+
+Most messages on a bus aren't interesting to any one application, so the dispatcher wins by not
+building a J1939Message for them at all.
+
+Run from the repository root:
+    python Benchmarks/j1939_dispatch.py
+"""
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.J1939Dispatcher import J1939Dispatcher
+from suite import bestTime
+
+MESSAGES = 20000
+REPEATS = 5
+WANTED = [0xF004, 0xFEF1, 0xFECA, 0xFEEE, 0xFEF2, 0xF003, 0xFEEF, 0xFEF5] # handled by the app
+TRAFFIC = WANTED + list(range(0xFF00, 0xFF40)) + [0xEA00, 0xEC00, 0xEB00] # everything on the bus
+
+def records(count : int = MESSAGES) -> list[bytes]:
+    rng = random.Random(1)
+    return [bytes(4) + toJ1939Message(rng.choice(TRAFFIC), 6, rng.randrange(8), 0xFF, bytes(8))
+            for _ in range(count)]
+
+def if_elif(raw, counts):
+    for record in raw:
+        msg = J1939Message(record)
+        pgn = msg.pgn
+        if pgn == 0xF004:
+            counts[0] += 1
+        elif pgn == 0xFEF1:
+            counts[1] += 1
+        elif pgn == 0xFECA:
+            counts[2] += 1
+        elif pgn == 0xFEEE:
+            counts[3] += 1
+        elif pgn == 0xFEF2:
+            counts[4] += 1
+        elif pgn == 0xF003:
+            counts[5] += 1
+        elif pgn == 0xFEEF:
+            counts[6] += 1
+        elif pgn == 0xFEF5:
+            counts[7] += 1
+
+def suiteCases() -> list[tuple]:
+    raw = records(1000)
+    dispatcher = J1939Dispatcher()
+    raw_dispatcher = J1939Dispatcher()
+    for pgn in WANTED:
+        dispatcher.addHandler(lambda msg: None, pgn=pgn)
+        raw_dispatcher.addHandler(lambda *args: None, pgn=pgn, raw=True)
+    return [
+        ("J1939Dispatcher.dispatchMany, 1000 messages", lambda: dispatcher.dispatchMany(raw)),
+        ("J1939Dispatcher.dispatchMany, 1000 messages, raw handlers", lambda: raw_dispatcher.dispatchMany(raw)),
+    ]
+
+def main():
+    raw = records()
+    counts = [0] * len(WANTED)
+    elapsed = bestTime(if_elif, raw, counts, repeats=REPEATS)[0]
+    print(f"{'if/elif on J1939Message:':<39}{MESSAGES / elapsed:>10.0f} msg/s")
+    for raw_handlers in (False, True):
+        dispatcher = J1939Dispatcher()
+        dispatch_counts = [0] * len(WANTED)
+        for i, pgn in enumerate(WANTED):
+            def handler(*args, i=i):
+                dispatch_counts[i] += 1
+            dispatcher.addHandler(handler, pgn=pgn, raw=raw_handlers)
+        elapsed = bestTime(dispatcher.dispatchMany, raw, repeats=REPEATS)[0]
+        assert dispatch_counts == counts
+        label = "raw handlers" if raw_handlers else "J1939Message handlers"
+        print(f"J1939Dispatcher, {label + ':':<22}{MESSAGES / elapsed:>10.0f} msg/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Measures J1939FilterSet throughput with a few hundred filters, against checking the same filters one
+by one in a loop.
+
+Run from the repository root:
+    python Benchmarks/j1939_filters.py
+"""
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import toJ1939Message
+from RP1210.J1939Filters import J1939FilterSet, FILTER_PGN, FILTER_SOURCE
+from suite import bestTime
+
+MESSAGES = 20000
+REPEATS = 5
+
+def build_filters(rng) -> list[tuple]:
+    filters = [(FILTER_PGN, pgn, 0, 0) for pgn in rng.sample(range(0xFE00, 0x10000), 200)]
+    filters += [(FILTER_PGN + FILTER_SOURCE, 0xF004, sa, 0) for sa in range(0, 0x40)]
+    return filters
+
+def linear(records, filters) -> list:
+    passed = []
+    for record in records:
+        pgn = int.from_bytes(record[4:7], 'little') & 0x3FFFF
+        sa = record[8]
+        for flag, f_pgn, f_sa, _ in filters:
+            if (not flag & FILTER_PGN or pgn == f_pgn) and (not flag & FILTER_SOURCE or sa == f_sa):
+                passed.append(record)
+                break
+    return passed
+
+def build_records(rng, count : int = MESSAGES) -> list[bytes]:
+    pgns = [0xF004] + list(range(0xFE00, 0x10000))
+    return [bytes(4) + toJ1939Message(rng.choice(pgns), 6, rng.randrange(0x80), 0xFF, bytes(8))
+            for _ in range(count)]
+
+def build_filter_set(filters) -> J1939FilterSet:
+    filter_set = J1939FilterSet()
+    for rule in filters:
+        filter_set.addFilter(*rule)
+    return filter_set
+
+def suiteCases() -> list[tuple]:
+    rng = random.Random(1)
+    filter_set = build_filter_set(build_filters(rng))
+    records = build_records(rng, 1000)
+    return [(f"J1939FilterSet.filterRecords, {len(filter_set)} filters, 1000 messages", lambda: filter_set.filterRecords(records))]
+
+def main():
+    rng = random.Random(1)
+    filters = build_filters(rng)
+    records = build_records(rng)
+    filter_set = build_filter_set(filters)
+    assert filter_set.filterRecords(records) == linear(records, filters)
+    print(f"{len(filters)} filters, {MESSAGES} messages")
+    print(f"checking each filter:   {MESSAGES / bestTime(linear, records, filters, repeats=REPEATS)[0]:>10.0f} msg/s")
+    print(f"J1939FilterSet:         {MESSAGES / bestTime(filter_set.filterRecords, records, repeats=REPEATS)[0]:>10.0f} msg/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Measures J1939Reassembler throughput on interleaved DM1 BAMs from many ECUs.
+
+A 250 kbit/s J1939 bus carries at most ~1900 frames per second, so the reassembler needs to handle
+well over that to keep up with a full bus.
+
+Run from the repository root:
+    python Benchmarks/j1939_reassembly.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.J1939Transport import J1939Reassembler
+
+ECUS = 32
+DM1_SIZE = 62 # 15 DTCs = 9 packets
+ROUNDS = 200
+
+def bam_packets(sa : int) -> list[bytes]:
+    """RP1210_ReadMessage output for one DM1 BAM (TP.CM + TP.DT packets) from sa."""
+    data = bytes([sa]) * DM1_SIZE
+    packets = (DM1_SIZE + 6) // 7
+    stream = [toJ1939Message(0xEC00, 7, sa, 0xFF, bytes((32, DM1_SIZE, 0, packets, 0xFF, 0xCA, 0xFE, 0x00)))]
+    for seq in range(1, packets + 1):
+        chunk = data[(seq - 1) * 7:seq * 7]
+        stream.append(toJ1939Message(0xEB00, 7, sa, 0xFF, bytes([seq]) + chunk.ljust(7, b'\xFF')))
+    return [bytes(4) + msg for msg in stream]
+
+def interleaved() -> list[bytes]:
+    """One DM1 BAM from every ECU, round-robin interleaved like every ECU broadcasting at once."""
+    streams = [bam_packets(sa) for sa in range(ECUS)]
+    return [stream[i] for i in range(len(streams[0])) for stream in streams]
+
+def suiteCases() -> list[tuple]:
+    messages = [J1939Message(msg) for msg in interleaved()]
+    reassembler = J1939Reassembler(max_sessions=ECUS)
+    return [(f"J1939Reassembler.processMany, {ECUS} interleaved BAMs", lambda: reassembler.processMany(messages))]
+
+def main():
+    raw = interleaved()
+    reassembler = J1939Reassembler(max_sessions=ECUS)
+    start = time.perf_counter()
+    parse_time = 0.0
+    for _ in range(ROUNDS):
+        t = time.perf_counter()
+        messages = [J1939Message(msg) for msg in raw]
+        parse_time += time.perf_counter() - t
+        assert len(reassembler.processMany(messages)) == ECUS
+    elapsed = time.perf_counter() - start
+    frames = ROUNDS * len(raw)
+    print(f"{ECUS} ECUs, {frames} frames, {reassembler.completed} DM1s reassembled")
+    print(f"total (parse + reassemble): {frames / elapsed:>10.0f} frames/s")
+    print(f"reassemble only:            {frames / (elapsed - parse_time):>10.0f} frames/s")
+
+if __name__ == "__main__":
+    main()
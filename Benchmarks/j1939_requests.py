@@ -0,0 +1,90 @@
+"""
+Compares polling an ECU inventory (Component ID, PGN 0xFEEB, from every ECU) one request at a time
+against sending every request at once with J1939Requester.
+
+The bus is the simulated adapter in RP1210.Simulator, where each ECU answers LATENCY seconds after
+it's asked, and one address doesn't answer at all, like a real fleet where something is always
+unplugged.
+
+Run from the repository root:
+    python Benchmarks/j1939_requests.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.J1939Requests import J1939Requester
+from RP1210.Simulator import SimulatedDLL, VirtualBus, simulatedClient
+
+ECUS = 30
+LATENCY = 0.02 # seconds for an ECU to answer
+TIMEOUT = 0.2
+ME = 0xF9
+MISSING = 7 # address that never answers
+
+def connect():
+    """
+    Returns (tx, rx) for a simulated client on a bus where every ECU but MISSING answers a Component
+    ID request LATENCY seconds after it's sent.
+    """
+    bus = VirtualBus(latency=LATENCY)
+    client = simulatedClient(SimulatedDLL(bus))
+    client.connect(b"J1939:Baud=Auto")
+    def tx(message : bytes) -> int:
+        da = message[5]
+        if message[0:3] == b'\x00\xEA\x00' and da != MISSING:
+            bus.inject(toJ1939Message(0xFEEB, 6, da, 0xFF, f"ECU{da:02}*MODEL*SN*".encode()))
+        return client.tx(message)
+    return tx, client.rx
+
+def serial(tx, rx) -> dict:
+    results = {}
+    for sa in range(ECUS):
+        tx(toJ1939Message(0xEA00, 6, ME, sa, b'\xEB\xFE\x00'))
+        deadline = time.monotonic() + TIMEOUT
+        while time.monotonic() < deadline:
+            raw = rx()
+            if raw:
+                msg = J1939Message(raw)
+                if msg.pgn == 0xFEEB and msg.sa == sa:
+                    results[sa] = msg
+                    break
+            else:
+                time.sleep(0.001)
+    return results
+
+def concurrent(tx, rx) -> dict:
+    requester = J1939Requester(tx, ME, timeout=TIMEOUT)
+    futures = {sa: requester.request(0xFEEB, da=sa) for sa in range(ECUS)}
+    requester.flush(rx=rx)
+    return {sa: future.result() for sa, future in futures.items() if future.exception() is None}
+
+def suiteCases() -> list[tuple]:
+    answers = []
+    def tx(message : bytes) -> int:
+        da = message[5]
+        answers.append(bytes(4) + toJ1939Message(0xFEEB, 6, da, ME, f"ECU{da:02}*MODEL*SN*".encode()))
+        return 0
+    def rx():
+        return answers.pop() if answers else None
+    requester = J1939Requester(tx, ME, timeout=TIMEOUT)
+    def inventory() -> int:
+        for sa in range(ECUS):
+            requester.request(0xFEEB, da=sa)
+        assert requester.flush(rx=rx) # everything's answered right away, so this never sleeps
+        return requester.answered
+    return [(f"J1939Requester, {ECUS} requests answered immediately", inventory)]
+
+def main():
+    for name, func in (("one at a time", serial), ("J1939Requester", concurrent)):
+        start = time.perf_counter()
+        results = func(*connect())
+        elapsed = time.perf_counter() - start
+        assert len(results) == ECUS - 1
+        print(f"{name + ':':<16} {len(results)}/{ECUS} ECUs answered in {elapsed * 1000:>7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures J1939Transmitter throughput on RTS/CTS bulk transfers and its pacing accuracy on BAMs.
+
+- Throughput: 1785-byte blocks sent to a J1939Reassembler over an in-memory loopback (no adapter),
+  so this is the CPU cost of the transport protocol on both ends.
+- Pacing: send times of BAM packets with the default 50 ms interval, using flush() and sleepUntil()
+  vs. time.sleep() between packets.
+
+Run from the repository root:
+    python Benchmarks/j1939_transmit.py
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.J1939Transport import J1939Reassembler, J1939Transmitter
+
+BLOCKS = 200
+BAM_PACKETS = 40
+
+BLOCK = bytes(range(255)) * 7
+
+def loopback() -> tuple:
+    """
+    Returns (transmitter, received, send), where send() sends BLOCK over RTS/CTS to a reassembler and
+    returns once it's done, and received is the list of messages the reassembler put together.
+    """
+    to_transmitter = []
+    reassembler = J1939Reassembler(address=0x00, tx=lambda msg: to_transmitter.append(J1939Message(bytes(4) + msg)))
+    received = []
+    transmitter = J1939Transmitter(lambda msg: received.extend(reassembler.processMany([J1939Message(bytes(4) + msg)])),
+                                   max_per_cts=255)
+    def send():
+        transmitter.send(0xEF00, 0xF9, 0x00, BLOCK)
+        while transmitter:
+            while to_transmitter:
+                transmitter.process(to_transmitter.pop(0))
+            transmitter.poll()
+    return transmitter, received, send
+
+def suiteCases() -> list[tuple]:
+    _, _, send = loopback()
+    return [(f"J1939Transmitter RTS/CTS loopback, {len(BLOCK)} bytes", send)]
+
+def throughput():
+    transmitter, received, send = loopback()
+    start = time.perf_counter()
+    for _ in range(BLOCKS):
+        send()
+    elapsed = time.perf_counter() - start
+    assert len(received) == BLOCKS
+    print(f"RTS/CTS loopback: {BLOCKS * len(BLOCK) / elapsed / 1024:.0f} KiB/s, "
+          f"{transmitter.packets_sent / elapsed:.0f} frames/s (sender + receiver)")
+
+def jitter(times : list[float], interval : float) -> str:
+    errors = [(b - a - interval) * 1000 for a, b in zip(times, times[1:])]
+    return f"mean error {statistics.mean(errors):+.3f} ms, max {max(map(abs, errors)):.3f} ms"
+
+def pacing():
+    times = []
+    transmitter = J1939Transmitter(lambda msg: times.append(time.monotonic()))
+    transmitter.send(0xFECA, 0xF9, 0xFF, bytes(7 * BAM_PACKETS))
+    transmitter.flush()
+    print(f"BAM pacing, flush():     {jitter(times[1:], 0.05)}")
+    times = []
+    for seq in range(BAM_PACKETS):
+        time.sleep(0.05)
+        times.append(time.monotonic())
+        toJ1939Message(0xEB00, 7, 0xF9, 0xFF, bytes(8))
+    print(f"BAM pacing, time.sleep(): {jitter(times, 0.05)}")
+
+if __name__ == "__main__":
+    throughput()
+    pacing()
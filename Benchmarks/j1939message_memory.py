@@ -0,0 +1,67 @@
+"""
+Measures J1939Message memory use per message and parse/modify throughput.
+
+Run from the repository root:
+    python Benchmarks/j1939message_memory.py
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import J1939Message, toJ1939Message
+from suite import DATA, timeCase
+
+COUNT = 100_000
+
+def raw_message(i : int) -> bytes:
+    """RP1210_ReadMessage output for a PDU2 message with 8 data bytes."""
+    return i.to_bytes(4, 'big') + b'\xCA\xFE\x00\x06' + bytes([i & 0xFF, 0xFF]) + i.to_bytes(8, 'little')
+
+def measure_memory(make) -> float:
+    """Returns the average number of bytes retained per message built by make(i)."""
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    messages = [make(i) for i in range(COUNT)]
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    list_overhead = sys.getsizeof(messages)
+    del messages
+    return (end - start - list_overhead) / COUNT
+
+def suiteCases() -> list[tuple]:
+    raw = b'\x00\x01\xE2\x40' + toJ1939Message(0xFEF1, 6, 0x00, 0xFF, DATA) # timestamp + message
+    msg = J1939Message(raw)
+    def fields():
+        m = J1939Message(raw)
+        return m.pgn, m.sa, m.da, m.pri, m.data, m.timestamp
+    def modify():
+        msg.pgn = 0xFEF1
+        msg.sa = 0x34
+        msg.pri = 3
+        msg.data = DATA
+        return bytes(msg)
+    return [
+        ("J1939Message parse", lambda: J1939Message(raw)),
+        ("J1939Message parse + fields", fields),
+        ("J1939Message parse + data", lambda: J1939Message(raw).data),
+        ("J1939Message build -> bytes", lambda: bytes(J1939Message(pgn=0xFECA, sa=0x12, data=DATA))),
+        ("J1939Message set pgn, sa, pri, data -> bytes", modify),
+    ]
+
+def main():
+    raws = [raw_message(i) for i in range(COUNT)]
+    print(f"{'case':<40}{'bytes/msg':>12}")
+    print(f"{'parsed from ReadMessage bytes':<40}{measure_memory(lambda i: J1939Message(raws[i])):>12.1f}")
+    print(f"{'parsed, then .data accessed':<40}"
+          f"{measure_memory(lambda i: (lambda m: (m.data, m)[1])(J1939Message(raws[i]))):>12.1f}")
+    print(f"{'built from params':<40}"
+          f"{measure_memory(lambda i: J1939Message(pgn=0xFECA, sa=i & 0xFF, data=raws[i][10:])):>12.1f}")
+    print()
+    print(f"{'case':<44}{'ops/s':>12}")
+    for name, function in suiteCases():
+        print(f"{name:<44}{1e9 / timeCase(function)['ns_per_call']:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark for message building: sanitize_msg_param() and the functions that use it on every
+message (toJ1939Message, J1939TxBatch, Commands, RP1210Client.tx's argument handling). UDS .raw is
+covered by suite.py's "uds" group.
+
+Run from the repository root:
+    python Benchmarks/message_encoding.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210 import Commands, J1939, sanitize_msg_param
+from suite import CAN_MSG, DATA, timeCase
+
+BUFFER = bytearray(64)
+MESSAGES = [(0xF004 + x, 6, 0x12, 0xFF, DATA) for x in range(100)]
+BATCH = J1939.J1939TxBatch()
+
+def encode_batch():
+    BATCH.clear()
+    BATCH.extend(MESSAGES)
+
+def suiteCases() -> list[tuple]:
+    entry = Commands.broadcastEntry(J1939.toJ1939Message(0xF004, 3, 0x00, 0xFF, DATA), 10)
+    return [
+        ("sanitize_msg_param(int, 1)", lambda: sanitize_msg_param(0x12, 1)),
+        ("sanitize_msg_param(int, 3, 'little')", lambda: sanitize_msg_param(0xFECA, 3, 'little')),
+        ("sanitize_msg_param(bytes)", lambda: sanitize_msg_param(DATA)),
+        ("sanitize_msg_param(bytes, len)", lambda: sanitize_msg_param(CAN_MSG, len(CAN_MSG))),
+        ("sanitize_msg_param(bytes, 4, 'little')", lambda: sanitize_msg_param(DATA, 4, 'little')),
+        ("sanitize_msg_param(str, 4)", lambda: sanitize_msg_param("abc", 4)),
+        ("sanitize_msg_param(list)", lambda: sanitize_msg_param([0x11, 0x22, 0x33])),
+        ("toJ1939Message", lambda: J1939.toJ1939Message(0xFECA, 6, 0x12, 0xFF, DATA)),
+        ("toJ1939MessageInto", lambda: J1939.toJ1939MessageInto(BUFFER, 0, 0xFECA, 6, 0x12, 0xFF, DATA)),
+        ("toJ1939Message, 100 messages", lambda: [J1939.toJ1939Message(*args) for args in MESSAGES]),
+        ("J1939TxBatch, 100 messages", encode_batch),
+        ("toJ1939Request", lambda: J1939.toJ1939Request(0xFECA, 0xF9)),
+        ("Commands.setJ1939Filters", lambda: Commands.setJ1939Filters(1 + 4, pgn=0xFECA, source=0x12)),
+        ("Commands.setCANFilters", lambda: Commands.setCANFilters(1, 0x1FFFFFFF, 0x18FEF100)),
+        ("Commands.protectJ1939Address", lambda: Commands.protectJ1939Address(0xF9, 0x123456789ABCDEF0)),
+        ("Commands.setEcho", lambda: Commands.setEcho(True)),
+        ("Commands.setMessageReceive", lambda: Commands.setMessageReceive(True)),
+        ("Commands.releaseJ1939Address", lambda: Commands.releaseJ1939Address(0xF9)),
+        ("Commands.setFilterType", lambda: Commands.setFilterType(0)),
+        ("Commands.setMaxErrorMsgSize", lambda: Commands.setMaxErrorMsgSize(0xFF)),
+        ("Commands.setJ1939InterpacketTime", lambda: Commands.setJ1939InterpacketTime(50)),
+        ("Commands.setJ1939Baud", lambda: Commands.setJ1939Baud(5)),
+        ("Commands.setCANBaud", lambda: Commands.setCANBaud(5)),
+        ("Commands.setBlockingTimeout", lambda: Commands.setBlockingTimeout(10, 10)),
+        ("Commands.generic", lambda: Commands.generic(DATA, 8)),
+        ("Commands.broadcastEntry", lambda: Commands.broadcastEntry(CAN_MSG, 100)),
+        ("Commands.addBroadcastList (4 entries)", lambda: Commands.addBroadcastList([entry] * 4)),
+        ("Commands.setBroadcastList", lambda: Commands.setBroadcastList(1, entry)),
+        ("Commands.viewBroadcastList", lambda: Commands.viewBroadcastList(2)),
+        ("Commands.removeBroadcastEntry", lambda: Commands.removeBroadcastEntry(2)),
+    ]
+
+def main():
+    print(f"{'case':<42}{'ns/call':>10}")
+    for name, function in suiteCases():
+        print(f"{name:<42}{timeCase(function)['ns_per_call']:>10.0f}")
+
+if __name__ == "__main__":
+    main()
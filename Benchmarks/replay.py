@@ -0,0 +1,80 @@
+"""
+Compares replaying a capture by sleeping between messages (sleep for the gap to the next message,
+then send it) against ReplayEngine, in real time and as fast as possible.
+
+Real time: how far behind schedule each message goes out. Sleeping between messages adds up every
+oversleep and every send, so it drifts later and later; ReplayEngine schedules every message from
+the start of the replay, so it doesn't.
+
+As fast as possible: messages per second through a tx that does nothing.
+
+Run from the repository root:
+    python Benchmarks/replay.py
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.Capture import CaptureReader, CaptureWriter
+from RP1210.J1939 import toJ1939Message
+from RP1210.Replay import REPLAY_ASAP, ReplayEngine
+from suite import bestTime, scratchPath
+
+TIMED_MESSAGES = 1000
+PERIOD = 0.001 # 1000 messages/second
+ASAP_MESSAGES = 200_000
+REPEATS = 3
+
+def write_capture(path : Path, count : int, period : float) -> None:
+    with CaptureWriter(path, clock=lambda: 1000.0) as writer:
+        for i in range(count):
+            writer.write(i.to_bytes(4, 'big') + toJ1939Message(0xF004, 3, i & 0xFF, 0xFF, bytes(8), 8),
+                         timestamp=1000.0 + i * period)
+
+def naive_replay(path : Path, tx) -> None:
+    """Sleeps for the gap between each message and the one before it."""
+    with CaptureReader(path) as capture:
+        last = None
+        for record in capture:
+            if last is not None:
+                time.sleep(record.time - last)
+            last = record.time
+            tx(bytes(record.message[4:]))
+
+def play_asap(path : Path) -> int:
+    return ReplayEngine(lambda msg: None, speed=REPLAY_ASAP).play(path)
+
+def lag_stats(sent : list[float]) -> tuple[float, float]:
+    """Returns (mean, worst) lag in ms, compared to sending every PERIOD seconds from the first message."""
+    lags = [(t - sent[0] - i * PERIOD) * 1000 for i, t in enumerate(sent)]
+    return sum(lags) / len(lags), max(lags)
+
+def suiteCases() -> list[tuple]:
+    path = scratchPath("replay.rpl")
+    write_capture(path, TIMED_MESSAGES, PERIOD)
+    return [(f"ReplayEngine.play as fast as possible, {TIMED_MESSAGES} messages", lambda: play_asap(path))]
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        timed = Path(directory) / "timed.rpl"
+        asap = Path(directory) / "asap.rpl"
+        write_capture(timed, TIMED_MESSAGES, PERIOD)
+        write_capture(asap, ASAP_MESSAGES, PERIOD)
+
+        naive_sent, engine_sent = [], []
+        naive_replay(timed, lambda msg: naive_sent.append(time.monotonic()))
+        ReplayEngine(lambda msg: engine_sent.append(time.monotonic())).play(timed)
+        assert len(naive_sent) == len(engine_sent) == TIMED_MESSAGES
+        print(f"real time, {TIMED_MESSAGES} messages {PERIOD * 1000:.0f} ms apart:")
+        print("  sleep between messages: mean lag %7.2f ms, worst %7.2f ms" % lag_stats(naive_sent))
+        print("  ReplayEngine:           mean lag %7.2f ms, worst %7.2f ms" % lag_stats(engine_sent))
+
+        best, sent = bestTime(play_asap, asap, repeats=REPEATS)
+        assert sent == ASAP_MESSAGES
+        print(f"as fast as possible: {ASAP_MESSAGES / best:,.0f} messages/s ({best * 1000:.1f} ms for {ASAP_MESSAGES})")
+
+if __name__ == "__main__":
+    main()
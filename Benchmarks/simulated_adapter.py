@@ -0,0 +1,184 @@
+"""
+Measures RP1210Client send and receive throughput against the simulated adapter in RP1210.Simulator,
+so the numbers can be reproduced on any OS without an adapter. The simulator's own overhead is
+included, so real adapters will differ; use this to compare the client's read/write paths with each
+other, not to predict bus performance.
+
+Reported:
+- tx() one message at a time vs txBatch() with a J1939TxBatch, received by a second client.
+- rx() one message at a time vs rxMany(), rxBatch() and a background reader (startReader()),
+reading traffic the bus generated ahead of time.
+- Receive latency with blocking reads: how long after a message is due the read returns it.
+
+Run from the repository root:
+    python Benchmarks/simulated_adapter.py
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210.J1939 import J1939TxBatch, toJ1939Message
+from RP1210.Reader import RxRingBuffer
+from RP1210.Simulator import SimulatedDLL, VirtualBus, simulatedClient
+from suite import DATA
+
+MESSAGES = 50000
+REPEATS = 3
+LATENCY_MESSAGES = 200
+LATENCY_RATE = 1000 # messages per second
+
+def connect(bus : VirtualBus):
+    client = simulatedClient(SimulatedDLL(bus))
+    client.connect(b"J1939:Baud=Auto")
+    return client
+
+def messages() -> list[bytes]:
+    return [toJ1939Message(0xFF00 + (i & 0xFF), 6, 0x00, 0xFF, i.to_bytes(8, 'little')) for i in range(256)]
+
+def tx_one(sender, msgs : list[bytes]) -> None:
+    for i in range(MESSAGES):
+        sender.tx(msgs[i & 0xFF])
+
+def tx_batch(sender, msgs : list[bytes]) -> None:
+    batch = J1939TxBatch(256)
+    for i in range(256):
+        batch.add(0xFF00 + i, 6, 0x00, 0xFF, i.to_bytes(8, 'little'))
+    for _ in range(MESSAGES // 256):
+        sender.txBatch(batch)
+    for i in range(MESSAGES % 256):
+        sender.tx(msgs[i])
+
+def rx_one(receiver) -> list[bytes]:
+    received = []
+    while True:
+        msg = receiver.rx()
+        if not msg:
+            return received
+        received.append(msg)
+
+def rx_many(receiver) -> list[bytes]:
+    received = []
+    while True:
+        msgs = receiver.rxMany(256)
+        if not msgs:
+            return received
+        received.extend(msgs)
+
+def rx_batch(receiver) -> list[bytes]:
+    received = []
+    batch = None
+    while True:
+        batch = receiver.rxBatch(256, batch=batch)
+        if not len(batch):
+            return received
+        received.extend(bytes(msg) for msg in batch)
+
+def rx_reader(receiver) -> list[bytes]:
+    ring = receiver.startReader(capacity=MESSAGES).ring
+    received = []
+    while len(received) < MESSAGES - 1:
+        msgs = ring.getMany(block=True, timeout=1.0)
+        if not msgs:
+            break
+        received.extend(msgs)
+    receiver.stopReader()
+    return received
+
+def sent(send, msgs : list[bytes]) -> float:
+    """Sends MESSAGES with send() to a second client. Returns how long send() took."""
+    bus = VirtualBus(rx_queue_size=MESSAGES)
+    sender, receiver = connect(bus), connect(bus)
+    start = time.perf_counter()
+    send(sender, msgs)
+    elapsed = time.perf_counter() - start
+    assert len(rx_many(receiver)) == MESSAGES
+    return elapsed
+
+def received(read) -> tuple[float, list[bytes]]:
+    """Reads MESSAGES - 1 messages with read(). Returns (how long read() took, messages minus timestamps)."""
+    bus = VirtualBus(rx_queue_size=MESSAGES)
+    receiver = connect(bus)
+    bus.addTraffic(messages(), rate=1e9, count=MESSAGES, start=0.0)
+    receiver.rxMany(1) # generates the traffic, so it isn't timed
+    start = time.perf_counter()
+    msgs = read(receiver)
+    elapsed = time.perf_counter() - start
+    return elapsed, [msg[4:] for msg in msgs]
+
+def suiteCases() -> list[tuple]:
+    """RP1210Client I/O against SimulatedDLL. Includes the simulator's overhead."""
+    msg = toJ1939Message(0xFEF1, 6, 0x00, 0xFF, DATA)
+    alone = connect(VirtualBus()) # nobody to receive what it sends
+    bus = VirtualBus()
+    sender, receiver = connect(bus), connect(bus)
+    ring = RxRingBuffer(capacity=64)
+    def tx_rx():
+        sender.tx(msg)
+        return receiver.rx()
+    def tx_rx_batch():
+        for _ in range(64):
+            sender.tx(msg)
+        return receiver.rxBatch(64)
+    def tx_rx_many():
+        for _ in range(64):
+            sender.tx(msg)
+        return receiver.rxMany(64)
+    def ring_put_get():
+        for _ in range(64):
+            ring.put(msg)
+        return ring.getMany()
+    assert tx_rx()[4:] == msg
+    assert len(tx_rx_batch()) == 64
+    assert len(tx_rx_many()) == 64
+    assert len(ring_put_get()) == 64
+    return [
+        ("RP1210Client.tx", lambda: alone.tx(msg)),
+        ("RP1210Client.rx (no message)", lambda: alone.rx()),
+        ("RP1210Client.tx + rx", tx_rx),
+        ("RP1210Client.tx x64 + rxBatch(64)", tx_rx_batch),
+        ("RP1210Client.tx x64 + rxMany(64)", tx_rx_many),
+        ("RxRingBuffer.put x64 + getMany", ring_put_get),
+    ]
+
+def bench_tx() -> None:
+    msgs = messages()
+    for name, send in (("tx() per message", tx_one), ("txBatch()", tx_batch)):
+        best = min(sent(send, msgs) for _ in range(REPEATS))
+        print(f"{name:24}: {MESSAGES / best:10,.0f} msg/s")
+
+def bench_rx() -> None:
+    expected = None
+    for name, read in (("rx() per message", rx_one), ("rxMany()", rx_many), ("rxBatch()", rx_batch),
+                       ("startReader()", rx_reader)):
+        results = [received(read) for _ in range(REPEATS)]
+        for _, msgs in results:
+            if expected is None:
+                expected = msgs
+            assert msgs[1:] == expected[1:] and len(msgs) == MESSAGES - 1
+        best = min(elapsed for elapsed, _ in results)
+        print(f"{name:24}: {(MESSAGES - 1) / best:10,.0f} msg/s")
+
+def bench_latency() -> None:
+    bus = VirtualBus(timestamp_weight=1)
+    receiver = connect(bus)
+    receiver.setBlockingTimeout(100, 10)
+    start = time.monotonic() + 0.01
+    bus.addTraffic(messages(), rate=LATENCY_RATE, count=LATENCY_MESSAGES, start=start)
+    late = []
+    for i in range(LATENCY_MESSAGES):
+        msg = receiver.rx(blocking=1)
+        assert msg
+        late.append((time.monotonic() - (start + i / LATENCY_RATE)) * 1000)
+    print(f"{'blocking rx() latency':24}: {statistics.mean(late):7.3f} ms mean, "
+          f"{max(late):7.3f} ms worst ({LATENCY_MESSAGES} messages at {LATENCY_RATE}/s)")
+
+def main():
+    bench_tx()
+    bench_rx()
+    bench_latency()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+The benchmark harness: times every registered case and saves the results as JSON, so releases can be
+compared with each other.
+
+Cases live next to the feature they measure, in that feature's own script (e.g. Benchmarks/replay.py),
+as a `suiteCases()` function returning (name, function) pairs; `CASE_GROUPS` lists every group. The
+scripts' own reports (throughput, lag, CPU use) time their workloads with `bestTime()` from here.
+
+Covered:
+- sanitize_msg_param(), toJ1939Message(), J1939TxBatch and every Commands builder that takes
+arguments (message_encoding)
+- J1939Message parsing, building and field changes (j1939message_memory)
+- DiagnosticMessage and DM1Tracker (dtc_array, dm1_tracking)
+- UDSMessage.fromMessageData() and .raw for the request and response of every UDS service (the "uds"
+group, in this file)
+- J1939Dispatcher, J1939FilterSet, J1939Reassembler, J1939Transmitter and J1939Requester (j1939_dispatch,
+j1939_filters, j1939_reassembly, j1939_transmit, j1939_requests)
+- TimestampConverter (timestamp_convert)
+- RP1210Client tx/rx paths and RxRingBuffer against the simulated adapter (simulated_adapter)
+- CaptureWriter and CaptureReader (capture_write, capture_read)
+- CyclicScheduler.poll(), ReplayEngine and BroadcastListManager (cyclic_scheduler, replay,
+broadcast_list)
+
+bridge_receive.py is the only script without cases here: what it measures (receive latency and idle
+CPU use in real time) isn't a per-call cost.
+
+Each case is timed with timeit (best of `--repeats` runs of however many calls take about 0.2 s) and
+reported in nanoseconds per call.
+
+Run from the repository root:
+    python Benchmarks/suite.py                              # run everything, save to Benchmarks/results/
+    python Benchmarks/suite.py -k UDS                       # only cases with "UDS" in their name
+    python Benchmarks/suite.py --compare Benchmarks/results/RP1210-1.0.1-py3.11.json
+
+With `--compare`, each case is listed next to its time in the older results, and the script exits
+with status 1 if any case got slower by more than `--threshold` (default 1.25 = 25% slower).
+Results are only comparable between runs on the same computer and Python version.
+"""
+import argparse
+import atexit
+import datetime
+import importlib
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210 import UDS
+
+RESULTS_DIRECTORY = Path(__file__).resolve().parent / "results"
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 1.25
+
+DATA = b'\x11\x22\x33\x44\x55\x66\x77\x88'
+"""Sample message data, shared by the cases in every script."""
+CAN_MSG = b'\x01\x18\xFE\xF1\x00' + DATA
+
+#########
+# CASES #
+#########
+
+def udsSample(cls) -> bytes:
+    """Returns valid message data for a UDSMessage subclass."""
+    msg = cls()
+    data = bytes([msg.sid])
+    if msg.hasSubfn():
+        data += b'\x01'
+    if msg.hasDID():
+        data += b'\xF1\x90'
+    if msg.hasData():
+        size = 4 if msg.dataSizeCanChange() else msg.dataSize()
+        data += bytes(range(1, size + 1))
+    return data
+
+def _uds_cases() -> list[tuple]:
+    cases = []
+    for cls in UDS.UDSMessage.__subclasses__():
+        sample = udsSample(cls)
+        try:
+            msg = UDS.UDSMessage.fromMessageData(sample)
+        except AttributeError: # services that build their data from other fields can't be parsed this way
+            msg = cls()
+        else:
+            assert type(msg) is cls, cls.__name__
+            cases.append((f"UDS {cls.__name__}.fromMessageData", lambda sample=sample: UDS.UDSMessage.fromMessageData(sample)))
+        cases.append((f"UDS {cls.__name__}.raw", lambda msg=msg: msg.raw))
+    return cases
+
+def _script(name : str):
+    """Returns a function that imports Benchmarks/<name>.py (only when its cases are run) and returns its cases."""
+    def cases() -> list[tuple]:
+        return importlib.import_module(name).suiteCases()
+    return cases
+
+SCRIPTS = ("message_encoding", "j1939message_memory", "dtc_array", "dm1_tracking", "j1939_dispatch", "j1939_filters",
+           "j1939_reassembly", "j1939_transmit", "j1939_requests", "timestamp_convert", "simulated_adapter",
+           "capture_write", "capture_read", "cyclic_scheduler", "replay", "broadcast_list")
+"""The scripts in Benchmarks/ with a `suiteCases()` function."""
+
+CASE_GROUPS = {"uds": _uds_cases, **{name: _script(name) for name in SCRIPTS}}
+"""Functions that return the (name, function) benchmark cases of each group."""
+
+###########
+# RUNNING #
+###########
+
+def timeCase(function, repeats : int = DEFAULT_REPEATS) -> dict:
+    """Times a function with timeit. Returns {"ns_per_call", "calls"} (calls per repeat)."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeats, number)) / number
+    return {"ns_per_call": round(best * 1e9, 1), "calls": number}
+
+def bestTime(function, *args, repeats : int = 3) -> tuple:
+    """
+    Calls function(*args) `repeats` times, for timing one big workload rather than many small calls.
+    Returns (seconds the fastest call took, what the last call returned).
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def scratchPath(name : str) -> str:
+    """Path to a file called name in a temporary directory that's deleted when Python exits, for cases that write files."""
+    global _scratch
+    if _scratch is None:
+        _scratch = tempfile.mkdtemp(prefix="rp1210-benchmarks-")
+        atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+    return str(Path(_scratch) / name)
+
+_scratch = None
+
+def run(keyword : str = "", repeats : int = DEFAULT_REPEATS, out = sys.stdout) -> dict:
+    """Runs every case with keyword in its name (case-insensitive) and returns the results."""
+    results = {}
+    for group, cases in CASE_GROUPS.items():
+        for name, function in cases():
+            if keyword.lower() not in name.lower():
+                continue
+            results[name] = dict(group=group, **timeCase(function, repeats))
+            print(f"{name:<64}{results[name]['ns_per_call']:>12.0f} ns", file=out)
+    return {
+        "package_version": packageVersion(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "repeats": repeats,
+        "results": results,
+    }
+
+def compare(new : dict, old : dict, threshold : float = DEFAULT_THRESHOLD, out = sys.stdout) -> list[str]:
+    """Prints new vs old times for every case in both. Returns the names of cases slower than threshold."""
+    regressions = []
+    print(f"\n{'case':<64}{'old ns':>10}{'new ns':>10}{'ratio':>8}", file=out)
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before = old["results"][name]["ns_per_call"]
+        after = result["ns_per_call"]
+        ratio = after / before if before else float('inf')
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  SLOWER"
+        print(f"{name:<64}{before:>10.0f}{after:>10.0f}{ratio:>8.2f}{flag}", file=out)
+    print(f"\n{len(regressions)} of {len(new['results'])} cases slower than {threshold:.2f}x", file=out)
+    return regressions
+
+def packageVersion() -> str:
+    """Version from pyproject.toml (so it works without installing the package)."""
+    pyproject = Path(__file__).resolve().parent.parent / "pyproject.toml"
+    try:
+        for line in pyproject.read_text().splitlines():
+            if line.startswith("version"):
+                return line.split("=", 1)[1].strip().strip('"')
+    except OSError:
+        pass
+    return "unknown"
+
+def defaultOutput() -> Path:
+    return RESULTS_DIRECTORY / f"RP1210-{packageVersion()}-py{platform.python_version()}.json"
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(description="RP1210 encode/decode and I/O benchmarks")
+    parser.add_argument("-k", "--keyword", default="", help="only run cases with this in their name")
+    parser.add_argument("-r", "--repeats", type=int, default=DEFAULT_REPEATS, help="timing runs per case (best is kept)")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="JSON file to save results to")
+    parser.add_argument("--no-save", action="store_true", help="don't save results")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.keyword, args.repeats)
+    if not args.no_save:
+        output = args.output or defaultOutput()
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nSaved to {output}")
+    if args.compare is not None:
+        old = json.loads(args.compare.read_text())
+        if compare(results, old, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
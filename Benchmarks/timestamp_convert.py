@@ -0,0 +1,72 @@
+"""
+Compares converting batches of adapter timestamps to host time one at a time (TimestampConverter.convert()
+for every message) against TimestampConverter.updateMany(), pure Python and NumPy.
+
+Run from the repository root:
+    python Benchmarks/timestamp_convert.py
+"""
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RP1210 import Timestamps
+from RP1210.Timestamps import TimestampConverter, messageTimestamps
+from suite import bestTime
+
+MESSAGES = 200_000
+BATCH = 256
+REPEATS = 3
+
+def traffic(count : int = MESSAGES) -> list[bytes]:
+    rng = random.Random(1)
+    ticks = 0xFFF00000 # wraps around partway through
+    messages = []
+    for _ in range(count):
+        ticks = (ticks + rng.randrange(100, 600)) & 0xFFFFFFFF
+        messages.append(ticks.to_bytes(4, 'big') + bytes(14))
+    return messages
+
+def one_at_a_time(messages) -> list[float]:
+    converter = TimestampConverter(weight=1.0)
+    convert = converter.convert
+    out = []
+    for i in range(0, len(messages), BATCH):
+        ticks = [int.from_bytes(message[0:4], 'big') for message in messages[i:i + BATCH]]
+        converter.update(ticks[-1], i * 1e-3) # newest message in the batch was received now
+        out += [convert(tick) for tick in ticks]
+    return out
+
+def batched(messages, use_numpy) -> list[float]:
+    converter = TimestampConverter(weight=1.0)
+    out = []
+    for i in range(0, len(messages), BATCH):
+        times = converter.updateMany(messageTimestamps(messages[i:i + BATCH], use_numpy), i * 1e-3, use_numpy)
+        out += times.tolist() if use_numpy else times
+    return out
+
+def suiteCases() -> list[tuple]:
+    messages = traffic(BATCH)
+    converter = TimestampConverter(weight=1.0)
+    convert = converter.convert
+    return [
+        ("TimestampConverter.convert", lambda: convert(0x12345678)),
+        (f"TimestampConverter.updateMany, {BATCH} messages", lambda: converter.updateMany(messageTimestamps(messages, False), 1.0, False)),
+    ]
+
+def main():
+    messages = traffic()
+    print(f"{MESSAGES} messages, {BATCH} per batch")
+    single_time, expected = bestTime(one_at_a_time, messages, repeats=REPEATS)
+    print(f"convert() for every message:{MESSAGES / single_time:>12.0f} msg/s")
+    python_time, result = bestTime(batched, messages, False, repeats=REPEATS)
+    assert max(abs(a - b) for a, b in zip(result, expected)) < 1e-6
+    print(f"updateMany():               {MESSAGES / python_time:>12.0f} msg/s")
+    if Timestamps.numpy is not None:
+        numpy_time, result = bestTime(batched, messages, True, repeats=REPEATS)
+        assert max(abs(a - b) for a, b in zip(result, expected)) < 1e-6
+        print(f"updateMany() with NumPy:    {MESSAGES / numpy_time:>12.0f} msg/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+asyncio interface for RP1210 adapters.
+
+RP1210 DLL calls block, so they can't be awaited directly. Wrapping `RP1210Client.rx(blocking=1)` in
+`run_in_executor` works, but it ties up one thread per adapter. The classes in this file use a
+single I/O thread per RP1210 API (DLL) instead, no matter how many clients are connected through
+it. The thread reads every client with `ReadMany()` and hands each batch of messages to the client's
+event loop with one `call_soon_threadsafe()` call.
+
+- `AsyncRP1210Client` - an async wrapper around `RP1210Client`.
+- `RP1210IOThread` - the I/O thread shared by every `AsyncRP1210Client` using the same API.
+
+```
+client = RP1210Client()
+client.setVendor("NULN2R32")
+client.setDevice(1)
+async with AsyncRP1210Client(client) as aclient:
+    await aclient.connect(b"J1939:Baud=Auto")
+    await aclient.send(J1939.toJ1939Message(0xEA00, 6, 0xF9, 0xFF, b'\\xE5\\xFE\\x00'))
+    async for msg in aclient:
+        print(J1939.J1939Message(msg))
+```
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from RP1210 import Reader
+
+class RP1210IOThread:
+    """
+    A thread that does all of the DLL calls for every `AsyncRP1210Client` sharing one RP1210 API.
+
+    Use `RP1210IOThread.get(api)` rather than creating one yourself; it returns the thread object
+    for `api`, creating it if needed. The thread starts when a client registers or a call is
+    submitted, and exits once it has no clients and no calls left to run.
+
+    Every loop, the thread:
+    - runs any calls submitted with `submit()` (e.g. SendMessage, SendCommand)
+    - reads each registered client with `ReadMany()` and delivers non-empty batches to its loop
+    - waits up to `idle_sleep` seconds for a new call if there was nothing to read
+
+    RP1210 has no way to be told when a message arrives, so an idle bus still costs one
+    `ReadMany()` (one RP1210_ReadMessage call) per client every `idle_sleep` seconds: about 1000
+    calls per second per client with the default. On a busy bus, each wakeup hands over a whole
+    batch. Raise `idle_sleep` if latency matters less than CPU time.
+
+    If reading a client returns an error, it's delivered once (again only if the error code
+    changes), and that client is only read every `error_retry` seconds until a read succeeds, so a
+    persistent error (e.g. an unplugged adapter) doesn't flood the event loop.
+
+    Args:
+    - `api` - the `RP1210API` to serve.
+    - `idle_sleep` - seconds to wait when there was nothing to read.
+    - `error_retry` - seconds between reads of a client whose last read returned an error.
+    """
+    _threads = {} #type: dict[str, RP1210IOThread]
+    _threads_lock = threading.Lock()
+
+    def __init__(self, api, idle_sleep : float = 0.001, error_retry : float = 0.1) -> None:
+        self.api = api
+        self.idle_sleep = idle_sleep
+        self.error_retry = error_retry
+        self._read_errors = {} #type: dict[AsyncRP1210Client, tuple[int, float]] # (error, retry at); I/O thread only
+        self._clients = () #type: tuple[AsyncRP1210Client]
+        self._calls = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None #type: threading.Thread
+
+    @classmethod
+    def get(cls, api):
+        """Returns the I/O thread for `api`, creating it if there isn't one."""
+        with cls._threads_lock:
+            io_thread = cls._threads.get(api.getAPIName())
+            if io_thread is None:
+                io_thread = cls(api)
+                cls._threads[api.getAPIName()] = io_thread
+            return io_thread
+
+    def register(self, client) -> None:
+        """Starts reading messages for `client` (an `AsyncRP1210Client`)."""
+        with self._lock:
+            if client not in self._clients:
+                self._clients += (client,)
+            self._start()
+
+    def unregister(self, client) -> None:
+        """Stops reading messages for `client`."""
+        with self._lock:
+            self._clients = tuple(c for c in self._clients if c is not client)
+            self._read_errors.pop(client, None)
+        self._calls.put(None) # wake up the thread in case it can exit
+
+    def submit(self, function, *args) -> Future:
+        """
+        Runs `function(*args)` on the I/O thread and returns a `concurrent.futures.Future` for its
+        result. Use `asyncio.wrap_future()` to await it.
+        """
+        future = Future()
+        with self._lock:
+            self._calls.put((future, function, args))
+            self._start()
+        return future
+
+    def isRunning(self) -> bool:
+        """Returns True if the I/O thread is alive."""
+        return self._thread is not None
+
+    def _start(self) -> None:
+        """Starts the thread if it isn't running. Must be called with the lock held."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name=f"RP1210IOThread-{self.api.getAPIName()}")
+            self._thread.start()
+
+    def _call(self, future : Future, function, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _run_calls(self, call) -> None:
+        """Runs `call` and any others that are waiting. None is just a wakeup and is skipped."""
+        calls = self._calls
+        while True:
+            if call is not None:
+                self._call(*call)
+            try:
+                call = calls.get_nowait()
+            except queue.Empty:
+                return
+
+    def _deliver(self, client, messages : list[bytes], error : int, exception : BaseException):
+        """Hands messages to client on its event loop. Unregisters the client if its loop is closed."""
+        try:
+            client._loop.call_soon_threadsafe(client._deliver, messages, error, exception)
+        except RuntimeError:
+            self.unregister(client)
+
+    def _run(self):
+        calls = self._calls
+        read_many = self.api.ReadMany
+        read_errors = self._read_errors
+        call = None
+        while True:
+            self._run_calls(call)
+            with self._lock:
+                if not self._clients and calls.empty():
+                    self._thread = None
+                    read_errors.clear()
+                    return
+            busy = False
+            now = time.monotonic()
+            for client in self._clients:
+                last_error, retry_at = read_errors.get(client, (0, 0.0))
+                if now < retry_at:
+                    continue
+                batch = client._batch
+                try:
+                    read_many(client._client_id, Batch=batch)
+                except Exception as e:
+                    self.unregister(client)
+                    self._deliver(client, [], 0, e)
+                    continue
+                error = batch.error
+                if error:
+                    read_errors[client] = (error, now + self.error_retry)
+                elif last_error:
+                    read_errors.pop(client, None)
+                if error == last_error:
+                    error = 0 # already delivered
+                if batch.count or error:
+                    busy = busy or batch.count > 0
+                    self._deliver(client, batch.toList(), error, None)
+            try:
+                call = calls.get_nowait() if busy else calls.get(timeout=self.idle_sleep)
+            except queue.Empty:
+                call = None
+
+class AsyncRP1210Client:
+    """
+    asyncio wrapper around an `RP1210Client`.
+
+    Configure the `RP1210Client` (vendor, device) as usual, then wrap it. Every DLL call is made on
+    the `RP1210IOThread` for the client's API, so one event loop can serve dozens of channels.
+
+    Args:
+    - `client` - the `RP1210Client` to wrap. It can already be connected.
+    - `queue_size` - max number of received messages to hold until you `recv()` them. When the
+    queue is full, the oldest messages are dropped and counted in `dropped`. 0 means no limit.
+    - `max_messages` - max number of messages read per `ReadMany()` call.
+    - `buffer_size` - the size of each message buffer in bytes. Defaults to 256.
+
+    Attributes:
+    - `client` - the wrapped `RP1210Client`.
+    - `dropped` - number of messages discarded because the queue was full.
+    - `errors` - number of times RP1210_ReadMessage started returning an error code. An error that
+    keeps coming back is counted once (see `RP1210IOThread`).
+    - `last_error` - the most recent error code returned by RP1210_ReadMessage (0 if none).
+
+    Received messages are `bytes` in the same format as `RP1210Client.rx()`, including timestamp.
+    """
+    def __init__(self, client, queue_size : int = 0, max_messages : int = 64, buffer_size : int = 256) -> None:
+        self.client = client
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = 0
+        self._queue = deque()
+        self._queue_size = queue_size
+        self._batch = Reader.RxBatch(max_messages, buffer_size)
+        self._client_id = client.getClientID()
+        self._loop = None #type: asyncio.AbstractEventLoop
+        self._waiter = None #type: asyncio.Future
+        self._io_thread = None #type: RP1210IOThread
+        self._exception = None #type: BaseException
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        msg = await self.recv()
+        if not msg:
+            raise StopAsyncIteration
+        return msg
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __len__(self) -> int:
+        """Returns the number of received messages waiting to be read."""
+        return len(self._queue)
+
+    def isOpen(self) -> bool:
+        """Returns True if messages are being read for this client."""
+        return self._io_thread is not None
+
+    async def open(self) -> None:
+        """
+        Starts reading messages for this client on its API's I/O thread.
+
+        `connect()` calls this for you. Call it directly if you connected the `RP1210Client` yourself.
+        """
+        if self._io_thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._client_id = self.client.getClientID()
+        self._exception = None
+        self._io_thread = RP1210IOThread.get(self.client.getAPI())
+        self._io_thread.register(self)
+
+    async def close(self) -> None:
+        """Stops reading messages for this client. Anyone waiting in `recv()` gets b''."""
+        if self._io_thread is not None:
+            self._io_thread.unregister(self)
+            self._io_thread = None
+        self._wake()
+
+    async def connect(self, protocol = b"J1939:Baud=Auto") -> int:
+        """
+        Calls `RP1210Client.connect()`, then starts reading messages if it worked.
+
+        Returns clientID; will return 128 (ERR_DLL_NOT_INITIALIZED) if there's an error.
+        """
+        client_id = await self._run(self.client.connect, protocol)
+        if client_id < 128:
+            await self.open()
+        return client_id
+
+    async def disconnect(self) -> int:
+        """
+        Stops reading messages, then calls `RP1210Client.disconnect()`.
+
+        Returns 0 if successful, or >127 if it failed.
+        """
+        await self.close()
+        return await self._run(self.client.disconnect)
+
+    async def recv(self, timeout : float = None) -> bytes:
+        """
+        Returns the oldest received message, waiting for one to arrive if necessary.
+        - timeout = max number of seconds to wait. Waits forever if None.
+
+        Returns b'' on timeout, or if the client is closed and there are no messages left.
+        Raises the exception from the I/O thread if reading from the DLL failed.
+        """
+        while not self._queue:
+            if self._exception is not None:
+                e, self._exception = self._exception, None
+                raise e
+            if self._io_thread is None:
+                return b''
+            self._waiter = self._loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            except asyncio.TimeoutError:
+                return b''
+            finally:
+                self._waiter = None
+        return self._queue.popleft()
+
+    def recvMany(self, max_count : int = 0) -> list[bytes]:
+        """
+        Returns up to max_count received messages without waiting, oldest first.
+        - max_count = max number of messages to return. Set to 0 to get every available message.
+        """
+        count = len(self._queue)
+        if max_count:
+            count = min(count, max_count)
+        popleft = self._queue.popleft
+        return [popleft() for _ in range(count)]
+
+    async def send(self, message, msg_size = 0) -> int:
+        """
+        Sends a message via `RP1210Client.tx()` on the I/O thread.
+
+        Returns 0 if successful, or >127 if it failed.
+        """
+        return await self._run(self.client.tx, message, msg_size)
+
+    async def command(self, CommandNumber, ClientCommand = b"", MessageSize = 0) -> int:
+        """
+        Calls `RP1210Client.command()` (RP1210_SendCommand) on the I/O thread.
+
+        Returns 0 if successful, or >127 if it failed.
+        """
+        return await self._run(self.client.command, CommandNumber, ClientCommand, MessageSize)
+
+    async def _run(self, function, *args):
+        """Runs function on the I/O thread for this client's API and awaits the result."""
+        io_thread = self._io_thread or RP1210IOThread.get(self.client.getAPI())
+        return await asyncio.wrap_future(io_thread.submit(function, *args))
+
+    def _deliver(self, messages : list[bytes], error : int, exception : BaseException) -> None:
+        """Called on the event loop by the I/O thread with a batch of messages."""
+        if error > 0:
+            self.errors += 1
+            self.last_error = error
+        if exception is not None:
+            self._exception = exception
+            self._io_thread = None
+        self._queue.extend(messages)
+        if self._queue_size:
+            overflow = len(self._queue) - self._queue_size
+            if overflow > 0:
+                self.dropped += overflow
+                for _ in range(overflow):
+                    self._queue.popleft()
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
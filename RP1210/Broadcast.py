@@ -0,0 +1,162 @@
+"""
+Keeps track of an adapter's broadcast list (RP1210_Set_Broadcast_For_XXX), so it can send periodic
+messages by itself.
+
+```
+broadcasts = BroadcastListManager(client.command, BROADCAST_FOR_J1939)
+broadcasts.add("eec1", toJ1939Message(0xF004, 3, 0x00, 0xFF, eec1_data), 0.01)
+broadcasts.add("ccvs", toJ1939Message(0xFEF1, 6, 0x00, 0xFF, ccvs_data), 0.1)
+broadcasts.apply() # one ADD_LIST command
+broadcasts.update("eec1", toJ1939Message(0xF004, 3, 0x00, 0xFF, new_data))
+broadcasts.apply() # REMOVE_ENTRY + ADD_LIST; ccvs isn't touched
+```
+
+The adapter's list can only be added to, have one entry removed (which moves the entries after it
+down one), or be destroyed, and there's no way to change an entry. `BroadcastListManager` keeps a
+copy of what the adapter has, and `apply()` works out the fewest commands that turn it into what
+you asked for.
+"""
+from ctypes import create_string_buffer
+
+from RP1210 import Commands
+
+BROADCAST_FOR_J1939 = Commands.COMMAND_IDS["SET_BROADCAST_FOR_J1939"]
+"""RP1210_Set_Broadcast_For_J1939 command number; `BroadcastListManager` default."""
+BROADCAST_FOR_CAN = Commands.COMMAND_IDS["SET_BROADCAST_FOR_CAN"]
+"""RP1210_Set_Broadcast_For_CAN command number."""
+
+class BroadcastListManager:
+    """
+    Mirrors one client's broadcast list for one protocol (see module docstring).
+
+    `add()`, `update()`, `remove()` and `clear()` only change what you want the list to be; nothing
+    is sent until `apply()`, so you can make several changes at once.
+
+    Args:
+    - `command` - function to send commands with, called as command(command_number, client_command,
+    size), e.g. `client.command`. Returns 0 if successful.
+    - `command_number` - `BROADCAST_FOR_J1939` or `BROADCAST_FOR_CAN` (or the J1708, J1850,
+    ISO15765, KWP2000 or ISO9141 one from `Commands.COMMAND_IDS`).
+
+    Counters (read-only):
+    - `commands_sent` - number of commands sent to the adapter.
+    - `errors` - number of commands the adapter rejected.
+    """
+    def __init__(self, command, command_number : int = BROADCAST_FOR_J1939) -> None:
+        self.command = command
+        self.command_number = command_number
+        self.commands_sent = 0
+        self.errors = 0
+        self._desired = {} #type: dict[object, tuple[bytes, int]] # key: (message, interval in ms)
+        self._actual = [] #type: list[tuple[object, bytes, int]] # (key, message, interval), in adapter order
+        self._known = True # False if a command failed, so we don't know what the adapter has
+
+    def __len__(self) -> int:
+        """Returns the number of entries you want in the list (which is what's in it after `apply()`)."""
+        return len(self._desired)
+
+    def __contains__(self, key) -> bool:
+        return key in self._desired
+
+    @property
+    def entries(self) -> list[tuple]:
+        """What the adapter has, as far as we know: (key, message, interval in ms), by entry number."""
+        return list(self._actual)
+
+    def add(self, key, message, period : float) -> None:
+        """
+        Adds an entry, or replaces the one with the same key.
+        - key = any hashable value to refer to the entry by
+        - message = RP1210_SendMessage bytes (e.g. from `toJ1939Message()`)
+        - period = seconds between sends. The adapter only takes whole milliseconds.
+        """
+        interval = round(period * 1000)
+        if not 0 < interval <= 0xFFFFFFFF:
+            raise ValueError("Broadcast period must be between 1 ms and about 49 days.")
+        self._desired[key] = (bytes(message), interval)
+
+    def update(self, key, message = None, period : float = None) -> None:
+        """Changes an entry's message and/or period. Raises KeyError if there's no entry with that key."""
+        old_message, old_interval = self._desired[key]
+        self.add(key, old_message if message is None else message,
+                 old_interval / 1000 if period is None else period)
+
+    def remove(self, key) -> None:
+        """Removes an entry. Does nothing if there's no entry with that key."""
+        self._desired.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        self._desired.clear()
+
+    def pending(self) -> bool:
+        """Returns True if `apply()` has something to send."""
+        return not self._known or len(self._kept()) != len(self._actual) or len(self._actual) != len(self._desired)
+
+    def apply(self) -> int:
+        """
+        Sends the fewest commands that make the adapter's list match: a REMOVE_ENTRY for each entry
+        that's gone or changed and one ADD_LIST for every new or changed entry, or DESTROY_LIST and
+        one ADD_LIST if that's fewer.
+
+        Returns 0 if successful, or the error code of the command that failed. If one fails, the
+        next `apply()` starts over with DESTROY_LIST.
+        """
+        kept = self._kept()
+        kept_keys = set(kept.values())
+        stale = [i for i in range(len(self._actual)) if i not in kept]
+        new = [key for key in self._desired if key not in kept_keys]
+        incremental = len(stale) + bool(new)
+        rebuild = 1 + bool(self._desired)
+        if not self._known or rebuild < incremental:
+            error = self._send(Commands.destroyBroadcastList())
+            if error:
+                return error
+            self._actual = []
+            self._known = True
+            new = list(self._desired)
+        else:
+            for i in reversed(stale): # from the end, so the entry numbers before it don't move
+                error = self._send(Commands.removeBroadcastEntry(i))
+                if error:
+                    return error
+                del self._actual[i]
+        if new:
+            entries = [Commands.broadcastEntry(*self._desired[key]) for key in new]
+            error = self._send(Commands.addBroadcastList(entries))
+            if error:
+                return error
+            self._actual.extend((key,) + self._desired[key] for key in new)
+        return 0
+
+    def queryLength(self) -> int:
+        """
+        Asks the adapter how many entries are in its list (LIST_LENGTH). Returns None if the command
+        failed. If the answer doesn't match what we think it has, the next `apply()` rebuilds the list.
+        """
+        buffer = create_string_buffer(Commands.getBroadcastListLength(), 2)
+        if self._send(buffer, 2):
+            return None
+        length = buffer.raw[1]
+        if length != len(self._actual):
+            self._known = False
+        return length
+
+    def _kept(self) -> dict[int, object]:
+        """Entries the adapter already has that are still wanted: {entry number: key}."""
+        desired = self._desired
+        kept = {}
+        seen = set()
+        for i, (key, message, interval) in enumerate(self._actual):
+            if key not in seen and desired.get(key) == (message, interval):
+                kept[i] = key
+                seen.add(key)
+        return kept
+
+    def _send(self, client_command, size : int = 0) -> int:
+        self.commands_sent += 1
+        error = self.command(self.command_number, client_command, size or len(client_command))
+        if error:
+            self.errors += 1
+            self._known = False
+        return error
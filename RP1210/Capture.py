@@ -0,0 +1,771 @@
+"""
+Logs received messages to disk in a compact binary format, from one or more adapters at once, and
+reads them back.
+
+```
+writer = CaptureWriter("capture.rpl", compression="zstd")
+writer.addClient(client_can1, channel=1) # starts the client's background reader if it isn't running
+writer.addClient(client_can2, channel=2)
+writer.start()
+...
+writer.close()
+```
+
+```
+with CaptureReader("capture.rpl") as capture:
+    for record in capture.records(pgn=0xF004, start=t0, end=t0 + 60):
+        msg = record.toJ1939Message()
+```
+
+Everything happens on the writer's own thread: each client's `RxReader` keeps draining its adapter
+into its ring buffer like usual, and the writer pulls whole batches out of the ring buffers, encodes
+them and writes them. You can also hand it messages yourself with `write()` and `writeMany()`, which
+just queue them and return.
+
+File format (all little-endian):
+- File header (`FILE_HEADER`, 32 bytes): magic, version, record size, compression, block size, and
+the time the file was created.
+- Any number of blocks, each of which is:
+    - Block header (`BLOCK_HEADER`, 40 bytes): magic, number of records, number of messages, number
+    of index keys, index size, data size, and the earliest and latest message time in the block.
+    - Index: (key, count) as two uint32s for each key, sorted by key, followed by the record number
+    (uint16) of every message with that key, in the same order. Never compressed.
+    - Data: the block's records, compressed with the file's compression if it has one.
+
+Every message starts a new fixed-size record (`RECORD_HEADER`, followed by the message bytes padded
+to `record_size`). Messages that don't fit in one record carry on into the next record(s).
+
+The index key of a message is `(pgn << 8) | sa` for J1939 (`pgn` as in `J1939Message.pgn`), or the
+CAN ID for CAN.
+"""
+import mmap
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+from itertools import repeat
+
+from RP1210.J1939 import J1939Message
+from RP1210.Timestamps import TimestampConverter, messageTimestamps
+
+try:
+    import zstandard
+except ImportError: # zstandard is optional (pip install RP1210[zstd])
+    zstandard = None
+try:
+    import lz4.frame as lz4frame
+except ImportError: # lz4 is optional (pip install RP1210[lz4])
+    lz4frame = None
+
+CAPTURE_MAGIC = b'RP1210LG'
+CAPTURE_VERSION = 1
+BLOCK_MAGIC = b'RPLB'
+
+FILE_HEADER = struct.Struct('<8sHHBxxxId4x')
+"""magic, version, record_size, compression, block_records, created (host time, seconds)"""
+BLOCK_HEADER = struct.Struct('<4sIIIIIdd')
+"""magic, records, messages, keys, index_size, data_size, first_time, last_time"""
+RECORD_HEADER = struct.Struct('<dIHBB')
+"""time (host time, seconds), key, length (of the message), channel, protocol"""
+_TIME = struct.Struct('<d') # RECORD_HEADER fields, so CaptureRecord can unpack just one
+_KEY = struct.Struct('<I')
+_LENGTH = struct.Struct('<H')
+
+PROTOCOL_RAW = 0x00
+"""Message isn't parsed; its index key is always 0."""
+PROTOCOL_J1939 = 0x01
+"""RP1210_ReadMessage output for a J1939 connection."""
+PROTOCOL_CAN = 0x02
+"""RP1210_ReadMessage output for a CAN connection."""
+PROTOCOL_ECHO = 0x80
+"""Set in the protocol byte if messages have the echo byte (see `RP1210Client.setEcho()`)."""
+
+COMPRESSION = {None: 0, "zlib": 1, "zstd": 2, "lz4": 3}
+"""
+Block compression codes. zstd needs the `zstandard` package, and lz4 needs the `lz4` package.
+
+- None - no compression (default)
+- "zlib" - zlib (always available)
+- "zstd" - Zstandard; about as small as zlib, and a lot faster
+- "lz4" - LZ4; fastest, but the biggest files
+"""
+
+_LITTLE = sys.byteorder == 'little'
+
+def messageKey(message, protocol : int = PROTOCOL_J1939) -> int:
+    """
+    Returns the index key of an RP1210_ReadMessage output: `(pgn << 8) | sa` for J1939, or the CAN
+    ID for CAN. Returns 0 if the message is too short or protocol is PROTOCOL_RAW.
+    - protocol = PROTOCOL_J1939 or PROTOCOL_CAN, plus PROTOCOL_ECHO if the message has an echo byte.
+    """
+    offset = 5 if protocol & PROTOCOL_ECHO else 4
+    protocol &= 0x7F
+    if protocol == PROTOCOL_J1939 and len(message) >= offset + 6:
+        pgn = message[offset] | (message[offset + 1] << 8) | ((message[offset + 2] & 0x03) << 16)
+        if (pgn & 0xFF00) < 0xF000: # PDU1: PS byte = DA
+            pgn = (pgn & 0x3FF00) | message[offset + 5]
+        return (pgn << 8) | message[offset + 4]
+    if protocol == PROTOCOL_CAN and len(message) >= offset + 5:
+        return int.from_bytes(message[offset + 1:offset + 5], 'big') & 0x1FFFFFFF
+    return 0
+
+def _compressor(compression : int):
+    if compression == 1:
+        return lambda data: zlib.compress(data, 1)
+    if compression == 2:
+        return zstandard.ZstdCompressor().compress
+    if compression == 3:
+        return lz4frame.compress
+    return None
+
+def _decompressor(compression : int):
+    if compression == 1:
+        return zlib.decompress
+    if compression == 2:
+        if zstandard is None:
+            raise ImportError("This capture is compressed with zstd. Install zstandard (pip install RP1210[zstd]).")
+        return zstandard.ZstdDecompressor().decompress
+    if compression == 3:
+        if lz4frame is None:
+            raise ImportError("This capture is compressed with lz4. Install lz4 (pip install RP1210[lz4]).")
+        return lz4frame.decompress
+    if compression == 0:
+        return None
+    raise ValueError(f"Unknown capture compression code {compression}.")
+
+class _Source:
+    __slots__ = ('read', 'channel', 'protocol', 'timestamps')
+
+    def __init__(self, read, channel : int, protocol : int, timestamps : TimestampConverter) -> None:
+        self.read = read
+        self.channel = channel
+        self.protocol = protocol
+        self.timestamps = timestamps
+
+class CaptureWriter:
+    """
+    Writes messages to a capture file (see the top of this file for the format) from a background thread.
+
+    Messages are encoded into fixed-size records in memory, and written a block (`block_records`
+    records) at a time. Partial blocks are written every `flush_interval` seconds so a quiet bus
+    still ends up on disk, and everything that's ready is written with one `write()` and one
+    `flush()`.
+
+    Each message is stamped with the host time (from `clock`) when the writer got it, or with its
+    adapter timestamp converted to host time if its source has a `TimestampConverter`. The adapter's
+    timestamp is still in the message bytes either way.
+
+    Args:
+    - `path` - file to write to. It's overwritten if it exists.
+    - `record_size` - size of each record in bytes, including its 16-byte header. The default of 48
+    fits any classic CAN or J1939 frame in one record; longer messages take up more than one.
+    - `block_records` - max number of records per block (1-65535).
+    - `compression` - block compression; see `COMPRESSION`.
+    - `flush_interval` - max number of seconds between writes to disk.
+    - `idle_sleep` - seconds the writer thread sleeps when there's nothing to do.
+    - `clock` - function that returns the current host time in seconds. Defaults to `time.time`.
+
+    Counters (read-only):
+    - `messages` - number of messages encoded.
+    - `records` - number of records written.
+    - `blocks` - number of blocks written.
+    - `bytes_written` - size of the file so far, in bytes.
+    """
+    def __init__(self, path, record_size : int = 48, block_records : int = 4096, compression : str = None,
+                    flush_interval : float = 0.5, idle_sleep : float = 0.001, clock = time.time) -> None:
+        if not RECORD_HEADER.size < record_size <= 0xFFFF:
+            raise ValueError(f"record_size must be more than {RECORD_HEADER.size} and at most 65535.")
+        if not 1 <= block_records <= 0xFFFF:
+            raise ValueError("block_records must be 1-65535.")
+        if compression not in COMPRESSION:
+            raise ValueError(f"Invalid compression '{compression}'. Must be one of: {list(COMPRESSION)}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression needs zstandard (pip install RP1210[zstd]).")
+        if compression == "lz4" and lz4frame is None:
+            raise ImportError("lz4 compression needs lz4 (pip install RP1210[lz4]).")
+        self.path = path
+        self.record_size = record_size
+        self.block_records = block_records
+        self.compression = compression
+        self.flush_interval = flush_interval
+        self.idle_sleep = idle_sleep
+        self.clock = clock
+        self.messages = 0
+        self.records = 0
+        self.blocks = 0
+        self.bytes_written = 0
+        self._compress = _compressor(COMPRESSION[compression])
+        self._sources = [] #type: list[_Source]
+        self._queue = deque() # (time, channel, protocol, list of messages) from write()/writeMany()
+        self._lock = threading.Lock() # held while encoding and writing
+        self._stop_event = threading.Event()
+        self._thread = None #type: threading.Thread
+        self._zeros = bytes(record_size)
+        self._reset_block()
+        self._ready = [] #type: list[bytes] # encoded blocks that haven't been written yet
+        self._last_flush = time.monotonic()
+        self._file = open(path, 'wb')
+        header = FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, record_size, COMPRESSION[compression],
+                                  block_records, clock())
+        self._file.write(header)
+        self.bytes_written = len(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    ###########
+    # SOURCES #
+    ###########
+
+    def addSource(self, read, channel : int = 0, protocol : int = PROTOCOL_J1939,
+                    timestamps : TimestampConverter = None) -> None:
+        """
+        Adds a function the writer thread calls to get messages.
+        - read = function that returns a list of messages (bytes), e.g. `client.rxMany`.
+        - channel = channel number (0-255) to log the messages with.
+        - protocol = PROTOCOL_J1939, PROTOCOL_CAN or PROTOCOL_RAW, plus PROTOCOL_ECHO if echo is on.
+        - timestamps = a TimestampConverter (with the same `clock` as the writer) to stamp each message
+        with its adapter timestamp converted to host time, instead of the time the writer got it.
+        Use one for each adapter if you're going to merge them by time.
+        """
+        if not 0 <= channel <= 0xFF:
+            raise ValueError(f"Channel {channel} out of range (0-255)")
+        with self._lock:
+            self._sources.append(_Source(read, channel, protocol, timestamps))
+
+    def addClient(self, client, channel : int = 0, protocol : int = PROTOCOL_J1939,
+                    timestamps : bool = True) -> None:
+        """
+        Logs every message an RP1210Client receives. Starts the client's background reader (see
+        `RP1210Client.startReader()`) if it isn't running, so the adapter is drained on its own thread.
+        - timestamps = if True, messages are stamped with the adapter's timestamps converted to host
+        time (see `TimestampConverter`), which is a lot more accurate than when the writer got them.
+
+        The writer takes every message out of the client's buffer, so don't read from the same client
+        elsewhere; use `write()` to log messages you're also handling yourself.
+        """
+        if client.getReader() is None:
+            client.startReader()
+        converter = TimestampConverter.fromClient(client, clock=self.clock) if timestamps else None
+        self.addSource(client.rxMany, channel, protocol, converter)
+
+    ##########
+    # WRITER #
+    ##########
+
+    def write(self, message, channel : int = 0, protocol : int = PROTOCOL_J1939, timestamp : float = None) -> None:
+        """
+        Queues one message (RP1210_ReadMessage output) to be logged, and returns right away.
+        - timestamp = host time of the message. Defaults to `clock()`.
+        """
+        self._queue.append((self.clock() if timestamp is None else timestamp, channel, protocol, (bytes(message),)))
+
+    def writeMany(self, messages, channel : int = 0, protocol : int = PROTOCOL_J1939, timestamp : float = None) -> None:
+        """
+        Queues messages (e.g. a list from `client.rxMany()`, or an `RxBatch`) to be logged with the
+        same timestamp, and returns right away. Memoryviews are copied, so you can reuse the batch.
+        """
+        messages = [bytes(message) for message in messages]
+        if messages:
+            self._queue.append((self.clock() if timestamp is None else timestamp, channel, protocol, messages))
+
+    def start(self) -> None:
+        """
+        Starts the writer thread. Does nothing if it's already running. If the last one is still
+        stopping (`stop()` timed out), waits for it to exit first.
+        """
+        if self.isRunning():
+            if not self._stop_event.is_set():
+                return
+            self._thread.join()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="CaptureWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout : float = 1.0) -> None:
+        """
+        Stops the writer thread, then writes everything it hasn't written yet. If the thread hasn't
+        exited after `timeout` seconds (e.g. it's in a long `idle_sleep`), `isRunning()` stays True
+        until it does.
+        """
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        if thread is None or not thread.is_alive():
+            self._thread = None
+        self.flush()
+
+    def isRunning(self) -> bool:
+        """Returns True if the writer thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self) -> int:
+        """
+        Reads every source and encodes whatever is queued, writing any blocks that fill up. This is
+        what the writer thread does in a loop; call it yourself if you didn't `start()` the thread.
+
+        Returns the number of messages encoded.
+        """
+        with self._lock:
+            count = self._poll()
+            if self._ready:
+                self._write_ready()
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+            return count
+
+    def flush(self) -> None:
+        """Reads every source one more time, and writes everything to disk, including a partial block."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._poll()
+            self._flush()
+
+    def close(self) -> None:
+        """Stops the writer thread, writes everything, and closes the file."""
+        self.stop()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _run(self):
+        stopped = self._stop_event.is_set
+        while not stopped():
+            if not self.poll():
+                time.sleep(self.idle_sleep)
+
+    def _poll(self) -> int:
+        """Encodes messages from every source and the queue. Must be called with the lock held."""
+        count = 0
+        for source in self._sources:
+            messages = source.read()
+            if messages:
+                times = self.clock()
+                if source.timestamps is not None:
+                    times = source.timestamps.updateMany(messageTimestamps(messages), times)
+                    if not isinstance(times, list):
+                        times = times.tolist()
+                self._encode(times, source.channel, source.protocol, messages)
+                count += len(messages)
+        queue = self._queue
+        while queue:
+            timestamp, channel, protocol, messages = queue.popleft()
+            self._encode(timestamp, channel, protocol, messages)
+            count += len(messages)
+        return count
+
+    def _flush(self) -> None:
+        """Finishes the current block and writes everything to disk. Must be called with the lock held."""
+        if self._block_messages:
+            self._finish_block()
+        if self._ready:
+            self._write_ready()
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def _write_ready(self) -> None:
+        data = b''.join(self._ready)
+        self._ready = []
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    ############
+    # ENCODING #
+    ############
+
+    def _reset_block(self) -> None:
+        self._block = bytearray()
+        self._block_messages = 0
+        self._index = {} #type: dict[int, array]
+        self._first_time = float('inf') # earliest and latest message time in the block
+        self._last_time = float('-inf')
+
+    def _encode(self, times, channel : int, protocol : int, messages) -> None:
+        """
+        Adds messages to the current block, finishing blocks as they fill up. times is one host time
+        for every message, or a list with one for each.
+        """
+        record_size = self.record_size
+        inline = record_size - RECORD_HEADER.size
+        block_records = self.block_records
+        pack = RECORD_HEADER.pack
+        zeros = self._zeros
+        block = self._block
+        index = self._index
+        if isinstance(times, (int, float)):
+            times = repeat(times)
+        for timestamp, message in zip(times, messages):
+            length = len(message)
+            records = 1 if length <= inline else 1 + -(-(length - inline) // record_size)
+            used = len(block) // record_size
+            if used and used + records > block_records:
+                self._finish_block()
+                block = self._block
+                index = self._index
+                used = 0
+            key = messageKey(message, protocol)
+            block += pack(timestamp, key, length, channel, protocol)
+            block += message
+            block += zeros[:inline - length] if length <= inline else zeros[:(inline - length) % record_size]
+            numbers = index.get(key)
+            if numbers is None:
+                numbers = index[key] = array('H')
+            numbers.append(used)
+            if timestamp < self._first_time:
+                self._first_time = timestamp
+            if timestamp > self._last_time:
+                self._last_time = timestamp
+            self._block_messages += 1
+            self.messages += 1
+            if used + records >= block_records:
+                self._finish_block()
+                block = self._block
+                index = self._index
+
+    def _finish_block(self) -> None:
+        """Encodes the current block and adds it to the blocks that are ready to write."""
+        records = len(self._block) // self.record_size
+        keys = sorted(self._index)
+        counts = array('I')
+        numbers = array('H')
+        for key in keys:
+            counts.append(key)
+            counts.append(len(self._index[key]))
+            numbers.extend(self._index[key])
+        if not _LITTLE:
+            counts.byteswap()
+            numbers.byteswap()
+        index = counts.tobytes() + numbers.tobytes()
+        data = bytes(self._block) if self._compress is None else self._compress(bytes(self._block))
+        self._ready.append(BLOCK_HEADER.pack(BLOCK_MAGIC, records, self._block_messages, len(keys), len(index),
+                                             len(data), self._first_time, self._last_time) + index + data)
+        self.records += records
+        self.blocks += 1
+        self._reset_block()
+
+def readCapture(path):
+    """
+    Reads a capture file from start to finish. Yields (time, channel, protocol, message) for every
+    message, where time is the host time it was logged at and message is the RP1210_ReadMessage
+    output (bytes).
+    """
+    with open(path, 'rb') as file:
+        magic, version, record_size, compression, _, _ = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f"{path} isn't an RP1210 capture file.")
+        if version != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version {version}.")
+        decompress = _decompressor(compression)
+        inline = record_size - RECORD_HEADER.size
+        while True:
+            header = file.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return # end of file (or a block that never finished writing)
+            magic, records, _, _, index_size, data_size, _, _ = BLOCK_HEADER.unpack(header)
+            if magic != BLOCK_MAGIC:
+                raise ValueError(f"Bad block in {path}.")
+            file.seek(index_size, 1)
+            data = file.read(data_size)
+            if len(data) < data_size:
+                return
+            if decompress is not None:
+                data = decompress(data)
+            offset = 0
+            end = records * record_size
+            while offset < end:
+                timestamp, _, length, channel, protocol = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                yield timestamp, channel, protocol, data[start:start + length]
+                offset += record_size if length <= inline else record_size * (1 + -(-(length - inline) // record_size))
+
+class CaptureRecord:
+    """
+    One message in a capture file, read straight out of the `CaptureReader`'s memory map (or the
+    decompressed block). Nothing is decoded until you access it, and `message` isn't a copy, so don't
+    keep records around after you close the reader.
+
+    Properties:
+    - `time` - host time the message was logged at (seconds).
+    - `key` - index key; `(pgn << 8) | sa` for J1939, or the CAN ID for CAN.
+    - `channel` - channel number the message was logged with.
+    - `protocol` - PROTOCOL_J1939, PROTOCOL_CAN or PROTOCOL_RAW, plus PROTOCOL_ECHO.
+    - `message` - the RP1210_ReadMessage output (memoryview).
+    - `pgn`, `sa` - PGN and source address of a J1939 message (from `key`).
+    """
+    __slots__ = ('_buffer', '_offset')
+
+    def __init__(self, buffer : memoryview, offset : int) -> None:
+        self._buffer = buffer
+        self._offset = offset
+
+    @property
+    def time(self) -> float:
+        return _TIME.unpack_from(self._buffer, self._offset)[0]
+
+    @property
+    def key(self) -> int:
+        return _KEY.unpack_from(self._buffer, self._offset + 8)[0]
+
+    @property
+    def channel(self) -> int:
+        return self._buffer[self._offset + 14]
+
+    @property
+    def protocol(self) -> int:
+        return self._buffer[self._offset + 15]
+
+    @property
+    def message(self) -> memoryview:
+        start = self._offset + RECORD_HEADER.size
+        return self._buffer[start:start + _LENGTH.unpack_from(self._buffer, self._offset + 12)[0]]
+
+    @property
+    def pgn(self) -> int:
+        return self.key >> 8
+
+    @property
+    def sa(self) -> int:
+        return self.key & 0xFF
+
+    def toJ1939Message(self) -> J1939Message:
+        """Returns the message as a J1939Message, which parses it without copying."""
+        return J1939Message(self.message, echo=bool(self.protocol & PROTOCOL_ECHO))
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.message)
+
+    def __repr__(self) -> str:
+        return f"CaptureRecord(time={self.time}, channel={self.channel}, key=0x{self.key:X}, message={bytes(self)!r})"
+
+class _CaptureBlock:
+    __slots__ = ('records', 'messages', 'keys', 'index_offset', 'data_offset', 'data_size',
+                 'first_time', 'last_time')
+
+class CaptureReader:
+    """
+    Reads a capture file written by `CaptureWriter`, without loading it into memory.
+
+    The file is memory-mapped, and opening it only reads the block headers, which each say how big
+    the block is, what time range it covers, and which keys (PGN/SA or CAN ID) are in it. Looking
+    for a time window or a PGN skips every block that can't have it, and uses the block's index to
+    go straight to the matching records without reading the others. Compressed blocks are only
+    decompressed if they have something you asked for.
+
+    A block that was cut off (e.g. the logger was killed) is ignored, along with anything after it.
+
+    Args:
+    - `path` - capture file to read.
+
+    Attributes:
+    - `record_size`, `block_records`, `compression`, `created` - from the file header.
+    - `messages` - number of messages in the file (same as `len(reader)`).
+    """
+    def __init__(self, path) -> None:
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        if len(self._view) < FILE_HEADER.size:
+            self.close()
+            raise ValueError(f"{path} isn't an RP1210 capture file.")
+        magic, version, record_size, compression, block_records, created = FILE_HEADER.unpack_from(self._view)
+        if magic != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} isn't an RP1210 capture file.")
+        if version != CAPTURE_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported capture version {version}.")
+        self.record_size = record_size
+        self.block_records = block_records
+        self.compression = {code: name for name, code in COMPRESSION.items()}.get(compression, compression)
+        self.created = created
+        self._decompress = _decompressor(compression)
+        self._blocks = self._read_blocks()
+        self.messages = sum(block.messages for block in self._blocks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.messages
+
+    def __iter__(self):
+        return self.records()
+
+    def close(self) -> None:
+        """
+        Closes the file. If you're still holding on to records (or their messages), the memory map
+        stays open until they're gone.
+        """
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError: # records still point into it
+                pass
+            self._mmap = None
+
+    @property
+    def start_time(self) -> float:
+        """Host time of the first message, or None if the file is empty."""
+        return min((block.first_time for block in self._blocks), default=None)
+
+    @property
+    def end_time(self) -> float:
+        """Host time of the last message, or None if the file is empty."""
+        return max((block.last_time for block in self._blocks), default=None)
+
+    def numBlocks(self) -> int:
+        """Returns the number of blocks in the file."""
+        return len(self._blocks)
+
+    def keyCounts(self, start : float = None, end : float = None) -> dict[int, int]:
+        """
+        Returns {key: number of messages} for the whole file, straight from the index (without
+        reading any records). start and end limit it to blocks that overlap that time window.
+        """
+        counts = {}
+        for block in self._select_blocks(start, end):
+            keys, block_counts, _ = self._index(block)
+            for key, count in zip(keys, block_counts):
+                counts[key] = counts.get(key, 0) + count
+        return counts
+
+    def records(self, start : float = None, end : float = None, pgn : int = None, sa : int = None,
+                    can_id : int = None, channel : int = None):
+        """
+        Yields a `CaptureRecord` for every message that matches, in the order they were written.
+        - start, end = host time window (start <= time < end). None = no limit.
+        - pgn = J1939 PGN (as in `J1939Message.pgn`, so PDU1 PGNs include the DA).
+        - sa = J1939 source address.
+        - can_id = CAN ID, for CAN captures.
+        - channel = channel number.
+        """
+        if can_id is not None and (pgn is not None or sa is not None):
+            raise ValueError("Can't filter by both CAN ID and PGN/SA.")
+        if pgn is None and sa is None and can_id is None:
+            match = None
+        elif can_id is not None:
+            match = lambda key: key == can_id
+        elif sa is None:
+            match = lambda key: key >> 8 == pgn
+        elif pgn is None:
+            match = lambda key: key & 0xFF == sa
+        else:
+            match = lambda key: key == (pgn << 8) | sa
+        protocol = None if match is None else PROTOCOL_CAN if can_id is not None else PROTOCOL_J1939
+        record_size = self.record_size
+        for block in self._select_blocks(start, end):
+            if match is None:
+                numbers = None
+            else:
+                numbers = self._numbers(block, match)
+                if not numbers:
+                    continue
+            data = self._data(block)
+            if numbers is None:
+                offsets = self._offsets(data, block.records)
+            else:
+                offsets = [number * record_size for number in numbers]
+            for offset in offsets:
+                if start is not None or end is not None:
+                    time_ = _TIME.unpack_from(data, offset)[0]
+                    if start is not None and time_ < start or end is not None and time_ >= end:
+                        continue
+                if channel is not None and data[offset + 14] != channel:
+                    continue
+                if protocol is not None and data[offset + 15] & 0x7F != protocol:
+                    continue
+                yield CaptureRecord(data, offset)
+
+    def _read_blocks(self) -> list[_CaptureBlock]:
+        view = self._view
+        size = len(view)
+        blocks = []
+        offset = FILE_HEADER.size
+        unpack = BLOCK_HEADER.unpack_from
+        while offset + BLOCK_HEADER.size <= size:
+            magic, records, messages, keys, index_size, data_size, first, last = unpack(view, offset)
+            if magic != BLOCK_MAGIC:
+                raise ValueError(f"Bad block in {self.path} at offset {offset}.")
+            block = _CaptureBlock()
+            block.records = records
+            block.messages = messages
+            block.keys = keys
+            block.index_offset = offset + BLOCK_HEADER.size
+            block.data_offset = block.index_offset + index_size
+            block.data_size = data_size
+            block.first_time = first
+            block.last_time = last
+            offset = block.data_offset + data_size
+            if offset > size:
+                break # cut off
+            blocks.append(block)
+        return blocks
+
+    def _select_blocks(self, start : float, end : float) -> list[_CaptureBlock]:
+        if start is None and end is None:
+            return self._blocks
+        return [block for block in self._blocks
+                if (start is None or block.last_time >= start) and (end is None or block.first_time < end)]
+
+    def _index(self, block : _CaptureBlock) -> tuple:
+        """Returns (keys, counts, record numbers) from a block's index."""
+        start = block.index_offset
+        pairs = self._view[start:start + 8 * block.keys]
+        numbers = self._view[start + 8 * block.keys:start + 8 * block.keys + 2 * block.messages]
+        if _LITTLE:
+            pairs = pairs.cast('I')
+            numbers = numbers.cast('H')
+        else:
+            pairs = array('I', pairs)
+            numbers = array('H', numbers)
+            pairs.byteswap()
+            numbers.byteswap()
+        return pairs[0::2], pairs[1::2], numbers
+
+    def _numbers(self, block : _CaptureBlock, match) -> list[int]:
+        """Returns the sorted record numbers of every message in block whose key matches."""
+        keys, counts, numbers = self._index(block)
+        found = []
+        position = 0
+        for key, count in zip(keys, counts):
+            if match(key):
+                found.extend(numbers[position:position + count])
+            position += count
+        if len(found) > 1:
+            found.sort()
+        return found
+
+    def _data(self, block : _CaptureBlock) -> memoryview:
+        data = self._view[block.data_offset:block.data_offset + block.data_size]
+        if self._decompress is not None:
+            data = memoryview(self._decompress(data))
+        return data
+
+    def _offsets(self, data : memoryview, records : int) -> list[int]:
+        """Returns the offset of every message in a block's data."""
+        record_size = self.record_size
+        inline = record_size - RECORD_HEADER.size
+        end = records * record_size
+        offsets = []
+        offset = 0
+        while offset < end:
+            offsets.append(offset)
+            length = _LENGTH.unpack_from(data, offset + 12)[0]
+            offset += record_size if length <= inline else record_size * (1 + -(-(length - inline) // record_size))
+        return offsets
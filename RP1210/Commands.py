@@ -3,9 +3,18 @@ Generate ClientCommand inputs for RP1210_SendCommand.
 
 Each function in this file returns a value that can be used for ClientCommand.
 """
+import struct
 from typing import Literal
 from . import sanitize_msg_param
 
+# Precompiled layouts for fixed-size commands. These are only used when every argument is an int that
+# fits; anything else (bytes, str, out-of-range values) goes through sanitize_msg_param() as usual.
+_J1939_FILTERS = struct.Struct('<BIBB') # flag, PGN (3 bytes) + priority (always 0), source, dest
+_CAN_FILTERS = struct.Struct('>BII') # CAN type, mask, header
+_PROTECT_J1939_ADDRESS = struct.Struct('>BQB') # address, NAME, status
+_U8_U8 = struct.Struct('BB')
+_BROADCAST_ENTRY = struct.Struct('<HI') # message length, interval (ms)
+
 COMMAND_IDS = {
     "RESET_DEVICE" : 0,
     "SET_ALL_FILTERS_STATES_TO_PASS" : 3,
@@ -170,6 +179,11 @@ def setJ1939Filters(filter_flag : int, pgn = 0, source = 0, dest = 0) -> bytes:
         Example (this will filter for messages that come from 0x1E and sent to 0xB0):
             command = Commands.setJ1939Filters(4+8, source=0x1E, dest=0xB0)
     """
+    try:
+        if pgn <= 0xFFFFFF:
+            return _J1939_FILTERS.pack(filter_flag, pgn, source, dest)
+    except (TypeError, struct.error):
+        pass
     ret_val = sanitize_msg_param(filter_flag, 1)
     ret_val += sanitize_msg_param(pgn, 3, 'little')
     ret_val += sanitize_msg_param(0, 1) # FILTER_PRIORITY was removed from RP1210 standard
@@ -191,6 +205,10 @@ def setCANFilters(can_type, mask, header) -> bytes:
 
     This is one of those functions that you're going to want the RP1210C documentation for.
     """
+    try:
+        return _CAN_FILTERS.pack(can_type, mask, header)
+    except struct.error:
+        pass
     ret_val = sanitize_msg_param(can_type, 1)
     ret_val += sanitize_msg_param(mask, 4)
     ret_val += sanitize_msg_param(header, 4)
@@ -252,6 +270,10 @@ def protectJ1939Address(address_to_claim, network_mgt_name, blocking = True) ->
         - Lowest name takes priority if two devices try to claim the same address
     - blocking (bool) - True will block until done, False will return before completion
     """
+    try:
+        return _PROTECT_J1939_ADDRESS.pack(address_to_claim, network_mgt_name, 0 if blocking else 2)
+    except struct.error:
+        pass
     addr = sanitize_msg_param(address_to_claim, 1)
     name = sanitize_msg_param(network_mgt_name, 8)
     if blocking:
@@ -304,6 +326,62 @@ def setBroadcastList(function : Literal[1, 2, 3, 4, 5], command) -> bytes:
     ret_val += sanitize_msg_param(command)
     return ret_val
 
+def broadcastEntry(message, interval_ms : int) -> bytes:
+    """
+    One entry in a broadcast list, for addBroadcastList().
+
+    Args:
+    - message - the message to broadcast, in RP1210_SendMessage format (e.g. from toJ1939Message()).
+    - interval_ms - how often to send it, in milliseconds (unsigned 32-bit int)
+
+    Entry format: message length (2 bytes), interval (4 bytes), message; both little-endian.
+    """
+    message = sanitize_msg_param(message)
+    return _BROADCAST_ENTRY.pack(len(message), interval_ms) + message
+
+def addBroadcastList(entries) -> bytes:
+    """
+    Add to Broadcast List (function 1 of RP1210_Set_Broadcast_For_XXX)
+
+    Args:
+    - entries - list of entries from broadcastEntry(), or one entry.
+    """
+    if not isinstance(entries, (bytes, bytearray)):
+        entries = b''.join(entries)
+    return setBroadcastList(1, entries)
+
+def viewBroadcastList(entry_number : int) -> bytes:
+    """
+    View Broadcast List entry (function 2 of RP1210_Set_Broadcast_For_XXX)
+
+    Args:
+    - entry_number (1 byte) - the entry to view, starting from 0.
+    """
+    return setBroadcastList(2, sanitize_msg_param(entry_number, 1))
+
+def destroyBroadcastList() -> bytes:
+    """
+    Destroy Broadcast List (function 3 of RP1210_Set_Broadcast_For_XXX)
+    """
+    return b'\x03'
+
+def removeBroadcastEntry(entry_number : int) -> bytes:
+    """
+    Remove Broadcast List entry (function 4 of RP1210_Set_Broadcast_For_XXX)
+
+    Args:
+    - entry_number (1 byte) - the entry to remove, starting from 0. Entries after it move down one.
+    """
+    return setBroadcastList(4, sanitize_msg_param(entry_number, 1))
+
+def getBroadcastListLength() -> bytes:
+    """
+    Broadcast List Length (function 5 of RP1210_Set_Broadcast_For_XXX)
+
+    The adapter writes the number of entries back into ClientCommand.
+    """
+    return b'\x05'
+
 
 def setFilterType(filter_type : Literal[0, 1]):
     """
@@ -390,7 +468,10 @@ def setBlockingTimeout(block1 : int, block2 : int):
     Block 1 and block 2 are multiplied together to determine the final blocking time in
     milliseconds. Set either block to 0 for infinite time.
     """
-    return sanitize_msg_param(block1, 1) + sanitize_msg_param(block2, 1)
+    try:
+        return _U8_U8.pack(block1, block2)
+    except struct.error:
+        return sanitize_msg_param(block1, 1) + sanitize_msg_param(block2, 1)
 
 def flushBuffers():
     """
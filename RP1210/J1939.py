@@ -6,8 +6,22 @@ While a dict of J1939 PGNs would be convenient, they are not provided here becau
 copyright of SAE.
 """
 
+import struct
+import sys
+from array import array
 from . import sanitize_msg_param
 
+try:
+    import numpy
+except ImportError: # numpy is optional (pip install RP1210[numpy])
+    numpy = None
+
+_J1939_HEADER = struct.Struct('<HBBBB') # PGN (3 bytes), how/priority, SA, DA
+_J1939_REQUEST = struct.Struct('<HBBBBHB') # J1939 header + requested PGN (3 bytes)
+J1939_HEADER_SIZE = _J1939_HEADER.size
+"""Size of the header in front of message data in RP1210_SendMessage J1939 format (PGN, how/priority, SA, DA)."""
+_J1939_MAX_DATA_SIZE = 1785 # max data size for a J1939 transport protocol message
+
 def toJ1939Message(pgn, pri, sa, da, data, size = 0, how = 0) -> bytes:
     """
     Converts args to J1939 message suitable for RP1210_SendMessage function.
@@ -17,7 +31,7 @@ def toJ1939Message(pgn, pri, sa, da, data, size = 0, how = 0) -> bytes:
 
     RP1210_SendMessage J1939 format:
     - PGN (3 bytes)
-    - Priority (1 byte)
+    - How/Priority (1 byte) - bit 7 = how to send (0 = RTS/CTS, 1 = BAM); bits 0-2 = priority
     - Source Address (1 byte)
     - Destination Address (1 byte)
     - Message Data (0 - 1785 byes)
@@ -29,14 +43,61 @@ def toJ1939Message(pgn, pri, sa, da, data, size = 0, how = 0) -> bytes:
     Arguments can be strings, ints, or bytes. This function will parse strings as UTF-8 characters,
     so don't provide it with letters or special characters unless that's what you mean to send.
     If you want to send it 0xFF, send it as an int and not "FF". Likewise, 0 != "0".
+
+    Use `toJ1939MessageInto()` or `J1939TxBatch` if you want to write messages into a buffer you
+    already have instead of creating new bytes.
+    """
+    header = None
+    try: # fast path for int args
+        if 0 <= pri <= 0xFF and 0 <= how <= 0xFF:
+            header = _J1939_HEADER.pack(pgn & 0xFFFF, pgn >> 16, (pri & 0b111) | ((how & 0b1) << 7), sa, da)
+    except (TypeError, struct.error):
+        pass
+    if header is None:
+        header = _sanitize_j1939_header(pgn, pri, sa, da, how)
+    return header + sanitize_msg_param(data, size)
+
+def _sanitize_j1939_header(pgn, pri, sa, da, how) -> bytes:
+    """Builds the 6-byte J1939 message header from args of any type accepted by sanitize_msg_param()."""
+    how_pri = (sanitize_msg_param(pri, 1)[0] & 0b111) | ((sanitize_msg_param(how, 1)[0] & 0b1) << 7)
+    return (sanitize_msg_param(pgn, 3, 'little') + bytes((how_pri,)) +
+            sanitize_msg_param(sa, 1) + sanitize_msg_param(da, 1))
+
+_J1939_MESSAGES = {} #type: dict[int, struct.Struct]
+"""Structs that pack a J1939 header + data in one call, by data length. Filled in as they're needed."""
+
+def _j1939_message_struct(length : int) -> struct.Struct:
+    packer = _J1939_MESSAGES.get(length)
+    if packer is None:
+        packer = _J1939_MESSAGES[length] = struct.Struct(f'<HBBBB{length}s')
+    return packer
+
+def toJ1939MessageInto(buffer, offset, pgn, pri, sa, da, data, size = 0, how = 0) -> int:
     """
-    ret_val = sanitize_msg_param(pgn, 3, 'little')
-    how_pri = sanitize_msg_param(pri, 1)[0] & 0b111 + ((sanitize_msg_param(how, 1)[0] & 0b1) << 7)
-    ret_val += sanitize_msg_param(how_pri, 1) # combine how & pri
-    ret_val += sanitize_msg_param(sa, 1)
-    ret_val += sanitize_msg_param(da, 1)
-    ret_val += sanitize_msg_param(data, size)
-    return ret_val
+    Same as `toJ1939Message()`, but writes the message into `buffer` at `offset` instead of
+    returning it. Returns the number of bytes written (6 + data size).
+    - buffer = bytearray, writable memoryview, or ctypes buffer (e.g. from create_string_buffer)
+    - offset = index in buffer to start writing at
+
+    For int args and bytes data, the whole message is written with one `struct.pack_into()` call
+    and nothing else is allocated. Raises ValueError if the message doesn't fit in the buffer;
+    nothing is written in that case.
+    """
+    if type(data) is not bytes or (size and size != len(data)):
+        data = sanitize_msg_param(data, size)
+    length = J1939_HEADER_SIZE + len(data)
+    if offset < 0 or offset + length > len(buffer):
+        raise ValueError(f"J1939 message ({length} bytes) doesn't fit in buffer at offset {offset}.")
+    try: # fast path for int args
+        if 0 <= pri <= 0xFF and 0 <= how <= 0xFF:
+            packer = _J1939_MESSAGES.get(len(data)) or _j1939_message_struct(len(data))
+            packer.pack_into(buffer, offset, pgn & 0xFFFF, pgn >> 16, (pri & 0b111) | ((how & 0b1) << 7),
+                             sa, da, data)
+            return length
+    except (TypeError, struct.error):
+        pass
+    buffer[offset:offset + length] = _sanitize_j1939_header(pgn, pri, sa, da, how) + data
+    return length
 
 def toJ1939Request(pgn_requested, sa, da = 255, pri = 6, size = 3) -> bytes:
     """
@@ -48,11 +109,217 @@ def toJ1939Request(pgn_requested, sa, da = 255, pri = 6, size = 3) -> bytes:
     - destination: 255 = global request; enter a different number to request from a specific address
     - priority: priority of request; default is 6
     """
+    if size >= 3:
+        try: # fast path for int args
+            if 0 <= pri <= 0xFF:
+                return _J1939_REQUEST.pack(0xEA00, 0, pri & 0b111, sa, da, pgn_requested & 0xFFFF,
+                                           pgn_requested >> 16) + b'\xFF' * (size - 3)
+        except (TypeError, struct.error):
+            pass
     pgn_request = sanitize_msg_param(pgn_requested, 3, 'little') # must be little-endian
     if size > 3:
         pgn_request += b'\xFF' * (size - 3)
     return toJ1939Message(0x00EA00, pri, sa, da, pgn_request, size)
 
+class J1939TxBatch:
+    """
+    A reusable buffer for encoding many J1939 messages back-to-back, e.g. everything a transmit
+    scheduler needs to send in one pass.
+
+    Each message is packed in place with `toJ1939MessageInto()`. Message `i` is stored at
+    `buffer[offsets[i]:offsets[i] + lengths[i]]`, same layout as `RxBatch`. Index or iterate over the
+    batch to get each message as a `memoryview`, or send them all with `RP1210Client.txBatch()`:
+    ```
+    batch = J1939TxBatch()
+    for pgn, data in outgoing:
+        batch.add(pgn, 6, 0xF9, 0xFF, data)
+    client.txBatch(batch)
+    batch.clear() # reuse the same buffer next time
+    ```
+    Args:
+    - `buffer_size` - initial size of the buffer in bytes. It doubles whenever it runs out of space,
+    which raises BufferError if you're still holding a memoryview of it.
+
+    Attributes:
+    - `buffer` - the bytearray holding every message.
+    - `offsets` - start of each message in `buffer`.
+    - `lengths` - length of each message in bytes.
+    - `nbytes` - number of bytes of `buffer` in use.
+    - `error` - error code that stopped the last `RP1210API.SendMany()` call, or 0 if every message was sent.
+    """
+    def __init__(self, buffer_size : int = 1024) -> None:
+        if buffer_size < 1:
+            raise ValueError("J1939TxBatch buffer_size must be at least 1.")
+        self.buffer = bytearray(buffer_size)
+        self.offsets = array('I')
+        self.lengths = array('H')
+        self.nbytes = 0
+        self.error = 0
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __bool__(self) -> bool:
+        return len(self.offsets) > 0
+
+    def __getitem__(self, index : int) -> memoryview:
+        offset = self.offsets[index]
+        return memoryview(self.buffer)[offset:offset + self.lengths[index]]
+
+    def __iter__(self):
+        view = memoryview(self.buffer)
+        for offset, length in zip(self.offsets, self.lengths):
+            yield view[offset:offset + length]
+
+    def add(self, pgn, pri, sa, da, data, size = 0, how = 0) -> int:
+        """
+        Encodes a message onto the end of the batch. Args are the same as `toJ1939Message()`.
+
+        Returns the index of the new message.
+        """
+        if type(data) is not bytes or (size and size != len(data)):
+            data = sanitize_msg_param(data, size)
+        offset = self.nbytes
+        self._reserve(offset + J1939_HEADER_SIZE + len(data))
+        length = toJ1939MessageInto(self.buffer, offset, pgn, pri, sa, da, data, 0, how)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.nbytes = offset + length
+        return len(self.offsets) - 1
+
+    def extend(self, messages) -> None:
+        """
+        Encodes every message in `messages` onto the end of the batch. Faster than calling `add()`
+        in a loop.
+        - messages = iterable of tuples of args for `add()`, e.g. (pgn, pri, sa, da, data)
+        """
+        buffer = self.buffer
+        into = toJ1939MessageInto
+        offsets_append = self.offsets.append
+        lengths_append = self.lengths.append
+        reserve = J1939_HEADER_SIZE + _J1939_MAX_DATA_SIZE
+        offset = self.nbytes
+        try:
+            for args in messages:
+                if offset + reserve > len(buffer):
+                    self._reserve(offset + reserve)
+                try:
+                    length = into(buffer, offset, *args)
+                except ValueError: # didn't fit; more than 1785 bytes of data
+                    self.nbytes = offset
+                    self.add(*args)
+                    offset = self.nbytes
+                    continue
+                offsets_append(offset)
+                lengths_append(length)
+                offset += length
+        finally:
+            self.nbytes = offset
+
+    def clear(self) -> None:
+        """Removes every message. The buffer is kept, so it won't need to grow again."""
+        del self.offsets[:]
+        del self.lengths[:]
+        self.nbytes = 0
+        self.error = 0
+
+    def toList(self) -> list[bytes]:
+        """Returns a copy of every message in the batch as a list of bytes."""
+        return [bytes(msg) for msg in self]
+
+    def _reserve(self, nbytes : int) -> None:
+        """Grows the buffer to at least nbytes, doubling it if that's bigger."""
+        size = len(self.buffer)
+        if nbytes > size:
+            self.buffer.extend(bytes(max(nbytes, 2 * size) - size))
+
+J1939_RECORD_FIELDS = [
+    ('timestamp', 'u4'),
+    ('pgn', 'u4'),
+    ('pri', 'u1'),
+    ('sa', 'u1'),
+    ('da', 'u1'),
+    ('dlc', 'u2'),
+    ('data', 'u1', (8,)),
+]
+"""
+Fields of each record returned by `decodeJ1939Records()`, in NumPy dtype format
+(use `numpy.dtype(J1939_RECORD_FIELDS)` to get the dtype).
+
+- `timestamp` - timestamp from RP1210_ReadMessage
+- `pgn` - PGN; PDU1 PGNs have the PDU Specific byte set to DA, same as `J1939Message.pgn`
+- `pri` - priority
+- `sa` - source address
+- `da` - destination address; 0xFF for PDU2 (broadcast) messages
+- `dlc` - length of message data in bytes. Can be more than 8 for reassembled multipacket messages.
+- `data` - first 8 bytes of message data, padded with 0x00 if `dlc` < 8
+"""
+
+def decodeJ1939Records(records, echo = False, use_numpy = None):
+    """
+    Decodes a batch of J1939 messages from RP1210_ReadMessage all at once.
+    - records = iterable of RP1210_ReadMessage outputs (bytes, bytearray, or memoryview), e.g. a list
+    of bytes from `client.rxMany()` or an `RxBatch` from `client.rxBatch()`.
+    - echo = set to True if you turned on echo with `setEcho()`. Echo flags are skipped.
+    - use_numpy = set to False to force the pure-Python decoder. Defaults to using NumPy if it's installed.
+
+    With NumPy, returns a structured array with the fields in `J1939_RECORD_FIELDS`, decoded with
+    vectorized operations. This is much faster than creating a `J1939Message` for every record:
+    ```
+    records = decodeJ1939Records(client.rxMany())
+    engine_speed = records[records['pgn'] == 0xF004]
+    ```
+    Without NumPy, returns a list of tuples with the same fields (`data` is 8 bytes). Records shorter than a J1939 message header are padded with 0x00, like J1939Message.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    offset = 4 + int(bool(echo)) # header starts after timestamp and echo byte
+    width = offset + 14 # header + 8 data bytes
+    if not isinstance(records, (list, tuple)):
+        records = list(records)
+    if use_numpy:
+        return _decode_j1939_records_numpy(records, offset, width)
+    return _decode_j1939_records_python(records, offset, width)
+
+def _decode_j1939_records_numpy(records, offset : int, width : int):
+    count = len(records)
+    raw = b''.join([bytes(record[:width]).ljust(width, b'\x00') for record in records])
+    rows = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(count, width)
+    lengths = numpy.fromiter(map(len, records), dtype=numpy.int64, count=count)
+    header = rows[:, offset:offset + 6].astype(numpy.uint32)
+    out = numpy.zeros(count, dtype=numpy.dtype(J1939_RECORD_FIELDS))
+    out['timestamp'] = rows[:, 0:4].copy().view('>u4').ravel()
+    pgn = (header[:, 0] | (header[:, 1] << 8) | (header[:, 2] << 16)) & 0x3FFFF # keep dp & res bits
+    da = header[:, 5]
+    pdu1 = (pgn & 0xFF00) < 0xF000
+    out['pgn'] = numpy.where(pdu1, (pgn & 0x3FF00) | da, pgn) # PDU1: PS byte = DA
+    out['da'] = numpy.where(pdu1, da, 0xFF) # PDU2: broadcast
+    out['pri'] = header[:, 3] & 0b111
+    out['sa'] = header[:, 4]
+    dlc = numpy.maximum(lengths - offset - 6, 0)
+    out['dlc'] = dlc
+    data = rows[:, offset + 6:].copy()
+    data[numpy.arange(8) >= dlc[:, None]] = 0 # clear padding
+    out['data'] = data
+    return out
+
+def _decode_j1939_records_python(records, offset : int, width : int) -> list:
+    out = []
+    for record in records:
+        length = len(record)
+        record = bytes(record[:width]).ljust(width, b'\x00')
+        pgn = int.from_bytes(record[offset:offset + 3], 'little') & 0x3FFFF # keep dp & res bits
+        da = record[offset + 5]
+        if (pgn & 0xFF00) < 0xF000: # PDU1: PS byte = DA
+            pgn = (pgn & 0x3FF00) | da
+        else: # PDU2: broadcast
+            da = 0xFF
+        dlc = max(length - offset - 6, 0)
+        data = record[offset + 6:offset + 6 + min(dlc, 8)].ljust(8, b'\x00')
+        out.append((int.from_bytes(record[0:4], 'big'), pgn, record[offset + 3] & 0b111,
+                    record[offset + 4], da, dlc, data))
+    return out
+
 class DTC():
     """
     A convenience class for parsing or generating the diagnostic trouble code (DTC) in diagnostic
@@ -248,6 +515,140 @@ class DTC():
 
     #endregion
 
+_DTC_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+_DTC_SWAP = sys.byteorder != 'little' # DTCs are stored as little-endian uint32s
+
+class DTCArray():
+    """
+    A packed array of DTCs, for when you have a lot of them and don't want a `DTC` object for each.
+
+    DTCs are stored as 32-bit ints in an `array` (the 4 DTC bytes, little-endian), and `spns()`,
+    `fmis()`, `ocs()` and `cms()` decode all of them at once - with NumPy if it's installed. A `DTC`
+    is only created when you index or iterate over the array.
+    ```
+    dtcs = DTCArray(dm2_data[2:]) # or DiagnosticMessage(msg).dtcs
+    if 110 in dtcs.spns():
+        ...
+    first = dtcs[0] # DTC
+    ```
+    Params:
+    - `data` : DTC bytes, 4 per DTC (without the lamp bytes). A partial DTC at the end is ignored.
+    """
+    __slots__ = ('_codes',)
+
+    def __init__(self, data : bytes = b'') -> None:
+        codes = array(_DTC_TYPECODE)
+        codes.frombytes(data[:len(data) - len(data) % 4])
+        if _DTC_SWAP:
+            codes.byteswap()
+        self._codes = codes
+
+    ##################
+    # DUNDER METHODS #
+    ##################
+    #region dundermethods
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            dtcs = DTCArray()
+            dtcs._codes = self._codes[index]
+            return dtcs
+        return DTC(self._codes[index].to_bytes(4, 'little'))
+
+    def __iter__(self):
+        for code in self._codes:
+            yield DTC(code.to_bytes(4, 'little'))
+
+    def __contains__(self, dtc) -> bool:
+        """True if the exact DTC (SPN, FMI, OC and CM) is in the array."""
+        try:
+            return int.from_bytes(sanitize_msg_param(dtc, 4), 'little') in self._codes
+        except (TypeError, OverflowError):
+            return False
+
+    def __add__(self, other):
+        if not isinstance(other, DTCArray):
+            return NotImplemented
+        dtcs = DTCArray()
+        dtcs._codes = self._codes + other._codes
+        return dtcs
+
+    def __bytes__(self) -> bytes:
+        if _DTC_SWAP:
+            codes = array(_DTC_TYPECODE, self._codes)
+            codes.byteswap()
+            return codes.tobytes()
+        return self._codes.tobytes()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, DTCArray):
+            return self._codes == other._codes
+        try:
+            return bytes(self) == sanitize_msg_param(other)
+        except (TypeError, ValueError):
+            return False
+
+    def __bool__(self) -> bool:
+        return len(self._codes) > 0
+
+    def __repr__(self) -> str:
+        return f"DTCArray({bytes(self)!r})"
+
+    #endregion
+
+    ##################
+    # PUBLIC METHODS #
+    ##################
+
+    def spns(self, use_numpy = None):
+        """SPN of every DTC. Returns a NumPy array if NumPy is used (see `codes()`), or a list."""
+        codes = self.codes(use_numpy)
+        if isinstance(codes, array):
+            return [(code & 0xFFFF) | ((code >> 5) & 0x70000) for code in codes]
+        return (codes & 0xFFFF) | ((codes >> 5) & 0x70000)
+
+    def fmis(self, use_numpy = None):
+        """FMI of every DTC. Returns a NumPy array if NumPy is used (see `codes()`), or a list."""
+        codes = self.codes(use_numpy)
+        if isinstance(codes, array):
+            return [(code >> 16) & 0x1F for code in codes]
+        return (codes >> 16) & 0x1F
+
+    def ocs(self, use_numpy = None):
+        """OC of every DTC. Returns a NumPy array if NumPy is used (see `codes()`), or a list."""
+        codes = self.codes(use_numpy)
+        if isinstance(codes, array):
+            return [(code >> 24) & 0x7F for code in codes]
+        return (codes >> 24) & 0x7F
+
+    def cms(self, use_numpy = None):
+        """CM bit of every DTC. Returns a NumPy array if NumPy is used (see `codes()`), or a list."""
+        codes = self.codes(use_numpy)
+        if isinstance(codes, array):
+            return [code >> 31 for code in codes]
+        return codes >> 31
+
+    def codes(self, use_numpy = None):
+        """
+        Returns the DTCs as 32-bit ints (the 4 DTC bytes, little-endian): a NumPy uint32 array that
+        shares memory with this DTCArray, or the `array` itself if use_numpy is False. Don't modify it.
+        - use_numpy = set to False to force the pure-Python version. Defaults to using NumPy if it's installed.
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if use_numpy:
+            if not self._codes:
+                return numpy.zeros(0, dtype=numpy.uint32)
+            return numpy.frombuffer(self._codes, dtype=numpy.uint32)
+        return self._codes
+
+    def toList(self) -> list[DTC]:
+        """Returns a list with a DTC for every code."""
+        return list(self)
+
 class J1939Message():
     """
     A class for parsing or generating an RP1210 J1939 message.
@@ -259,6 +660,9 @@ class J1939Message():
     ... # etc, for all properties in 'Accessible properties' below
     ```
     - If you used the command 'Set Echo Transmitted Messages' to turn echo on, set arg echo = True.
+    - You can also pass a memoryview or bytearray (e.g. from `client.rxInto()` or `client.rxBatch()`).
+    Header properties are parsed straight from the buffer, and `msg`/`data` are only copied out of it
+    the first time you access them - so don't reuse the buffer until you're done with the message.
 
     Generating a J1939 message:
     ```
@@ -310,12 +714,19 @@ class J1939Message():
 
     NOTE: When PGN and other values like DA conflict, the most recently assigned value will take precedence.
     When ambiguous, this class will default to assigning the destination address to the PGN rather than from it.
+
+    NOTE: This class uses `__slots__` to keep memory use down when you hold on to lots of messages, so you
+    can't add your own attributes to an instance. `msg` and `data` are only built when you access them.
     """
+    __slots__ = ('_msg', '_view', '_pgn', '_da', '_sa', '_pri', '_data', '_res', '_dp', 'timestamp',
+                 '_isecho', '_how')
+
     def __init__(self, RP1210_ReadMessage_bytes : bytes = None,
                     pgn : int = None, da : int = None, sa : int = None, data : bytes = None,
                     pri : int = 6, size : int = 0, how = 0, echo = False) -> None:
         # init everything
-        self._msg = b''
+        self._msg = None # None if it needs to be (re)built from the other properties or _view
+        self._view = None # memoryview this message was parsed from, until msg/data are copied out
         self._pgn = pgn
         self._da = da
         self._sa = sa
@@ -337,6 +748,11 @@ class J1939Message():
     #####################
 
     def _assign_from_rp1210_readmessage(self, RP1210_ReadMessage_bytes : bytes, echo : int):
+        if isinstance(RP1210_ReadMessage_bytes, (memoryview, bytearray)):
+            view = memoryview(RP1210_ReadMessage_bytes).cast('B')
+            if len(view) >= 10 + echo: # otherwise it needs padding, so copy it like anything else
+                self._assign_from_view(view, echo)
+                return
         if not isinstance(RP1210_ReadMessage_bytes, bytes):
             RP1210_ReadMessage_bytes = sanitize_msg_param(RP1210_ReadMessage_bytes)
         if len(RP1210_ReadMessage_bytes) < 10 + echo:
@@ -348,6 +764,15 @@ class J1939Message():
             self._isecho = True
         self._assign_from_msg()
 
+    def _assign_from_view(self, view : memoryview, echo : int):
+        """Parses header properties from a buffer without copying; `msg` and `data` are copied lazily."""
+        self.timestamp = int.from_bytes(view[0:4], 'big')
+        if echo and view[4] == 0x01:
+            self._isecho = True
+        self._view = view[4+echo:]
+        self._data = None
+        self._assign_header(self._view)
+
     def _assign_from_params(self, size):
         # sanitize input
         if self._sa is None:
@@ -379,22 +804,36 @@ class J1939Message():
         """
         Updates all relevant properties from `msg` property.
         """
-        self._pgn = int.from_bytes(self._msg[0:3], 'little')
-        self._pri = int(self._msg[3]) & 0b111
-        self._how = (int(self._msg[3]) & 0b10000000) >> 7
-        self._sa = int(self._msg[4])
-        self._da = int(self._msg[5])
-        if len(self._msg) > 6:
-            self._data = self._msg[6:]
-        else:
-            self._data = b''
+        self._view = None
+        self._data = None # sliced from _msg when it's needed
+        self._assign_header(self._msg)
+
+    def _assign_header(self, msg):
+        """Updates PGN, priority, how, SA, and DA from the first 6 bytes of msg (bytes or memoryview)."""
+        self._pgn = msg[0] + (msg[1] << 8) + (msg[2] << 16)
+        self._pri = msg[3] & 0b111
+        self._how = (msg[3] & 0b10000000) >> 7
+        self._sa = msg[4]
+        self._da = msg[5]
         # assign dp and res bits from PGN without updating DA
         self._assign_from_pgn(assign_da=False)
         self._assign_to_pgn(assign_da=True)
 
     def _assign_to_msg(self):
-        self._msg = toJ1939Message(self._pgn, self._pri, self._sa, self._da, self._data,
-                                    size=self.size, how=self._how)
+        """Marks `msg` as out of date; it's rebuilt from the other properties the next time it's accessed."""
+        if self._data is None:
+            self._data = self.msg[6:]
+        self._msg = None
+        self._view = None
+
+    def _build_msg(self) -> bytes:
+        if self._view is not None: # copy out of the buffer this message was parsed from
+            self._msg = bytes(self._view)
+            self._view = None
+        else:
+            self._msg = toJ1939Message(self._pgn, self._pri, self._sa, self._da, self._data,
+                                        size=len(self._data), how=self._how)
+        return self._msg
 
     def _assign_from_pgn(self, assign_da = True):
         if self.pdu() == 1 and (assign_da or self._da is None): # destination specific
@@ -422,7 +861,10 @@ class J1939Message():
 
         Will be filled with bytes of 0x00 if len isn't long enough to fill a message.
         """
-        return self._msg
+        msg = self._msg
+        if msg is None:
+            msg = self._build_msg()
+        return msg
 
     @msg.setter
     def msg(self, val : bytes):
@@ -520,16 +962,21 @@ class J1939Message():
         This value has no effect on `MessageSize` param to `RP1210_SendMessage`, which is set
         in its function call.
         """
-        return len(self._data)
+        if self._data is not None:
+            return len(self._data)
+        if self._view is not None:
+            return len(self._view) - 6
+        return max(len(self._msg) - 6, 0)
 
     @size.setter
     def size(self, val : int):
         if not isinstance(val, int):
             val = int.from_bytes(sanitize_msg_param(val, 1), 'big')
-        if len(self._data) > val:
-            self._data = self._data[:val]
-        elif len(self._data) < val:
-            self._data += b'\xFF' * (val - len(self._data))
+        data = self.data
+        if len(data) > val:
+            self._data = data[:val]
+        elif len(data) < val:
+            self._data = data + b'\xFF' * (val - len(data))
         self._assign_to_msg()
 
     @property
@@ -537,7 +984,10 @@ class J1939Message():
         """
         Message Data.
         """
-        return self._data
+        data = self._data
+        if data is None:
+            data = self._data = self.msg[6:]
+        return data
 
     @data.setter
     def data(self, val : bytes):
@@ -580,45 +1030,46 @@ class J1939Message():
     #################
 
     def __getitem__(self, index : int) -> int:
-        return self._msg[index]
+        return self.msg[index]
 
     def __setitem__(self, index : int, val):
-        if index >= len(self._msg):
+        if index >= len(self.msg):
             self.size = index - 5
+        msg = self.msg
         new_msg = b''
-        for x in range(len(self._msg)):
+        for x in range(len(msg)):
             if x == index:
                 new_msg += sanitize_msg_param(val, 1)
             else:
-                new_msg += int.to_bytes(self._msg[x], 1, 'big')
+                new_msg += int.to_bytes(msg[x], 1, 'big')
         self._msg = new_msg
         self._assign_from_msg()
 
     def __iadd__(self, val):
-        self._msg += sanitize_msg_param(val, 1)
+        self._msg = self.msg + sanitize_msg_param(val, 1)
         self._assign_from_msg()
         return self
 
     def __bytes__(self) -> bytes:
-        return self._msg
+        return self.msg
 
     def __int__(self) -> int:
-        return int.from_bytes(self._msg, 'big')
+        return int.from_bytes(self.msg, 'big')
 
     def __str__(self) -> str:
-        return str(self._msg)
+        return str(self.msg)
 
     def __len__(self) -> int:
-        return len(self._msg)
+        return len(self.msg)
 
     def __eq__(self, other) -> bool:
         try:
-            return self._msg == sanitize_msg_param(other)
+            return self.msg == sanitize_msg_param(other)
         except TypeError:
             return False
 
     def __bool__(self) -> bool:
-        return len(self._msg) > 6
+        return self.size > 0
 
     ##################
     # PUBLIC METHODS #
@@ -677,10 +1128,14 @@ class DiagnosticMessage():
     for dtc in DiagnosticMessage(msg_data):
         process_dtc(dtc)
     ```
+    DTCs aren't parsed into `DTC` objects until you index, iterate over, or use `codes`. If you're
+    going through a lot of messages (e.g. big DM2 histories), use `dtcs` instead, which is a
+    `DTCArray` that decodes every DTC at once without creating any objects.
     """
     def __init__(self, msg = None) -> None:
         self._lamps = b'\x00\x00'
-        self._codes = [] #type: list[DTC]
+        self._codes = [] #type: list[DTC] # None until something needs DTC objects
+        self._dtcs = None #type: DTCArray # parsed from _data on demand if _codes is None
         self._data =  b'\x00\x00'
         if msg is None:
             self.data = b'\x00\x00'
@@ -697,6 +1152,8 @@ class DiagnosticMessage():
 
     def num_dtcs(self) -> int:
         """Returns the number of DTCs in the message."""
+        if self._codes is None:
+            return max(len(self._data) - 2, 0) // 4
         return len(self._codes)
 
     def mil(self):
@@ -720,6 +1177,10 @@ class DiagnosticMessage():
     #######################
 
     def _assign_data(self):
+        if self._codes is None: # DTCs are still just bytes
+            self._data = self._lamps + self._data[2:len(self._data) - (len(self._data) - 2) % 4]
+            self._dtcs = None
+            return
         self._data = b''
         self._data += self._lamps
         for dtc in self._codes:
@@ -734,7 +1195,14 @@ class DiagnosticMessage():
             self._lamps = self._data[0:2]
 
     def _assign_codes(self):
-        self._codes = self.to_dtcs(self._data)
+        self._codes = None # parsed when they're needed
+        self._dtcs = None
+
+    def _materialize_codes(self) -> list[DTC]:
+        if self._codes is None:
+            self._codes = self.dtcs.toList()
+            self._dtcs = None
+        return self._codes
 
     ##################
     # DUNDER METHODS #
@@ -742,18 +1210,27 @@ class DiagnosticMessage():
     #region dundermethods
 
     def __getitem__(self, index : int) -> DTC:
-        return self._codes[index]
+        return self._materialize_codes()[index]
     
     def __setitem__(self, index : int, dtc : DTC):
+        codes = self._materialize_codes()
         if isinstance(dtc, DTC):
-            self._codes[index] = dtc
+            codes[index] = dtc
         else:
-            self._codes[index] = DTC(dtc)
+            codes[index] = DTC(dtc)
         self._assign_data()
 
+    def __iter__(self):
+        return iter(self._materialize_codes())
+
     def __iadd__(self, dtc : DTC):
         """Add DTCs to DiagnosticMessage."""
-        self._data += sanitize_msg_param(dtc, 4)
+        dtc_bytes = sanitize_msg_param(dtc, 4)
+        if self._codes is None:
+            self._data = self._data[:len(self._data) - (len(self._data) - 2) % 4] + dtc_bytes
+            self._dtcs = None
+            return self
+        self._data += dtc_bytes
         if isinstance(dtc, DTC):
             self._codes.append(dtc)
         else:
@@ -778,7 +1255,7 @@ class DiagnosticMessage():
 
     def __bool__(self) -> bool:
         """Returns True if the DiagnosticMessage contains DTCs."""
-        return len(self._codes) > 0
+        return self.num_dtcs() > 0
 
     def __eq__(self, other) -> bool:
         """Returns True if diagnostic message data is exactly equal to some other data."""
@@ -797,7 +1274,7 @@ class DiagnosticMessage():
     @property
     def codes(self) -> list[DTC]:
         """List of DTC objects parsed from DiagnosticMessage."""
-        return self._codes
+        return self._materialize_codes()
         # return self.to_dtcs(self.data)
 
     @codes.setter
@@ -817,6 +1294,18 @@ class DiagnosticMessage():
             self._codes = self.to_dtcs(b'\x00\x00' + sanitize_msg_param(new_codes))
         self._assign_data()
 
+    @property
+    def dtcs(self) -> DTCArray:
+        """
+        The DTCs as a `DTCArray`, without creating a `DTC` object for each one. Don't modify it; it's
+        rebuilt if you change the message.
+        """
+        if self._codes is not None:
+            return DTCArray(b''.join(sanitize_msg_param(dtc, 4) for dtc in self._codes))
+        if self._dtcs is None:
+            self._dtcs = DTCArray(self._data[2:])
+        return self._dtcs
+
     @property
     def lamps(self) -> bytes:
         """Byte 0 is lamp codes; Byte 1 is reserved."""
@@ -0,0 +1,225 @@
+"""
+Routes received J1939 messages to handlers by PGN and/or source address.
+
+Instead of this:
+```
+msg = J1939Message(client.rx())
+if msg.pgn == 0xF004:
+    ...
+elif msg.pgn == 0xFECA and msg.sa == 0x00:
+    ...
+```
+do this:
+```
+dispatcher = J1939Dispatcher()
+dispatcher.addHandler(on_engine_speed, pgn=0xF004)
+dispatcher.addHandler(on_engine_dm1, pgn=0xFECA, sa=0x00)
+dispatcher.addHandler(on_anything_from_trans, sa=0x03)
+while True:
+    dispatcher.dispatchMany(client.rxBatch(batch=batch))
+```
+Only the PGN, SA and DA are decoded to route a message. A `J1939Message` is only built if at least
+one matching handler wants one, and then only once no matter how many handlers get it.
+"""
+from RP1210.J1939 import J1939Message
+
+class J1939Dispatcher:
+    """
+    Calls handlers for received J1939 messages based on their PGN, source address, both, or a
+    predicate, without checking every handler for every message.
+
+    Handlers are kept in dicts by PGN and by (PGN, SA), and in a 256-entry list by SA. The first time
+    a (PGN, SA) pair is seen, its handlers are merged into one tuple (in the order they were added)
+    and cached, so routing a message costs one dict lookup after that.
+
+    PGNs are routed without the PDU Specific byte for PDU1 (destination specific) messages, so
+    register 0xEA00 to get every request no matter who it's sent to. Use `da` in a predicate if
+    you only want some destinations.
+
+    Handlers are called with a `J1939Message`, or with `(record, pgn, sa, da)` if you add them with
+    `raw=True`, where record is the RP1210_ReadMessage output it was decoded from. Raw handlers let you
+    skip building a `J1939Message` entirely; if record is a memoryview (e.g. from an `RxBatch`), it's
+    only valid until the handler returns.
+
+    Args:
+    - `echo` - set to True if you turned on echo with `setEcho()`, same as `J1939Message`.
+
+    Counters (read-only):
+    - `dispatched` - number of messages that matched at least one handler.
+    - `unhandled` - number of messages that didn't match any handler.
+    """
+    def __init__(self, echo : bool = False) -> None:
+        self.echo = bool(echo)
+        self.dispatched = 0
+        self.unhandled = 0
+        self._offset = 4 + int(self.echo) # header starts after timestamp and echo byte
+        self._handlers = {} #type: dict[int, tuple]
+        self._by_pgn = {} #type: dict[int, list[tuple]]
+        self._by_pgn_sa = {} #type: dict[int, list[tuple]]
+        self._by_sa = [[] for _ in range(256)] #type: list[list[tuple]]
+        self._any = [] #type: list[tuple]
+        self._routes = {} #type: dict[int, tuple]
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        """Returns the number of registered handlers."""
+        return len(self._handlers)
+
+    def addHandler(self, handler, pgn : int = None, sa : int = None, predicate = None, raw : bool = False) -> int:
+        """
+        Registers a handler.
+        - handler = function to call with each matching message
+        - pgn = only call it for messages with this PGN (None = any PGN)
+        - sa = only call it for messages from this source address (None = any SA)
+        - predicate = function called with `(pgn, sa, da)` that returns True if handler should get
+        the message. It's only called for messages that match pgn and sa, so narrow those down if you can.
+        - raw = set to True to call handler with `(record, pgn, sa, da)` instead of a J1939Message
+
+        Returns an ID you can pass to `removeHandler()`.
+        """
+        if pgn is not None:
+            pgn = self._route_pgn(pgn)
+        if sa is not None and not 0 <= sa <= 0xFF:
+            raise ValueError(f"Invalid source address {sa}; must be between 0 and 255.")
+        handler_id = self._next_id
+        self._next_id += 1
+        entry = (handler_id, handler, predicate, bool(raw))
+        self._handlers[handler_id] = (entry, pgn, sa)
+        if pgn is not None and sa is not None:
+            self._by_pgn_sa.setdefault((pgn << 8) | sa, []).append(entry)
+        elif pgn is not None:
+            self._by_pgn.setdefault(pgn, []).append(entry)
+        elif sa is not None:
+            self._by_sa[sa].append(entry)
+        else:
+            self._any.append(entry)
+        self._routes.clear()
+        return handler_id
+
+    def removeHandler(self, handler_id : int) -> bool:
+        """Unregisters the handler with ID handler_id. Returns False if there isn't one."""
+        registered = self._handlers.pop(handler_id, None)
+        if registered is None:
+            return False
+        entry, pgn, sa = registered
+        if pgn is not None and sa is not None:
+            self._by_pgn_sa[(pgn << 8) | sa].remove(entry)
+        elif pgn is not None:
+            self._by_pgn[pgn].remove(entry)
+        elif sa is not None:
+            self._by_sa[sa].remove(entry)
+        else:
+            self._any.remove(entry)
+        self._routes.clear()
+        return True
+
+    def clear(self) -> None:
+        """Unregisters every handler."""
+        for handler_id in list(self._handlers):
+            self.removeHandler(handler_id)
+
+    def dispatch(self, record) -> int:
+        """
+        Routes one message to its handlers.
+        - record = RP1210_ReadMessage output (bytes, bytearray or memoryview), e.g. from `client.rx()`
+
+        Returns the number of handlers that were called.
+        """
+        if len(record) < self._offset + 6:
+            return 0
+        return self._dispatch(record)
+
+    def dispatchMany(self, records) -> int:
+        """
+        Routes every message in records to its handlers.
+        - records = iterable of RP1210_ReadMessage outputs, e.g. a list of bytes from `client.rxMany()`
+        or an `RxBatch` from `client.rxBatch()`
+
+        Returns the number of handlers that were called.
+        """
+        dispatch = self._dispatch
+        min_size = self._offset + 6
+        calls = 0
+        for record in records:
+            if len(record) >= min_size:
+                calls += dispatch(record)
+        return calls
+
+    def dispatchMessage(self, msg : J1939Message) -> int:
+        """
+        Routes a J1939Message you already have to its handlers. Raw handlers get `bytes(msg)` (no
+        timestamp) as record.
+
+        Returns the number of handlers that were called.
+        """
+        pgn = msg.pgn
+        sa = msg.sa
+        da = msg.da
+        if (pgn & 0xFF00) < 0xF000:
+            pgn &= 0x3FF00
+        route = self._routes.get((pgn << 8) | sa)
+        if route is None:
+            route = self._route(pgn, sa)
+        if not route:
+            self.unhandled += 1
+            return 0
+        calls = 0
+        for _, handler, predicate, raw in route:
+            if predicate is not None and not predicate(pgn, sa, da):
+                continue
+            calls += 1
+            if raw:
+                handler(bytes(msg), pgn, sa, da)
+            else:
+                handler(msg)
+        self.dispatched += calls > 0
+        return calls
+
+    def _dispatch(self, record) -> int:
+        offset = self._offset
+        pgn = (record[offset] | (record[offset + 1] << 8) | (record[offset + 2] << 16)) & 0x3FFFF
+        sa = record[offset + 4]
+        if (pgn & 0xFF00) < 0xF000: # PDU1; PS byte is the DA
+            pgn &= 0x3FF00
+            da = record[offset + 5]
+        else:
+            da = 0xFF
+        route = self._routes.get((pgn << 8) | sa)
+        if route is None:
+            route = self._route(pgn, sa)
+        if not route:
+            self.unhandled += 1
+            return 0
+        msg = None
+        calls = 0
+        for _, handler, predicate, raw in route:
+            if predicate is not None and not predicate(pgn, sa, da):
+                continue
+            calls += 1
+            if raw:
+                handler(record, pgn, sa, da)
+                continue
+            if msg is None:
+                if type(record) is not bytes:
+                    record = bytes(record) # don't hand out views of a buffer that's about to be reused
+                msg = J1939Message(record, echo=self.echo)
+            handler(msg)
+        self.dispatched += calls > 0
+        return calls
+
+    def _route(self, pgn : int, sa : int) -> tuple:
+        """Builds and caches the handlers for pgn and sa, in the order they were added."""
+        entries = (self._by_pgn_sa.get((pgn << 8) | sa, []) + self._by_pgn.get(pgn, []) +
+                   self._by_sa[sa] + self._any)
+        route = tuple(sorted(entries, key=lambda entry: entry[0]))
+        self._routes[(pgn << 8) | sa] = route
+        return route
+
+    @staticmethod
+    def _route_pgn(pgn : int) -> int:
+        """Returns pgn the way messages are routed: PDU1 PGNs without the PDU Specific byte."""
+        if not 0 <= pgn <= 0x3FFFF:
+            raise ValueError(f"Invalid PGN 0x{pgn:X}; must be between 0 and 0x3FFFF.")
+        if (pgn & 0xFF00) < 0xF000:
+            pgn &= 0x3FF00
+        return pgn
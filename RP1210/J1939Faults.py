@@ -0,0 +1,252 @@
+"""
+Keeps track of active faults (DM1) from every ECU on a J1939 bus.
+
+`DiagnosticMessage` is good for looking at one DM1. `DM1Tracker` is for watching DM1s as they come
+in, e.g. on a gateway: it remembers the last DM1 from each source address, tells you which faults
+appeared or cleared, and doesn't parse anything when a DM1 is the same as the last one (which it
+usually is, since DM1s repeat every second).
+
+```
+tracker = DM1Tracker(callback=print)
+reassembler = J1939Reassembler() # DM1s with more than one DTC are multipacket
+while True:
+    msg = J1939Message(client.rx())
+    tracker.process(reassembler.process(msg) or msg)
+    if tracker.faults:
+        ...
+```
+"""
+import time
+
+from RP1210.J1939 import DTC, J1939Message
+
+DM1_PGN = 0x00FECA
+
+class DM1Event:
+    """
+    A fault that appeared or cleared.
+
+    Attributes:
+    - `appeared` - True if the fault is now active, False if it cleared.
+    - `sa` - source address of the ECU reporting it.
+    - `spn` - Suspect Parameter Number.
+    - `fmi` - Failure Mode Identifier.
+    - `oc` - Occurrence Count (the last one reported, for cleared faults).
+    """
+    __slots__ = ('appeared', 'sa', 'spn', 'fmi', 'oc')
+
+    def __init__(self, appeared : bool, sa : int, spn : int, fmi : int, oc : int) -> None:
+        self.appeared = appeared
+        self.sa = sa
+        self.spn = spn
+        self.fmi = fmi
+        self.oc = oc
+
+    def dtc(self) -> DTC:
+        """Returns the fault as a DTC."""
+        return DTC(spn=self.spn, fmi=self.fmi, oc=self.oc)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DM1Event):
+            return NotImplemented
+        return (self.appeared, self.sa, self.spn, self.fmi, self.oc) == \
+               (other.appeared, other.sa, other.spn, other.fmi, other.oc)
+
+    def __repr__(self) -> str:
+        state = "appeared" if self.appeared else "cleared"
+        return f"DM1Event({state}, sa=0x{self.sa:02X}, spn={self.spn}, fmi={self.fmi}, oc={self.oc})"
+
+class DM1Source:
+    """
+    The last DM1 from one source address.
+
+    Attributes:
+    - `sa` - source address.
+    - `data` - data from the last DM1 (bytes).
+    - `lamps` - lamp status byte (MIL, RSL, AWL, PL; 2 bits each) from the last DM1.
+    - `faults` - dict of {(spn, fmi): oc} for every active fault.
+    - `last_seen` - time (from `clock`) the last DM1 was received.
+    """
+    __slots__ = ('sa', 'data', 'lamps', 'faults', 'last_seen')
+
+    def __init__(self, sa : int) -> None:
+        self.sa = sa
+        self.data = None #type: bytes
+        self.lamps = 0
+        self.faults = {} #type: dict[tuple[int, int], int]
+        self.last_seen = 0.0
+
+    def mil(self) -> int:
+        """MIL (malfunction indicator lamp) status (0-3)."""
+        return (self.lamps & 0b11000000) >> 6
+
+    def rsl(self) -> int:
+        """RSL (red stop lamp) status (0-3)."""
+        return (self.lamps & 0b00110000) >> 4
+
+    def awl(self) -> int:
+        """AWL (amber warning lamp) status (0-3)."""
+        return (self.lamps & 0b00001100) >> 2
+
+    def pl(self) -> int:
+        """PL (protection lamp) status (0-3)."""
+        return self.lamps & 0b00000011
+
+    def __repr__(self) -> str:
+        return f"DM1Source(sa=0x{self.sa:02X}, lamps=0x{self.lamps:02X}, faults={len(self.faults)})"
+
+class DM1Tracker:
+    """
+    Tracks the active faults and lamp status of every ECU from the DM1s they send.
+
+    Each DM1's data is compared to the last one from the same source address as raw bytes; if it's
+    the same, that's all that happens. If it changed, its DTCs are decoded straight from the bytes
+    (no `DTC` objects) and compared with the last set to find the faults that appeared and cleared.
+
+    Active faults are kept in one dict for every ECU as they change, so `faults` is always up to date
+    and reading it doesn't scan anything. Faults are identified by source address, SPN and FMI; an
+    occurrence count change updates the count but isn't an event.
+
+    A DTC of all zeros ("no active faults") or all 0xFF (padding) isn't a fault.
+
+    Args:
+    - `callback` - function to call with each `DM1Event`, as it happens.
+    - `timeout` - seconds without a DM1 before an ECU's faults are cleared (e.g. it's been turned off).
+    J1939-73 sends DM1 once a second, so 3 or so is reasonable. None = never.
+    - `clock` - function that returns the current time in seconds. Defaults to `time.monotonic`.
+
+    Attributes:
+    - `sources` - dict of {source address: `DM1Source`} for every ECU that's sent a DM1.
+    - `faults` - dict of {(sa, spn, fmi): oc} for every active fault (read-only).
+
+    Counters (read-only):
+    - `updates` - number of DM1s that were different from the last one.
+    - `unchanged` - number of DM1s that were the same as the last one, and were skipped.
+    """
+    def __init__(self, callback = None, timeout : float = None, clock = time.monotonic) -> None:
+        self.callback = callback
+        self.timeout = timeout
+        self.clock = clock
+        self.sources = {} #type: dict[int, DM1Source]
+        self.faults = {} #type: dict[tuple[int, int, int], int]
+        self.updates = 0
+        self.unchanged = 0
+
+    def __len__(self) -> int:
+        """Returns the number of active faults."""
+        return len(self.faults)
+
+    def process(self, msg : J1939Message) -> list[DM1Event]:
+        """
+        Handles one received message (J1939Message or RP1210_ReadMessage bytes). Anything that
+        isn't a DM1 is ignored.
+
+        Returns a list of DM1Events (empty if nothing changed).
+        """
+        if not isinstance(msg, J1939Message):
+            msg = J1939Message(msg)
+        if msg.pgn != DM1_PGN:
+            return []
+        return self.update(msg.sa, msg.data)
+
+    def processMany(self, messages) -> list[DM1Event]:
+        """Calls `process()` for each message in messages. Returns every DM1Event."""
+        events = []
+        for msg in messages:
+            events += self.process(msg)
+        return events
+
+    def update(self, sa : int, data : bytes) -> list[DM1Event]:
+        """
+        Updates the faults for sa from DM1 data (lamps followed by DTCs, i.e. `J1939Message.data`).
+
+        Returns a list of DM1Events (empty if nothing changed).
+        """
+        now = self.clock()
+        source = self.sources.get(sa)
+        if source is None:
+            source = DM1Source(sa)
+            self.sources[sa] = source
+        elif source.data == data:
+            source.last_seen = now
+            self.unchanged += 1
+            return []
+        self.updates += 1
+        data = bytes(data)
+        source.data = data
+        source.last_seen = now
+        source.lamps = data[0] if data else 0
+        faults = {}
+        for i in range(2, len(data) - 3, 4):
+            key = data[i] | (data[i + 1] << 8) | (data[i + 2] << 16) # SPN + FMI
+            if key == 0 or key == 0xFFFFFF:
+                continue # no active faults / padding
+            faults[((key >> 21) << 16 | (key & 0xFFFF), (key >> 16) & 0x1F)] = data[i + 3] & 0x7F
+        return self._replace(source, faults)
+
+    def checkTimeouts(self, now : float = None) -> list[DM1Event]:
+        """
+        Clears the faults for every ECU that hasn't sent a DM1 in `timeout` seconds, and forgets it.
+        - now = current time from `clock`. Defaults to `clock()`.
+
+        Returns a list of DM1Events for the faults that cleared.
+        """
+        if self.timeout is None:
+            return []
+        if now is None:
+            now = self.clock()
+        events = []
+        for sa in [sa for sa, source in self.sources.items() if now - source.last_seen >= self.timeout]:
+            events += self.removeSource(sa)
+        return events
+
+    def removeSource(self, sa : int) -> list[DM1Event]:
+        """Clears the faults for sa and forgets it. Returns a list of DM1Events for the faults that cleared."""
+        source = self.sources.get(sa)
+        if source is None:
+            return []
+        events = self._replace(source, {})
+        del self.sources[sa]
+        return events
+
+    def activeFaults(self, sa : int = None) -> dict:
+        """
+        Returns a dict of active faults: {(sa, spn, fmi): oc} for every ECU, or {(spn, fmi): oc} for
+        just sa. Don't modify it.
+        """
+        if sa is None:
+            return self.faults
+        source = self.sources.get(sa)
+        return source.faults if source is not None else {}
+
+    def isActive(self, sa : int, spn : int, fmi : int = None) -> bool:
+        """Returns True if sa has an active fault for spn (and fmi, if given)."""
+        if fmi is not None:
+            return (sa, spn, fmi) in self.faults
+        source = self.sources.get(sa)
+        return source is not None and any(fault_spn == spn for fault_spn, _ in source.faults)
+
+    def clear(self) -> None:
+        """Forgets every ECU and fault, without any events."""
+        self.sources.clear()
+        self.faults.clear()
+
+    def _replace(self, source : DM1Source, faults : dict) -> list[DM1Event]:
+        """Replaces source's faults with faults, and returns what appeared and cleared."""
+        sa = source.sa
+        old = source.faults
+        events = []
+        all_faults = self.faults
+        for (spn, fmi), oc in old.items():
+            if (spn, fmi) not in faults:
+                del all_faults[(sa, spn, fmi)]
+                events.append(DM1Event(False, sa, spn, fmi, oc))
+        for (spn, fmi), oc in faults.items():
+            if (spn, fmi) not in old:
+                events.append(DM1Event(True, sa, spn, fmi, oc))
+            all_faults[(sa, spn, fmi)] = oc
+        source.faults = faults
+        if self.callback is not None:
+            for event in events:
+                self.callback(event)
+        return events
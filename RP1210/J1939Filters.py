@@ -0,0 +1,352 @@
+"""
+Software J1939 message filtering with the same rules as `setJ1939Filters()`, for when you need more
+filters than your adapter will take.
+
+```
+filters = J1939FilterSet()
+for pgn in pgns_i_care_about: # hundreds of them
+    filters.addFilter(J1939_FILTERS["PGN"], pgn=pgn)
+filters.addFilter(J1939_FILTERS["PGN"] + J1939_FILTERS["SOURCE"], pgn=0xFECA, source=0x00)
+filters.apply(client) # sets as much filtering as possible in the adapter
+while True:
+    for msg in filters.filterRecords(client.rxMany()):
+        ...
+```
+"""
+from RP1210.Commands import J1939_FILTERS
+
+FILTER_PGN = J1939_FILTERS["PGN"]
+FILTER_SOURCE = J1939_FILTERS["SOURCE"]
+FILTER_DEST = J1939_FILTERS["DEST"]
+_FILTER_FLAGS = FILTER_PGN | FILTER_SOURCE | FILTER_DEST
+
+_SELECTIVITY = {FILTER_PGN : 1 / 128, FILTER_SOURCE : 1 / 16, FILTER_DEST : 1 / 4}
+"""
+Rough fraction of bus traffic that matches one PGN, source or destination address. Only used to pick
+which filters to set in the adapter when they don't all fit, so it doesn't need to be exact.
+"""
+
+class J1939FilterSet:
+    """
+    A set of J1939 filters that works like the adapter's own FILTER_INCLUSIVE J1939 filters: a message
+    passes if it matches at least one filter, and a filter matches if every field in its filter_flag
+    matches. An empty J1939FilterSet doesn't pass anything, same as after `setAllFiltersToDiscard()`.
+
+    Filters are compiled into bitmaps (one bit for each of the 0x40000 PGNs, and 256-bit ints for
+    source and destination addresses), so checking a message takes the same time no matter how many
+    filters there are. Only the PGN, SA and DA are decoded from each message.
+
+    PGNs are compared without the PDU Specific byte for PDU1 (destination specific) PGNs, so use
+    FILTER_DEST to filter on destination address.
+
+    `apply()` sets filters in the adapter too. If the adapter won't take all of them, it gets a smaller
+    set of broader filters that passes everything this set passes (e.g. PGN-only filters in place of
+    PGN + source filters), and the rest of the filtering is done here.
+
+    Args:
+    - `echo` - set to True if you turned on echo with `setEcho()`, same as `J1939Message`.
+
+    Attributes:
+    - `filters` - list of (filter_flag, pgn, source, dest) for each filter.
+    - `hardware_filters` - filters set in the adapter by the last call to `apply()`, or None if the
+    adapter is passing everything.
+
+    Counters (read-only):
+    - `passed` - number of messages that passed.
+    - `hw_rejected` - number of messages rejected that the adapter's filters should have dropped. Messages
+    that the adapter actually dropped never get here, so this is usually only nonzero if the adapter
+    is passing everything or messages were received before `apply()` was called.
+    - `sw_rejected` - number of messages that passed the adapter's filters but were rejected here.
+    """
+    def __init__(self, echo : bool = False) -> None:
+        self.echo = bool(echo)
+        self.filters = [] #type: list[tuple[int, int, int, int]]
+        self.hardware_filters = None #type: list[tuple[int, int, int, int]]
+        self.passed = 0
+        self.hw_rejected = 0
+        self.sw_rejected = 0
+        self._offset = 4 + int(self.echo) # header starts after timestamp and echo byte
+        self._hardware = None #type: J1939FilterSet
+        self._compile()
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def addFilter(self, filter_flag : int, pgn = 0, source = 0, dest = 0) -> None:
+        """
+        Adds a filter. Takes the same arguments as `setJ1939Filters()`.
+        - filter_flag = FILTER_PGN (1), FILTER_SOURCE (4), FILTER_DEST (8), or any of them added together.
+        0 passes everything.
+        - pgn = PGN to match if filter_flag includes FILTER_PGN
+        - source = source address to match if filter_flag includes FILTER_SOURCE
+        - dest = destination address to match if filter_flag includes FILTER_DEST
+
+        Filters that are already in the set are ignored.
+        """
+        rule = self._to_filter(filter_flag, pgn, source, dest)
+        if rule not in self.filters:
+            self.filters.append(rule)
+            self._add_compiled(rule)
+
+    def removeFilter(self, filter_flag : int, pgn = 0, source = 0, dest = 0) -> bool:
+        """Removes a filter added with the same arguments. Returns False if there isn't one."""
+        rule = self._to_filter(filter_flag, pgn, source, dest)
+        if rule not in self.filters:
+            return False
+        self.filters.remove(rule)
+        self._compile()
+        return True
+
+    def clear(self) -> None:
+        """Removes every filter. Doesn't change the adapter's filters until you call `apply()` again."""
+        self.filters.clear()
+        self._compile()
+
+    def matches(self, pgn : int, sa : int, da : int = 0xFF) -> bool:
+        """
+        Returns True if a message with this PGN, source address and destination address passes.
+        pgn can include the destination address for PDU1 PGNs (like `J1939Message.pgn`).
+        """
+        pgn &= 0x3FFFF
+        if (pgn & 0xFF00) < 0xF000:
+            pgn &= 0x3FF00
+        else:
+            da = 0xFF
+        return self._matches(pgn, sa, da)
+
+    def check(self, record) -> bool:
+        """
+        Returns True if record passes, and updates the counters.
+        - record = RP1210_ReadMessage output (bytes, bytearray or memoryview), e.g. from `client.rx()`
+
+        Records too short to hold a J1939 header are rejected.
+        """
+        offset = self._offset
+        if len(record) < offset + 6:
+            self.sw_rejected += 1
+            return False
+        pgn = (record[offset] | (record[offset + 1] << 8) | (record[offset + 2] << 16)) & 0x3FFFF
+        if (pgn & 0xFF00) < 0xF000: # PDU1; PS byte is the DA
+            pgn &= 0x3FF00
+            da = record[offset + 5]
+        else:
+            da = 0xFF
+        return self._count(pgn, record[offset + 4], da)
+
+    def filterRecords(self, records) -> list:
+        """
+        Returns the records that pass, and updates the counters.
+        - records = iterable of RP1210_ReadMessage outputs, e.g. a list of bytes from `client.rxMany()`
+
+        Records are returned as-is; copy them if they're memoryviews into a buffer you're going to reuse
+        (e.g. an `RxBatch`).
+        """
+        offset = self._offset
+        min_size = offset + 6
+        count = self._count
+        passed = []
+        append = passed.append
+        for record in records:
+            if len(record) < min_size:
+                self.sw_rejected += 1
+                continue
+            pgn = (record[offset] | (record[offset + 1] << 8) | (record[offset + 2] << 16)) & 0x3FFFF
+            if (pgn & 0xFF00) < 0xF000:
+                pgn &= 0x3FF00
+                da = record[offset + 5]
+            else:
+                da = 0xFF
+            if count(pgn, record[offset + 4], da):
+                append(record)
+        return passed
+
+    def hardwareFilters(self, max_filters : int = None) -> list:
+        """
+        Returns the filters to set in an adapter that takes at most max_filters filters (None = no limit),
+        or None if the adapter will have to pass everything.
+
+        If every filter fits, they're returned as-is. Otherwise, filters are broadened by dropping the
+        same fields (e.g. source address) from each of them, so that there are fewer distinct filters,
+        and the most selective set that fits is returned. Every message this set passes will pass them.
+        """
+        for hw_filters in self._pushdown_candidates():
+            if max_filters is None or len(hw_filters) <= max_filters:
+                return hw_filters
+        return None
+
+    def apply(self, client, max_filters : int = None) -> bool:
+        """
+        Sets as many of these filters as possible in the adapter, so unwanted messages are dropped before
+        they're read. The adapter's existing J1939 filters are replaced.
+        - client = a connected RP1210Client
+        - max_filters = maximum number of filters to try setting (None = as many as the adapter will take)
+
+        If the adapter returns an error (e.g. ERR_MAX_FILTERS_EXCEEDED), fewer, broader filters are tried
+        until one fits; if none do, the adapter is set to pass everything. Either way, keep checking
+        received messages with `check()` or `filterRecords()`.
+
+        Returns True if every filter was set in the adapter exactly.
+        """
+        candidates = self._pushdown_candidates()
+        limit = max_filters
+        for hw_filters in candidates:
+            if limit is not None and len(hw_filters) > limit:
+                continue
+            accepted = self._set_hardware_filters(client, hw_filters)
+            if accepted == len(hw_filters):
+                self._use_hardware_filters(hw_filters)
+                return hw_filters is candidates[0]
+            if accepted < 0:
+                break # adapter won't filter at all
+            limit = accepted
+        client.setAllFiltersToPass()
+        self._use_hardware_filters(None)
+        return False
+
+    def resetCounters(self) -> None:
+        """Sets passed, hw_rejected and sw_rejected back to 0."""
+        self.passed = 0
+        self.hw_rejected = 0
+        self.sw_rejected = 0
+
+    def _count(self, pgn : int, sa : int, da : int) -> bool:
+        """Checks a message with a normalized PGN and updates the counters."""
+        if self._matches(pgn, sa, da):
+            self.passed += 1
+            return True
+        if self._hardware is not None and not self._hardware._matches(pgn, sa, da):
+            self.hw_rejected += 1
+        else:
+            self.sw_rejected += 1
+        return False
+
+    def _matches(self, pgn : int, sa : int, da : int) -> bool:
+        """Checks a message with a normalized PGN (PDU1 PGNs with PS = 0)."""
+        if self._pass_all or self._pgns[pgn >> 3] & (1 << (pgn & 7)):
+            return True
+        if (self._sas >> sa) & 1 or (self._das >> da) & 1:
+            return True
+        by_pgn = self._by_pgn.get(pgn)
+        if by_pgn is not None:
+            sa_mask, da_mask, sa_da = by_pgn
+            if (sa_mask >> sa) & 1 or (da_mask >> da) & 1 or (sa_da.get(sa, 0) >> da) & 1:
+                return True
+        return (self._sa_da.get(sa, 0) >> da) & 1 == 1
+
+    def _compile(self) -> None:
+        """Rebuilds the bitmaps from filters."""
+        self._pass_all = False
+        self._pgns = bytearray(0x40000 >> 3) # PGN-only filters
+        self._sas = 0 # source-only filters
+        self._das = 0 # destination-only filters
+        self._sa_da = {} #type: dict[int, int] # source + destination filters; sa: da bitmap
+        self._by_pgn = {} #type: dict[int, tuple[int, int, dict]] # pgn: (sa bitmap, da bitmap, sa: da bitmap)
+        for rule in self.filters:
+            self._add_compiled(rule)
+
+    def _add_compiled(self, rule : tuple) -> None:
+        flag, pgn, sa, da = rule
+        if flag == 0:
+            self._pass_all = True
+        elif flag == FILTER_PGN:
+            self._pgns[pgn >> 3] |= 1 << (pgn & 7)
+        elif flag == FILTER_SOURCE:
+            self._sas |= 1 << sa
+        elif flag == FILTER_DEST:
+            self._das |= 1 << da
+        elif flag == FILTER_SOURCE | FILTER_DEST:
+            self._sa_da[sa] = self._sa_da.get(sa, 0) | (1 << da)
+        else:
+            sa_mask, da_mask, sa_da = self._by_pgn.get(pgn, (0, 0, {}))
+            if flag == FILTER_PGN | FILTER_SOURCE:
+                sa_mask |= 1 << sa
+            elif flag == FILTER_PGN | FILTER_DEST:
+                da_mask |= 1 << da
+            else:
+                sa_da[sa] = sa_da.get(sa, 0) | (1 << da)
+            self._by_pgn[pgn] = (sa_mask, da_mask, sa_da)
+
+    def _pushdown_candidates(self) -> list:
+        """
+        Returns every set of filters that passes at least everything this set passes: the filters
+        themselves, then broader versions with fields dropped, from most to least selective.
+        Broadened sets that would pass everything aren't included.
+        """
+        candidates = [(0, list(self.filters))]
+        for keep in range(_FILTER_FLAGS): # every proper subset of the fields
+            if keep & ~_FILTER_FLAGS:
+                continue
+            broadened = {} # dict to drop duplicates but keep the order
+            for flag, pgn, sa, da in self.filters:
+                rule = self._to_filter(flag & keep, pgn, sa, da)
+                if rule[0] == 0:
+                    break # would pass everything
+                broadened[rule] = None
+            else:
+                broadened = list(broadened)
+                if broadened != candidates[0][1]:
+                    candidates.append((self._estimate(broadened), broadened))
+        candidates[1:] = sorted(candidates[1:], key=lambda candidate: (candidate[0], len(candidate[1])))
+        return [hw_filters for _, hw_filters in candidates]
+
+    @staticmethod
+    def _estimate(hw_filters : list) -> float:
+        """Rough fraction of bus traffic that hw_filters would pass."""
+        total = 0.0
+        for flag, _, _, _ in hw_filters:
+            fraction = 1.0
+            for field, selectivity in _SELECTIVITY.items():
+                if flag & field:
+                    fraction *= selectivity
+            total += fraction
+        return min(total, 1.0)
+
+    @staticmethod
+    def _set_hardware_filters(client, hw_filters : list) -> int:
+        """
+        Replaces the adapter's J1939 filters with hw_filters.
+
+        Returns the number of filters the adapter accepted, or -1 if it wouldn't start filtering.
+        """
+        if client.setAllFiltersToDiscard() != 0:
+            return -1
+        if client.setJ1939FilterType(0) != 0: # FILTER_INCLUSIVE
+            return -1
+        for i, (flag, pgn, sa, da) in enumerate(hw_filters):
+            if client.setJ1939Filters(flag, pgn, sa, da) != 0:
+                return i
+        return len(hw_filters)
+
+    def _use_hardware_filters(self, hw_filters : list) -> None:
+        self.hardware_filters = hw_filters
+        if hw_filters is None:
+            self._hardware = None
+            return
+        self._hardware = J1939FilterSet(self.echo)
+        for rule in hw_filters:
+            self._hardware.addFilter(*rule)
+
+    @staticmethod
+    def _to_filter(filter_flag : int, pgn : int, source : int, dest : int) -> tuple:
+        """Validates a filter and returns it as (filter_flag, pgn, source, dest) with unused fields set to 0."""
+        if filter_flag & ~_FILTER_FLAGS & ~0x02 or filter_flag < 0:
+            raise ValueError(f"Invalid J1939 filter flag {filter_flag}.")
+        filter_flag &= _FILTER_FLAGS # FILTER_PRIORITY (2) was removed from RP1210 standard
+        if filter_flag & FILTER_PGN:
+            if not 0 <= pgn <= 0x3FFFF:
+                raise ValueError(f"Invalid PGN 0x{pgn:X}; must be between 0 and 0x3FFFF.")
+            if (pgn & 0xFF00) < 0xF000:
+                pgn &= 0x3FF00
+        else:
+            pgn = 0
+        if filter_flag & FILTER_SOURCE:
+            if not 0 <= source <= 0xFF:
+                raise ValueError(f"Invalid source address {source}; must be between 0 and 255.")
+        else:
+            source = 0
+        if filter_flag & FILTER_DEST:
+            if not 0 <= dest <= 0xFF:
+                raise ValueError(f"Invalid destination address {dest}; must be between 0 and 255.")
+        else:
+            dest = 0
+        return (filter_flag, pgn, source, dest)
@@ -0,0 +1,317 @@
+"""
+Sends J1939 requests (PGN 0xEA00) and matches the responses to them, with many requests in flight
+at once.
+
+```
+requester = J1939Requester(client.tx, address=0xF9)
+futures = {sa: requester.request(0xFEEB, da=sa) for sa in ecus} # Component ID from every ECU
+requester.flush(rx=client.rx) # one timeout window, not one per ECU
+for sa, future in futures.items():
+    try:
+        print(sa, future.result())
+    except TimeoutError:
+        print(sa, "didn't answer")
+```
+"""
+import heapq
+import time
+from concurrent.futures import Future
+
+from RP1210.J1939 import J1939Message, toJ1939Request
+from RP1210.J1939Transport import J1939Reassembler, TP_CM_PGN, TP_CM_BAM, TP_CM_RTS
+from RP1210.Timing import pollUntilDone
+
+ACK_PGN = 0x00E800
+"""Acknowledgement PGN; sent in place of the requested PGN to ACK/NACK a request."""
+
+ACK_POSITIVE = 0
+ACK_NEGATIVE = 1
+ACK_ACCESS_DENIED = 2
+ACK_CANNOT_RESPOND = 3
+
+def ackControl(msg : J1939Message) -> int:
+    """
+    Returns the control byte (ACK_POSITIVE, ACK_NEGATIVE, ACK_ACCESS_DENIED or ACK_CANNOT_RESPOND) if
+    msg is an Acknowledgement, or None if it isn't.
+    """
+    if msg.pgn & 0x3FF00 != ACK_PGN:
+        return None
+    return msg.data[0]
+
+class J1939PendingRequest:
+    """
+    A request that's waiting for a response.
+
+    Attributes:
+    - `pgn` - the requested PGN.
+    - `da` - address the request was sent to; 0xFF = global request.
+    - `future` - the `concurrent.futures.Future` for the response.
+    - `deadline` - time (from `clock`) when the request times out.
+    - `responses` - for global requests, the responses received so far, by source address.
+    - `expected` - for global requests, the source addresses to wait for, or None to wait for the timeout.
+    - `sent` - False until `tx` accepted the request.
+    """
+    __slots__ = ('pgn', 'da', 'pri', 'future', 'deadline', 'responses', 'expected', 'sent')
+
+    def __init__(self, pgn : int, da : int, pri : int, deadline : float, expected = None) -> None:
+        self.pgn = pgn
+        self.da = da
+        self.pri = pri
+        self.future = Future()
+        self.deadline = deadline
+        self.responses = {} #type: dict[int, J1939Message]
+        self.expected = None if expected is None else set(expected)
+        self.sent = False
+
+    def __repr__(self) -> str:
+        return f"J1939PendingRequest(pgn=0x{self.pgn:X}, da=0x{self.da:X}, done={self.future.done()})"
+
+class J1939Requester:
+    """
+    Sends J1939 requests and resolves a `concurrent.futures.Future` for each one when its response
+    arrives, so you can have as many requests in flight as you want and wait for all of them at once.
+
+    Pending requests are kept in a dict by (PGN, responder SA), so each received message is matched
+    with one lookup no matter how many requests are waiting. Feed every received message to
+    `process()`, or let `flush()` do it for you.
+
+    - Requests sent to one address resolve to the first response from that address: the requested
+    PGN, or an Acknowledgement (PGN 0xE800) if it NACKs the request (see `ackControl()`). If nothing
+    arrives in time, the future raises TimeoutError.
+    - Global requests (da = 0xFF) collect a response from every address that answers, and resolve to
+    a dict of {source address: J1939Message} when they time out, or as soon as every address in
+    `expected` has answered.
+
+    Responses with more than 8 bytes (e.g. Component ID, 0xFEEB) are reassembled with `reassembler`,
+    which is a `J1939Reassembler` that answers RTS/CTS sessions sent to `address` unless you provide
+    your own. A request's deadline is pushed back when a multipacket response to it starts, so slow
+    transfers don't time out halfway.
+
+    Requesting a PGN from an address that already has the same request pending doesn't send the
+    request again; both futures get the same response.
+
+    This class isn't thread-safe; call everything but `Future.result()` from the same thread.
+
+    Args:
+    - `tx` - function to send messages with, e.g. `client.tx`. If it returns a nonzero int (e.g.
+    ERR_TX_QUEUE_FULL), the request is sent again on the next `poll()`.
+    - `address` - your source address.
+    - `timeout` - default seconds to wait for a response. J1939-21 says 1.25 s.
+    - `reassembler` - `J1939Reassembler` to rebuild multipacket responses with. Messages passed to
+    `process()` are passed to it too. Set `requester.reassembler = None` if you reassemble them
+    yourself and pass the results to `process()`.
+    - `clock` - function that returns the current time in seconds. Defaults to `time.monotonic`.
+
+    Counters (read-only):
+    - `sent` - number of requests sent.
+    - `answered` - number of responses matched to a request.
+    - `nacked` - number of requests answered with a negative Acknowledgement.
+    - `timed_out` - number of requests to one address that timed out.
+    """
+    def __init__(self, tx, address : int, timeout : float = 1.25, reassembler : J1939Reassembler = None,
+                 clock = time.monotonic) -> None:
+        if not 0 <= address <= 0xFD:
+            raise ValueError(f"Invalid source address {address}; must be between 0 and 253.")
+        self.tx = tx
+        self.address = address
+        self.timeout = timeout
+        self.clock = clock
+        if reassembler is None:
+            reassembler = J1939Reassembler(address=address, tx=tx, clock=clock)
+        self.reassembler = reassembler
+        self.sent = 0
+        self.answered = 0
+        self.nacked = 0
+        self.timed_out = 0
+        self.pending = {} #type: dict[int, list[J1939PendingRequest]]
+        """Requests to one address, by `(pgn << 8) | da`."""
+        self.pending_global = {} #type: dict[int, list[J1939PendingRequest]]
+        """Global requests, by PGN."""
+        self._schedule = [] # heap of (deadline, counter, request)
+        self._counter = 0
+        self._unsent = [] #type: list[J1939PendingRequest]
+
+    def __len__(self) -> int:
+        """Returns the number of requests waiting for a response."""
+        return sum(map(len, self.pending.values())) + sum(map(len, self.pending_global.values()))
+
+    def request(self, pgn : int, da : int = 0xFF, timeout : float = None, pri : int = 6,
+                expected = None) -> Future:
+        """
+        Sends a request for pgn and returns a Future for the response.
+        - pgn = the PGN you're requesting
+        - da = address to request it from; 0xFF = global request
+        - timeout = seconds to wait for a response. Defaults to `timeout`.
+        - pri = priority of the request
+        - expected = for global requests, the source addresses to wait for (e.g. every ECU you know
+        about), so the future resolves as soon as they've all answered. None = wait for the timeout.
+
+        The future resolves to a J1939Message (requests to one address) or a dict of
+        {source address: J1939Message} (global requests). Call `poll()` or `flush()` to time out
+        requests that don't get an answer.
+        """
+        if not 0 <= pgn <= 0x3FFFF:
+            raise ValueError(f"Invalid PGN 0x{pgn:X}; must be between 0 and 0x3FFFF.")
+        if not 0 <= da <= 0xFF:
+            raise ValueError(f"Invalid destination address {da}; must be between 0 and 255.")
+        if (pgn & 0xFF00) < 0xF000:
+            pgn &= 0x3FF00 # PDU1; responses can be sent to anyone
+        now = self.clock()
+        request = J1939PendingRequest(pgn, da, pri, now + (self.timeout if timeout is None else timeout), expected)
+        if da == 0xFF:
+            others = self.pending_global.setdefault(pgn, [])
+        else:
+            others = self.pending.setdefault((pgn << 8) | da, [])
+        # only ask once; if the same request is already pending, its response is shared
+        shared = bool(others)
+        request.sent = any(other.sent for other in others)
+        others.append(request)
+        self._counter += 1
+        heapq.heappush(self._schedule, (request.deadline, self._counter, request))
+        if not shared:
+            self._send(request)
+        return request.future
+
+    def process(self, msg : J1939Message) -> None:
+        """
+        Handles one received message (J1939Message or RP1210_ReadMessage bytes), resolving any request
+        it answers. Multipacket messages are passed to `reassembler`, and their reassembled message
+        is handled when it's complete.
+        """
+        if not isinstance(msg, J1939Message):
+            msg = J1939Message(msg)
+        full = self.reassembler.process(msg) if self.reassembler is not None else None
+        self._match(msg)
+        if full is not None:
+            self._match(full)
+
+    def processMany(self, messages) -> None:
+        """Calls `process()` for each message in messages."""
+        for msg in messages:
+            self.process(msg)
+
+    def poll(self, now : float = None) -> float:
+        """
+        Resends requests that `tx` couldn't send, and times out requests that waited too long.
+        - now = current time from `clock`. Defaults to `clock()`.
+
+        Returns the number of seconds until the next request times out, or None if none are waiting.
+        """
+        if now is None:
+            now = self.clock()
+        if self._unsent:
+            unsent, self._unsent = self._unsent, []
+            for request in unsent:
+                if not request.future.done():
+                    self._send(request)
+        schedule = self._schedule
+        while schedule and (schedule[0][0] <= now or schedule[0][2].future.done()):
+            deadline, _, request = heapq.heappop(schedule)
+            if request.future.done():
+                self._remove(request) # answered or cancelled
+            elif request.deadline > deadline: # pushed back by a multipacket response
+                self._counter += 1
+                heapq.heappush(schedule, (request.deadline, self._counter, request))
+            else:
+                self._expire(request)
+        if not schedule:
+            return None
+        return max(schedule[0][0] - now, 0.0)
+
+    def flush(self, rx = None, timeout : float = None, poll_interval : float = 0.001) -> bool:
+        """
+        Handles received messages and calls `poll()` until every request is done.
+        - rx = function that returns a received message (J1939Message or RP1210_ReadMessage bytes)
+        or something falsy if there isn't one, e.g. `client.rx`. Without it, requests can only time out.
+        - timeout = max seconds to wait. Waits until everything is done if None.
+        - poll_interval = max seconds between calls to rx. Waits between them are plain sleeps.
+
+        Returns True if every request was answered or timed out, or False if `timeout` ran out first.
+        """
+        # response deadlines don't need to be hit to the millisecond, so no busy-waiting at all
+        return pollUntilDone(self.poll, rx, self.process, timeout, poll_interval, self.clock, spin=0)
+
+    def _send(self, request : J1939PendingRequest) -> None:
+        ret = self.tx(toJ1939Request(request.pgn, self.address, request.da, request.pri))
+        if isinstance(ret, int) and ret != 0:
+            self._unsent.append(request)
+            return
+        request.sent = True
+        self.sent += 1
+
+    def _match(self, msg : J1939Message) -> None:
+        pgn = msg.pgn
+        sa = msg.sa
+        if (pgn & 0xFF00) < 0xF000: # PDU1; only take responses sent to us or to everyone
+            if msg.da != self.address and msg.da != 0xFF:
+                return
+            pgn &= 0x3FF00
+        if pgn == TP_CM_PGN:
+            self._on_transport(msg)
+            return
+        if pgn == ACK_PGN:
+            data = msg.data
+            if len(data) < 8:
+                return
+            pgn = data[5] | (data[6] << 8) | (data[7] << 16)
+            if (pgn & 0xFF00) < 0xF000:
+                pgn &= 0x3FF00
+            if data[0] != ACK_POSITIVE:
+                if self.pending.get((pgn << 8) | sa):
+                    self.nacked += 1
+        requests = self.pending.pop((pgn << 8) | sa, None)
+        if requests:
+            self.answered += 1
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_result(msg)
+        requests = self.pending_global.get(pgn)
+        if requests:
+            self.answered += 1
+            for request in list(requests):
+                request.responses[sa] = msg
+                expected = request.expected
+                if expected is not None and expected.issubset(request.responses):
+                    self._resolve_global(request)
+
+    def _on_transport(self, msg : J1939Message) -> None:
+        """Gives requests more time if a multipacket response to them just started."""
+        data = msg.data
+        if len(data) < 8 or data[0] not in (TP_CM_BAM, TP_CM_RTS):
+            return
+        pgn = data[5] | (data[6] << 8) | (data[7] << 16)
+        if (pgn & 0xFF00) < 0xF000:
+            pgn &= 0x3FF00
+        # the reassembler gives up after this long, so the response is either here or lost by then
+        reassembler = self.reassembler
+        if reassembler is not None:
+            deadline = self.clock() + reassembler.cts_timeout + data[3] * reassembler.timeout
+        else: # someone else is reassembling it
+            deadline = self.clock() + self.timeout
+        for request in self.pending.get((pgn << 8) | msg.sa, []) + self.pending_global.get(pgn, []):
+            request.deadline = max(request.deadline, deadline)
+
+    def _expire(self, request : J1939PendingRequest) -> None:
+        self._remove(request)
+        if request.da == 0xFF:
+            self._resolve_global(request)
+        else:
+            self.timed_out += 1
+            request.future.set_exception(TimeoutError(
+                f"No response to request for PGN 0x{request.pgn:X} from 0x{request.da:02X}."))
+
+    def _resolve_global(self, request : J1939PendingRequest) -> None:
+        self._remove(request)
+        if not request.future.done():
+            request.future.set_result(dict(request.responses))
+
+    def _remove(self, request : J1939PendingRequest) -> None:
+        if request.da == 0xFF:
+            index, key = self.pending_global, request.pgn
+        else:
+            index, key = self.pending, (request.pgn << 8) | request.da
+        requests = index.get(key)
+        if requests and request in requests:
+            requests.remove(request)
+            if not requests:
+                del index[key]
@@ -0,0 +1,638 @@
+"""
+J1939 Transport Protocol (J1939-21 TP.CM and TP.DT) for RP1210 clients.
+
+J1939 messages with more than 8 bytes of data are sent as a series of TP.DT packets with 7 bytes of
+data each, announced by a TP.CM message: a BAM for broadcast messages, or an RTS for messages sent
+to a specific address, where the receiver controls the flow with CTS messages.
+
+Your RP1210 adapter normally does this for you. It doesn't if you connect with
+`isAppPacketizingincomingMsgs` set, and most adapters only support a handful of RTS/CTS sessions at a
+time (see `RP1210Config.getNumberOfSessions()`). Use the classes in this file to do it yourself.
+
+- `J1939Reassembler` - rebuilds multipacket messages from a stream of `J1939Message`s.
+- `J1939Transmitter` - sends multipacket messages, with many sessions at once and precise pacing.
+- `TPSession`, `TPTxSession` - the state of one message being reassembled or sent.
+
+```
+reassembler = J1939Reassembler(address=0xF9, tx=client.tx)
+while True:
+    msg = reassembler.process(J1939Message(client.rx()))
+    if msg:
+        print(msg) # complete multipacket message, e.g. a DM1 with lots of DTCs
+```
+"""
+import heapq
+import time
+from collections import deque
+
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.Timing import pollUntilDone
+
+TP_CM_PGN = 0x00EC00
+"""PGN for Transport Protocol - Connection Management (TP.CM)."""
+TP_DT_PGN = 0x00EB00
+"""PGN for Transport Protocol - Data Transfer (TP.DT)."""
+
+TP_CM_RTS = 16
+TP_CM_CTS = 17
+TP_CM_EOM_ACK = 19
+TP_CM_BAM = 32
+TP_CM_ABORT = 255
+
+TP_MAX_SIZE = 1785
+"""Max data size in bytes for a message sent with the transport protocol (255 packets * 7 bytes)."""
+
+TP_ABORT_REASONS = {
+    1: "Already in one or more connection managed sessions and cannot support another",
+    2: "System resources were needed for another task so this connection managed session was terminated",
+    3: "A timeout occurred and this is the connection abort to close the session",
+    4: "CTS messages received when data transfer is in progress",
+    5: "Maximum retransmit request limit reached",
+    6: "Unexpected data transfer packet",
+    7: "Bad sequence number",
+    8: "Duplicate sequence number",
+    9: "Total message size is greater than 1785 bytes",
+    250: "Reason not listed",
+}
+"""Connection Abort reasons from J1939-21, by code (byte 2 of a TP.CM_Abort message)."""
+
+_SWEEP_INTERVAL = 0.1 # seconds between checks for sessions that timed out
+
+class TPSession:
+    """
+    The state of one multipacket message being reassembled by `J1939Reassembler`.
+
+    Attributes:
+    - `sa` - source address of the message (the sender).
+    - `da` - destination address of the message; 0xFF for BAM.
+    - `pgn` - PGN of the message being sent.
+    - `pri` - priority of the TP.CM message that started the session.
+    - `size` - message data size in bytes.
+    - `packets` - total number of TP.DT packets.
+    - `next_seq` - sequence number of the next TP.DT packet we expect.
+    - `window_end` - sequence number of the last packet allowed by the most recent CTS (RTS/CTS only).
+    - `max_per_cts` - max number of packets per CTS, from the RTS.
+    - `is_bam` - True for BAM, False for RTS/CTS.
+    - `deadline` - when this session times out, in `J1939Reassembler.clock` seconds.
+    - `timestamp` - timestamp of the most recent packet.
+    - `buffer` - the preallocated memoryview the data is reassembled into.
+    """
+    __slots__ = ('sa', 'da', 'pgn', 'pri', 'size', 'packets', 'next_seq', 'window_end', 'max_per_cts',
+                 'is_bam', 'deadline', 'timestamp', 'buffer')
+
+    def __init__(self, sa : int, da : int, pgn : int, pri : int, size : int, packets : int,
+                 is_bam : bool, buffer : memoryview) -> None:
+        self.sa = sa
+        self.da = da
+        self.pgn = pgn
+        self.pri = pri
+        self.size = size
+        self.packets = packets
+        self.next_seq = 1
+        self.window_end = packets
+        self.max_per_cts = 255
+        self.is_bam = is_bam
+        self.deadline = 0.0
+        self.timestamp = 0
+        self.buffer = buffer
+
+    def __repr__(self) -> str:
+        kind = "BAM" if self.is_bam else "RTS/CTS"
+        return (f"TPSession({kind}, pgn=0x{self.pgn:04X}, sa=0x{self.sa:02X}, da=0x{self.da:02X}, "
+                f"packet {self.next_seq - 1}/{self.packets})")
+
+class J1939Reassembler:
+    """
+    Rebuilds multipacket J1939 messages (BAM and RTS/CTS) from TP.CM and TP.DT packets.
+
+    Feed every received `J1939Message` to `process()`. It returns the complete message when the
+    last packet of a multipacket message arrives, and None otherwise. Anything that isn't a TP.CM or
+    TP.DT message is ignored, so you can pass it your whole receive stream.
+
+    Sessions are looked up by (SA, DA) - the same key TP.DT packets carry - so each packet is handled
+    in constant time no matter how many sessions are open. Data is reassembled into one of
+    `max_sessions` buffers that are allocated up front and reused, and only copied out once the
+    message is complete.
+
+    RTS/CTS sessions sent to `address` are answered with CTS, EndOfMsgAck and Connection Abort
+    messages via `tx` if it's provided. Every other session is reassembled passively, following
+    the CTS messages on the bus, which is what you want for logging or monitoring.
+
+    Sessions are dropped if:
+    - no packet arrives within `timeout` seconds (or `cts_timeout` after an RTS or CTS)
+    - a packet arrives out of order (duplicate packets are ignored)
+    - a Connection Abort is received for it
+    - a new BAM or RTS arrives with the same SA and DA
+
+    Args:
+    - `address` - your source address. Set to None to reassemble everything passively.
+    - `tx` - function to send TP.CM messages with, e.g. `client.tx`. Called with bytes from
+    `toJ1939Message()`. Set to None to never send anything.
+    - `max_sessions` - max number of messages that can be reassembled at once.
+    - `cts_packets` - max number of packets to ask for in each CTS (1-255).
+    - `timeout` - max seconds between packets (T1 in J1939-21).
+    - `cts_timeout` - max seconds between an RTS or CTS and the next packet (T2 in J1939-21).
+    - `clock` - function that returns the current time in seconds. Defaults to `time.monotonic`.
+
+    Counters (read-only):
+    - `completed` - number of messages reassembled.
+    - `aborted` - number of sessions that were aborted or replaced by a new session.
+    - `timed_out` - number of sessions that timed out.
+    - `rejected` - number of sessions that weren't started because they were invalid or there
+    wasn't a free buffer.
+    - `unexpected` - number of TP.DT packets that didn't belong to any session.
+    """
+    def __init__(self, address : int = None, tx = None, max_sessions : int = 64, cts_packets : int = 16,
+                 timeout : float = 0.75, cts_timeout : float = 1.25, clock = time.monotonic) -> None:
+        if max_sessions < 1:
+            raise ValueError("J1939Reassembler max_sessions must be at least 1.")
+        if not 1 <= cts_packets <= 255:
+            raise ValueError("J1939Reassembler cts_packets must be between 1 and 255.")
+        self.address = address
+        self.tx = tx
+        self.cts_packets = cts_packets
+        self.timeout = timeout
+        self.cts_timeout = cts_timeout
+        self.clock = clock
+        self.completed = 0
+        self.aborted = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.unexpected = 0
+        self.sessions = {} #type: dict[int, TPSession]
+        """Open sessions, by `(sa << 8) | da`."""
+        pool = memoryview(bytearray(max_sessions * TP_MAX_SIZE))
+        self._free = [pool[i:i + TP_MAX_SIZE] for i in range(0, len(pool), TP_MAX_SIZE)]
+        self._next_sweep = 0.0
+
+    def __len__(self) -> int:
+        """Returns the number of open sessions."""
+        return len(self.sessions)
+
+    def process(self, msg : J1939Message) -> J1939Message:
+        """
+        Handles one received message. Returns the reassembled message if msg was the last packet of
+        a multipacket message, or None.
+
+        The reassembled message has the PGN, SA and DA of the original message, the priority of the
+        TP.CM message that started it, and the timestamp of its last TP.DT packet.
+        """
+        now = self.clock()
+        if now >= self._next_sweep:
+            self.checkTimeouts(now)
+        pgn = msg.pgn & 0x03FF00 # PDU Specific byte is the DA
+        if pgn == TP_DT_PGN:
+            return self._on_data(msg, now)
+        if pgn == TP_CM_PGN:
+            self._on_control(msg, now)
+        return None
+
+    def processMany(self, messages) -> list[J1939Message]:
+        """
+        Calls `process()` for each message in messages (e.g. a list of J1939Messages).
+
+        Returns a list of every message that was reassembled.
+        """
+        process = self.process
+        return [full for full in map(process, messages) if full is not None]
+
+    def checkTimeouts(self, now : float = None) -> list[TPSession]:
+        """
+        Drops every session that has timed out, and sends a Connection Abort for the ones sent to you.
+        `process()` calls this for you every 100 ms or so, so you only need to call it yourself if
+        you stop calling `process()`.
+        - now = current time from `clock`. Defaults to `clock()`.
+
+        Returns the sessions that timed out.
+        """
+        if now is None:
+            now = self.clock()
+        self._next_sweep = now + _SWEEP_INTERVAL
+        expired = [session for session in self.sessions.values() if session.deadline <= now]
+        for session in expired:
+            self.timed_out += 1
+            self._close(session)
+            if self._is_receiver(session):
+                self._send(session.sa, session.da, session.pgn, bytes((TP_CM_ABORT, 3, 0xFF, 0xFF, 0xFF)))
+        return expired
+
+    def clear(self) -> None:
+        """Drops every open session without sending anything."""
+        for session in list(self.sessions.values()):
+            self._close(session)
+
+    def _is_receiver(self, session : TPSession) -> bool:
+        """Returns True if we're supposed to answer session with CTS/EndOfMsgAck/Abort messages."""
+        return self.tx is not None and not session.is_bam and session.da == self.address
+
+    def _send(self, sa : int, da : int, pgn : int, control : bytes) -> None:
+        """Sends a TP.CM message with 5 bytes of control data from da (us) back to sa (the sender)."""
+        self.tx(toJ1939Message(TP_CM_PGN, 7, da, sa, control + pgn.to_bytes(3, 'little')))
+
+    def _send_cts(self, session : TPSession, now : float) -> None:
+        count = min(session.packets - session.next_seq + 1, session.max_per_cts, self.cts_packets)
+        session.window_end = session.next_seq + count - 1
+        session.deadline = now + self.cts_timeout
+        self._send(session.sa, session.da, session.pgn, bytes((TP_CM_CTS, count, session.next_seq, 0xFF, 0xFF)))
+
+    def _close(self, session : TPSession) -> None:
+        del self.sessions[(session.sa << 8) | session.da]
+        self._free.append(session.buffer)
+        session.buffer = None
+
+    def _on_control(self, msg : J1939Message, now : float) -> None:
+        data = msg.data
+        if len(data) < 8:
+            return
+        control = data[0]
+        sa = msg.sa
+        da = msg.da
+        pgn = data[5] | (data[6] << 8) | (data[7] << 16)
+        if control == TP_CM_BAM:
+            self._open(msg, sa, 0xFF, pgn, data, True, now)
+        elif control == TP_CM_RTS:
+            self._open(msg, sa, da, pgn, data, False, now)
+        elif control == TP_CM_CTS: # sent by the receiver, so SA and DA are swapped
+            session = self.sessions.get((da << 8) | sa)
+            if session is None or session.pgn != pgn or self._is_receiver(session):
+                return
+            count, next_seq = data[1], data[2]
+            if count and 1 <= next_seq <= session.packets: # the sender (re)starts at next_seq
+                session.next_seq = next_seq
+                session.window_end = min(next_seq + count - 1, session.packets)
+            session.deadline = now + self.cts_timeout
+        elif control == TP_CM_ABORT: # can come from either side
+            session = self.sessions.get((sa << 8) | da) or self.sessions.get((da << 8) | sa)
+            if session is not None and session.pgn == pgn and not session.is_bam:
+                self.aborted += 1
+                self._close(session)
+
+    def _open(self, msg : J1939Message, sa : int, da : int, pgn : int, data : bytes, is_bam : bool,
+              now : float) -> None:
+        """Starts a new session from a BAM or RTS."""
+        old = self.sessions.get((sa << 8) | da)
+        if old is not None: # sender gave up on the old one
+            self.aborted += 1
+            self._close(old)
+        size = data[1] | (data[2] << 8)
+        packets = data[3]
+        reason = 0
+        if not 0 < size <= TP_MAX_SIZE or packets != (size + 6) // 7:
+            reason = 9
+        elif not self._free:
+            reason = 1
+        if reason:
+            self.rejected += 1
+            if self.tx is not None and not is_bam and da == self.address:
+                self._send(sa, da, pgn, bytes((TP_CM_ABORT, reason, 0xFF, 0xFF, 0xFF)))
+            return
+        session = TPSession(sa, da, pgn, msg.pri, size, packets, is_bam, self._free.pop())
+        session.timestamp = msg.timestamp
+        self.sessions[(sa << 8) | da] = session
+        if is_bam:
+            session.deadline = now + self.timeout
+            return
+        session.max_per_cts = data[4] or 255 # 0xFF = no limit
+        if self._is_receiver(session):
+            self._send_cts(session, now)
+        else:
+            session.deadline = now + self.cts_timeout
+
+    def _on_data(self, msg : J1939Message, now : float) -> J1939Message:
+        session = self.sessions.get((msg.sa << 8) | msg.da)
+        if session is None:
+            self.unexpected += 1
+            return None
+        data = msg.data
+        seq = data[0] if data else 0
+        if seq != session.next_seq:
+            if 0 < seq < session.next_seq: # duplicate, e.g. retransmitted after a CTS
+                return None
+            self.aborted += 1
+            self._close(session)
+            if self._is_receiver(session):
+                self._send(session.sa, session.da, session.pgn, bytes((TP_CM_ABORT, 7, 0xFF, 0xFF, 0xFF)))
+            return None
+        start = (seq - 1) * 7
+        length = min(7, session.size - start) # last packet is padded with 0xFF
+        chunk = data[1:1 + length]
+        if len(chunk) < length:
+            chunk += b'\xFF' * (length - len(chunk))
+        session.buffer[start:start + length] = chunk
+        session.timestamp = msg.timestamp
+        if seq == session.packets:
+            return self._complete(session)
+        session.next_seq = seq + 1
+        if seq == session.window_end and self._is_receiver(session):
+            self._send_cts(session, now)
+        else:
+            session.deadline = now + self.timeout
+        return None
+
+    def _complete(self, session : TPSession) -> J1939Message:
+        data = bytes(session.buffer[:session.size])
+        self.completed += 1
+        self._close(session)
+        if self._is_receiver(session):
+            self._send(session.sa, session.da, session.pgn,
+                       bytes((TP_CM_EOM_ACK, session.size & 0xFF, session.size >> 8, session.packets, 0xFF)))
+        msg = J1939Message(pgn=session.pgn, da=session.da, sa=session.sa, data=data, pri=session.pri,
+                           size=session.size)
+        msg.timestamp = session.timestamp
+        return msg
+
+TX_SENDING = 0
+TX_WAITING = 1 # for CTS or EndOfMsgAck
+TX_DONE = 2
+
+class TPTxSession:
+    """
+    The state of one multipacket message being sent by `J1939Transmitter`.
+
+    Attributes:
+    - `sa` - source address (you).
+    - `da` - destination address; 0xFF for BAM.
+    - `pgn` - PGN of the message being sent.
+    - `pri` - priority of the TP.CM and TP.DT messages.
+    - `data` - message data, padded with 0xFF to a multiple of 7 bytes.
+    - `size` - message data size in bytes.
+    - `packets` - total number of TP.DT packets.
+    - `is_bam` - True for BAM, False for RTS/CTS.
+    - `next_seq` - sequence number of the next TP.DT packet to send.
+    - `window_end` - sequence number of the last packet we're allowed to send before the next CTS.
+    - `state` - `TX_SENDING`, `TX_WAITING` (for CTS or EndOfMsgAck) or `TX_DONE`.
+    - `due` - when the next packet is due (or when the session times out if waiting), in
+    `J1939Transmitter.clock` seconds.
+    - `error` - 0 if the message was sent; otherwise the Connection Abort reason (3 = timeout).
+    See `TP_ABORT_REASONS`.
+    - `callback` - function called with this session when it's done, or None.
+    """
+    __slots__ = ('sa', 'da', 'pgn', 'pri', 'data', 'size', 'packets', 'is_bam', 'next_seq',
+                 'window_end', 'state', 'due', 'error', 'callback', '_token')
+
+    def __init__(self, sa : int, da : int, pgn : int, pri : int, data : bytes, callback = None) -> None:
+        self.sa = sa
+        self.da = da
+        self.pgn = pgn
+        self.pri = pri
+        self.size = len(data)
+        self.packets = (self.size + 6) // 7
+        self.data = data + b'\xFF' * (self.packets * 7 - self.size)
+        self.is_bam = da == 0xFF
+        self.next_seq = 1
+        self.window_end = self.packets if self.is_bam else 0
+        self.state = TX_WAITING
+        self.due = 0.0
+        self.error = 0
+        self.callback = callback
+        self._token = 0 # bumped whenever due changes, to skip stale scheduler entries
+
+    def done(self) -> bool:
+        """Returns True if the session finished, whether or not the message was sent."""
+        return self.state == TX_DONE
+
+    def __repr__(self) -> str:
+        kind = "BAM" if self.is_bam else "RTS/CTS"
+        return (f"TPTxSession({kind}, pgn=0x{self.pgn:04X}, sa=0x{self.sa:02X}, da=0x{self.da:02X}, "
+                f"packet {self.next_seq - 1}/{self.packets})")
+
+class J1939Transmitter:
+    """
+    Sends multipacket J1939 messages (up to 1785 bytes) with BAM or RTS/CTS from your application
+    instead of from the adapter, so you aren't limited by the adapter's session count or its fixed
+    interpacket time.
+
+    Every session is kept in a heap ordered by when its next packet is due, so many sessions can run
+    at once. `poll()` sends every packet that's due and returns how long until the next one;
+    `flush()` does that in a loop, waiting for packets with `Timing.sleepUntil()` rather than a plain
+    sleep so they go out on time. Feed received messages to `process()` so RTS/CTS sessions can
+    follow CTS windows and finish on EndOfMsgAck.
+    ```
+    transmitter = J1939Transmitter(client.tx)
+    transmitter.send(0xEF00, 0xF9, 0x00, calibration_block) # RTS/CTS
+    transmitter.send(0xFECA, 0xF9, 0xFF, dm1_data) # BAM
+    transmitter.flush(rx=client.rx)
+    ```
+    Only one session can be open per SA and DA at a time (J1939-21); anything else you send to the
+    same address is queued until the open session finishes, as is everything past `max_sessions`.
+
+    Args:
+    - `tx` - function to send messages with, e.g. `client.tx`. Called with bytes from
+    `toJ1939Message()`. If it returns a nonzero int (e.g. ERR_TX_QUEUE_FULL), the packet is sent
+    again `retry_interval` seconds later.
+    - `max_sessions` - max number of sessions sending at once.
+    - `bam_interval` - seconds between BAM packets. J1939-21 requires 50 to 200 ms.
+    - `rts_interval` - seconds between RTS/CTS packets. The receiver controls the flow with CTS, so
+    this can be 0 (as fast as `tx` goes).
+    - `max_per_cts` - max packets per CTS to ask for in the RTS (1-255; 255 = no limit).
+    - `timeout` - max seconds to wait for a CTS or EndOfMsgAck (T3 in J1939-21).
+    - `hold_timeout` - max seconds to wait after a CTS asking us to hold (T4 in J1939-21).
+    - `retry_interval` - seconds to wait before resending a packet that `tx` failed to send.
+    - `clock` - function that returns the current time in seconds. Defaults to `time.monotonic`.
+
+    Counters (read-only):
+    - `completed` - number of messages sent.
+    - `aborted` - number of sessions aborted by the receiver.
+    - `timed_out` - number of sessions that timed out.
+    - `packets_sent` - number of TP.CM and TP.DT messages sent.
+    - `tx_errors` - number of times `tx` returned an error.
+    """
+    def __init__(self, tx, max_sessions : int = 16, bam_interval : float = 0.05, rts_interval : float = 0.0,
+                 max_per_cts : int = 255, timeout : float = 1.25, hold_timeout : float = 1.05,
+                 retry_interval : float = 0.001, clock = time.monotonic) -> None:
+        if max_sessions < 1:
+            raise ValueError("J1939Transmitter max_sessions must be at least 1.")
+        if not 1 <= max_per_cts <= 255:
+            raise ValueError("J1939Transmitter max_per_cts must be between 1 and 255.")
+        self.tx = tx
+        self.max_sessions = max_sessions
+        self.bam_interval = bam_interval
+        self.rts_interval = rts_interval
+        self.max_per_cts = max_per_cts
+        self.timeout = timeout
+        self.hold_timeout = hold_timeout
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.completed = 0
+        self.aborted = 0
+        self.timed_out = 0
+        self.packets_sent = 0
+        self.tx_errors = 0
+        self.sessions = {} #type: dict[int, TPTxSession]
+        """Open sessions, by `(sa << 8) | da`."""
+        self._pending = deque() #type: deque[TPTxSession]
+        self._schedule = [] # heap of (due, counter, session, token)
+        self._counter = 0
+
+    def __len__(self) -> int:
+        """Returns the number of open and queued sessions."""
+        return len(self.sessions) + len(self._pending)
+
+    def send(self, pgn : int, sa : int, da : int, data : bytes, pri : int = 7, callback = None) -> TPTxSession:
+        """
+        Starts sending a message with the transport protocol: BAM if da is 0xFF, RTS/CTS otherwise.
+        The TP.CM message is sent right away if there's room for another session; call `poll()` or
+        `flush()` to send the rest.
+        - pgn = PGN of the message
+        - sa = source address (you)
+        - da = destination address; 0xFF = broadcast (BAM)
+        - data = message data (9 to 1785 bytes)
+        - pri = priority of the TP.CM and TP.DT messages
+        - callback = function to call with the `TPTxSession` when it's done
+
+        Returns the new `TPTxSession`. Raises ValueError if data is too short or too long for the
+        transport protocol; send messages with 8 bytes of data or less with `tx` directly.
+        """
+        data = bytes(data)
+        if not 8 < len(data) <= TP_MAX_SIZE:
+            raise ValueError(f"Transport protocol messages need 9 to {TP_MAX_SIZE} bytes of data, not {len(data)}.")
+        session = TPTxSession(sa, da, pgn, pri, data, callback)
+        self._pending.append(session)
+        self._start_pending(self.clock())
+        return session
+
+    def process(self, msg : J1939Message) -> None:
+        """
+        Handles one received message (J1939Message or RP1210_ReadMessage bytes). CTS, EndOfMsgAck and
+        Connection Abort messages for your RTS/CTS sessions are acted on; everything else is ignored.
+        """
+        if not isinstance(msg, J1939Message):
+            msg = J1939Message(msg)
+        if msg.pgn & 0x03FF00 != TP_CM_PGN:
+            return
+        session = self.sessions.get((msg.da << 8) | msg.sa) # sent by the receiver, so SA and DA are swapped
+        data = msg.data
+        if session is None or session.is_bam or len(data) < 8:
+            return
+        if data[5] | (data[6] << 8) | (data[7] << 16) != session.pgn:
+            return
+        control = data[0]
+        now = self.clock()
+        if control == TP_CM_CTS:
+            count, next_seq = data[1], data[2]
+            if count == 0: # hold the connection open
+                session.state = TX_WAITING
+                self._reschedule(session, now + self.hold_timeout)
+            elif 1 <= next_seq <= session.packets:
+                session.next_seq = next_seq # can go back to resend packets
+                session.window_end = min(next_seq + count - 1, session.packets)
+                session.state = TX_SENDING
+                self._reschedule(session, now)
+        elif control == TP_CM_EOM_ACK:
+            if session.next_seq > session.packets:
+                self._finish(session, 0, now)
+        elif control == TP_CM_ABORT:
+            self.aborted += 1
+            self._finish(session, data[1], now)
+
+    def poll(self, now : float = None) -> float:
+        """
+        Sends every packet that is due, and times out sessions that waited too long.
+        - now = current time from `clock`. Defaults to `clock()`.
+
+        Returns the number of seconds until something else is due (0 if it's due now), or None if
+        there's nothing scheduled.
+        """
+        if now is None:
+            now = self.clock()
+        schedule = self._schedule
+        while schedule and schedule[0][0] <= now:
+            due, _, session, token = heapq.heappop(schedule)
+            if token != session._token:
+                continue # stale entry; the session was rescheduled
+            if session.state == TX_WAITING: # no CTS or EndOfMsgAck in time
+                self.timed_out += 1
+                if not session.is_bam:
+                    self._send_cm(session, bytes((TP_CM_ABORT, 3, 0xFF, 0xFF, 0xFF)))
+                self._finish(session, 3, now)
+                continue
+            self._send_packet(session, due, now)
+        while schedule and schedule[0][3] != schedule[0][2]._token:
+            heapq.heappop(schedule)
+        if not schedule:
+            return None
+        return max(schedule[0][0] - now, 0.0)
+
+    def flush(self, rx = None, timeout : float = None, poll_interval : float = 0.001) -> bool:
+        """
+        Calls `poll()` until every session is done, waiting precisely until the next packet is due.
+        - rx = function that returns a received message (J1939Message or RP1210_ReadMessage bytes)
+        or something falsy if there isn't one, e.g. `client.rx`. Every received message is passed to
+        `process()`. Required for RTS/CTS sessions, which otherwise time out.
+        - timeout = max seconds to wait. Waits until everything is done if None.
+        - poll_interval = max seconds between calls to rx. Waits between them are plain sleeps, so
+        waiting for a CTS or EndOfMsgAck doesn't busy-wait.
+
+        Returns True if every session finished, or False if it timed out.
+        """
+        done = pollUntilDone(self.poll, rx, self.process, timeout, poll_interval, self.clock)
+        return done and not (self.sessions or self._pending)
+
+    def _reschedule(self, session : TPTxSession, due : float) -> None:
+        session.due = due
+        session._token += 1
+        self._counter += 1
+        heapq.heappush(self._schedule, (due, self._counter, session, session._token))
+
+    def _start_pending(self, now : float) -> None:
+        """Starts queued sessions if there's room for them."""
+        pending = self._pending
+        for _ in range(len(pending)):
+            if len(self.sessions) >= self.max_sessions:
+                return
+            session = pending.popleft()
+            key = (session.sa << 8) | session.da
+            if key in self.sessions:
+                pending.append(session) # wait for the open session with the same addresses
+                continue
+            self.sessions[key] = session
+            if session.is_bam:
+                self._send_cm(session, bytes((TP_CM_BAM, session.size & 0xFF, session.size >> 8, session.packets, 0xFF)))
+                session.state = TX_SENDING
+                self._reschedule(session, now + self.bam_interval)
+            else:
+                self._send_cm(session, bytes((TP_CM_RTS, session.size & 0xFF, session.size >> 8, session.packets,
+                                              self.max_per_cts)))
+                self._reschedule(session, now + self.timeout)
+
+    def _send_cm(self, session : TPTxSession, control : bytes) -> None:
+        ret_val = self.tx(toJ1939Message(TP_CM_PGN, session.pri, session.sa, session.da,
+                                         control + session.pgn.to_bytes(3, 'little')))
+        if ret_val: # not retried; the session times out or the receiver aborts it
+            self.tx_errors += 1
+        else:
+            self.packets_sent += 1
+
+    def _send_packet(self, session : TPTxSession, due : float, now : float) -> None:
+        """Sends the next TP.DT packet for session and schedules the one after it."""
+        seq = session.next_seq
+        start = (seq - 1) * 7
+        ret_val = self.tx(toJ1939Message(TP_DT_PGN, session.pri, session.sa, session.da,
+                                         bytes((seq,)) + session.data[start:start + 7]))
+        if ret_val: # adapter didn't take it; try again soon
+            self.tx_errors += 1
+            self._reschedule(session, now + self.retry_interval)
+            return
+        self.packets_sent += 1
+        session.next_seq = seq + 1
+        if session.is_bam:
+            if seq == session.packets:
+                self._finish(session, 0, now)
+            else:
+                self._reschedule(session, now + self.bam_interval) # never less than bam_interval apart
+        elif seq >= session.window_end: # wait for the next CTS, or EndOfMsgAck if that was the last one
+            session.state = TX_WAITING
+            self._reschedule(session, now + self.timeout)
+        else:
+            self._reschedule(session, due + self.rts_interval)
+
+    def _finish(self, session : TPTxSession, error : int, now : float) -> None:
+        session.state = TX_DONE
+        session.error = error
+        session._token += 1 # drop anything left in the schedule
+        del self.sessions[(session.sa << 8) | session.da]
+        if error == 0:
+            self.completed += 1
+        self._start_pending(now)
+        if session.callback is not None:
+            session.callback(session)
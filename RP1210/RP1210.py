@@ -4,9 +4,9 @@ Base RP1210 functions.
 import os
 import configparser
 from configparser import ConfigParser
-from ctypes import POINTER, c_char_p, c_int32, c_long, c_short, c_void_p, cdll, CDLL, create_string_buffer
+from ctypes import POINTER, c_char, c_char_p, c_int32, c_long, c_short, c_void_p, cdll, CDLL, create_string_buffer
 from typing import Literal
-from . import Commands, sanitize_msg_param
+from . import Commands, Reader, sanitize_msg_param
 
 RP1210_ERRORS = {
     1: "NO_ERRORS",
@@ -155,9 +155,12 @@ def getAPINames(rp121032_path : str = None) -> list[str]:
 
     You can provide your own path to RP121032.ini, or let it find it on its own.
 
-    Returns empty list [] if RP121032.ini isn't found or couldn't be parsed.
+    Returns empty list [] if RP121032.ini isn't found or couldn't be parsed, or if no path is given
+    and the WINDIR environment variable isn't set (i.e. not on Windows).
     """
     if not rp121032_path: # find our own path if none is given
+        if "WINDIR" not in os.environ:
+            return []
         rp121032_path = os.path.join(os.environ["WINDIR"], "RP121032.ini")
     elif not os.path.isfile(rp121032_path): # check if file exists
         raise FileNotFoundError(f"RP121032.ini not found at {rp121032_path}.")
@@ -957,6 +960,29 @@ class RP1210API:
             ret_val = (ret_val - 0x10000)
         return ret_val
 
+    def SendMany(self, ClientID : int, Batch) -> int:
+        """
+        Calls RP1210_SendMessage for every message in Batch, in order, without copying them.
+        - ClientID = clientID you got from ClientConnect
+        - Batch = a J1939TxBatch, or anything else with `buffer` (bytearray), `offsets`, `lengths`
+        and `error` attributes
+
+        Sending stops at the first error, and the error code is stored in `Batch.error`.
+
+        Returns the number of messages that were sent.
+        """
+        send = self.getDLL().RP1210_SendMessage
+        buffer = Batch.buffer
+        sent = 0
+        Batch.error = 0
+        for offset, length in zip(Batch.offsets, Batch.lengths):
+            ret_val = send(ClientID, (c_char * length).from_buffer(buffer, offset), length, 0, 0) & 0xFFFF
+            if ret_val != 0:
+                Batch.error = 0x10000 - ret_val if ret_val >= 0x8000 else ret_val
+                break
+            sent += 1
+        return sent
+
     def ReadMessage(self, ClientID : int, RxBuffer : bytes, BufferSize = 0, 
                         BlockOnRead = 0) -> int:
         """
@@ -964,6 +990,7 @@ class RP1210API:
         - ClientID = clientID you got from ClientConnect
         - RxBuffer = buffer you want to read the message into (called fpchAPIMessage in RP1210 docs)
             - Generate this via create_string_buffer()
+            - A bytearray or writable memoryview also works; the message is read into it in place.
         - BufferSize = the size of the buffer in bytes. Defaults to len(RxBuffer) if no value
         is provided.
         - BlockOnRead = sets NON_BLOCKING_IO or BLOCKING_IO. Defaults to NON_BLOCKING_IO.
@@ -972,6 +999,8 @@ class RP1210API:
         is present. Returns a negative number containing an error code if there was an error, e.g.
         -128 -> error code 128.
         """
+        if isinstance(RxBuffer, (bytearray, memoryview)):
+            RxBuffer = (c_char * memoryview(RxBuffer).nbytes).from_buffer(RxBuffer)
         if not BufferSize:
             BufferSize = len(RxBuffer)
         ret_val = self.getDLL().RP1210_ReadMessage(ClientID, RxBuffer, BufferSize, BlockOnRead) & 0xFFFF
@@ -996,6 +1025,40 @@ class RP1210API:
             return b''
         return RxBuffer[:size]
 
+    def ReadMany(self, ClientID : int, MaxMessages = 64, BufferSize = 256, Batch = None) -> Reader.RxBatch:
+        """
+        Calls ReadMessage (NON_BLOCKING_IO) repeatedly until there are no messages left or MaxMessages
+        messages have been read. Returns an RxBatch holding every message that was read.
+        - ClientID = clientID you got from ClientConnect
+        - MaxMessages = max number of messages to read. Ignored if Batch is provided.
+        - BufferSize = the size of each message buffer in bytes. Ignored if Batch is provided.
+        - Batch = an RxBatch to read into. Reuse the same RxBatch for every call to avoid
+        allocating anything per call.
+
+        Messages are stored back-to-back in one buffer; iterate over the batch to get each one as a
+        memoryview. Output still includes leading 4 timestamp bytes, if applicable.
+
+        If ReadMessage returns an error, reading stops and the error code is stored in `Batch.error`.
+        """
+        if Batch is None:
+            Batch = Reader.RxBatch(MaxMessages, BufferSize)
+        read = self.getDLL().RP1210_ReadMessage
+        lengths = Batch.lengths
+        size = Batch.buffer_size
+        count = 0
+        Batch.error = 0
+        for slot in Batch.slots:
+            ret_val = read(ClientID, slot, size, 0) & 0xFFFF
+            if ret_val == 0:
+                break
+            if ret_val >= 0x8000: # error code
+                Batch.error = 0x10000 - ret_val
+                break
+            lengths[count] = ret_val
+            count += 1
+        Batch.count = count
+        return Batch
+
     def ReadVersion(self, DLLMajorVersionBuffer : bytes, 
                         DLLMinorVersionBuffer : bytes,
                         APIMajorVersionBuffer : bytes,
@@ -1485,6 +1548,7 @@ class RP1210Client(RP1210VendorList):
 
     def __init__(self, rp121032_path : str = None, api_dir : str = None, config_dir : str = None) -> None:
         self.clientID = 128 # DLL_NOT_INITIALIZED
+        self._reader = None #type: Reader.RxReader
         super().__init__(rp121032_path, api_dir, config_dir)
 
     def __str__(self) -> str:
@@ -1507,6 +1571,42 @@ class RP1210Client(RP1210VendorList):
         """
         return self.clientID
 
+    def startReader(self, capacity = 4096, buffer_size = 256, overflow = "drop-oldest",
+                    blocking = 0) -> Reader.RxReader:
+        """
+        Starts reading messages on a background thread so the adapter's receive queue never fills up.
+        - capacity = max number of messages to hold until you read them.
+        - buffer_size = the size of each message buffer in bytes. Defaults to 256.
+        - overflow = what to do when `capacity` is reached: "drop-oldest", "drop-newest", or "block".
+        - blocking = BlockOnRead argument used by the reader thread. Defaults to NON_BLOCKING_IO.
+            - If you use BLOCKING_IO, call setBlockingTimeout() first.
+
+        Call this after `connect()`. While the reader is running, `rx()` and `rxMany()` return messages
+        from the reader's buffer instead of calling ReadMessage directly.
+
+        Returns the RxReader, which holds drop/error counters in `reader.ring`. If a reader is already
+        running, it is stopped and replaced.
+        """
+        self.stopReader()
+        ring = Reader.RxRingBuffer(capacity, buffer_size, overflow)
+        self._reader = Reader.RxReader(self.getAPI(), self.getClientID(), ring, blocking)
+        self._reader.start()
+        return self._reader
+
+    def stopReader(self) -> None:
+        """
+        Stops the background reader started with `startReader()`, if there is one.
+
+        Messages left in the reader's buffer are discarded.
+        """
+        if self._reader is not None:
+            self._reader.stop()
+            self._reader = None
+
+    def getReader(self) -> Reader.RxReader:
+        """Returns the background reader started with `startReader()`, or None if it isn't running."""
+        return self._reader
+
     ####################
     # RP1210 FUNCTIONS #
     ####################
@@ -1534,6 +1634,7 @@ class RP1210Client(RP1210VendorList):
         Returns 0 if successful, or >127 if it failed.
             You can use translateClientID() to translate the failure code.
         """
+        self.stopReader()
         try:
             return self.getAPI().ClientDisconnect(self.clientID) & 0xFFFF
         except Exception:
@@ -1558,11 +1659,64 @@ class RP1210Client(RP1210VendorList):
 
         Output still includes leading 4 timestamp bytes, if applicable.
 
+        If a background reader is running (see `startReader()`), returns the oldest message from its
+        buffer instead, or b'' if there isn't one. buffer_size is ignored in that case.
+
         Unlike most of the other functions in this module, this function WILL throw an exception
         if the relevant RP1210API isn't able to be initialized!
         """
+        if self._reader is not None:
+            return self._reader.ring.get(bool(blocking))
         return self.getAPI().ReadDirect(self.getClientID(), buffer_size, blocking)
 
+    def rxInto(self, buffer, blocking = 0) -> memoryview:
+        """
+        Reads one message into a buffer you provide and returns a memoryview of the message.
+        - buffer = bytearray, writable memoryview, or ctypes buffer (e.g. from create_string_buffer())
+        - blocking = sets NON_BLOCKING_IO or BLOCKING_IO. Defaults to NON_BLOCKING_IO.
+
+        Nothing is copied: the returned memoryview points into `buffer`, so it's only valid until you
+        read into the same buffer again. You can pass it straight to J1939Message, which parses it
+        without copying. Returns an empty memoryview if no message was read.
+
+        Output still includes leading 4 timestamp bytes, if applicable.
+
+        This function ignores the background reader (see `startReader()`), and WILL throw an
+        exception if the relevant RP1210API isn't able to be initialized!
+        """
+        size = self.getAPI().ReadMessage(self.getClientID(), buffer, 0, blocking)
+        view = memoryview(buffer).cast('B')
+        return view[:max(size, 0)]
+
+    def rxMany(self, max_count = 0, blocking = 0) -> list[bytes]:
+        """
+        Returns up to max_count messages as a list of bytes, oldest first.
+        - max_count = max number of messages to return. Set to 0 to get every available message.
+        - blocking = if set, waits for at least one message to arrive. Only applies if a background
+        reader is running.
+
+        If a background reader is running (see `startReader()`), messages come from its buffer.
+        Otherwise, this calls `rxBatch()` and copies the results (max_count of 0 reads up to 64).
+        """
+        if self._reader is not None:
+            return self._reader.ring.getMany(max_count, bool(blocking))
+        return self.rxBatch(max_count or 64).toList()
+
+    def rxBatch(self, max_count = 64, buffer_size = 256, batch = None) -> Reader.RxBatch:
+        """
+        Reads every available message (up to max_count) into an RxBatch via ReadMany.
+        - max_count = max number of messages to read. Ignored if batch is provided.
+        - buffer_size = the size of each message buffer in bytes. Ignored if batch is provided.
+        - batch = an RxBatch to read into. Pass the same one every time for the least overhead.
+
+        Iterate over the returned batch to get each message as a memoryview. This is much faster than
+        calling rx() in a loop when there's a lot of traffic.
+
+        Unlike most of the other functions in this module, this function WILL throw an exception
+        if the relevant RP1210API isn't able to be initialized!
+        """
+        return self.getAPI().ReadMany(self.getClientID(), max_count, buffer_size, batch)
+
     def tx(self, message, msg_size = 0) -> int:
         """
         Send a message to the databus your adapter is connected to.
@@ -1583,6 +1737,19 @@ class RP1210Client(RP1210VendorList):
         except Exception:
             return 128 # DLL_NOT_INITIALIZED
 
+    def txBatch(self, batch) -> int:
+        """
+        Sends every message in a J1939TxBatch via SendMany.
+        - batch = the J1939TxBatch to send
+
+        Returns the number of messages that were sent. If one failed, sending stops there and its
+        error code is stored in `batch.error`.
+
+        Unlike most of the other functions in this module, this function WILL throw an exception
+        if the relevant RP1210API isn't able to be initialized!
+        """
+        return self.getAPI().SendMany(self.getClientID(), batch)
+
     #####################
     # COMMAND FUNCTIONS #
     #####################
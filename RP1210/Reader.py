@@ -0,0 +1,341 @@
+"""
+Background message reading for RP1210 clients.
+
+`RP1210Client.rx()` reads one message at a time from the thread that calls it. If your application
+stops calling `rx()` for a while (e.g. to do some processing), the adapter's receive queue will fill
+up and you'll start getting ERR_RX_QUEUE_FULL on a busy bus. The classes in this file solve that
+problem by draining the adapter continuously from a dedicated thread.
+
+- `RxRingBuffer` - a bounded buffer of preallocated message slots.
+- `RxReader` - a thread that calls RP1210_ReadMessage in a loop and fills an `RxRingBuffer`.
+- `RxBatch` - a reusable buffer that `RP1210API.ReadMany()` reads many messages into at once.
+
+You usually won't need to touch these directly; call `RP1210Client.startReader()` instead and keep
+using `rx()` like you normally would.
+"""
+import threading
+import time
+from array import array
+from ctypes import c_char
+
+OVERFLOW_POLICIES = ("drop-oldest", "drop-newest", "block")
+"""
+What an `RxRingBuffer` should do when a message arrives and every slot is full.
+
+- "drop-oldest" - overwrite the oldest unread message (default)
+- "drop-newest" - discard the message that just arrived
+- "block" - stop reading from the adapter until there is room in the buffer
+"""
+
+class RxRingBuffer:
+    """
+    A bounded FIFO buffer made of preallocated, fixed-size message slots.
+
+    Every slot is backed by one contiguous `bytearray`, and each slot has a ctypes `c_char` array
+    view that can be handed straight to RP1210_ReadMessage. The producer (usually an `RxReader`)
+    reads into a slot in place, so nothing is allocated per message on the reading thread.
+    Consumers only ever receive `bytes` copies of the slots, and never touch ctypes.
+
+    There is always one spare slot that consumers can't see, so the producer can read into it
+    without holding a lock. The overflow policy is applied when the slot is committed.
+    This buffer supports a single producer thread and any number of consumer threads.
+
+    Args:
+    - `capacity` - maximum number of unread messages.
+    - `slot_size` - size of each slot in bytes (the BufferSize passed to RP1210_ReadMessage).
+    - `overflow` - what to do when the buffer is full. See `OVERFLOW_POLICIES`.
+
+    Counters (read-only):
+    - `received` - number of messages that were put into the buffer.
+    - `dropped` - number of messages that were discarded because the buffer was full.
+    - `errors` - number of error codes the producer reported via `putError()`.
+    - `last_error` - the most recent error code reported via `putError()` (0 if none).
+    """
+    def __init__(self, capacity : int = 4096, slot_size : int = 256, overflow : str = "drop-oldest") -> None:
+        if capacity < 1:
+            raise ValueError("RxRingBuffer capacity must be at least 1.")
+        if slot_size < 1:
+            raise ValueError("RxRingBuffer slot_size must be at least 1.")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy '{overflow}'. Must be one of: {OVERFLOW_POLICIES}")
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self.overflow = overflow
+        self._num_slots = capacity + 1 # +1 for the producer's spare slot
+        self._storage = bytearray(self._num_slots * slot_size)
+        self._slots = [(c_char * slot_size).from_buffer(self._storage, i * slot_size)
+                       for i in range(self._num_slots)]
+        self._lengths = array('H', bytes(2 * self._num_slots))
+        self._head = 0 # total number of slots committed by the producer
+        self._tail = 0 # total number of slots consumed (or dropped)
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = 0
+
+    def __len__(self) -> int:
+        """Returns the number of unread messages in the buffer."""
+        return self._head - self._tail
+
+    def __bool__(self) -> bool:
+        return self._head != self._tail
+
+    ############
+    # PRODUCER #
+    ############
+
+    def claim(self, timeout : float = None):
+        """
+        Returns the index of the spare slot that the producer should write the next message into.
+
+        If the overflow policy is "block", this waits up to `timeout` seconds for a consumer to make
+        room, and returns None if there still isn't any.
+
+        The slot isn't visible to consumers until you call `commit()`.
+        """
+        if self.overflow == "block" and self._head - self._tail >= self.capacity:
+            with self._lock:
+                if not self._not_full.wait_for(lambda: self._head - self._tail < self.capacity, timeout):
+                    return None
+        return self._head % self._num_slots
+
+    def commit(self, slot : int, size : int) -> bool:
+        """
+        Publishes `size` bytes written into `slot` (which you got from `claim()`).
+
+        Applies the overflow policy if the buffer is full. Returns False if the message was dropped.
+        """
+        with self._lock:
+            if self._head - self._tail >= self.capacity:
+                self.dropped += 1
+                if self.overflow == "drop-newest":
+                    return False
+                self._tail += 1 # drop-oldest
+            self._lengths[slot] = size
+            self._head += 1
+            self.received += 1
+            self._not_empty.notify()
+            return True
+
+    def slot(self, index : int):
+        """Returns the ctypes `c_char` array for a slot, suitable for RP1210_ReadMessage."""
+        return self._slots[index]
+
+    def put(self, message : bytes, timeout : float = None) -> bool:
+        """
+        Copies a message into the buffer. Returns False if the message was discarded.
+
+        Messages longer than `slot_size` are truncated.
+        """
+        index = self.claim(timeout)
+        if index is None:
+            with self._lock:
+                self.dropped += 1
+            return False
+        size = min(len(message), self.slot_size)
+        start = index * self.slot_size
+        self._storage[start:start + size] = message[:size]
+        return self.commit(index, size)
+
+    def putError(self, error_code : int) -> None:
+        """Records an error code reported while producing messages."""
+        with self._lock:
+            self.errors += 1
+            self.last_error = error_code
+
+    ############
+    # CONSUMER #
+    ############
+
+    def get(self, block : bool = False, timeout : float = None) -> bytes:
+        """
+        Removes and returns the oldest message in the buffer.
+
+        Returns b'' if the buffer is empty (after waiting up to `timeout` seconds if `block` is set).
+        """
+        with self._lock:
+            if self._head == self._tail:
+                if not block or not self._not_empty.wait_for(lambda: self._head != self._tail, timeout):
+                    return b''
+            return self._pop()
+
+    def getMany(self, max_count : int = 0, block : bool = False, timeout : float = None) -> list[bytes]:
+        """
+        Removes and returns up to `max_count` messages from the buffer, oldest first.
+
+        Set `max_count` to 0 to get everything that's currently in the buffer.
+
+        Returns an empty list if the buffer is empty (after waiting up to `timeout` seconds if
+        `block` is set).
+        """
+        with self._lock:
+            if self._head == self._tail:
+                if not block or not self._not_empty.wait_for(lambda: self._head != self._tail, timeout):
+                    return []
+            count = self._head - self._tail
+            if max_count:
+                count = min(count, max_count)
+            return [self._pop() for _ in range(count)]
+
+    def clear(self) -> None:
+        """Discards all unread messages (they are not counted as dropped)."""
+        with self._lock:
+            self._tail = self._head
+            self._not_full.notify_all()
+
+    def notifyAll(self) -> None:
+        """Wakes up every thread waiting on the buffer, e.g. when shutting down."""
+        with self._lock:
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def _pop(self) -> bytes:
+        """Copies the oldest message out of the buffer. Must be called with the lock held."""
+        index = self._tail % self._num_slots
+        start = index * self.slot_size
+        message = bytes(self._storage[start:start + self._lengths[index]])
+        self._tail += 1
+        self._not_full.notify()
+        return message
+
+class RxReader:
+    """
+    Reads messages from an RP1210 API on a background thread and stores them in an `RxRingBuffer`.
+
+    ```
+    reader = RxReader(client.getAPI(), client.getClientID(), RxRingBuffer(overflow="drop-oldest"))
+    reader.start()
+    ...
+    msg = reader.ring.get()
+    ...
+    reader.stop()
+    ```
+
+    Args:
+    - `api` - the `RP1210API` to read from.
+    - `client_id` - clientID you got from ClientConnect.
+    - `ring` - the `RxRingBuffer` to fill. A default one is created if this is None.
+    - `blocking` - BlockOnRead argument for RP1210_ReadMessage. If you use BLOCKING_IO (1), set a
+    blocking timeout with `RP1210Client.setBlockingTimeout()` first, or `stop()` won't be able to
+    interrupt the thread until the next message arrives.
+    - `idle_sleep` - seconds to sleep when a non-blocking read comes back empty.
+
+    Error codes returned by RP1210_ReadMessage are counted in `ring.errors` and `ring.last_error`.
+    """
+    def __init__(self, api, client_id : int, ring : RxRingBuffer = None, blocking : int = 0,
+                    idle_sleep : float = 0.001) -> None:
+        self.api = api
+        self.client_id = client_id
+        self.ring = ring if ring is not None else RxRingBuffer()
+        self.blocking = blocking
+        self.idle_sleep = idle_sleep
+        self._stop_event = threading.Event()
+        self._thread = None #type: threading.Thread
+
+    def start(self) -> None:
+        """Starts the reader thread. Does nothing if it's already running."""
+        if self.isRunning():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"RxReader-{self.client_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout : float = 1.0) -> None:
+        """Stops the reader thread and waits up to `timeout` seconds for it to exit."""
+        self._stop_event.set()
+        self.ring.notifyAll()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def isRunning(self) -> bool:
+        """Returns True if the reader thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        ring = self.ring
+        read = self.api.ReadMessage
+        client_id = self.client_id
+        slot_size = ring.slot_size
+        blocking = self.blocking
+        stopped = self._stop_event.is_set
+        while not stopped():
+            index = ring.claim(timeout=0.1)
+            if index is None: # buffer is full and overflow policy is "block"
+                continue
+            size = read(client_id, ring.slot(index), slot_size, blocking)
+            if size > 0:
+                ring.commit(index, size)
+            elif size < 0:
+                ring.putError(-size)
+                time.sleep(self.idle_sleep)
+            elif not blocking:
+                time.sleep(self.idle_sleep)
+
+class RxBatch:
+    """
+    A reusable, contiguous buffer for reading many messages in one call to `RP1210API.ReadMany()`.
+
+    Message `i` is stored at `buffer[offsets[i]:offsets[i] + lengths[i]]`. Index or iterate over
+    the batch to get each message as a `memoryview` without copying it:
+    ```
+    batch = RxBatch(64)
+    while True:
+        client.rxBatch(batch=batch)
+        for msg in batch:
+            process(msg) # memoryview
+    ```
+    The views are only valid until the batch is filled again; use `bytes(msg)` or `toList()` if you
+    need to keep messages around.
+
+    Args:
+    - `max_messages` - maximum number of messages read per call.
+    - `buffer_size` - space reserved for each message in bytes (BufferSize for RP1210_ReadMessage).
+
+    Attributes:
+    - `count` - number of messages read by the last call (same as `len(batch)`).
+    - `error` - error code that ended the last read, or 0 if it ended normally.
+    """
+    def __init__(self, max_messages : int = 64, buffer_size : int = 256) -> None:
+        if max_messages < 1:
+            raise ValueError("RxBatch max_messages must be at least 1.")
+        if buffer_size < 1:
+            raise ValueError("RxBatch buffer_size must be at least 1.")
+        self.max_messages = max_messages
+        self.buffer_size = buffer_size
+        self.buffer = bytearray(max_messages * buffer_size)
+        self.offsets = array('I', range(0, max_messages * buffer_size, buffer_size))
+        self.lengths = array('H', bytes(2 * max_messages))
+        self.count = 0
+        self.error = 0
+        self.slots = [(c_char * buffer_size).from_buffer(self.buffer, offset) for offset in self.offsets]
+        """ctypes `c_char` array for each message slot, suitable for RP1210_ReadMessage."""
+        self._view = memoryview(self.buffer)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __getitem__(self, index : int) -> memoryview:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("RxBatch index out of range")
+        offset = self.offsets[index]
+        return self._view[offset:offset + self.lengths[index]]
+
+    def __iter__(self):
+        view = self._view
+        offsets = self.offsets
+        lengths = self.lengths
+        for i in range(self.count):
+            yield view[offsets[i]:offsets[i] + lengths[i]]
+
+    def toList(self) -> list[bytes]:
+        """Returns a copy of every message in the batch as a list of bytes."""
+        return [bytes(msg) for msg in self]
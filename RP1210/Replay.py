@@ -0,0 +1,241 @@
+"""
+Replays captured traffic onto a bus, in real time or faster.
+
+```
+replay = ReplayEngine(client.tx, speed=1.0)
+replay.play("field.rpl", channel=1) # blocks until it's done; or start() it on its own thread
+print(replay.sent, replay.worst_lag)
+```
+
+Messages come from a capture file (see `RP1210.Capture`), a `CaptureReader`, or any iterable of
+`J1939Message`s or (time, message) tuples. They're prepared a chunk at a time, ahead of when they're
+due: RP1210_ReadMessage output is already in RP1210_SendMessage format once the timestamp (and echo
+byte) is cut off, so each message is turned into the bytes `tx` is called with, and its send time
+goes into an array. The send loop then only waits and calls `tx`.
+
+Send times are all relative to when the replay started, so they don't drift the way sleeping
+between messages does: if one message goes out late, the next one is still sent on time.
+"""
+import threading
+import time
+from array import array
+from itertools import islice
+from pathlib import Path
+
+from RP1210.Capture import PROTOCOL_ECHO, CaptureReader
+from RP1210.J1939 import J1939Message
+from RP1210.Timestamps import TimestampConverter
+from RP1210.Timing import sleepUntil
+
+REPLAY_ASAP = 0.0
+"""`ReplayEngine` speed that sends every message as fast as `tx` can take them."""
+
+class ReplayEngine:
+    """
+    Sends captured messages with `tx` at the same pace they were captured (or `speed` times faster).
+
+    Messages are prepared `chunk_size` at a time. The next chunk is prepared while the engine is
+    waiting for a message that's due later than it took to prepare the last one, so preparing doesn't
+    hold up sending unless the bus was busy for the whole chunk.
+
+    If sending falls more than `max_lag` seconds behind (e.g. `tx` blocked for a while), the schedule
+    is moved back by however far behind it is, instead of sending everything it missed all at once.
+
+    Args:
+    - `tx` - function to send messages with, e.g. `client.tx`. Called with RP1210_SendMessage bytes.
+    If it returns a nonzero int, that's counted in `tx_errors`.
+    - `speed` - 1.0 = real time, 2.0 = twice as fast, etc. `REPLAY_ASAP` (0) = as fast as possible.
+    - `chunk_size` - number of messages to prepare at a time.
+    - `max_lag` - max seconds behind schedule before the schedule is moved. None = never.
+    - `weight` - microseconds per tick of `J1939Message.timestamp` (TimeStampWeight), for replaying
+    J1939Messages.
+    - `clock` - function that returns the current time in seconds. Defaults to `time.monotonic`.
+    - `spin` - seconds to busy-wait before each message (see `Timing.sleepUntil()`). 0 = don't.
+    - `sleep` - function called as sleep(seconds) to wait for the next message; for a fake `clock` in
+    tests (with spin=0). Defaults to waiting on an event `stop()` sets, so stopping doesn't have to
+    wait for the next message to be due.
+
+    Counters (read-only):
+    - `sent` - number of messages sent.
+    - `tx_errors` - number of times `tx` returned an error.
+    - `resyncs` - number of times the schedule was moved because of `max_lag`.
+    - `worst_lag` - the most a message was sent behind schedule, in seconds.
+    """
+    def __init__(self, tx, speed : float = 1.0, chunk_size : int = 4096, max_lag : float = 0.1,
+                    weight : float = 1.0, clock = time.monotonic, spin : float = 0.002, sleep = None) -> None:
+        if speed < 0:
+            raise ValueError("ReplayEngine speed can't be negative.")
+        if chunk_size < 1:
+            raise ValueError("ReplayEngine chunk_size must be at least 1.")
+        self.tx = tx
+        self.speed = speed
+        self.chunk_size = chunk_size
+        self.max_lag = max_lag
+        self.weight = weight
+        self.clock = clock
+        self.spin = spin
+        self.sleep = sleep
+        self.sent = 0
+        self.tx_errors = 0
+        self.resyncs = 0
+        self.worst_lag = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None #type: threading.Thread
+
+    def play(self, source, **filters) -> int:
+        """
+        Replays every message in source, and returns when they've all been sent (or `stop()` was called).
+        - source = capture file path, `CaptureReader`, or iterable of `J1939Message`s or (time, message)
+        tuples, where time is in seconds and message is RP1210_SendMessage bytes.
+        - filters = passed to `CaptureReader.records()` for capture files (e.g. channel=1, pgn=0xF004,
+        start=..., end=...).
+
+        Returns the number of messages sent.
+        """
+        self._stop_event.clear()
+        return self._play_source(source, filters)
+
+    def start(self, source, **filters) -> None:
+        """
+        Calls `play()` on a background thread. Does nothing if it's already running. If the last one
+        is still stopping (`stop()` timed out), waits for it to exit first.
+        """
+        if self.isRunning():
+            if not self._stop_event.is_set():
+                return
+            self._thread.join()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._play_source, args=(source, filters),
+                                        name="ReplayEngine", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout : float = 1.0) -> None:
+        """
+        Stops replaying, and waits up to `timeout` seconds for the background thread to exit. If it
+        hasn't (e.g. `tx` is blocked), `isRunning()` stays True until it does; it won't send anything
+        else once `tx` returns.
+        """
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        if thread is None or not thread.is_alive():
+            self._thread = None
+
+    def wait(self, timeout : float = None) -> bool:
+        """Waits for the background replay to finish. Returns True if it has."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.isRunning()
+
+    def isRunning(self) -> bool:
+        """Returns True if the background thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    ###########
+    # SOURCES #
+    ###########
+
+    def _play_source(self, source, filters : dict) -> int:
+        if isinstance(source, (str, Path)):
+            with CaptureReader(source) as capture:
+                return self._play(self._from_capture(capture, filters))
+        if isinstance(source, CaptureReader):
+            return self._play(self._from_capture(source, filters))
+        if filters:
+            raise ValueError("Filters only apply to capture files.")
+        return self._play(self._from_iterable(source))
+
+    @staticmethod
+    def _from_capture(capture : CaptureReader, filters : dict):
+        """Yields (time, message) from capture records, with the timestamp and echo bytes cut off."""
+        for record in capture.records(**filters):
+            offset = 5 if record.protocol & PROTOCOL_ECHO else 4
+            yield record.time, bytes(record.message[offset:])
+
+    def _from_iterable(self, messages):
+        """Yields (time, message) from J1939Messages or (time, message) tuples."""
+        converter = TimestampConverter(self.weight)
+        scale = converter.scale
+        for message in messages:
+            if isinstance(message, J1939Message):
+                yield converter.unwrap(message.timestamp) * scale, message.msg
+            else:
+                yield message
+
+    #############
+    # SCHEDULER #
+    #############
+
+    def _chunk(self, frames, first_time : float) -> tuple:
+        """Prepares the next chunk: (messages, send times relative to the start of the replay)."""
+        chunk = list(islice(frames, self.chunk_size))
+        if not chunk:
+            return None
+        inverse = 1.0 / self.speed if self.speed else 0.0
+        return [message for _, message in chunk], array('d', [(t - first_time) * inverse for t, _ in chunk])
+
+    def _play(self, frames) -> int:
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            return 0
+        first_time = first[0]
+        frames = _prepend(first, frames)
+        clock = self.clock
+        spin = self.spin
+        tx = self.tx
+        stopped = self._stop_event.is_set
+        timed = bool(self.speed)
+        max_lag = self.max_lag
+        sent = 0
+        start = clock()
+        chunk = self._chunk(frames, first_time)
+        prepare_time = clock() - start # how long the last chunk took to prepare
+        origin = clock()
+        next_chunk = None
+        while chunk is not None:
+            messages, dues = chunk
+            for message, due in zip(messages, dues):
+                if stopped():
+                    self.sent += sent
+                    return sent
+                if timed:
+                    deadline = origin + due
+                    lag = clock() - deadline
+                    if lag < 0:
+                        if next_chunk is None and -lag > prepare_time + spin:
+                            start = clock()
+                            next_chunk = self._chunk(frames, first_time) or ()
+                            prepare_time = clock() - start
+                        self._wait_until(deadline)
+                        if stopped(): # while waiting
+                            self.sent += sent
+                            return sent
+                    else:
+                        if lag > self.worst_lag:
+                            self.worst_lag = lag
+                        if max_lag is not None and lag > max_lag:
+                            origin += lag
+                            self.resyncs += 1
+                if tx(message):
+                    self.tx_errors += 1
+                sent += 1
+            if next_chunk is None:
+                start = clock()
+                chunk = self._chunk(frames, first_time)
+                prepare_time = clock() - start
+            else:
+                chunk = next_chunk or None
+                next_chunk = None
+        self.sent += sent
+        return sent
+
+    def _wait_until(self, deadline : float) -> None:
+        """Waits until `clock()` >= deadline, or until `stop()` is called."""
+        stop_event = self._stop_event
+        sleepUntil(deadline, self.clock, self.spin, self.sleep or stop_event.wait, stop_event.is_set)
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
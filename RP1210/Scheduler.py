@@ -0,0 +1,351 @@
+"""
+Sends cyclic (periodic) messages, e.g. the PGNs an ECU broadcasts every 10 ms, 100 ms or 1 s.
+
+```
+scheduler = CyclicScheduler(client.tx)
+scheduler.addJ1939(0xF004, eec1_data, 0.01, sa=0x00) # EEC1 every 10 ms
+scheduler.addJ1939(0xFEF1, ccvs_data, 0.1, sa=0x00)
+scheduler.start()
+...
+scheduler.update((0xF004, 0x00, 0xFF), new_eec1_data) # goes out next time it's due
+print(scheduler[(0xF004, 0x00, 0xFF)].jitter_max)
+```
+
+Every message is sent from one thread. Messages are kept in a heap ordered by when they're next
+due, and are encoded once when they're added (or updated), so sending one is a heap pop and a call
+to `tx`. Each one is due a whole number of periods after it was added, so late sends don't push the
+messages after them back.
+
+Messages can also be sent by the adapter itself with RP1210_Set_Broadcast_For_XXX, if it supports
+that (pass `broadcast=client.command` and `hardware=True`).
+"""
+import heapq
+import threading
+import time
+
+from RP1210.Broadcast import BROADCAST_FOR_CAN, BROADCAST_FOR_J1939, BroadcastListManager
+from RP1210.J1939 import J1939_HEADER_SIZE, toJ1939Message
+from RP1210.Timing import sleepUntil
+
+class CyclicMessage:
+    """
+    One message sent by `CyclicScheduler`.
+
+    Attributes:
+    - `key` - the key it was added with.
+    - `period` - seconds between sends.
+    - `message` - what's sent (RP1210_SendMessage bytes).
+    - `header` - bytes that `CyclicScheduler.update()` puts in front of new data (the J1939 header
+    for messages from `addJ1939()`; empty otherwise).
+    - `hardware` - True if the adapter is sending it (see `CyclicScheduler`).
+    - `due` - when it's next due, in `CyclicScheduler.clock` seconds.
+
+    Counters (read-only):
+    - `sent` - number of times it was sent.
+    - `tx_errors` - number of times `tx` returned an error.
+    - `missed` - number of periods skipped because sending fell more than a whole period behind.
+    - `jitter_max` - the latest it was sent after it was due, in seconds (measured when `tx` is called).
+    - `jitter_mean` - how late it was sent on average, in seconds.
+    - `jitter_stdev` - standard deviation of how late it was sent, in seconds.
+    """
+    __slots__ = ('key', 'period', 'message', 'header', 'hardware', 'due', 'sent', 'tx_errors', 'missed',
+                 'jitter_max', 'jitter_mean', '_jitter_m2', '_token')
+
+    def __init__(self, key, message : bytes, period : float, header : bytes = b'', hardware : bool = False) -> None:
+        self.key = key
+        self.period = period
+        self.message = message
+        self.header = header
+        self.hardware = hardware
+        self.due = 0.0
+        self._token = 0 # bumped whenever due changes, to skip stale scheduler entries
+        self.resetStats()
+
+    @property
+    def jitter_stdev(self) -> float:
+        if self.sent < 2:
+            return 0.0
+        return (self._jitter_m2 / (self.sent - 1)) ** 0.5
+
+    def resetStats(self) -> None:
+        """Resets the counters and jitter stats."""
+        self.sent = 0
+        self.tx_errors = 0
+        self.missed = 0
+        self.jitter_max = 0.0
+        self.jitter_mean = 0.0
+        self._jitter_m2 = 0.0
+
+    def _record(self, lateness : float) -> None:
+        """Adds one send to the jitter stats (Welford's algorithm, so nothing is stored per send)."""
+        self.sent += 1
+        delta = lateness - self.jitter_mean
+        self.jitter_mean += delta / self.sent
+        self._jitter_m2 += delta * (lateness - self.jitter_mean)
+        if lateness > self.jitter_max:
+            self.jitter_max = lateness
+
+    def __repr__(self) -> str:
+        where = "hardware" if self.hardware else f"sent {self.sent}"
+        return f"CyclicMessage({self.key!r}, every {self.period * 1000:g} ms, {where})"
+
+class CyclicScheduler:
+    """
+    Sends any number of cyclic messages from one thread (see module docstring).
+
+    Call `start()` to send them from a background thread, or call `poll()` yourself; it sends every
+    message that's due and returns how long until the next one. Messages can be added, removed and
+    updated from any thread while it runs; `tx` is called without holding the scheduler's lock, so
+    those don't wait for a slow adapter. `update()` swaps a message's bytes in one assignment, so
+    it never goes out half-updated and its schedule doesn't change.
+
+    Hardware offload: with `broadcast` (e.g. `client.command`), messages added with `hardware=True`
+    are put in the adapter's broadcast list instead, and the adapter sends them itself. The list is
+    kept by a `BroadcastListManager` (`broadcast_list`), so adding, removing or updating one only
+    sends the commands for that message. If the adapter rejects a command, the hardware messages are
+    sent by the scheduler instead.
+
+    Args:
+    - `tx` - function to send messages with, e.g. `client.tx`. If it returns a nonzero int, that's
+    counted in the message's `tx_errors`.
+    - `broadcast` - function to send commands with, called as broadcast(command_number, client_command,
+    size), e.g. `client.command`. None = no hardware offload.
+    - `broadcast_command` - `BROADCAST_FOR_J1939` or `BROADCAST_FOR_CAN`, depending on the protocol
+    the client is connected with.
+    - `clock` - function that returns the current time in seconds. Defaults to `time.monotonic`.
+    - `spin` - seconds to busy-wait before each message is due (see `sleepUntil()`).
+
+    Counters (read-only):
+    - `broadcast_errors` - number of times the adapter rejected the broadcast list.
+    """
+    def __init__(self, tx, broadcast = None, broadcast_command : int = BROADCAST_FOR_J1939,
+                 clock = time.monotonic, spin : float = 0.002) -> None:
+        self.tx = tx
+        self.broadcast = broadcast
+        self.broadcast_command = broadcast_command
+        self.clock = clock
+        self.spin = spin
+        self.broadcast_errors = 0
+        self.broadcast_list = None if broadcast is None else BroadcastListManager(broadcast, broadcast_command)
+        """Mirror of the adapter's broadcast list, or None."""
+        self.messages = {} #type: dict[object, CyclicMessage]
+        """Every message, by key."""
+        self._schedule = [] # heap of (due, counter, message, token)
+        self._counter = 0
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None #type: threading.Thread
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __contains__(self, key) -> bool:
+        return key in self.messages
+
+    def __getitem__(self, key) -> CyclicMessage:
+        return self.messages[key]
+
+    def add(self, key, message, period : float, offset : float = 0.0, hardware : bool = False) -> CyclicMessage:
+        """
+        Adds a message to send every period seconds. Replaces the message with the same key, if
+        there is one.
+        - key = any hashable value to refer to the message by, for `update()` and `remove()`
+        - message = RP1210_SendMessage bytes (e.g. from `toJ1939Message()`)
+        - offset = seconds from now until it's first sent. Spread out messages with the same
+        period with this so they don't all go out at once.
+        - hardware = have the adapter send it (needs `broadcast`).
+
+        Returns the new `CyclicMessage`.
+        """
+        return self._add(CyclicMessage(key, bytes(message), period, hardware=hardware), offset)
+
+    def addJ1939(self, pgn : int, data, period : float, sa : int, da : int = 0xFF, pri : int = 6, how : int = 0,
+                 offset : float = 0.0, hardware : bool = False, key = None) -> CyclicMessage:
+        """
+        Adds a J1939 message to send every period seconds. Its key is (pgn, sa, da) unless you give
+        it one. `update()` takes just the data for these.
+        """
+        message = toJ1939Message(pgn, pri, sa, da, data, how=how)
+        if key is None:
+            key = (pgn, sa, da)
+        return self._add(CyclicMessage(key, message, period, message[:J1939_HEADER_SIZE], hardware), offset)
+
+    def update(self, key, data) -> None:
+        """
+        Changes what a message sends, starting the next time it's due.
+        - data = new message data for messages from `addJ1939()`; the whole message otherwise.
+
+        Raises KeyError if there's no message with that key.
+        """
+        entry = self.messages[key]
+        entry.message = entry.header + bytes(data)
+        if entry.hardware:
+            self._sync_broadcast()
+
+    def setPeriod(self, key, period : float) -> None:
+        """Changes how often a message is sent. It's next sent one new period after it was last due."""
+        if period <= 0:
+            raise ValueError("CyclicScheduler period must be more than 0.")
+        with self._lock:
+            entry = self.messages[key]
+            last_due = entry.due - entry.period if entry.sent else None
+            entry.period = period
+            if entry.hardware:
+                self._sync_broadcast()
+            elif last_due is not None:
+                self._reschedule(entry, last_due + period)
+
+    def remove(self, key) -> None:
+        """Stops sending a message. Does nothing if there's no message with that key."""
+        with self._lock:
+            entry = self.messages.pop(key, None)
+            if entry is None:
+                return
+            entry._token += 1
+            if entry.hardware:
+                self._sync_broadcast()
+
+    def clear(self) -> None:
+        """Stops sending every message."""
+        with self._lock:
+            hardware = any(entry.hardware for entry in self.messages.values())
+            self.messages.clear()
+            self._schedule.clear()
+            if hardware:
+                self._sync_broadcast()
+
+    def poll(self, now : float = None) -> float:
+        """
+        Sends every message that's due.
+        - now = current time from `clock`. Defaults to `clock()`.
+
+        Returns the number of seconds until the next message is due (0 if it's due now), or None if
+        there's nothing to send.
+        """
+        if now is None:
+            now = self.clock()
+        tx = self.tx
+        clock = self.clock
+        lock = self._lock
+        schedule = self._schedule
+        while True:
+            with lock:
+                if not schedule or schedule[0][0] > now:
+                    break
+                due, _, entry, token = heapq.heappop(schedule)
+                if token != entry._token:
+                    continue # stale entry; removed or rescheduled
+                entry.due = due + entry.period # so setPeriod() during tx counts from this send
+            # tx is called without the lock, so add(), update() and remove() don't wait for the adapter
+            entry._record(clock() - due)
+            if tx(entry.message):
+                entry.tx_errors += 1
+            now = clock()
+            with lock:
+                if token != entry._token or self.messages.get(entry.key) is not entry:
+                    continue # removed or rescheduled while it was being sent
+                due += entry.period
+                if due <= now: # fell a whole period behind; skip the ones it missed
+                    skipped = int((now - due) // entry.period) + 1
+                    entry.missed += skipped
+                    due += skipped * entry.period
+                self._reschedule(entry, due, wake=False)
+        with lock:
+            while schedule and schedule[0][3] != schedule[0][2]._token:
+                heapq.heappop(schedule)
+            if not schedule:
+                return None
+            return max(schedule[0][0] - now, 0.0)
+
+    ##########
+    # THREAD #
+    ##########
+
+    def start(self) -> None:
+        """
+        Starts sending from a background thread. Does nothing if it's already running. If the last
+        one is still stopping (`stop()` timed out), waits for it to exit first.
+        """
+        if self.isRunning():
+            if not self._stop_event.is_set():
+                return
+            self._thread.join()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="CyclicScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout : float = 1.0) -> None:
+        """
+        Stops the background thread, and waits up to `timeout` seconds for it to exit. If it hasn't
+        (e.g. `tx` is blocked), `isRunning()` stays True until it does. Hardware messages keep going
+        until they're removed.
+        """
+        self._stop_event.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        if thread is None or not thread.is_alive():
+            self._thread = None
+
+    def isRunning(self) -> bool:
+        """Returns True if the background thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        clock = self.clock
+        spin = self.spin
+        while not self._stop_event.is_set():
+            wait = self.poll()
+            if wait is None or wait > spin:
+                # sleep until it's almost due, or until a message is added or rescheduled
+                self._wakeup.wait(None if wait is None else wait - spin)
+                self._wakeup.clear()
+            else:
+                sleepUntil(clock() + wait, clock, spin)
+
+    ###########
+    # HELPERS #
+    ###########
+
+    def _add(self, entry : CyclicMessage, offset : float) -> CyclicMessage:
+        if entry.period <= 0:
+            raise ValueError("CyclicScheduler period must be more than 0.")
+        if entry.hardware and self.broadcast is None:
+            raise ValueError("CyclicScheduler needs a broadcast function to send messages from the adapter.")
+        with self._lock:
+            old = self.messages.pop(entry.key, None)
+            if old is not None:
+                old._token += 1
+            self.messages[entry.key] = entry
+            if entry.hardware or (old is not None and old.hardware):
+                self._sync_broadcast()
+            if not entry.hardware:
+                self._reschedule(entry, self.clock() + offset)
+        return entry
+
+    def _reschedule(self, entry : CyclicMessage, due : float, wake : bool = True) -> None:
+        entry.due = due
+        entry._token += 1
+        self._counter += 1
+        heapq.heappush(self._schedule, (due, self._counter, entry, entry._token))
+        if wake and self._schedule[0][2] is entry:
+            self._wakeup.set() # it's due sooner than whatever the thread is waiting for
+
+    def _sync_broadcast(self) -> None:
+        """Makes the adapter's broadcast list match the hardware messages."""
+        with self._lock:
+            broadcast_list = self.broadcast_list
+            entries = [entry for entry in self.messages.values() if entry.hardware]
+            broadcast_list.clear()
+            for entry in entries:
+                broadcast_list.add(entry.key, entry.message, entry.period)
+            if broadcast_list.apply():
+                # not supported (or the list is full); send them from here instead
+                self.broadcast_errors += 1
+                for entry in entries:
+                    entry.hardware = False
+                    self._reschedule(entry, self.clock())
+                broadcast_list.clear()
+                broadcast_list.apply()
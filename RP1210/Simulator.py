@@ -0,0 +1,533 @@
+"""
+A simulated RP1210 adapter, so code that uses this package can be tested and benchmarked without a
+real adapter, drivers, or Windows.
+
+`SimulatedDLL` stands in for the CDLL you'd get from `cdll.LoadLibrary()`, so it goes wherever a DLL
+would go (`RP1210API.setDLL()`). Its clients are connected to a `VirtualBus`: messages sent by one
+client are received by every other client connected with the same protocol, on any SimulatedDLL
+sharing the bus.
+```
+bus = VirtualBus(latency=0.0005)
+bus.addTraffic([toJ1939Message(0xF004, 3, 0x00, 0xFF, eec1_data)], rate=1000) # 1000 messages/s
+client = simulatedClient(SimulatedDLL(bus))
+client.connect(b"J1939:Baud=Auto")
+print(J1939Message(client.rx()))
+```
+Or use one in place of a real adapter's DLL: `client.getAPI().setDLL(SimulatedDLL(bus))`.
+
+Supported: RP1210_ClientConnect, ClientDisconnect, SendMessage, ReadMessage (blocking and
+non-blocking), SendCommand (filters, echo, message receive, broadcast lists, blocking timeout,
+flush, connection speed; everything else is accepted and ignored), ReadVersion,
+ReadDetailedVersion, GetErrorMsg, GetHardwareStatus, GetLastErrorMsg and Ioctl.
+
+Received messages are in RP1210_ReadMessage format: a 4-byte timestamp, an echo byte if echo is
+on, then the message as it was sent. Traffic from `addTraffic()` and adapter broadcast lists is
+generated when a client reads, with the timestamps it would have had, so there's no thread to keep
+up and nothing depends on how fast the computer is.
+"""
+import ctypes
+import threading
+import time
+from collections import deque
+
+from RP1210.RP1210 import RP1210_ERRORS, RP1210Client, RP1210Config
+
+SIMULATOR_API_NAME = "RP1210SIM"
+"""API name of `SimulatedConfig`."""
+
+SIMULATOR_INI = """
+[VendorInformation]
+Name=Simulated RP1210 Adapter
+TimeStampWeight=1000
+Version=1.0
+RP1210=C
+AutoDetectCapable=no
+Devices=1
+Protocols=1,2
+J1939Addresses=16
+NumberOfRTSCTSSessions=16
+CANFormatsSupported=4,5
+J1939FormatsSupported=1,2
+
+[ProtocolInformation1]
+ProtocolDescription=SAE J1939 Protocol
+ProtocolSpeed=250,500,1000,Auto
+ProtocolString=J1939
+ProtocolParams=N/A
+Devices=1
+
+[ProtocolInformation2]
+ProtocolDescription=CAN Network Protocol
+ProtocolSpeed=125,250,500,1000,Auto
+ProtocolString=CAN
+ProtocolParams=N/A
+Devices=1
+
+[DeviceInformation1]
+DeviceID=1
+DeviceDescription=Simulated adapter
+DeviceName=Simulated adapter
+DeviceParams=N/A
+"""
+"""Vendor .ini contents of `SimulatedConfig`."""
+
+# error codes
+_INVALID_CLIENT_ID = 129
+_CLIENT_AREA_FULL = 131
+_TX_QUEUE_FULL = 137
+_MESSAGE_TOO_LONG = 141
+_INVALID_COMMAND = 144
+_BLOCK_NOT_ALLOWED = 155
+_CODE_NOT_FOUND = 154
+_INVALID_IOCTL_ID = 600
+
+# commands
+_SET_ALL_FILTERS_TO_PASS = 3
+_J1939_FILTERS = 4
+_CAN_FILTERS = 5
+_ECHO = 16
+_SET_ALL_FILTERS_TO_DISCARD = 17
+_MESSAGE_RECEIVE = 18
+_BROADCAST_COMMANDS = (20, 21, 22, 23, 33, 41, 42)
+_FLUSH_BUFFERS = 39
+_CONNECTION_SPEED = 45
+_BLOCKING_TIMEOUT = 215
+
+class _DLLFunction:
+    """A DLL function; `RP1210API` sets argtypes on these, which plain bound methods don't allow."""
+    __slots__ = ('function', 'argtypes', 'restype')
+
+    def __init__(self, function) -> None:
+        self.function = function
+        self.argtypes = None
+        self.restype = None
+
+    def __call__(self, *args):
+        return self.function(*args)
+
+def _read_arg(data, size : int) -> bytes:
+    """bytes, a ctypes buffer or a (c_char * n).from_buffer() -> bytes"""
+    if isinstance(data, bytes):
+        return data[:size] if size else data
+    view = memoryview(data).cast('B')
+    return bytes(view[:size] if size else view)
+
+def _write_arg(buffer, data : bytes) -> None:
+    """Writes into a ctypes buffer. Does nothing if buffer is read-only (e.g. bytes)."""
+    if isinstance(buffer, ctypes.Array):
+        ctypes.memmove(buffer, data, min(len(data), ctypes.sizeof(buffer)))
+
+class _Generator:
+    """Messages sent over and over at a fixed rate, generated when someone reads."""
+    __slots__ = ('messages', 'period', 'start', 'sent', 'next_due', 'remaining', 'index', 'sender')
+
+    def __init__(self, messages : list, period : float, start : float, count : int, sender) -> None:
+        self.messages = messages
+        self.period = period
+        self.start = start
+        self.sent = 0
+        self.next_due = start
+        self.remaining = count
+        self.index = 0
+        self.sender = sender
+
+class _SimulatedClient:
+    """The state of one connected client."""
+    __slots__ = ('client_id', 'dll', 'protocol', 'queue', 'in_flight', 'echo', 'receive', 'filter_mode', 'filters',
+                 'broadcasts', 'block_timeout', 'sent', 'received', 'overflows', 'last_error')
+
+    def __init__(self, client_id : int, dll, protocol : str) -> None:
+        self.client_id = client_id
+        self.dll = dll
+        self.protocol = protocol
+        self.queue = deque() #type: deque[tuple[float, bytes, bool]] # (deliver at, message, echoed)
+        self.in_flight = deque() #type: deque[float] # delivery times of messages we sent
+        self.echo = False
+        self.receive = True
+        self.filter_mode = True # True = pass everything, False = discard everything, None = use filters
+        self.filters = [] #type: list[tuple]
+        self.broadcasts = {} #type: dict[int, list[_Generator]] # command number: broadcast list
+        self.block_timeout = None #type: float
+        self.sent = 0
+        self.received = 0
+        self.overflows = 0
+        self.last_error = 0
+
+    def accepts(self, message : bytes) -> bool:
+        if not self.receive:
+            return False
+        if self.filter_mode is not None:
+            return self.filter_mode
+        for kind, *args in self.filters:
+            if kind == _J1939_FILTERS and len(message) >= 6:
+                flags, pgn, sa, da = args
+                if flags & 1 and int.from_bytes(message[0:3], 'little') != pgn:
+                    continue
+                if flags & 4 and message[4] != sa:
+                    continue
+                if flags & 8 and message[5] != da:
+                    continue
+                return True
+            if kind == _CAN_FILTERS and len(message) >= 3:
+                can_type, mask, header = args
+                if can_type != message[0]:
+                    continue
+                arbitration_id = int.from_bytes(message[1:5] if message[0] else message[1:3], 'big')
+                if arbitration_id & mask == header & mask:
+                    return True
+        return False
+
+class VirtualBus:
+    """
+    What simulated clients are connected to.
+
+    Args:
+    - `latency` - seconds from when a message is sent (or generated) until it can be read.
+    - `rx_queue_size` - max messages each client holds before the newest are dropped.
+    - `tx_queue_size` - max messages a client can have on their way (sent, but not delivered yet
+    because of `latency`) before SendMessage returns ERR_TX_QUEUE_FULL.
+    - `timestamp_weight` - microseconds per timestamp tick (TimeStampWeight). Defaults to 1000,
+    like `SimulatedConfig`.
+    - `clock` - function that returns the current time in seconds. Defaults to `time.monotonic`.
+
+    Counters (read-only):
+    - `messages` - number of messages put on the bus.
+    - `dropped` - number of messages dropped because a client's queue was full.
+    """
+    def __init__(self, latency : float = 0.0, rx_queue_size : int = 8192, tx_queue_size : int = 256,
+                 timestamp_weight : float = 1000.0, clock = time.monotonic) -> None:
+        if rx_queue_size < 1 or tx_queue_size < 1:
+            raise ValueError("VirtualBus queue sizes must be at least 1.")
+        self.latency = latency
+        self.rx_queue_size = rx_queue_size
+        self.tx_queue_size = tx_queue_size
+        self.timestamp_weight = timestamp_weight
+        self.clock = clock
+        self.messages = 0
+        self.dropped = 0
+        self.clients = [] #type: list[_SimulatedClient]
+        self._generators = [] #type: list[_Generator]
+        self._ticks_per_second = 1e6 / timestamp_weight
+        self._condition = threading.Condition(threading.RLock())
+
+    def inject(self, message, protocol : str = "J1939") -> None:
+        """
+        Puts a message on the bus from some other node; every client connected with protocol gets it.
+        - message = in RP1210_SendMessage format, e.g. from `toJ1939Message()`
+        """
+        with self._condition:
+            self._deliver(None, protocol, bytes(message), self.clock())
+
+    def addTraffic(self, messages, rate : float, protocol : str = "J1939", count : int = None, start : float = None) -> None:
+        """
+        Generates traffic from other nodes: sends `messages` one after the other, over and over, at
+        `rate` messages per second.
+        - count = total number of messages to send. None = forever.
+        - start = `clock` time of the first one. Defaults to now.
+        """
+        if rate <= 0:
+            raise ValueError("VirtualBus traffic rate must be more than 0.")
+        messages = [bytes(message) for message in messages]
+        if not messages:
+            raise ValueError("VirtualBus traffic needs at least one message.")
+        with self._condition:
+            self._generators.append(_Generator(messages, 1.0 / rate, self.clock() if start is None else start,
+                                               count, protocol))
+            self._condition.notify_all()
+
+    def clearTraffic(self) -> None:
+        """Stops all traffic from `addTraffic()`."""
+        with self._condition:
+            self._generators.clear()
+
+    def timestamp(self, t : float) -> bytes:
+        """Returns the 4-byte RP1210 timestamp for clock time t."""
+        return (int(t * self._ticks_per_second) & 0xFFFFFFFF).to_bytes(4, 'big')
+
+    # everything below is called with self._condition held
+
+    def _deliver(self, sender : _SimulatedClient, protocol : str, message : bytes, t : float) -> None:
+        deliver_at = t + self.latency
+        self.messages += 1
+        for client in self.clients:
+            if client.protocol != protocol:
+                continue
+            echoed = client is sender
+            if (echoed and not client.echo) or not client.accepts(message):
+                continue
+            if len(client.queue) >= self.rx_queue_size:
+                client.overflows += 1
+                self.dropped += 1
+                continue
+            client.queue.append((deliver_at, message, echoed))
+        self._condition.notify_all()
+
+    def _generate(self, now : float) -> None:
+        """Sends every generated message that's due by now, in time order."""
+        sources = list(self._generators)
+        for client in self.clients:
+            for entries in client.broadcasts.values():
+                sources.extend(entries)
+        due = [source for source in sources if source.next_due <= now]
+        while due:
+            source = min(due, key=lambda source: source.next_due)
+            if isinstance(source.sender, _SimulatedClient):
+                self._deliver(source.sender, source.sender.protocol, source.messages[0], source.next_due)
+            else:
+                self._deliver(None, source.sender, source.messages[source.index], source.next_due)
+                source.index = (source.index + 1) % len(source.messages)
+                if source.remaining is not None:
+                    source.remaining -= 1
+                    if source.remaining <= 0:
+                        self._generators.remove(source)
+                        due.remove(source)
+                        continue
+            source.sent += 1
+            source.next_due = source.start + source.sent * source.period # doesn't add up rounding errors
+            if source.next_due > now:
+                due.remove(source)
+
+    def _next_event(self) -> float:
+        """Returns the clock time something will next be generated, or None."""
+        times = [source.next_due for source in self._generators]
+        for client in self.clients:
+            for entries in client.broadcasts.values():
+                times.extend(entry.next_due for entry in entries)
+        return min(times, default=None)
+
+class SimulatedDLL:
+    """
+    A stand-in for an RP1210 adapter's DLL (see module docstring). Give it to `RP1210API.setDLL()`,
+    or use `simulatedClient()`.
+
+    Args:
+    - `bus` - the `VirtualBus` its clients are connected to. Defaults to a new one.
+    - `max_clients` - max clients connected at once.
+    - `dll_version`, `api_version`, `firmware_version` - what the version functions report.
+    """
+    def __init__(self, bus : VirtualBus = None, max_clients : int = 16, dll_version : str = "1.0",
+                 api_version : str = "3.0", firmware_version : str = "1.0") -> None:
+        self.bus = VirtualBus() if bus is None else bus
+        self.max_clients = max_clients
+        self.dll_version = dll_version
+        self.api_version = api_version
+        self.firmware_version = firmware_version
+        self.clients = {} #type: dict[int, _SimulatedClient]
+        """Connected clients, by ClientID."""
+        for name in ("ClientConnect", "ClientDisconnect", "SendMessage", "ReadMessage", "SendCommand",
+                     "ReadVersion", "ReadDetailedVersion", "GetErrorMsg", "GetHardwareStatus",
+                     "GetLastErrorMsg", "Ioctl"):
+            setattr(self, "RP1210_" + name, _DLLFunction(getattr(self, "_" + name)))
+
+    def _client(self, client_id : int) -> _SimulatedClient:
+        return self.clients.get(client_id)
+
+    def _ClientConnect(self, hwnd, device_id, protocol, tx_buffer_size, rx_buffer_size, packetizing) -> int:
+        protocol = _read_arg(protocol, 0).split(b'\x00')[0].decode('utf8', 'replace')
+        protocol = protocol.split(':')[0].strip() or "J1939"
+        with self.bus._condition:
+            if len(self.clients) >= self.max_clients:
+                return _CLIENT_AREA_FULL
+            client_id = min(set(range(self.max_clients)) - set(self.clients))
+            client = _SimulatedClient(client_id, self, protocol)
+            self.clients[client_id] = client
+            self.bus.clients.append(client)
+        return client_id
+
+    def _ClientDisconnect(self, client_id) -> int:
+        with self.bus._condition:
+            client = self.clients.pop(client_id, None)
+            if client is None:
+                return _INVALID_CLIENT_ID
+            self.bus.clients.remove(client)
+            self.bus._condition.notify_all()
+        return 0
+
+    def _SendMessage(self, client_id, message, size, notify = 0, block = 0) -> int:
+        bus = self.bus
+        with bus._condition:
+            client = self._client(client_id)
+            if client is None:
+                return _INVALID_CLIENT_ID
+            now = bus.clock()
+            in_flight = client.in_flight
+            while in_flight and in_flight[0] <= now:
+                in_flight.popleft()
+            if len(in_flight) >= bus.tx_queue_size:
+                client.last_error = _TX_QUEUE_FULL
+                return _TX_QUEUE_FULL
+            bus._generate(now)
+            if bus.latency:
+                in_flight.append(now + bus.latency)
+            client.sent += 1
+            bus._deliver(client, client.protocol, _read_arg(message, size), now)
+        return 0
+
+    def _ReadMessage(self, client_id, buffer, size, block = 0) -> int:
+        bus = self.bus
+        with bus._condition:
+            client = self._client(client_id)
+            if client is None:
+                return -_INVALID_CLIENT_ID
+            end = None
+            while True:
+                now = bus.clock()
+                bus._generate(now)
+                queue = client.queue
+                if queue and queue[0][0] <= now:
+                    break
+                if not block or self._client(client_id) is None:
+                    return 0
+                if end is None and client.block_timeout is not None:
+                    end = now + client.block_timeout
+                if end is not None and now >= end:
+                    return 0
+                # wait for a message to be sent, delivered, or generated
+                wakeups = [t for t in (queue[0][0] if queue else None, bus._next_event(), end) if t is not None]
+                bus._condition.wait(max(min(wakeups) - now, 0.0) if wakeups else None)
+            deliver_at, message, echoed = queue[0]
+            header = bus.timestamp(deliver_at - bus.latency)
+            if client.echo:
+                header += b'\x01' if echoed else b'\x00'
+            data = header + message
+            if len(data) > size:
+                client.last_error = _MESSAGE_TOO_LONG
+                return -_MESSAGE_TOO_LONG
+            queue.popleft()
+            client.received += 1
+        ctypes.memmove(buffer, data, len(data))
+        return len(data)
+
+    def _SendCommand(self, command, client_id, client_command, size) -> int:
+        with self.bus._condition:
+            client = self._client(client_id)
+            if client is None:
+                return _INVALID_CLIENT_ID
+            data = _read_arg(client_command, size) if client_command else b''
+            if command == _SET_ALL_FILTERS_TO_PASS:
+                client.filter_mode = True
+                client.filters.clear()
+            elif command == _SET_ALL_FILTERS_TO_DISCARD:
+                client.filter_mode = False
+                client.filters.clear()
+            elif command == _J1939_FILTERS:
+                if len(data) < 7:
+                    return _INVALID_COMMAND
+                client.filter_mode = None
+                client.filters.append((command, data[0], int.from_bytes(data[1:4], 'little'), data[5], data[6]))
+            elif command == _CAN_FILTERS:
+                if len(data) < 9:
+                    return _INVALID_COMMAND
+                client.filter_mode = None
+                client.filters.append((command, data[0], int.from_bytes(data[1:5], 'big'), int.from_bytes(data[5:9], 'big')))
+            elif command == _ECHO:
+                client.echo = bool(data and data[0])
+            elif command == _MESSAGE_RECEIVE:
+                client.receive = bool(data and data[0])
+            elif command == _FLUSH_BUFFERS:
+                client.queue.clear()
+            elif command == _BLOCKING_TIMEOUT:
+                timeout = data[0] * data[1] if len(data) >= 2 else 0
+                client.block_timeout = timeout / 1000 if timeout else None
+            elif command == _CONNECTION_SPEED:
+                _write_arg(client_command, b'250000\x00')
+            elif command in _BROADCAST_COMMANDS:
+                return self._broadcast(client, command, data, client_command)
+        return 0
+
+    def _broadcast(self, client : _SimulatedClient, command : int, data : bytes, client_command) -> int:
+        """RP1210_Set_Broadcast_For_XXX; see `Commands.setBroadcastList()`."""
+        if not data:
+            return _INVALID_COMMAND
+        entries = client.broadcasts.setdefault(command, [])
+        function = data[0]
+        now = self.bus.clock()
+        if function == 1: # ADD_LIST
+            i = 1
+            while i + 6 <= len(data):
+                length = int.from_bytes(data[i:i + 2], 'little')
+                interval = int.from_bytes(data[i + 2:i + 6], 'little')
+                if not interval or i + 6 + length > len(data):
+                    return _INVALID_COMMAND
+                entries.append(_Generator([data[i + 6:i + 6 + length]], interval / 1000, now, None, client))
+                i += 6 + length
+            self.bus._condition.notify_all()
+        elif function == 2: # VIEW_B_LIST
+            if len(data) < 2 or data[1] >= len(entries):
+                return _INVALID_COMMAND
+            entry = entries[data[1]]
+            _write_arg(client_command, data[:2] + len(entry.messages[0]).to_bytes(2, 'little')
+                       + round(entry.period * 1000).to_bytes(4, 'little') + entry.messages[0])
+        elif function == 3: # DESTROY_LIST
+            entries.clear()
+        elif function == 4: # REMOVE_ENTRY
+            if len(data) < 2 or data[1] >= len(entries):
+                return _INVALID_COMMAND
+            del entries[data[1]]
+        elif function == 5: # LIST_LENGTH
+            _write_arg(client_command, bytes((function, len(entries))))
+        else:
+            return _INVALID_COMMAND
+        return 0
+
+    def _ReadVersion(self, dll_major, dll_minor, api_major, api_minor) -> int:
+        for buffer, version, part in ((dll_major, self.dll_version, 0), (dll_minor, self.dll_version, 1),
+                                      (api_major, self.api_version, 0), (api_minor, self.api_version, 1)):
+            _write_arg(buffer, (version.split('.') + ['0'])[part].encode() + b'\x00')
+        return 0
+
+    def _ReadDetailedVersion(self, client_id, api_version, dll_version, firmware_version) -> int:
+        if self._client(client_id) is None:
+            return _INVALID_CLIENT_ID
+        _write_arg(api_version, self.api_version.encode() + b'\x00')
+        _write_arg(dll_version, self.dll_version.encode() + b'\x00')
+        _write_arg(firmware_version, self.firmware_version.encode() + b'\x00')
+        return 0
+
+    def _GetErrorMsg(self, error_code, buffer) -> int:
+        if error_code not in RP1210_ERRORS:
+            return _CODE_NOT_FOUND
+        _write_arg(buffer, RP1210_ERRORS[error_code].encode() + b'\x00')
+        return 0
+
+    def _GetHardwareStatus(self, client_id, buffer, size, block = 0) -> int:
+        if self._client(client_id) is None:
+            return _INVALID_CLIENT_ID
+        if block:
+            return _BLOCK_NOT_ALLOWED
+        status = bytearray(max(size, 0))
+        if status:
+            status[0] = 0x03 # device located and adapter active
+        if len(status) > 1:
+            status[1] = len(self.clients)
+        _write_arg(buffer, bytes(status))
+        return 0
+
+    def _GetLastErrorMsg(self, error_code, sub_error_code, buffer, size) -> int:
+        return self._GetErrorMsg(error_code, buffer)
+
+    def _Ioctl(self, client_id, ioctl_id, input_buffer, output_buffer) -> int:
+        return _INVALID_IOCTL_ID
+
+class SimulatedConfig(RP1210Config):
+    """
+    An `RP1210Config` for a `SimulatedDLL`, with its vendor information from `SIMULATOR_INI`
+    instead of an .ini file. Add it to an `RP1210Client` with `setVendor()`.
+    - dll = the SimulatedDLL to use. Defaults to a new one on its own bus.
+    """
+    def __init__(self, dll : SimulatedDLL = None, api_name : str = SIMULATOR_API_NAME) -> None:
+        self.dll = SimulatedDLL() if dll is None else dll
+        super().__init__(api_name)
+        self.api.setDLL(self.dll)
+
+    def populate(self):
+        self.read_string(SIMULATOR_INI)
+
+def simulatedClient(dll : SimulatedDLL = None) -> RP1210Client:
+    """
+    Returns an `RP1210Client` using a `SimulatedConfig`, ready to `connect()`.
+    - dll = the SimulatedDLL to use. Defaults to a new one on its own bus.
+    """
+    client = RP1210Client()
+    client.setVendor(SimulatedConfig(dll))
+    return client
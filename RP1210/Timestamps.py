@@ -0,0 +1,208 @@
+"""
+Converts adapter timestamps to host time.
+
+The timestamp at the start of every RP1210_ReadMessage output is a 32-bit tick counter. How long a
+tick is depends on the adapter (TimeStampWeight in the vendor .ini file, in microseconds), it wraps
+around every so often (a bit over an hour for 1 us ticks), and it has nothing to do with the
+computer's clock. `TimestampConverter` fixes all three:
+```
+timestamps = TimestampConverter.fromClient(client)
+msg = J1939Message(client.rx())
+host_time = timestamps.update(msg.timestamp) # time.monotonic() time the message was received
+```
+For batches, `updateMany()` and `convertMany()` do everything with one vectorized multiply-add
+(NumPy if it's installed), so you can give each adapter its own converter and merge their messages
+by host time.
+"""
+import time
+from collections import deque
+
+try:
+    import numpy
+except ImportError: # numpy is optional (pip install RP1210[numpy])
+    numpy = None
+
+_HALF = 0x80000000
+_MASK = 0xFFFFFFFF
+
+def messageTimestamps(messages, use_numpy = None):
+    """
+    Returns the raw timestamps (ticks) of RP1210_ReadMessage outputs, e.g. a list from
+    `client.rxMany()` or an `RxBatch`.
+    - use_numpy = set to False to get a list. Defaults to returning a NumPy array if NumPy is installed.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy:
+        raw = b''.join([bytes(message[0:4]).rjust(4, b'\x00') for message in messages])
+        return numpy.frombuffer(raw, dtype='>u4').astype(numpy.int64)
+    return [int.from_bytes(message[0:4], 'big') for message in messages]
+
+class TimestampConverter:
+    """
+    Unwraps an adapter's 32-bit timestamps, and maps them to host time.
+
+    Unwrapping: each timestamp is taken to be the closest one to the timestamp before it, so the
+    counter can wrap around as many times as it likes as long as messages are less than half a
+    wraparound apart.
+
+    Mapping: every time you `update()`, the converter compares the message's timestamp with the host
+    time it was received at. The smallest difference seen in each `window` seconds is the one with
+    the least delay between the adapter and your code, and a straight line through the last
+    `history` of those gives the offset and drift between the adapter's clock and the host's. Until
+    there are two of them, it uses the smallest difference so far with no drift.
+
+    Args:
+    - `weight` - microseconds per tick (TimeStampWeight from the vendor .ini file). Defaults to 1.0.
+    - `clock` - host clock to map onto. Defaults to `time.monotonic`; use `time.time` for epoch time.
+    - `window` - seconds (adapter time) per offset sample.
+    - `history` - number of offset samples used to estimate drift.
+
+    Attributes (read-only):
+    - `offset` - host time minus adapter time (seconds), at adapter time `reference`.
+    - `drift` - how much faster the host clock runs than the adapter's (e.g. 20e-6 = 20 ppm).
+    - `reference` - adapter time (seconds) that `offset` applies at.
+    """
+    def __init__(self, weight : float = 1.0, clock = time.monotonic, window : float = 1.0, history : int = 60) -> None:
+        if weight <= 0:
+            raise ValueError("TimestampConverter weight must be more than 0.")
+        if history < 2:
+            raise ValueError("TimestampConverter history must be at least 2.")
+        self.weight = weight
+        self.clock = clock
+        self.window = window
+        self.scale = weight * 1e-6
+        """seconds per tick"""
+        self.offset = None #type: float
+        self.drift = 0.0
+        self.reference = 0.0
+        self._last = None #type: int # last unwrapped timestamp, in ticks
+        self._samples = deque(maxlen=history) #type: deque[tuple[float, float]] # (adapter time, offset)
+        self._bucket_start = None #type: float
+        self._bucket_time = 0.0
+        self._bucket_offset = 0.0
+
+    @classmethod
+    def fromClient(cls, client, **kwargs):
+        """Returns a TimestampConverter with the TimeStampWeight of client's vendor."""
+        return cls(client.getCurrentVendor().getTimeStampWeight(), **kwargs)
+
+    ##############
+    # UNWRAPPING #
+    ##############
+
+    def unwrap(self, ticks : int) -> int:
+        """Returns the unwrapped timestamp (ticks, as an int that doesn't wrap)."""
+        if self._last is None:
+            self._last = ticks
+        else:
+            self._last += ((ticks - self._last + _HALF) & _MASK) - _HALF
+        return self._last
+
+    def unwrapMany(self, ticks, use_numpy = None):
+        """
+        Unwraps a batch of timestamps. Returns an int64 NumPy array, or a list if use_numpy is False.
+        - use_numpy = set to False to force the pure-Python version. Defaults to using NumPy if it's installed.
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if not use_numpy:
+            unwrap = self.unwrap
+            return [unwrap(tick) for tick in ticks]
+        ticks = numpy.asarray(ticks, dtype=numpy.int64)
+        if not len(ticks):
+            return ticks
+        last = int(ticks[0]) if self._last is None else self._last
+        steps = numpy.diff(ticks, prepend=last & _MASK)
+        steps = ((steps + _HALF) & _MASK) - _HALF
+        unwrapped = numpy.cumsum(steps) + last
+        self._last = int(unwrapped[-1])
+        return unwrapped
+
+    ###########
+    # MAPPING #
+    ###########
+
+    def update(self, ticks : int, host_time : float = None) -> float:
+        """
+        Converts a message's timestamp to host time, and uses it to improve the offset and drift estimates.
+        - host_time = when the message was received. Defaults to `clock()`.
+        """
+        adapter_time = self.unwrap(ticks) * self.scale
+        self._observe(adapter_time, self.clock() if host_time is None else host_time)
+        return self._to_host(adapter_time)
+
+    def updateMany(self, ticks, host_time : float = None, use_numpy = None):
+        """
+        Converts a batch of timestamps that were all received at host_time (e.g. from one
+        `client.rxMany()`), and uses the newest one to improve the estimates. Returns a NumPy array,
+        or a list if use_numpy is False.
+        """
+        unwrapped = self.unwrapMany(ticks, use_numpy)
+        if len(unwrapped):
+            self._observe(int(max(unwrapped)) * self.scale, self.clock() if host_time is None else host_time)
+        return self._to_host_many(unwrapped)
+
+    def convert(self, ticks : int) -> float:
+        """Converts a timestamp to host time with the current estimates, without updating them."""
+        return self._to_host(self.unwrap(ticks) * self.scale)
+
+    def convertMany(self, ticks, use_numpy = None):
+        """
+        Converts a batch of timestamps to host time with the current estimates, without updating
+        them. Returns a NumPy array, or a list if use_numpy is False.
+        """
+        return self._to_host_many(self.unwrapMany(ticks, use_numpy))
+
+    def reset(self) -> None:
+        """Forgets the offset, drift and the last timestamp, e.g. after reconnecting to the adapter."""
+        self.offset = None
+        self.drift = 0.0
+        self.reference = 0.0
+        self._last = None
+        self._samples.clear()
+        self._bucket_start = None
+
+    def _to_host(self, adapter_time : float) -> float:
+        if self.offset is None:
+            return adapter_time
+        return adapter_time + self.offset + self.drift * (adapter_time - self.reference)
+
+    def _to_host_many(self, unwrapped):
+        offset = 0.0 if self.offset is None else self.offset
+        # host = adapter + offset + drift * (adapter - reference), as one multiply-add on the ticks
+        scale = self.scale * (1.0 + self.drift)
+        constant = offset - self.drift * self.reference
+        if isinstance(unwrapped, list):
+            return [tick * scale + constant for tick in unwrapped]
+        return unwrapped * scale + constant
+
+    def _observe(self, adapter_time : float, host_time : float) -> None:
+        offset = host_time - adapter_time
+        if self._bucket_start is None:
+            self._bucket_start = adapter_time
+            self._bucket_time, self._bucket_offset = adapter_time, offset
+        elif adapter_time - self._bucket_start >= self.window:
+            self._samples.append((self._bucket_time, self._bucket_offset))
+            self._bucket_start = adapter_time
+            self._bucket_time, self._bucket_offset = adapter_time, offset
+            self._fit()
+        elif offset < self._bucket_offset:
+            self._bucket_time, self._bucket_offset = adapter_time, offset
+        if len(self._samples) < 2 and (self.offset is None or self._bucket_offset < self.offset):
+            self.offset = self._bucket_offset
+            self.reference = self._bucket_time
+
+    def _fit(self) -> None:
+        """Fits a line through the offset samples."""
+        samples = self._samples
+        if len(samples) < 2:
+            return
+        count = len(samples)
+        mean_time = sum(t for t, _ in samples) / count
+        mean_offset = sum(o for _, o in samples) / count
+        spread = sum((t - mean_time) ** 2 for t, _ in samples)
+        if spread > 0:
+            self.drift = sum((t - mean_time) * (o - mean_offset) for t, o in samples) / spread
+        self.offset = mean_offset
+        self.reference = mean_time
@@ -0,0 +1,66 @@
+"""
+Precise waits, shared by the classes that send on a schedule (`CyclicScheduler`, `J1939Transmitter`,
+`J1939Requester`, `ReplayEngine`). Nothing protocol-specific lives here.
+"""
+import time
+
+def sleepUntil(deadline : float, clock = time.monotonic, spin : float = 0.002, sleep = time.sleep,
+               stopped = None) -> None:
+    """
+    Waits until `clock()` >= deadline. More precise than `time.sleep()` on its own: it sleeps until
+    `spin` seconds before the deadline, then busy-waits the rest of the way, since `time.sleep()`
+    can oversleep by a few milliseconds (up to ~15 ms on older versions of Windows).
+    - deadline = time to wait until, in `clock` seconds
+    - clock = function that returns the current time in seconds. Defaults to `time.monotonic`.
+    - spin = how long to busy-wait for at the end, in seconds. 0 = just sleep.
+    - sleep = function called as sleep(seconds) for the part before `spin`, e.g. an Event's `wait`
+    so it can be interrupted, or a fake clock's sleep in tests.
+    - stopped = function that returns True to stop waiting early (checked while busy-waiting)
+    """
+    remaining = deadline - clock()
+    if remaining > spin:
+        sleep(remaining - spin)
+    if spin <= 0:
+        return
+    while clock() < deadline:
+        if stopped is not None and stopped():
+            return
+
+def pollUntilDone(poll, rx = None, process = None, timeout : float = None, poll_interval : float = 0.001,
+                  clock = time.monotonic, spin : float = 0.002) -> bool:
+    """
+    The loop behind `flush()` in `J1939Transmitter` and `J1939Requester`: passes every message from
+    `rx` to `process`, calls `poll`, and waits until the next thing is due, until `poll` returns None.
+    - poll = function that does whatever's due and returns seconds until the next thing is, or None
+    if there's nothing left to do
+    - rx = function that returns a received message, or something falsy if there isn't one
+    - process = function called with every message from rx
+    - timeout = max seconds to wait. Waits until everything is done if None.
+    - poll_interval = max seconds between calls to rx. These waits are plain sleeps; only waits for
+    what `poll` said is due use `sleepUntil()` (and its busy-wait).
+    - clock = function that returns the current time in seconds. Defaults to `time.monotonic`.
+    - spin = `sleepUntil()` spin for those waits. 0 if being a bit late doesn't matter.
+
+    Returns True if there's nothing left to do, or False if `timeout` ran out first.
+    """
+    end = None if timeout is None else clock() + timeout
+    while True:
+        if rx is not None:
+            while True:
+                msg = rx()
+                if not msg:
+                    break
+                process(msg)
+        wait = poll()
+        if wait is None:
+            return True
+        now = clock()
+        if end is not None and now >= end:
+            return False
+        deadline = now + wait
+        if end is not None:
+            deadline = min(deadline, end)
+        if rx is not None and deadline - now > poll_interval:
+            time.sleep(poll_interval) # just checking for messages, so no need to be precise
+        else:
+            sleepUntil(deadline, clock, spin)
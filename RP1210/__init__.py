@@ -21,41 +21,43 @@ def sanitize_msg_param(param, num_bytes : int = 0, byteorder : str = 'big') -> b
     This function is meant for internal use in message/protocol files; it's only public because
     I didn't want to copy/paste it a bunch of times.
     """
-    if param is None:
-        param = b''
+    # this gets called several times for every message, so the common types are checked first and
+    # nothing is converted more than once
     if isinstance(param, int): # int to bytes
         if num_bytes == 0:
-            num_bytes = (param.bit_length() + 7) // 8
-            if param == 0: # don't cut it off if the input is zero
-                num_bytes = 1
+            num_bytes = (param.bit_length() + 7) // 8 or 1 # don't cut it off if the input is zero
         return param.to_bytes(num_bytes, byteorder)
-    elif isinstance(param, str): # string to bytes
-        if param == "": # check for empty string
-            return b'' + b'\x00' * num_bytes
-        return sanitize_msg_param(str.encode(param, 'utf8'), num_bytes, byteorder)
-    elif isinstance(param, bytes):
-         # convert to int, run sanitize_msg_param again
-        if num_bytes == 0:
-            if param == b'': # len == 1 for b'', but we don't want to return b'\x00'
-                return b''
-            num_bytes = len(param)
-        if byteorder == 'little':
-            param2 = param[::-1]
-        else:
-            param2 = param
-        val = int.from_bytes(param2[:num_bytes], byteorder)
-        return sanitize_msg_param(val, num_bytes, byteorder)
-    elif isinstance(param, float):
-        # convert to int, run sanitize_msg_param again
-        return sanitize_msg_param(int(param), num_bytes, byteorder)
-    else:
-        try:
-            return sanitize_msg_param(bytes(param), num_bytes, byteorder)
-        except Exception:
-            raise TypeError('Invalid type used for sanitize_msg_param():', param)
-    
+    if type(param) is not bytes:
+        if param is None:
+            param = b''
+        elif isinstance(param, str): # string to bytes
+            if param == "": # check for empty string
+                return b'\x00' * num_bytes
+            param = param.encode('utf8')
+        elif isinstance(param, float):
+            return sanitize_msg_param(int(param), num_bytes, byteorder)
+        elif not isinstance(param, bytes):
+            try:
+                param = bytes(param)
+            except Exception:
+                raise TypeError('Invalid type used for sanitize_msg_param():', param)
+    # bytes: cut to num_bytes, or fill with 0x00 (on the left for big-endian, on the right for little)
+    if num_bytes == 0:
+        if byteorder == 'big' or not param:
+            return bytes(param)
+        num_bytes = len(param)
+    if byteorder != 'big' and byteorder != 'little':
+        raise ValueError("byteorder must be either 'little' or 'big'")
+    if byteorder == 'little':
+        param = param[::-1][:num_bytes]
+        return param + b'\x00' * (num_bytes - len(param))
+    param = param[:num_bytes]
+    if len(param) < num_bytes:
+        return b'\x00' * (num_bytes - len(param)) + param
+    return bytes(param)
+
 
 # Import everything from RP1210.py
 from RP1210.RP1210 import *
 # Import other modules (not necessary in Python 3.9+)
-from RP1210 import Commands, J1939, UDS
+from RP1210 import AsyncClient, Broadcast, Capture, Commands, J1939, J1939Dispatcher, J1939Faults, J1939Filters, J1939Requests, J1939Transport, Reader, Replay, Scheduler, Simulator, Timestamps, UDS
@@ -6,7 +6,30 @@ import can
 from can import Message, CanProtocol, CanOperationError
 
 import RP1210
+from RP1210.Capture import CaptureWriter, PROTOCOL_CAN
+from RP1210.Timestamps import TimestampConverter
 
+RECEIVE_MODES = ("blocking", "poll")
+"""
+How `PyRP1210Bridge` reads messages from the adapter.
+
+- "blocking" - a reader thread calls RP1210_ReadMessage with BLOCKING_IO and fills a buffer, and
+`recv()` wakes up as soon as a message lands in it (default)
+- "poll" - `recv()` reads with NON_BLOCKING_IO and sleeps `poll_interval` seconds between reads
+"""
+
+TIMESTAMP_MODES = ("host", "raw")
+"""
+What `PyRP1210Bridge` puts in `can.Message.timestamp`.
+
+- "host" - the adapter's timestamp converted to epoch time (like `time.time()`) with a
+`TimestampConverter`, using the vendor's TimeStampWeight (default)
+- "raw" - the adapter's timestamp as-is (ticks)
+"""
+
+STANDARD_CAN = 0x00
+EXTENDED_CAN = 0x01
+_ID_MASKS = {STANDARD_CAN: 0x7FF, EXTENDED_CAN: 0x1FFFFFFF}
 
 class PyRP1210Bridge(can.bus.BusABC):
     def __init__(
@@ -14,15 +37,44 @@ class PyRP1210Bridge(can.bus.BusABC):
             channel: Any,
             bitrate: int = 500_000,
             poll_interval: float = 0.01,
+            receive_mode: str = "blocking",
+            blocking_timeout: int = 100,
+            rx_queue_size: int = 4096,
+            capture: Optional[CaptureWriter] = None,
+            capture_channel: int = 0,
+            timestamp_mode: str = "host",
             **kwargs: object,
     ):
         """
         :param channel: String in format "DLL_NAME[:DEVICE_ID[:CHANNEL]]"
                         e.g., "PEAKRP32", "PEAKRP32:1", "PEAKRP32:1:2"
+        :param poll_interval: Seconds to sleep between reads in "poll" receive mode.
+        :param receive_mode: "blocking" or "poll"; see RECEIVE_MODES.
+        :param blocking_timeout: Blocking timeout in ms for the reader thread in "blocking" mode.
+                        This is how long shutdown() can take to stop the reader thread.
+        :param rx_queue_size: Max number of received frames buffered in "blocking" mode. The
+                        oldest frames are dropped when it's full.
+        :param capture: CaptureWriter to log every received frame to, before filtering in software.
+                        Frames are only queued on the receiving thread; the writer does the rest.
+        :param capture_channel: Channel number to log frames with in capture.
+        :param timestamp_mode: "host" or "raw"; see TIMESTAMP_MODES.
         """
+        if receive_mode not in RECEIVE_MODES:
+            raise ValueError(f"Invalid receive_mode '{receive_mode}'. Must be one of: {RECEIVE_MODES}")
+        if timestamp_mode not in TIMESTAMP_MODES:
+            raise ValueError(f"Invalid timestamp_mode '{timestamp_mode}'. Must be one of: {TIMESTAMP_MODES}")
+        if not (1 <= blocking_timeout <= 255 * 255):
+            raise ValueError(f"blocking_timeout {blocking_timeout} out of range (1-65025 ms)")
         self._rx_buffer = deque()
+        self._reader = None
+        self._is_filtered = True  # True if the adapter drops everything that doesn't match can_filters
+        self.hardware_filters = []  # (can_type, mask, header) for each filter set in the adapter
         self.poll_interval = poll_interval
+        self.receive_mode = receive_mode
         self.bitrate = bitrate
+        self.capture = capture
+        self.capture_channel = capture_channel
+        self.timestamps = None  # TimestampConverter in "host" timestamp_mode
 
         parts = channel.split(":")
         if len(parts) > 3 or len(parts) < 1:
@@ -53,12 +105,13 @@ class PyRP1210Bridge(can.bus.BusABC):
         self.interface = RP1210.RP1210Client()
         self.interface.setVendor(self.dll_name)
         self.interface.setDevice(self.device_id)
+        if timestamp_mode == "host":
+            self.timestamps = TimestampConverter.fromClient(self.interface, clock=time.time)
 
         conn_str = f"CAN:Baud={self.bitrate},Channel={self.device_channel}"
         self.interface.connect(conn_str.encode("utf-8"))
 
-        self.interface.setAllFiltersToPass()
-
+        # sets can_filters via _apply_filters()
         super().__init__(
             channel=channel,
             bitrate=bitrate,
@@ -66,13 +119,159 @@ class PyRP1210Bridge(can.bus.BusABC):
             **kwargs,
         )
 
+        if self.receive_mode == "blocking":
+            self._start_reader(blocking_timeout, rx_queue_size)
+
     def send(self, msg: Message, timeout: Optional[float] = None) -> None:
         arb_id = msg.arbitration_id
         self.interface.tx(b"\x01" + arb_id.to_bytes(4, "big") + msg.data)
 
+    def _apply_filters(self, filters: Optional[can.typechecking.CanFilters]) -> None:
+        """
+        Pushes python-can filters down to the adapter, so unwanted frames are dropped before they
+        ever reach Python.
+
+        Each filter becomes an RP1210 CAN filter (Set Message Filtering for CAN, with filter type
+        FILTER_INCLUSIVE) for standard IDs, extended IDs, or both if "extended" isn't specified.
+        If the adapter won't take all of them (e.g. ERR_MAX_FILTERS_EXCEEDED), the filters are
+        merged into one broader filter per CAN type, and frames are also checked in software.
+        If even that fails, the adapter passes everything and all filtering is done in software.
+
+        Frames that were already received but not read yet are discarded when filters change.
+        """
+        if not filters:
+            self._is_filtered = self._set_hardware_filters(None)
+        else:
+            exact = self._to_hardware_filters(filters)
+            if self._set_hardware_filters(exact):
+                self._is_filtered = True
+            else:
+                self._is_filtered = False
+                if not self._set_hardware_filters(self._merge_hardware_filters(exact)):
+                    self._set_hardware_filters(None)
+        self._rx_buffer.clear()
+        if self._reader is not None:
+            self._reader.ring.clear()
+
+    @staticmethod
+    def _to_hardware_filters(filters: can.typechecking.CanFilters) -> list:
+        """
+        Translates python-can filters to a list of (can_type, mask, header) for setCANFilters().
+
+        Filters that can't match any frame of a CAN type (e.g. a standard filter with ID bits above
+        0x7FF in its mask) are left out for that type.
+        """
+        hw_filters = []
+        for can_filter in filters:
+            can_id = can_filter["can_id"]
+            can_mask = can_filter["can_mask"]
+            if "extended" in can_filter:
+                can_types = [EXTENDED_CAN if can_filter["extended"] else STANDARD_CAN]
+            else:
+                can_types = [STANDARD_CAN, EXTENDED_CAN]
+            for can_type in can_types:
+                id_mask = _ID_MASKS[can_type]
+                if can_id & can_mask & ~id_mask:
+                    continue  # frames of this type never have these ID bits set
+                hw_filter = (can_type, can_mask & id_mask, can_id & can_mask & id_mask)
+                if hw_filter not in hw_filters:
+                    hw_filters.append(hw_filter)
+        return hw_filters
+
+    @staticmethod
+    def _merge_hardware_filters(hw_filters: list) -> list:
+        """
+        Merges filters into one filter per CAN type that passes everything any of them passes.
+        The merged mask only keeps the bits that every filter cares about and agrees on.
+        """
+        merged = {}
+        for can_type, mask, header in hw_filters:
+            if can_type in merged:
+                merged_mask, merged_header = merged[can_type]
+                mask &= merged_mask & ~(header ^ merged_header)
+            merged[can_type] = (mask, header & mask)
+        return [(can_type, mask, header) for can_type, (mask, header) in merged.items()]
+
+    def _set_hardware_filters(self, hw_filters: Optional[list]) -> bool:
+        """
+        Replaces the adapter's CAN filters with hw_filters, or passes everything if it's None.
+
+        Returns True if the adapter accepted every filter.
+        """
+        self.hardware_filters = []
+        if hw_filters is None:
+            return self.interface.setAllFiltersToPass() == 0
+        if self.interface.setAllFiltersToDiscard() != 0:
+            return False
+        if self.interface.setCANFilterType(0) != 0:  # FILTER_INCLUSIVE
+            return False
+        for can_type, mask, header in hw_filters:
+            if self.interface.setCANFilters(can_type, mask, header) != 0:
+                return False
+            self.hardware_filters.append((can_type, mask, header))
+        return True
+
+    def _start_reader(self, blocking_timeout: int, rx_queue_size: int) -> None:
+        """
+        Starts the adapter's background reader with BLOCKING_IO, so frames are read as soon as they
+        arrive. Falls back to NON_BLOCKING_IO (with a short sleep between empty reads) if the
+        adapter doesn't accept the Set Blocking Timeout command, since a blocking read with no
+        timeout could never be stopped.
+        """
+        block2 = -(-blocking_timeout // 255)  # ceil
+        block1 = -(-blocking_timeout // block2)
+        blocking = 1 if self.interface.setBlockingTimeout(block1, block2) == 0 else 0
+        self._reader = self.interface.startReader(capacity=rx_queue_size, buffer_size=256 + 5,
+                                                  blocking=blocking)
+
+    def _to_message(self, res) -> Message:
+        """Converts a message read from the adapter (CAN format, with timestamp) to a can.Message."""
+        timestamp = int.from_bytes(res[0:4], "big")
+        if self.timestamps is not None:
+            timestamp = self.timestamps.update(timestamp)
+        flags = res[4]
+        arbitration_id = int.from_bytes(res[5: 5 + 4], "big")
+        dlc = len(res) - 4 - 5
+        if dlc > 0:
+            data = res[9:]
+        else:
+            data = b""
+
+        if flags != 0xFF:
+            is_extended = bool(flags & 0x01)
+            is_remote = bool((flags >> 1) & 0x01)
+            is_error = bool((flags >> 2) & 0x01)
+        else:
+            is_extended = True
+            is_remote = False
+            is_error = False
+
+        if is_error:
+            raise CanOperationError("RP1210 error reported")
+
+        return Message(
+            arbitration_id=arbitration_id,
+            is_extended_id=is_extended,
+            timestamp=timestamp,
+            is_remote_frame=is_remote,
+            dlc=dlc,
+            data=data,
+            channel=self.channel_info,
+            is_rx=True,
+        )
+
     def _recv_internal(self, timeout: Optional[float] = None):
+        if self._reader is not None:
+            # wait on the reader's buffer; wakes up as soon as a frame arrives
+            res = self._reader.ring.get(block=timeout != 0, timeout=timeout)
+            if not res:
+                return None, False
+            if self.capture is not None:
+                self.capture.write(res, self.capture_channel, PROTOCOL_CAN)
+            return self._to_message(res), self._is_filtered
+
         if self._rx_buffer:
-            return self._rx_buffer.popleft(), False
+            return self._rx_buffer.popleft(), self._is_filtered
 
         start = time.monotonic()
 
@@ -83,41 +282,13 @@ class PyRP1210Bridge(can.bus.BusABC):
                 if res is None or len(res) == 0:
                     break  # Hardware queue is empty
 
-                timestamp = int.from_bytes(res[0:4], "big")
-                flags = res[4]
-                arbitration_id = int.from_bytes(res[5: 5 + 4], "big")
-                dlc = len(res) - 4 - 5
-                if dlc > 0:
-                    data = res[9:]
-                else:
-                    data = b""
-
-                if flags != 0xFF:
-                    is_extended = bool(flags & 0x01)
-                    is_remote = bool((flags >> 1) & 0x01)
-                    is_error = bool((flags >> 2) & 0x01)
-                else:
-                    is_extended = True
-                    is_remote = False
-                    is_error = False
-
-                if is_error:
-                    raise CanOperationError("RP1210 error reported")
-
-                msg = Message(
-                    arbitration_id=arbitration_id,
-                    is_extended_id=is_extended,
-                    timestamp=timestamp,
-                    is_remote_frame=is_remote,
-                    dlc=dlc,
-                    data=data,
-                    channel=self.channel_info,
-                    is_rx=True,
-                )
-                self._rx_buffer.append(msg)
+                if self.capture is not None:
+                    self.capture.write(res, self.capture_channel, PROTOCOL_CAN)
+
+                self._rx_buffer.append(self._to_message(res))
 
             if self._rx_buffer:
-                return self._rx_buffer.popleft(), False
+                return self._rx_buffer.popleft(), self._is_filtered
 
             if timeout == 0:
                 return None, False
@@ -130,4 +301,5 @@ class PyRP1210Bridge(can.bus.BusABC):
 
     def shutdown(self) -> None:
         super().shutdown()
-        self.interface.disconnect()
+        self.interface.disconnect()  # also stops the reader thread
+        self._reader = None
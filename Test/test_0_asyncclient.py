@@ -0,0 +1,167 @@
+"""
+Tests for RP1210.AsyncClient (AsyncRP1210Client, RP1210IOThread).
+
+These tests use a fake RP1210 DLL, so they don't need an adapter.
+"""
+import asyncio
+import ctypes
+import threading
+from types import SimpleNamespace
+import pytest
+import RP1210
+from RP1210.AsyncClient import AsyncRP1210Client, RP1210IOThread
+
+RP121032_PATH = "Test/test-files/RP121032.ini"
+DLL_DIRECTORY = "Test/test-files/dlls"
+INI_DIRECTORY = "Test/test-files/ini-files"
+
+class FakeDLL():
+    """A fake RP1210 DLL with one receive queue per clientID that records which thread calls it."""
+    def __init__(self):
+        self.queues = {}
+        self.sent = []
+        self.commands = []
+        self.threads = set()
+        self.lock = threading.Lock()
+        self.RP1210_ReadMessage = self.read
+        self.RP1210_SendMessage = self.send
+        self.RP1210_SendCommand = self.command
+
+    def read(self, ClientID, RxBuffer, BufferSize, BlockOnRead):
+        self.threads.add(threading.current_thread().name)
+        with self.lock:
+            messages = self.queues.get(ClientID)
+            if not messages:
+                return 0
+            msg = messages.pop(0)
+        if isinstance(msg, int): # error code, returned as 16-bit 2's complement
+            return 0x10000 - msg
+        ctypes.memmove(RxBuffer, msg, len(msg))
+        return len(msg)
+
+    def send(self, ClientID, ClientMessage, MessageSize, NotifyStatusOnTx, BlockOnSend):
+        self.threads.add(threading.current_thread().name)
+        self.sent.append((ClientID, bytes(ClientMessage[:MessageSize])))
+        return 0
+
+    def command(self, CommandNumber, ClientID, ClientCommand, MessageSize):
+        self.threads.add(threading.current_thread().name)
+        self.commands.append((CommandNumber, ClientID, bytes(ClientCommand[:MessageSize])))
+        return 0
+
+    def inject(self, client_id, messages):
+        with self.lock:
+            self.queues.setdefault(client_id, []).extend(messages)
+
+def make_client(dll, client_id) -> RP1210.RP1210Client:
+    client = RP1210.RP1210Client(RP121032_PATH, DLL_DIRECTORY, INI_DIRECTORY)
+    client.setVendor("NULN2R32")
+    client.getAPI().dll = dll
+    client.clientID = client_id
+    return client
+
+@pytest.fixture
+def dll():
+    dll = FakeDLL()
+    yield dll
+    RP1210IOThread._threads.clear()
+
+def test_AsyncRP1210Client_recv(dll):
+    async def main():
+        messages = [x.to_bytes(4, 'big') + bytes([x]) * 8 for x in range(200)]
+        dll.inject(1, messages)
+        async with AsyncRP1210Client(make_client(dll, 1), max_messages=16) as aclient:
+            assert aclient.isOpen()
+            received = [await aclient.recv() for _ in range(150)]
+            received += [await aclient.recv(timeout=1) for _ in range(50)]
+            assert received == messages
+            assert await aclient.recv(timeout=0.01) == b''
+        assert not aclient.isOpen()
+        assert await aclient.recv() == b''
+    asyncio.run(main())
+    assert all(name.startswith("RP1210IOThread") for name in dll.threads)
+
+def test_AsyncRP1210Client_async_for(dll):
+    async def main():
+        aclient = AsyncRP1210Client(make_client(dll, 2))
+        await aclient.open()
+        dll.inject(2, [b'\x00\x00\x00\x01\xAA', b'\x00\x00\x00\x02\xBB'])
+        received = []
+        async for msg in aclient:
+            received.append(msg)
+            if len(received) == 2:
+                await aclient.close()
+        return received
+    assert asyncio.run(main()) == [b'\x00\x00\x00\x01\xAA', b'\x00\x00\x00\x02\xBB']
+
+def test_AsyncRP1210Client_many_clients_one_thread(dll):
+    async def main():
+        aclients = [AsyncRP1210Client(make_client(dll, x)) for x in range(1, 25)]
+        for aclient in aclients:
+            await aclient.open()
+            dll.inject(aclient.client.clientID, [bytes([aclient.client.clientID]) * 5] * 3)
+        io_thread = RP1210IOThread.get(aclients[0].client.getAPI())
+        assert all(aclient._io_thread is io_thread for aclient in aclients)
+        for aclient in aclients:
+            for _ in range(3):
+                assert await aclient.recv(timeout=1) == bytes([aclient.client.clientID]) * 5
+        for aclient in aclients:
+            await aclient.close()
+    asyncio.run(main())
+    assert len(dll.threads) == 1
+
+def test_AsyncRP1210Client_send_command(dll):
+    async def main():
+        async with AsyncRP1210Client(make_client(dll, 3)) as aclient:
+            assert await aclient.send(b'\x01\x02\x03') == 0
+            assert await aclient.command(3) == 0
+    asyncio.run(main())
+    assert dll.sent == [(3, b'\x01\x02\x03')]
+    assert dll.commands == [(3, 3, b'')]
+    assert all(name.startswith("RP1210IOThread") for name in dll.threads)
+
+def test_AsyncRP1210Client_queue_size_and_errors(dll):
+    async def main():
+        dll.inject(4, [bytes([x]) for x in range(10)] + [139])
+        async with AsyncRP1210Client(make_client(dll, 4), queue_size=4) as aclient:
+            while aclient.errors == 0:
+                await asyncio.sleep(0.001)
+            assert aclient.last_error == 139
+            assert aclient.dropped == 6
+            assert len(aclient) == 4
+            assert aclient.recvMany(1) == [b'\x06']
+            assert aclient.recvMany() == [b'\x07', b'\x08', b'\x09']
+    asyncio.run(main())
+
+def test_AsyncRP1210Client_persistent_error(dll):
+    reads = []
+    def failing_read(ClientID, RxBuffer, BufferSize, BlockOnRead):
+        reads.append(ClientID)
+        return 0x10000 - 142 # ERR_HARDWARE_NOT_RESPONDING, every time
+    async def main():
+        aclient = AsyncRP1210Client(make_client(dll, 6))
+        aclient.client.getAPI().dll = SimpleNamespace(RP1210_ReadMessage=failing_read)
+        RP1210IOThread.get(aclient.client.getAPI()).error_retry = 0.05
+        async with aclient:
+            await asyncio.sleep(0.3)
+            assert aclient.errors == 1 # delivered once, not once per read
+            assert aclient.last_error == 142
+            assert 3 <= len(reads) <= 10 # retried every 50 ms, not every idle_sleep
+            # a different error is delivered
+            aclient.client.getAPI().dll = SimpleNamespace(RP1210_ReadMessage=lambda *args: 0x10000 - 139)
+            await asyncio.sleep(0.15)
+            assert aclient.errors == 2
+            assert aclient.last_error == 139
+    asyncio.run(main())
+
+def test_AsyncRP1210Client_read_exception(dll):
+    def broken_read(ClientID, RxBuffer, BufferSize, BlockOnRead):
+        raise OSError("adapter unplugged")
+    async def main():
+        aclient = AsyncRP1210Client(make_client(dll, 5))
+        aclient.client.getAPI().dll = SimpleNamespace(RP1210_ReadMessage=broken_read)
+        await aclient.open()
+        with pytest.raises(OSError):
+            await aclient.recv(timeout=1)
+        assert not aclient.isOpen()
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Tests for RP1210.Broadcast (BroadcastListManager).
+"""
+import pytest
+from RP1210 import Commands
+from RP1210.Broadcast import BROADCAST_FOR_CAN, BROADCAST_FOR_J1939, BroadcastListManager
+
+class FakeAdapter():
+    """Stands in for client.command; keeps a broadcast list the way an adapter would."""
+    def __init__(self, fail_on = None):
+        self.list = [] #type: list[tuple[bytes, int]]
+        self.commands = [] #type: list[bytes]
+        self.fail_on = fail_on # function code to reject
+
+    def __call__(self, command_number, client_command, size = 0) -> int:
+        assert command_number == BROADCAST_FOR_J1939
+        data = bytes(client_command)[:size]
+        self.commands.append(data)
+        function = data[0]
+        if function == self.fail_on:
+            return 134
+        if function == 1: # ADD_LIST
+            i = 1
+            while i < len(data):
+                length = int.from_bytes(data[i:i + 2], 'little')
+                interval = int.from_bytes(data[i + 2:i + 6], 'little')
+                self.list.append((data[i + 6:i + 6 + length], interval))
+                i += 6 + length
+        elif function == 3: # DESTROY_LIST
+            self.list.clear()
+        elif function == 4: # REMOVE_ENTRY
+            del self.list[data[1]]
+        elif function == 5: # LIST_LENGTH
+            client_command[1] = len(self.list)
+        return 0
+
+def check(manager : BroadcastListManager, adapter : FakeAdapter) -> None:
+    """The mirror matches the adapter."""
+    assert [(message, interval) for _, message, interval in manager.entries] == adapter.list
+    assert not manager.pending()
+
+def test_BroadcastListManager_add():
+    adapter = FakeAdapter()
+    manager = BroadcastListManager(adapter)
+    manager.add("a", b'\x01', 0.01)
+    manager.add("b", b'\x02', 0.1)
+    manager.add("c", b'\x03', 1.0)
+    assert len(manager) == 3
+    assert "b" in manager
+    assert manager.pending()
+    assert manager.apply() == 0
+    assert adapter.commands == [Commands.addBroadcastList([Commands.broadcastEntry(b'\x01', 10),
+                                                           Commands.broadcastEntry(b'\x02', 100),
+                                                           Commands.broadcastEntry(b'\x03', 1000)])]
+    check(manager, adapter)
+    assert manager.apply() == 0 # nothing to do
+    assert manager.commands_sent == 1
+
+def test_BroadcastListManager_minimal_changes():
+    adapter = FakeAdapter()
+    manager = BroadcastListManager(adapter)
+    for i in range(6):
+        manager.add(i, bytes([i]), 0.01)
+    manager.apply()
+    adapter.commands.clear()
+    # change one message: REMOVE_ENTRY + ADD_LIST; the others keep going
+    manager.update(1, b'\xAA')
+    manager.apply()
+    assert adapter.commands == [Commands.removeBroadcastEntry(1), Commands.addBroadcastList(Commands.broadcastEntry(b'\xAA', 10))]
+    check(manager, adapter)
+    # remove two (from the end first, so the entry numbers don't move)
+    adapter.commands.clear()
+    manager.remove(2)
+    manager.remove(4)
+    manager.remove("not there")
+    manager.apply()
+    assert adapter.commands == [Commands.removeBroadcastEntry(3), Commands.removeBroadcastEntry(1)]
+    check(manager, adapter)
+    # change a period
+    adapter.commands.clear()
+    manager.update(3, period=0.05)
+    manager.apply()
+    assert adapter.commands == [Commands.removeBroadcastEntry(1), Commands.addBroadcastList(Commands.broadcastEntry(b'\x03', 50))]
+    check(manager, adapter)
+    assert [key for key, _, _ in manager.entries] == [0, 5, 1, 3]
+    # replacing everything: DESTROY_LIST + ADD_LIST is fewer
+    adapter.commands.clear()
+    for key in (0, 1, 3, 5):
+        manager.update(key, b'\xFF' + bytes([key]))
+    manager.apply()
+    assert [command[0] for command in adapter.commands] == [3, 1]
+    check(manager, adapter)
+    # removing everything
+    adapter.commands.clear()
+    manager.clear()
+    manager.apply()
+    assert adapter.commands == [Commands.destroyBroadcastList()]
+    check(manager, adapter)
+
+def test_BroadcastListManager_errors():
+    adapter = FakeAdapter(fail_on=4)
+    manager = BroadcastListManager(adapter)
+    manager.add("a", b'\x01', 0.01)
+    manager.add("b", b'\x02', 0.01)
+    assert manager.apply() == 0
+    manager.remove("a")
+    assert manager.apply() == 134
+    assert manager.errors == 1
+    assert manager.pending()
+    # state is unknown, so it starts over
+    adapter.fail_on = None
+    adapter.commands.clear()
+    assert manager.apply() == 0
+    assert adapter.commands == [Commands.destroyBroadcastList(), Commands.addBroadcastList([Commands.broadcastEntry(b'\x02', 10)])]
+    check(manager, adapter)
+
+def test_BroadcastListManager_queryLength():
+    adapter = FakeAdapter()
+    manager = BroadcastListManager(adapter)
+    manager.add("a", b'\x01', 0.01)
+    manager.apply()
+    assert manager.queryLength() == 1
+    assert not manager.pending()
+    adapter.list.append((b'\x99', 10)) # someone else changed it
+    assert manager.queryLength() == 2
+    assert manager.pending()
+    manager.apply()
+    check(manager, adapter)
+    adapter.fail_on = 5
+    assert manager.queryLength() is None
+
+def test_BroadcastListManager_invalid_args():
+    manager = BroadcastListManager(FakeAdapter(), BROADCAST_FOR_CAN)
+    assert manager.command_number == BROADCAST_FOR_CAN
+    with pytest.raises(ValueError):
+        manager.add("a", b'\x01', 0)
+    with pytest.raises(ValueError):
+        manager.add("a", b'\x01', 0.0001)
+    with pytest.raises(KeyError):
+        manager.update("a", b'\x02')
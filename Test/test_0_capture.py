@@ -0,0 +1,253 @@
+"""
+Tests for RP1210.Capture (CaptureWriter, CaptureReader).
+"""
+import ctypes
+import threading
+import time
+import pytest
+import RP1210
+from RP1210 import Capture
+from RP1210.Capture import (BLOCK_HEADER, FILE_HEADER, PROTOCOL_CAN, PROTOCOL_ECHO, PROTOCOL_J1939,
+                            PROTOCOL_RAW, CaptureReader, CaptureWriter, messageKey, readCapture)
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.Timestamps import TimestampConverter
+from utilities import FakeClock
+
+RP121032_PATH = "Test/test-files/RP121032.ini"
+DLL_DIRECTORY = "Test/test-files/dlls"
+INI_DIRECTORY = "Test/test-files/ini-files"
+
+class FakeAPI():
+    """Stands in for RP1210API.ReadMessage; returns queued messages, then 0 (no message)."""
+    def __init__(self, messages = None):
+        self.messages = list(messages or [])
+
+    def ReadMessage(self, ClientID, RxBuffer, BufferSize = 0, BlockOnRead = 0):
+        if not self.messages:
+            return 0
+        msg = self.messages.pop(0)
+        ctypes.memmove(RxBuffer, msg, len(msg))
+        return len(msg)
+
+def j1939(pgn, sa, da = 0xFF, data = bytes(8), timestamp = 0) -> bytes:
+    return timestamp.to_bytes(4, 'big') + toJ1939Message(pgn, 6, sa, da, data, len(data))
+
+def can_frame(arbitration_id : int, data : bytes, timestamp = 0) -> bytes:
+    return timestamp.to_bytes(4, 'big') + b'\x01' + arbitration_id.to_bytes(4, 'big') + data
+
+def test_messageKey():
+    msg = j1939(0xF004, 0x00)
+    assert messageKey(msg) == (0xF004 << 8) | 0x00
+    msg = j1939(0xEA00, 0xF9, da=0x17, data=b'\xEB\xFE\x00')
+    assert messageKey(msg) == (J1939Message(msg).pgn << 8) | 0xF9
+    assert messageKey(msg[:4] + b'\x00' + msg[4:], PROTOCOL_J1939 | PROTOCOL_ECHO) == messageKey(msg)
+    assert messageKey(can_frame(0x18FEF100, b'\x01'), PROTOCOL_CAN) == 0x18FEF100
+    assert messageKey(msg, PROTOCOL_RAW) == 0
+    assert messageKey(b'\x00' * 6) == 0
+
+@pytest.mark.parametrize("compression", argvalues=[None, "zlib", "zstd", "lz4"])
+def test_CaptureWriter_round_trip(tmp_path, compression):
+    if compression == "zstd" and Capture.zstandard is None or compression == "lz4" and Capture.lz4frame is None:
+        pytest.skip(f"{compression} isn't installed")
+    path = tmp_path / "capture.rpl"
+    clock = FakeClock(1000.0)
+    messages = [j1939(0xF004, sa, data=bytes([i]) * 8, timestamp=i) for i, sa in enumerate([0, 3, 0, 0x0B] * 10)]
+    messages.append(j1939(0xFECA, 0x00, data=bytes(range(100)))) # multipacket; takes 3 records
+    with CaptureWriter(path, block_records=16, compression=compression, clock=clock) as writer:
+        writer.writeMany(messages[:20], channel=1)
+        clock.now += 1
+        writer.writeMany(messages[20:], channel=1)
+        writer.write(can_frame(0x123, b'\xAA'), channel=2, protocol=PROTOCOL_CAN, timestamp=5.0)
+        writer.flush()
+    records = list(readCapture(path))
+    assert [record[3] for record in records] == messages + [can_frame(0x123, b'\xAA')]
+    assert [record[0] for record in records] == [1000.0] * 20 + [1001.0] * 21 + [5.0]
+    assert {record[1] for record in records} == {1, 2}
+    assert records[-1][2] == PROTOCOL_CAN
+    assert writer.messages == 42
+    assert writer.records == 44
+    assert writer.blocks == 3 # 16, 16 and 12 records
+    assert writer.bytes_written == path.stat().st_size
+
+def test_CaptureWriter_file_format(tmp_path):
+    path = tmp_path / "capture.rpl"
+    clock = FakeClock(1000.0)
+    with CaptureWriter(path, record_size=40, block_records=4, clock=clock) as writer:
+        for sa in (0x00, 0x03, 0x00):
+            writer.write(j1939(0xF004, sa))
+            clock.now += 0.5
+    data = path.read_bytes()
+    magic, version, record_size, compression, block_records, created = FILE_HEADER.unpack_from(data)
+    assert (magic, version, record_size, compression, block_records, created) == \
+        (b'RP1210LG', 1, 40, 0, 4, 1000.0)
+    magic, records, messages, keys, index_size, data_size, first, last = BLOCK_HEADER.unpack_from(data, FILE_HEADER.size)
+    assert (magic, records, messages, keys, first, last) == (b'RPLB', 3, 3, 2, 1000.0, 1001.0)
+    index = data[FILE_HEADER.size + BLOCK_HEADER.size:][:index_size]
+    assert index == ((0xF004 << 8).to_bytes(4, 'little') + (2).to_bytes(4, 'little') +
+                     ((0xF004 << 8) | 3).to_bytes(4, 'little') + (1).to_bytes(4, 'little') +
+                     b'\x00\x00\x02\x00' + b'\x01\x00')
+    assert data_size == 3 * 40
+    assert len(data) == FILE_HEADER.size + BLOCK_HEADER.size + index_size + data_size
+
+def test_CaptureWriter_sources_and_thread(tmp_path):
+    path = tmp_path / "capture.rpl"
+    inbox = {1: [], 2: []}
+    def reader(channel):
+        def read():
+            messages, inbox[channel] = inbox[channel], []
+            return messages
+        return read
+    writer = CaptureWriter(path, flush_interval=0.01)
+    writer.addSource(reader(1), channel=1)
+    writer.addSource(reader(2), channel=2, protocol=PROTOCOL_CAN)
+    writer.start()
+    assert writer.isRunning()
+    inbox[1] += [j1939(0xF004, 0x00)] * 100
+    inbox[2] += [can_frame(0x100, b'\x01')] * 50
+    deadline = time.monotonic() + 2
+    while writer.messages < 150 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+    assert not writer.isRunning()
+    channels = [record[1] for record in readCapture(path)]
+    assert channels.count(1) == 100 and channels.count(2) == 50
+    with pytest.raises(ValueError):
+        writer.addSource(reader(1), channel=256)
+
+def test_CaptureWriter_stop_timeout(tmp_path):
+    """If stop() times out, the writer still knows it's running, and start() waits for it instead of running two."""
+    writer = CaptureWriter(tmp_path / "capture.rpl", idle_sleep=0.3)
+    writer.start()
+    time.sleep(0.05) # in its idle sleep
+    writer.stop(timeout=0.01)
+    assert writer.isRunning()
+    writer.start()
+    assert [thread.name for thread in threading.enumerate()].count("CaptureWriter") == 1
+    writer.close()
+    assert not writer.isRunning()
+
+def test_CaptureWriter_addClient(tmp_path):
+    messages = [j1939(0xF004, 0x00, timestamp=i) for i in range(500)]
+    client = RP1210.RP1210Client(RP121032_PATH, DLL_DIRECTORY, INI_DIRECTORY)
+    client.clientID = 0
+    api = FakeAPI(messages)
+    client.getAPI = lambda: api
+    writer = CaptureWriter(tmp_path / "capture.rpl", block_records=64)
+    writer.addClient(client, channel=1)
+    assert client.getReader() is not None # started by addClient
+    writer.start()
+    deadline = time.monotonic() + 2
+    while writer.messages < len(messages) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+    client.stopReader()
+    assert [record[3] for record in readCapture(tmp_path / "capture.rpl")] == messages
+    assert writer.blocks >= 8
+
+def test_CaptureWriter_source_timestamps(tmp_path):
+    """Messages from a source with a TimestampConverter get their own times, from the adapter's timestamps."""
+    clock = FakeClock(1000.0)
+    inbox = []
+    def read():
+        messages = inbox[:]
+        inbox.clear()
+        return messages
+    writer = CaptureWriter(tmp_path / "capture.rpl", clock=clock)
+    writer.addSource(read, timestamps=TimestampConverter(weight=1000, clock=clock)) # 1 ms ticks
+    inbox.extend(j1939(0xF004, 0x00, timestamp=ticks) for ticks in (0xFFFFFFF6, 0xFFFFFFFB, 0x00000000))
+    clock.now = 1000.0 # when the writer read them
+    writer.poll()
+    inbox.append(j1939(0xF004, 0x00, timestamp=0x0A)) # 10 ms later
+    clock.now = 1000.5
+    writer.close()
+    with CaptureReader(tmp_path / "capture.rpl") as capture:
+        assert [record.time for record in capture] == pytest.approx([999.99, 999.995, 1000.0, 1000.01])
+        assert (capture.start_time, capture.end_time) == pytest.approx((999.99, 1000.01))
+
+def test_CaptureWriter_invalid_args(tmp_path):
+    with pytest.raises(ValueError):
+        CaptureWriter(tmp_path / "a.rpl", record_size=16)
+    with pytest.raises(ValueError):
+        CaptureWriter(tmp_path / "a.rpl", block_records=0x10000)
+    with pytest.raises(ValueError):
+        CaptureWriter(tmp_path / "a.rpl", compression="bzip2")
+    (tmp_path / "b.rpl").write_bytes(b'not a capture' * 10)
+    with pytest.raises(ValueError):
+        list(readCapture(tmp_path / "b.rpl"))
+
+def write_capture(path, compression = None) -> list[tuple]:
+    """Writes a capture with 3 ECUs on 2 channels over 100 seconds; returns (time, channel, message) for each."""
+    clock = FakeClock(1000.0)
+    written = []
+    with CaptureWriter(path, block_records=50, compression=compression, clock=clock) as writer:
+        for second in range(100):
+            clock.now = 1000.0 + second
+            for sa in (0x00, 0x03, 0x0B):
+                for pgn in (0xF004, 0xFEF1):
+                    msg = j1939(pgn, sa, data=bytes([second]) * 8, timestamp=second)
+                    writer.write(msg, channel=1 if sa else 0)
+                    written.append((clock.now, 1 if sa else 0, msg))
+            if second % 10 == 0:
+                msg = j1939(0xFECA, 0x00, data=bytes(range(30)))
+                writer.write(msg)
+                written.append((clock.now, 0, msg))
+    return written
+
+@pytest.mark.parametrize("compression", argvalues=[None, "zlib"])
+def test_CaptureReader_records(tmp_path, compression):
+    path = tmp_path / "capture.rpl"
+    written = write_capture(path, compression)
+    with CaptureReader(path) as capture:
+        assert len(capture) == len(written)
+        assert capture.compression == compression
+        assert capture.numBlocks() > 10
+        assert (capture.start_time, capture.end_time) == (1000.0, 1099.0)
+        assert [(r.time, r.channel, bytes(r)) for r in capture] == written
+        # PGN
+        records = list(capture.records(pgn=0xFEF1))
+        assert [bytes(r) for r in records] == [m for _, _, m in written if messageKey(m) >> 8 == 0xFEF1]
+        assert len(records) == 300
+        assert all(r.toJ1939Message().pgn == 0xFEF1 for r in records)
+        # PGN + SA, SA, multipacket
+        assert [bytes(r) for r in capture.records(pgn=0xF004, sa=0x03)] == \
+            [m for _, _, m in written if messageKey(m) == (0xF004 << 8) | 0x03]
+        assert len(list(capture.records(sa=0x0B))) == 200
+        dm1 = list(capture.records(pgn=0xFECA))
+        assert len(dm1) == 10 and len(dm1[0].message) == 40
+        # time window
+        window = list(capture.records(start=1010.0, end=1020.0))
+        assert [bytes(r) for r in window] == [m for t, _, m in written if 1010 <= t < 1020]
+        assert [r.sa for r in capture.records(start=1050.0, end=1051.0, pgn=0xF004, channel=1)] == [0x03, 0x0B]
+        assert list(capture.records(start=2000.0)) == []
+        assert list(capture.records(can_id=0x18FEF100)) == []
+        with pytest.raises(ValueError):
+            list(capture.records(pgn=0xF004, can_id=0x100))
+        counts = capture.keyCounts()
+        assert counts[(0xF004 << 8) | 0x00] == 100 and counts[(0xFECA << 8) | 0x00] == 10
+        assert sum(counts.values()) == len(written)
+
+def test_CaptureReader_zero_copy(tmp_path):
+    path = tmp_path / "capture.rpl"
+    write_capture(path)
+    capture = CaptureReader(path)
+    record = next(capture.records(pgn=0xFEF1, sa=0x0B))
+    assert isinstance(record.message, memoryview)
+    assert record.message.obj is capture._mmap
+    assert record.pgn == 0xFEF1 and record.sa == 0x0B and record.protocol == PROTOCOL_J1939
+    assert "key=0xFEF10B" in repr(record)
+    capture.close()
+
+def test_CaptureReader_can_and_truncated(tmp_path):
+    path = tmp_path / "capture.rpl"
+    with CaptureWriter(path, block_records=4) as writer:
+        writer.writeMany([can_frame(0x100 + i % 3, bytes([i])) for i in range(10)], channel=2, protocol=PROTOCOL_CAN)
+    with CaptureReader(path) as capture:
+        assert [r.message[-1] for r in capture.records(can_id=0x101)] == [1, 4, 7]
+        assert list(capture.records(pgn=0x100)) == [] # not J1939
+    data = path.read_bytes()
+    path.write_bytes(data[:-5]) # last block was cut off
+    with CaptureReader(path) as capture:
+        assert len(capture) == 8
+    path.write_bytes(b'not a capture' * 10)
+    with pytest.raises(ValueError):
+        CaptureReader(path)
@@ -4,6 +4,7 @@ Tests command strings for basic correctness, following the RP1210C standard.
 Doesn't test commands on an adapter.
 """
 
+import pytest
 from RP1210 import Commands, sanitize_msg_param
 
 def test_reset():
@@ -154,3 +155,43 @@ def test_setBlockingTimeout():
     for x in range(255):
         for y in range(255):
             assert Commands.setBlockingTimeout(x, y) == sanitize_msg_param(x, 1) + sanitize_msg_param(y, 1)
+
+FAST_PATH_VALUES = [0, 1, 0x7F, 0xFF, 0x100, 0xFFFFFF, 0x1000000, -1, True, b'\x12', b'\x12\x34\x56', '', '7', 2.5]
+
+def expect_same(function, expected_function, *args):
+    """Asserts function(*args) matches expected_function(*args), including any exception type."""
+    try:
+        expected = expected_function(*args)
+    except Exception as e:
+        with pytest.raises(type(e)):
+            function(*args)
+        return
+    assert function(*args) == expected
+
+def test_fixed_layout_commands_match_sanitize_msg_param():
+    """The struct-based fast paths must give the same output as building the commands with sanitize_msg_param()."""
+    for a in FAST_PATH_VALUES:
+        for b in FAST_PATH_VALUES:
+            expect_same(Commands.setJ1939Filters, lambda flag, pgn, sa, da: sanitize_msg_param(flag, 1) +
+                        sanitize_msg_param(pgn, 3, 'little') + b'\x00' + sanitize_msg_param(sa, 1) +
+                        sanitize_msg_param(da, 1), 5, a, b, b)
+            expect_same(Commands.setCANFilters, lambda can_type, mask, header: sanitize_msg_param(can_type, 1) +
+                        sanitize_msg_param(mask, 4) + sanitize_msg_param(header, 4), 1, a, b)
+            expect_same(Commands.protectJ1939Address, lambda a, b, blocking: sanitize_msg_param(a, 1) +
+                        sanitize_msg_param(b, 8) + (b'\x00' if blocking else b'\x02'), a, b, a)
+            expect_same(Commands.setBlockingTimeout, lambda a, b: sanitize_msg_param(a, 1) +
+                        sanitize_msg_param(b, 1), a, b)
+
+def test_broadcastEntry():
+    assert Commands.broadcastEntry(b'\x04\xF0\x00\x06\x00\xFF' + bytes(8), 10) == \
+        b'\x0E\x00' + b'\x0A\x00\x00\x00' + b'\x04\xF0\x00\x06\x00\xFF' + bytes(8)
+    assert Commands.broadcastEntry(b'\xAA', 1000) == b'\x01\x00\xE8\x03\x00\x00\xAA'
+
+def test_broadcastList_functions():
+    entries = [Commands.broadcastEntry(b'\xAA', 10), Commands.broadcastEntry(b'\xBB\xCC', 100)]
+    assert Commands.addBroadcastList(entries) == b'\x01' + entries[0] + entries[1]
+    assert Commands.addBroadcastList(entries[0]) == b'\x01' + entries[0]
+    assert Commands.viewBroadcastList(3) == b'\x02\x03'
+    assert Commands.destroyBroadcastList() == b'\x03'
+    assert Commands.removeBroadcastEntry(0) == b'\x04\x00'
+    assert Commands.getBroadcastListLength() == b'\x05'
@@ -0,0 +1,268 @@
+"""
+Tests for RP1210.pyrp1210bridge (PyRP1210Bridge, the python-can interface).
+
+These tests use a fake RP1210 DLL, so they don't need an adapter.
+"""
+import ctypes
+import threading
+import time
+import pytest
+import RP1210
+from RP1210 import pyrp1210bridge
+from RP1210.pyrp1210bridge import PyRP1210Bridge
+
+RP121032_PATH = "Test/test-files/RP121032.ini"
+DLL_DIRECTORY = "Test/test-files/dlls"
+INI_DIRECTORY = "Test/test-files/ini-files"
+
+class FakeCANDLL():
+    """
+    A fake RP1210 DLL for a CAN connection that supports blocking reads and CAN filters, and records
+    commands.
+    """
+    def __init__(self, support_blocking_timeout = True, max_filters = 16):
+        self.rx_queue = []
+        self.pass_all = False
+        self.filters = [] # (can_type, mask, header)
+        self.max_filters = max_filters
+        self.hw_dropped = 0
+        self.sent = []
+        self.commands = []
+        self.blocking_timeout = None # seconds; None = forever
+        self.support_blocking_timeout = support_blocking_timeout
+        self.read_threads = set()
+        self.cond = threading.Condition()
+        self.RP1210_ClientConnect = lambda *args: 1
+        self.RP1210_ClientDisconnect = self.disconnect
+        self.RP1210_SendMessage = lambda ClientID, msg, size, *args: self.sent.append(bytes(msg[:size])) or 0
+        self.RP1210_SendCommand = self.command
+        self.RP1210_ReadMessage = self.read
+
+    def disconnect(self, ClientID):
+        with self.cond:
+            self.cond.notify_all()
+        return 0
+
+    def command(self, CommandNumber, ClientID, ClientCommand, MessageSize):
+        self.commands.append((CommandNumber, bytes(ClientCommand[:MessageSize])))
+        if CommandNumber == 215:
+            if not self.support_blocking_timeout:
+                return 0x10000 - 143 # ERR_COMMAND_NOT_SUPPORTED
+            block1, block2 = ClientCommand[0], ClientCommand[1]
+            self.blocking_timeout = block1 * block2 / 1000 if block1 and block2 else None
+        elif CommandNumber == 3: # Set All Filter States to Pass
+            self.pass_all = True
+            self.filters = []
+        elif CommandNumber == 17: # Set All Filter States to Discard
+            self.pass_all = False
+            self.filters = []
+        elif CommandNumber == 5: # Set Message Filtering for CAN
+            if len(self.filters) >= self.max_filters:
+                return 0x10000 - 161 # ERR_MAX_FILTERS_EXCEEDED
+            self.pass_all = False
+            self.filters.append((ClientCommand[0], int.from_bytes(ClientCommand[1:5], 'big'),
+                                 int.from_bytes(ClientCommand[5:9], 'big')))
+        return 0
+
+    def read(self, ClientID, RxBuffer, BufferSize, BlockOnRead):
+        self.read_threads.add(threading.current_thread().name)
+        with self.cond:
+            if not self.rx_queue and BlockOnRead:
+                self.cond.wait_for(lambda: self.rx_queue, self.blocking_timeout)
+            if not self.rx_queue:
+                return 0x10000 - 142 if BlockOnRead else 0 # timed out; ERR_HARDWARE_NOT_RESPONDING
+            msg = self.rx_queue.pop(0)
+        ctypes.memmove(RxBuffer, msg, len(msg))
+        return len(msg)
+
+    def matches(self, message : bytes) -> bool:
+        can_type = message[4] & 0x01
+        can_id = int.from_bytes(message[5:9], 'big')
+        return self.pass_all or any(can_type == t and can_id & mask == header for t, mask, header in self.filters)
+
+    def inject(self, message : bytes):
+        if not self.matches(message):
+            self.hw_dropped += 1
+            return
+        with self.cond:
+            self.rx_queue.append(message)
+            self.cond.notify_all()
+
+@pytest.fixture
+def fake_dll(monkeypatch):
+    dll = FakeCANDLL()
+    RP1210Client = RP1210.RP1210Client
+    def make_client():
+        client = RP1210Client(RP121032_PATH, DLL_DIRECTORY, INI_DIRECTORY)
+        client.getAPI = lambda api=client.getAPI(): api
+        client.getAPI().dll = dll
+        return client
+    monkeypatch.setattr(pyrp1210bridge.RP1210, "RP1210Client", make_client)
+    return dll
+
+def can_frame(arbitration_id : int, data : bytes, timestamp = 0, flags = 0x01) -> bytes:
+    return timestamp.to_bytes(4, 'big') + bytes([flags]) + arbitration_id.to_bytes(4, 'big') + data
+
+def test_PyRP1210Bridge_invalid_args(fake_dll):
+    with pytest.raises(ValueError):
+        PyRP1210Bridge("NULN2R32", receive_mode="interrupt")
+    with pytest.raises(ValueError):
+        PyRP1210Bridge("NULN2R32", blocking_timeout=0)
+    with pytest.raises(ValueError):
+        PyRP1210Bridge("NULN2R32", timestamp_mode="adapter")
+
+@pytest.mark.parametrize("receive_mode", argvalues=["blocking", "poll"])
+def test_PyRP1210Bridge_recv(fake_dll, receive_mode):
+    bus = PyRP1210Bridge("NULN2R32:1", receive_mode=receive_mode, poll_interval=0.001, timestamp_mode="raw")
+    try:
+        assert bus.recv(timeout=0) is None
+        fake_dll.inject(can_frame(0x18FEF100, b'\x01\x02\x03', timestamp=1234))
+        fake_dll.inject(can_frame(0x123, b'', flags=0x00))
+        msg = bus.recv(timeout=1)
+        assert msg.arbitration_id == 0x18FEF100
+        assert msg.is_extended_id
+        assert msg.data == b'\x01\x02\x03'
+        assert msg.timestamp == 1234
+        msg = bus.recv(timeout=1)
+        assert msg.arbitration_id == 0x123
+        assert not msg.is_extended_id
+        assert msg.dlc == 0
+        assert bus.recv(timeout=0.01) is None
+    finally:
+        bus.shutdown()
+    if receive_mode == "blocking":
+        assert (215, b'\x64\x01') in fake_dll.commands # 100 ms blocking timeout
+        assert all(name.startswith("RxReader") for name in fake_dll.read_threads)
+    else:
+        assert not any(name.startswith("RxReader") for name in fake_dll.read_threads)
+
+def test_PyRP1210Bridge_host_timestamps(fake_dll):
+    bus = PyRP1210Bridge("NULN2R32:1")
+    try:
+        fake_dll.inject(can_frame(0x100, b'\x01', timestamp=0xFFFFF000))
+        first = bus.recv(timeout=1)
+        time.sleep(0.02) # received after it was sent, as far as the host is concerned
+        fake_dll.inject(can_frame(0x100, b'\x02', timestamp=0x00001000)) # 8192 us later; wrapped
+        second = bus.recv(timeout=1)
+        assert abs(first.timestamp - time.time()) < 1 # epoch time, like python-can's other interfaces
+        assert second.timestamp - first.timestamp == pytest.approx(8192e-6, abs=1e-6)
+    finally:
+        bus.shutdown()
+
+def test_PyRP1210Bridge_recv_wakes_immediately(fake_dll):
+    bus = PyRP1210Bridge("NULN2R32:1", poll_interval=1.0)
+    try:
+        threading.Timer(0.05, fake_dll.inject, [can_frame(0x100, b'\xAA')]).start()
+        start = time.monotonic()
+        msg = bus.recv(timeout=2)
+        assert msg.data == b'\xAA'
+        assert time.monotonic() - start < 0.5 # poll_interval is ignored in blocking mode
+    finally:
+        bus.shutdown()
+    assert not bus._reader
+
+def test_PyRP1210Bridge_blocking_timeout_unsupported(fake_dll):
+    fake_dll.support_blocking_timeout = False
+    bus = PyRP1210Bridge("NULN2R32:1", blocking_timeout=1000)
+    try:
+        assert bus._reader.blocking == 0 # falls back to non-blocking reads
+        fake_dll.inject(can_frame(0x100, b'\xBB'))
+        assert bus.recv(timeout=1).data == b'\xBB'
+    finally:
+        bus.shutdown()
+    assert (215, b'\xFA\x04') in fake_dll.commands # 250 * 4 ms = 1000 ms
+
+def test_PyRP1210Bridge_send(fake_dll):
+    import can
+    bus = PyRP1210Bridge("NULN2R32:1")
+    try:
+        bus.send(can.Message(arbitration_id=0x18FEF100, data=b'\x01\x02'))
+    finally:
+        bus.shutdown()
+    assert fake_dll.sent == [b'\x01\x18\xFE\xF1\x00\x01\x02']
+
+FILTER_FRAMES = [
+    can_frame(0x18FEF100, b'\x01', flags=0x01),
+    can_frame(0x18FEF200, b'\x02', flags=0x01),
+    can_frame(0x0CF00400, b'\x03', flags=0x01),
+    can_frame(0x100, b'\x04', flags=0x00),
+    can_frame(0x101, b'\x05', flags=0x00),
+    can_frame(0x7FF, b'\x06', flags=0x00),
+]
+
+def recv_all(bus) -> list[bytes]:
+    received = []
+    while True:
+        msg = bus.recv(timeout=0.05)
+        if msg is None:
+            return received
+        received.append(bytes(msg.data))
+
+@pytest.mark.parametrize("can_filters, hw_filters, expected", argvalues=[
+    (None, [], b'\x01\x02\x03\x04\x05\x06'),
+    ([{"can_id": 0x18FEF100, "can_mask": 0x1FFFFFFF, "extended": True}], [(1, 0x1FFFFFFF, 0x18FEF100)], b'\x01'),
+    ([{"can_id": 0x100, "can_mask": 0x7FF, "extended": False}], [(0, 0x7FF, 0x100)], b'\x04'),
+    ([{"can_id": 0x100, "can_mask": 0x7FE}], [(0, 0x7FE, 0x100), (1, 0x7FE, 0x100)], b'\x01\x04\x05'),
+    ([{"can_id": 0x00FEF000, "can_mask": 0x00FFF000}], [(1, 0x00FFF000, 0x00FEF000)], b'\x01\x02'),
+    ([{"can_id": 0x0CF00400, "can_mask": 0x1FFFFFFF, "extended": True},
+      {"can_id": 0x7FF, "can_mask": 0x7FF, "extended": False}],
+     [(1, 0x1FFFFFFF, 0x0CF00400), (0, 0x7FF, 0x7FF)], b'\x03\x06'),
+])
+@pytest.mark.parametrize("receive_mode", argvalues=["blocking", "poll"])
+def test_PyRP1210Bridge_hardware_filters(fake_dll, receive_mode, can_filters, hw_filters, expected):
+    bus = PyRP1210Bridge("NULN2R32:1", receive_mode=receive_mode, poll_interval=0.001, can_filters=can_filters)
+    try:
+        assert bus.hardware_filters == hw_filters
+        assert bus._is_filtered
+        for frame in FILTER_FRAMES:
+            fake_dll.inject(frame)
+        assert fake_dll.hw_dropped == 6 - len(expected)
+        assert b''.join(recv_all(bus)) == expected
+    finally:
+        bus.shutdown()
+
+def test_PyRP1210Bridge_hardware_filters_merged(fake_dll):
+    """If the adapter runs out of filters, they're merged into a broader one and checked in software."""
+    fake_dll.max_filters = 1
+    can_filters = [{"can_id": 0x18FEF100, "can_mask": 0x1FFFFFFF, "extended": True},
+                   {"can_id": 0x18FEF200, "can_mask": 0x1FFFFFFF, "extended": True}]
+    bus = PyRP1210Bridge("NULN2R32:1", can_filters=can_filters)
+    try:
+        assert not bus._is_filtered
+        assert bus.hardware_filters == [(1, 0x1FFFFCFF, 0x18FEF000)]
+        for frame in FILTER_FRAMES:
+            fake_dll.inject(frame)
+        assert fake_dll.hw_dropped == 4
+        assert recv_all(bus) == [b'\x01', b'\x02']
+        # back to pass-all if the merged filters don't fit either
+        bus.set_filters([{"can_id": 0x100, "can_mask": 0x7FF}])
+        assert not bus._is_filtered
+        assert fake_dll.pass_all
+        for frame in FILTER_FRAMES:
+            fake_dll.inject(frame)
+        assert recv_all(bus) == [b'\x01', b'\x04'] # 0x18FEF100 & 0x7FF == 0x100
+        # and removing filters passes everything
+        bus.set_filters(None)
+        assert bus._is_filtered
+        for frame in FILTER_FRAMES:
+            fake_dll.inject(frame)
+        assert len(recv_all(bus)) == 6
+    finally:
+        bus.shutdown()
+
+@pytest.mark.parametrize("receive_mode", argvalues=["blocking", "poll"])
+def test_PyRP1210Bridge_capture(fake_dll, receive_mode, tmp_path):
+    from RP1210.Capture import CaptureWriter, PROTOCOL_CAN, readCapture
+    writer = CaptureWriter(tmp_path / "capture.rpl")
+    bus = PyRP1210Bridge("NULN2R32:1", receive_mode=receive_mode, poll_interval=0.001,
+                         capture=writer, capture_channel=3)
+    try:
+        for frame in FILTER_FRAMES:
+            fake_dll.inject(frame)
+        assert len(recv_all(bus)) == 6
+    finally:
+        bus.shutdown()
+        writer.close()
+    records = list(readCapture(tmp_path / "capture.rpl"))
+    assert [record[3] for record in records] == FILTER_FRAMES
+    assert all(record[1:3] == (3, PROTOCOL_CAN) for record in records)
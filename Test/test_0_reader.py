@@ -0,0 +1,245 @@
+"""
+Tests for RP1210.Reader (RxRingBuffer, RxReader, RxBatch) and the batch/background reading functions
+in RP1210API and RP1210Client.
+
+These tests feed messages through a fake RP1210_ReadMessage, so they don't need an adapter.
+"""
+import ctypes
+import time
+from types import SimpleNamespace
+import pytest
+import RP1210
+from RP1210.Reader import RxBatch, RxRingBuffer, RxReader
+
+RP121032_PATH = "Test/test-files/RP121032.ini"
+DLL_DIRECTORY = "Test/test-files/dlls"
+INI_DIRECTORY = "Test/test-files/ini-files"
+
+class FakeAPI():
+    """Stands in for RP1210API.ReadMessage; returns queued messages, then 0 (no message)."""
+    def __init__(self, messages = None):
+        self.messages = list(messages or [])
+        self.reads = 0
+
+    def ReadMessage(self, ClientID, RxBuffer, BufferSize = 0, BlockOnRead = 0):
+        self.reads += 1
+        if not self.messages:
+            return 0
+        msg = self.messages.pop(0)
+        if isinstance(msg, int): # error code
+            return -msg
+        ctypes.memmove(RxBuffer, msg, len(msg))
+        return len(msg)
+
+def fake_dll(messages):
+    """Returns a fake DLL whose RP1210_ReadMessage returns queued messages like the real thing."""
+    messages = list(messages)
+    def RP1210_ReadMessage(ClientID, RxBuffer, BufferSize, BlockOnRead):
+        if not messages:
+            return 0
+        msg = messages.pop(0)
+        if isinstance(msg, int): # error code, returned as 16-bit 2's complement
+            return 0x10000 - msg
+        ctypes.memmove(RxBuffer, msg, len(msg))
+        return len(msg)
+    return SimpleNamespace(RP1210_ReadMessage=RP1210_ReadMessage, messages=messages)
+
+def wait_for(condition, timeout = 2.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.001)
+    return condition()
+
+def test_RxRingBuffer_invalid_args():
+    with pytest.raises(ValueError):
+        RxRingBuffer(capacity=0)
+    with pytest.raises(ValueError):
+        RxRingBuffer(slot_size=0)
+    with pytest.raises(ValueError):
+        RxRingBuffer(overflow="drop-everything")
+
+def test_RxRingBuffer_fifo():
+    ring = RxRingBuffer(capacity=4, slot_size=16)
+    assert not ring
+    assert ring.get() == b''
+    assert ring.getMany() == []
+    for x in range(3):
+        assert ring.put(bytes([x]) * (x + 1))
+    assert len(ring) == 3
+    assert ring.get() == b'\x00'
+    assert ring.getMany() == [b'\x01\x01', b'\x02\x02\x02']
+    assert not ring
+    assert ring.received == 3
+    assert ring.dropped == 0
+
+def test_RxRingBuffer_wraparound():
+    ring = RxRingBuffer(capacity=3, slot_size=8)
+    for x in range(20):
+        assert ring.put(x.to_bytes(2, 'big'))
+        assert ring.get() == x.to_bytes(2, 'big')
+    assert ring.received == 20
+
+def test_RxRingBuffer_truncates_long_messages():
+    ring = RxRingBuffer(capacity=2, slot_size=4)
+    ring.put(b'\x01\x02\x03\x04\x05\x06')
+    assert ring.get() == b'\x01\x02\x03\x04'
+
+def test_RxRingBuffer_getMany_max_count():
+    ring = RxRingBuffer(capacity=8, slot_size=4)
+    for x in range(5):
+        ring.put(bytes([x]))
+    assert ring.getMany(2) == [b'\x00', b'\x01']
+    assert ring.getMany(0) == [b'\x02', b'\x03', b'\x04']
+
+def test_RxRingBuffer_drop_oldest():
+    ring = RxRingBuffer(capacity=3, slot_size=4, overflow="drop-oldest")
+    for x in range(5):
+        assert ring.put(bytes([x]))
+    assert ring.dropped == 2
+    assert ring.received == 5
+    assert ring.getMany() == [b'\x02', b'\x03', b'\x04']
+
+def test_RxRingBuffer_drop_newest():
+    ring = RxRingBuffer(capacity=3, slot_size=4, overflow="drop-newest")
+    results = [ring.put(bytes([x])) for x in range(5)]
+    assert results == [True, True, True, False, False]
+    assert ring.dropped == 2
+    assert ring.received == 3
+    assert ring.getMany() == [b'\x00', b'\x01', b'\x02']
+
+def test_RxRingBuffer_block():
+    ring = RxRingBuffer(capacity=2, slot_size=4, overflow="block")
+    assert ring.put(b'\x00')
+    assert ring.put(b'\x01')
+    assert ring.claim(timeout=0.01) is None
+    assert not ring.put(b'\x02', timeout=0.01)
+    assert ring.dropped == 1
+    assert ring.get() == b'\x00'
+    assert ring.put(b'\x03')
+    assert ring.getMany() == [b'\x01', b'\x03']
+
+def test_RxRingBuffer_get_blocking_timeout():
+    ring = RxRingBuffer(capacity=2, slot_size=4)
+    start = time.monotonic()
+    assert ring.get(block=True, timeout=0.05) == b''
+    assert time.monotonic() - start >= 0.04
+
+def test_RxRingBuffer_clear_and_errors():
+    ring = RxRingBuffer(capacity=4, slot_size=4)
+    ring.put(b'\x01')
+    ring.clear()
+    assert not ring
+    assert ring.dropped == 0
+    ring.putError(139)
+    assert ring.errors == 1
+    assert ring.last_error == 139
+
+def test_RxReader_reads_into_ring():
+    messages = [bytes([x]) * 10 for x in range(50)]
+    api = FakeAPI(messages + [139]) # finish with ERR_RX_QUEUE_FULL
+    reader = RxReader(api, 0, RxRingBuffer(capacity=64, slot_size=32))
+    reader.start()
+    assert reader.isRunning()
+    assert wait_for(lambda: reader.ring.errors == 1)
+    reader.stop()
+    assert not reader.isRunning()
+    assert reader.ring.getMany() == [bytes([x]) * 10 for x in range(50)]
+    assert reader.ring.last_error == 139
+
+def test_RxReader_drop_newest_keeps_draining():
+    api = FakeAPI([bytes([x]) for x in range(10)])
+    reader = RxReader(api, 0, RxRingBuffer(capacity=4, slot_size=8, overflow="drop-newest"))
+    reader.start()
+    assert wait_for(lambda: reader.ring.dropped == 6)
+    reader.stop()
+    assert not api.messages # adapter queue was still drained
+    assert reader.ring.getMany() == [b'\x00', b'\x01', b'\x02', b'\x03']
+
+def test_RP1210Client_startReader():
+    client = RP1210.RP1210Client(RP121032_PATH, DLL_DIRECTORY, INI_DIRECTORY)
+    client.clientID = 0
+    api = FakeAPI([b'\x00\x00\x00\x01' + b'\xAA' * 8, b'\x00\x00\x00\x02' + b'\xBB' * 8])
+    client.getAPI = lambda: api
+    assert client.getReader() is None
+    reader = client.startReader(capacity=16, overflow="drop-newest")
+    assert client.getReader() is reader
+    assert wait_for(lambda: reader.ring.received == 2)
+    assert client.rx() == b'\x00\x00\x00\x01' + b'\xAA' * 8
+    assert client.rxMany() == [b'\x00\x00\x00\x02' + b'\xBB' * 8]
+    assert client.rx() == b''
+    client.stopReader()
+    assert client.getReader() is None
+    assert not reader.isRunning()
+
+def test_RxBatch_invalid_args():
+    with pytest.raises(ValueError):
+        RxBatch(0)
+    with pytest.raises(ValueError):
+        RxBatch(4, 0)
+
+def test_RP1210API_ReadMany():
+    messages = [x.to_bytes(4, 'big') + bytes([x]) * (x % 9) for x in range(10)]
+    api = RP1210.RP1210API("FAKE")
+    api.dll = fake_dll(messages)
+    batch = api.ReadMany(0, MaxMessages=4, BufferSize=32)
+    assert len(batch) == batch.count == 4
+    assert batch.error == 0
+    assert [bytes(msg) for msg in batch] == messages[:4]
+    assert bytes(batch[-1]) == messages[3]
+    with pytest.raises(IndexError):
+        batch[4]
+    # reuse batch; offsets are fixed, lengths vary
+    assert api.ReadMany(0, Batch=batch) is batch
+    assert batch.toList() == messages[4:8]
+    assert list(batch.offsets) == [0, 32, 64, 96]
+    assert list(batch.lengths) == [len(msg) for msg in messages[4:8]]
+    # read until empty
+    assert api.ReadMany(0, Batch=batch).toList() == messages[8:]
+    assert not api.ReadMany(0, Batch=batch)
+
+def test_RP1210API_ReadMany_error():
+    api = RP1210.RP1210API("FAKE")
+    api.dll = fake_dll([b'\x00\x00\x00\x01\xAA', 139, b'\x00\x00\x00\x02\xBB'])
+    batch = api.ReadMany(0)
+    assert batch.toList() == [b'\x00\x00\x00\x01\xAA']
+    assert batch.error == 139
+    assert api.ReadMany(0, Batch=batch).toList() == [b'\x00\x00\x00\x02\xBB']
+    assert batch.error == 0
+
+def test_RP1210Client_rxBatch_rxMany():
+    client = RP1210.RP1210Client(RP121032_PATH, DLL_DIRECTORY, INI_DIRECTORY)
+    client.clientID = 0
+    messages = [bytes([x]) * 12 for x in range(100)]
+    client.getAPI().dll = fake_dll(messages)
+    batch = client.rxBatch(10)
+    assert batch.toList() == messages[:10]
+    assert client.rxBatch(batch=batch).toList() == messages[10:20]
+    assert client.rxMany(5) == messages[20:25]
+    assert client.rxMany() == messages[25:89]
+    assert client.rxMany() == messages[89:]
+    assert client.rxMany() == []
+
+def test_RP1210API_ReadMessage_bytearray():
+    api = RP1210.RP1210API("FAKE")
+    api.dll = fake_dll([b'\x00\x00\x00\x01\xAA\xBB'])
+    buffer = bytearray(16)
+    assert api.ReadMessage(0, buffer) == 6
+    assert buffer[:6] == b'\x00\x00\x00\x01\xAA\xBB'
+
+def test_RP1210Client_rxInto():
+    client = RP1210.RP1210Client(RP121032_PATH, DLL_DIRECTORY, INI_DIRECTORY)
+    client.clientID = 0
+    j1939_msg = b'\x00\x00\x00\x07' + b'\xCA\xFE\x00\x06\x12\xFF' + b'\x01\x02\x03\x04'
+    client.getAPI().dll = fake_dll([j1939_msg, b'\x00\x00\x00\x08\xBB', 139])
+    buffer = bytearray(256)
+    view = client.rxInto(buffer)
+    assert isinstance(view, memoryview)
+    assert view.obj is buffer # zero-copy
+    assert view == j1939_msg
+    msg = RP1210.J1939.J1939Message(view)
+    assert msg.pgn == 0xFECA
+    assert msg.sa == 0x12
+    assert msg.data == b'\x01\x02\x03\x04'
+    assert client.rxInto(buffer) == b'\x00\x00\x00\x08\xBB'
+    assert client.rxInto(buffer) == b'' # error
+    assert client.rxInto(buffer) == b'' # no message
@@ -0,0 +1,168 @@
+"""
+Tests for RP1210.Replay (ReplayEngine).
+"""
+import time
+import pytest
+from RP1210.Capture import PROTOCOL_CAN, PROTOCOL_ECHO, PROTOCOL_J1939, CaptureReader, CaptureWriter
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.Replay import REPLAY_ASAP, ReplayEngine
+from utilities import FakeClock, Recorder
+
+def fake_timed(speed = 1.0, **kwargs) -> tuple:
+    """Returns (ReplayEngine, Recorder) running on a FakeClock, so timing is exact."""
+    clock = FakeClock(1000.0)
+    tx = Recorder(clock=clock)
+    return ReplayEngine(tx, speed=speed, clock=clock, sleep=clock.sleep, spin=0, **kwargs), tx
+
+def j1939(pgn, sa, data = bytes(8), timestamp = 0) -> bytes:
+    return timestamp.to_bytes(4, 'big') + toJ1939Message(pgn, 6, sa, 0xFF, data, len(data))
+
+def write_capture(path) -> list[tuple]:
+    """Writes 30 messages 10 ms apart, alternating between channels 0 and 1; returns (time, channel, message) for each."""
+    clock = FakeClock(1000.0)
+    written = []
+    with CaptureWriter(path, block_records=8, clock=clock) as writer:
+        for i in range(30):
+            clock.now = 1000.0 + i * 0.01
+            msg = j1939(0xF004 if i % 3 else 0xFEF1, 0x00, data=bytes([i]) * 8, timestamp=i)
+            writer.write(msg, channel=i % 2)
+            written.append((clock.now, i % 2, msg))
+    return written
+
+def test_ReplayEngine_capture(tmp_path):
+    path = tmp_path / "capture.rpl"
+    written = write_capture(path)
+    tx = Recorder()
+    replay = ReplayEngine(tx, speed=REPLAY_ASAP, chunk_size=7)
+    assert replay.play(path) == 30
+    assert [message for _, message in tx.calls] == [msg[4:] for _, _, msg in written]
+    assert replay.sent == 30
+    # filters
+    tx.calls.clear()
+    with CaptureReader(path) as capture:
+        assert replay.play(capture, channel=1, pgn=0xF004) == 10
+    assert [message for _, message in tx.calls] == \
+        [msg[4:] for _, channel, msg in written if channel == 1 and J1939Message(msg).pgn == 0xF004]
+    assert replay.sent == 40
+
+def test_ReplayEngine_capture_echo_and_can(tmp_path):
+    path = tmp_path / "capture.rpl"
+    echoed = j1939(0xF004, 0x00)
+    echoed = echoed[:4] + b'\x01' + echoed[4:]
+    can = b'\x00\x00\x00\x05' + b'\x01' + (0x18FEF100).to_bytes(4, 'big') + b'\xAA\xBB'
+    with CaptureWriter(path) as writer:
+        writer.write(echoed, protocol=PROTOCOL_J1939 | PROTOCOL_ECHO, timestamp=1.0)
+        writer.write(can, channel=1, protocol=PROTOCOL_CAN, timestamp=1.0)
+    tx = Recorder()
+    ReplayEngine(tx, speed=REPLAY_ASAP).play(path)
+    assert [message for _, message in tx.calls] == [echoed[5:], can[4:]]
+
+def test_ReplayEngine_iterables():
+    tx = Recorder()
+    replay = ReplayEngine(tx, speed=REPLAY_ASAP, chunk_size=2)
+    messages = [J1939Message(j1939(0xF004, sa, timestamp=0xFFFFFFF0 + sa)) for sa in range(5)]
+    assert replay.play(messages) == 5
+    assert [message for _, message in tx.calls] == [msg.msg for msg in messages]
+    tx.calls.clear()
+    assert replay.play(iter([(0.0, b'\x01'), (0.001, b'\x02')])) == 2
+    assert [message for _, message in tx.calls] == [b'\x01', b'\x02']
+    assert replay.play([]) == 0
+    with pytest.raises(ValueError):
+        replay.play(messages, channel=1)
+
+@pytest.mark.parametrize("speed", argvalues=[1.0, 4.0])
+def test_ReplayEngine_timing(speed):
+    replay, tx = fake_timed(speed, chunk_size=4)
+    frames = [(100.0 + i * 0.02, bytes([i])) for i in range(15)]
+    replay.play(frames)
+    start = tx.calls[0][0]
+    offsets = [sent - start for sent, _ in tx.calls]
+    assert offsets == pytest.approx([i * 0.02 / speed for i in range(15)], abs=1e-9)
+    assert replay.resyncs == 0
+    assert replay.worst_lag == 0.0
+
+def test_ReplayEngine_J1939Message_weight():
+    """J1939Message timestamps are in ticks of `weight` microseconds."""
+    replay, tx = fake_timed(weight=1000) # 1 ms ticks
+    replay.play([J1939Message(j1939(0xF004, 0x00, timestamp=ticks)) for ticks in (0, 10, 30)])
+    start = tx.calls[0][0]
+    assert [sent - start for sent, _ in tx.calls] == pytest.approx([0.0, 0.01, 0.03], abs=1e-9)
+
+def test_ReplayEngine_max_lag():
+    """tx blocks for 50 ms once; the schedule moves back instead of sending the backlog all at once."""
+    clock = FakeClock(1000.0)
+    sent = []
+    def tx(message):
+        sent.append(clock())
+        if message[0] == 3:
+            clock.now += 0.05
+    frames = [(i * 0.005, bytes([i])) for i in range(10)]
+    replay = ReplayEngine(tx, max_lag=0.01, clock=clock, sleep=clock.sleep, spin=0)
+    replay.play(frames)
+    assert replay.resyncs == 1
+    assert replay.worst_lag == pytest.approx(0.045)
+    gaps = [b - a for a, b in zip(sent[4:], sent[5:])]
+    assert gaps == pytest.approx([0.005] * 5, abs=1e-9)
+    # without max_lag, it catches up by sending the late ones right away
+    sent.clear()
+    replay = ReplayEngine(tx, max_lag=None, clock=clock, sleep=clock.sleep, spin=0)
+    replay.play(frames)
+    assert replay.resyncs == 0
+    assert sent[9] == sent[4]
+
+def test_ReplayEngine_tx_errors():
+    replay = ReplayEngine(Recorder(result=-129), speed=REPLAY_ASAP)
+    replay.play([(0.0, b'\x01'), (0.0, b'\x02')])
+    assert replay.tx_errors == 2
+    assert replay.sent == 2
+
+def test_ReplayEngine_thread():
+    tx = Recorder()
+    replay = ReplayEngine(tx)
+    replay.start([(i * 0.01, bytes([i])) for i in range(100)])
+    assert replay.isRunning()
+    time.sleep(0.05)
+    replay.stop()
+    assert not replay.isRunning()
+    assert 0 < replay.sent < 100
+    sent = replay.sent
+    time.sleep(0.03)
+    assert len(tx.calls) == sent
+    # runs to the end
+    replay.start([(i * 0.001, bytes([i])) for i in range(10)])
+    assert replay.wait(1.0)
+    assert replay.sent == sent + 10
+
+def test_ReplayEngine_stop_while_waiting():
+    """stop() doesn't wait for the next message to be due, and nothing is sent after it returns."""
+    tx = Recorder()
+    replay = ReplayEngine(tx)
+    replay.start([(0.0, b'a'), (3.0, b'b')])
+    while not tx.calls:
+        time.sleep(0.001)
+    start = time.monotonic()
+    replay.stop(timeout=0.5)
+    assert time.monotonic() - start < 0.4
+    assert not replay.isRunning()
+    replay.start([(0.0, b'c')])
+    assert replay.wait(1.0)
+    assert [message for _, message in tx.calls] == [b'a', b'c']
+
+def test_ReplayEngine_stop_timeout():
+    """If tx is stuck, stop() times out but the engine still knows it's running, and start() waits for it."""
+    tx = Recorder(delay=0.2)
+    replay = ReplayEngine(tx)
+    replay.start([(0.0, b'a'), (0.0, b'b')])
+    while not tx.calls:
+        time.sleep(0.001)
+    replay.stop(timeout=0.01)
+    assert replay.isRunning()
+    replay.start([(0.0, b'c')])
+    assert replay.wait(1.0)
+    assert [message for _, message in tx.calls] == [b'a', b'c']
+
+def test_ReplayEngine_invalid_args():
+    with pytest.raises(ValueError):
+        ReplayEngine(Recorder(), speed=-1)
+    with pytest.raises(ValueError):
+        ReplayEngine(Recorder(), chunk_size=0)
@@ -175,6 +175,58 @@ def test_sanitize_msg_param_typeerror():
         sanitize_msg_param(RP1210.RP1210VendorList())
         sanitize_msg_param(CDLL())
 
+def _sanitize_msg_param_reference(param, num_bytes : int = 0, byteorder : str = 'big') -> bytes:
+    """The original, recursive sanitize_msg_param(); the current one must give the same output."""
+    if param is None:
+        param = b''
+    if isinstance(param, int):
+        if num_bytes == 0:
+            num_bytes = (param.bit_length() + 7) // 8
+            if param == 0:
+                num_bytes = 1
+        return param.to_bytes(num_bytes, byteorder)
+    elif isinstance(param, str):
+        if param == "":
+            return b'' + b'\x00' * num_bytes
+        return _sanitize_msg_param_reference(str.encode(param, 'utf8'), num_bytes, byteorder)
+    elif isinstance(param, bytes):
+        if num_bytes == 0:
+            if param == b'':
+                return b''
+            num_bytes = len(param)
+        if byteorder == 'little':
+            param2 = param[::-1]
+        else:
+            param2 = param
+        val = int.from_bytes(param2[:num_bytes], byteorder)
+        return _sanitize_msg_param_reference(val, num_bytes, byteorder)
+    elif isinstance(param, float):
+        return _sanitize_msg_param_reference(int(param), num_bytes, byteorder)
+    else:
+        try:
+            return _sanitize_msg_param_reference(bytes(param), num_bytes, byteorder)
+        except Exception:
+            raise TypeError('Invalid type used for sanitize_msg_param():', param)
+
+@pytest.mark.parametrize("param", argvalues=[
+    None, 0, 1, 0xFF, 0x100, 0xDEADBEEF, 2**70, True, False, 0.0, 3.9, 255.5,
+    b'', b'\x00', b'\x01\x02\x03', b'\x00\x00\xAB', bytes(range(20)),
+    bytearray(b'\x01\x02'), memoryview(b'\x0A\x0B\x0C'), [1, 2, 3], (0xFE,),
+    "", "0", "Boogity", "\u00e9",
+])
+@pytest.mark.parametrize("num_bytes", argvalues=[0, 1, 2, 3, 4, 8, 25])
+@pytest.mark.parametrize("byteorder", argvalues=['big', 'little'])
+def test_sanitize_msg_param_matches_reference(param, num_bytes, byteorder):
+    try:
+        expected = _sanitize_msg_param_reference(param, num_bytes, byteorder)
+    except Exception as e:
+        with pytest.raises(type(e)):
+            sanitize_msg_param(param, num_bytes, byteorder)
+        return
+    result = sanitize_msg_param(param, num_bytes, byteorder)
+    assert type(result) is bytes
+    assert result == expected
+
 def test_rp1210client_populate_logic():
     """Tests whether RP1210Client recognizes relevant drivers when adapter is disconnected."""
     vendors = []
@@ -344,6 +396,13 @@ class Test_getAPINames:
     def test_getAPINames_default(self):
         assert ['PEAKRP32', 'DLAUSB32', 'NULN2R32', 'DG121032', 'VRP32'] == RP1210.getAPINames()
 
+    def test_getAPINames_no_windir(self, monkeypatch, tmp_path):
+        """without WINDIR, it doesn't fall back to RP121032.ini in the current directory"""
+        monkeypatch.delenv("WINDIR", raising=False)
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "RP121032.ini").write_text("[RP1210Support]\nAPIImplementations=STRAY32\n")
+        assert [] == RP1210.getAPINames()
+
 def test_delete_files():
     """Deletes the files created by other tests."""
     assert os.path.exists("getAPINames_empty.ini")
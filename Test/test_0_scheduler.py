@@ -0,0 +1,231 @@
+"""
+Tests for RP1210.Scheduler (CyclicScheduler).
+"""
+import threading
+import time
+import pytest
+from RP1210 import Commands
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.Scheduler import BROADCAST_FOR_CAN, BROADCAST_FOR_J1939, CyclicScheduler
+from utilities import FakeClock, Recorder
+
+def run(scheduler : CyclicScheduler, clock : FakeClock, until : float, step : float = 0.001) -> None:
+    """Polls scheduler with a fake clock, in steps."""
+    while clock.now < until + 1e-9:
+        scheduler.poll()
+        clock.now = round(clock.now + step, 6)
+
+def test_CyclicScheduler_periods():
+    clock = FakeClock(1000.0)
+    tx = Recorder(clock)
+    scheduler = CyclicScheduler(tx, clock=clock)
+    fast = scheduler.addJ1939(0xF004, bytes(8), 0.01, sa=0x00)
+    slow = scheduler.addJ1939(0xFEF1, bytes(8), 0.1, sa=0x00, offset=0.005)
+    assert len(scheduler) == 2
+    assert (0xF004, 0x00, 0xFF) in scheduler
+    assert scheduler[(0xFEF1, 0x00, 0xFF)] is slow
+    run(scheduler, clock, 1001.0)
+    assert fast.sent == 101 # at 0 ms, 10 ms, ... 1000 ms
+    assert slow.sent == 10
+    assert fast.message == toJ1939Message(0xF004, 6, 0x00, 0xFF, bytes(8))
+    times = [t for t, msg in tx.calls if J1939Message(b'\x00' * 4 + msg).pgn == 0xF004]
+    assert times == pytest.approx([1000.0 + i * 0.01 for i in range(101)], abs=1e-6)
+    assert fast.jitter_max == pytest.approx(0.0, abs=1e-6)
+
+def test_CyclicScheduler_poll_returns_wait():
+    clock = FakeClock(1000.0)
+    scheduler = CyclicScheduler(Recorder(clock), clock=clock)
+    assert scheduler.poll() is None
+    scheduler.add("a", b'\x01', 0.05, offset=0.02)
+    assert scheduler.poll() == pytest.approx(0.02)
+    clock.now += 0.02
+    assert scheduler.poll() == pytest.approx(0.05)
+
+def test_CyclicScheduler_update():
+    clock = FakeClock(1000.0)
+    tx = Recorder(clock)
+    scheduler = CyclicScheduler(tx, clock=clock)
+    scheduler.addJ1939(0xF004, bytes(8), 0.01, sa=0x00)
+    scheduler.add("raw", b'\x01\x02', 0.01)
+    run(scheduler, clock, 1000.015)
+    scheduler.update((0xF004, 0x00, 0xFF), b'\xAA' * 8)
+    scheduler.update("raw", b'\x03')
+    assert scheduler[(0xF004, 0x00, 0xFF)].due == pytest.approx(1000.02) # schedule didn't change
+    run(scheduler, clock, 1000.02)
+    assert tx.calls[-2][1] == toJ1939Message(0xF004, 6, 0x00, 0xFF, b'\xAA' * 8)
+    assert tx.calls[-1][1] == b'\x03'
+    with pytest.raises(KeyError):
+        scheduler.update("nope", b'')
+
+def test_CyclicScheduler_remove_and_setPeriod():
+    clock = FakeClock(1000.0)
+    tx = Recorder(clock)
+    scheduler = CyclicScheduler(tx, clock=clock)
+    a = scheduler.add("a", b'\x01', 0.01)
+    b = scheduler.add("b", b'\x02', 0.01)
+    run(scheduler, clock, 1000.005)
+    scheduler.remove("b")
+    scheduler.remove("b") # already gone
+    scheduler.setPeriod("a", 0.1)
+    assert a.due == pytest.approx(1000.1)
+    run(scheduler, clock, 1000.2)
+    assert a.sent == 3
+    assert b.sent == 1
+    # adding with the same key replaces it
+    c = scheduler.add("a", b'\x03', 0.05)
+    run(scheduler, clock, 1000.301)
+    assert a.sent == 3
+    assert c.sent == 3
+    scheduler.clear()
+    assert len(scheduler) == 0
+    assert scheduler.poll() is None
+
+def test_CyclicScheduler_missed_and_stats():
+    clock = FakeClock(1000.0)
+    def slow_tx(message):
+        clock.now += 0.035 if message == b'\x01' else 0.001
+    scheduler = CyclicScheduler(slow_tx, clock=clock)
+    entry = scheduler.add("a", b'\x01', 0.01)
+    scheduler.poll()
+    assert entry.sent == 1
+    assert entry.missed == 3 # due at 10, 20 and 30 ms, but tx took 35 ms
+    assert entry.due == pytest.approx(1000.04)
+    clock.now = 1000.042
+    scheduler.poll()
+    assert entry.jitter_max == pytest.approx(0.002)
+    assert entry.jitter_mean == pytest.approx(0.001)
+    assert entry.jitter_stdev > 0
+    entry.resetStats()
+    assert (entry.sent, entry.missed, entry.jitter_max) == (0, 0, 0.0)
+
+def test_CyclicScheduler_tx_errors():
+    clock = FakeClock(1000.0)
+    scheduler = CyclicScheduler(Recorder(clock, result=131), clock=clock)
+    entry = scheduler.add("a", b'\x01', 0.01)
+    run(scheduler, clock, 1000.02)
+    assert entry.tx_errors == entry.sent == 3
+
+def test_CyclicScheduler_changes_during_tx():
+    """tx is called without the lock, so changes from other threads don't wait for a slow adapter."""
+    clock = FakeClock(1000.0)
+    entered, release = threading.Event(), threading.Event()
+    tx = Recorder(clock)
+    def slow_tx(message):
+        entered.set()
+        release.wait(2)
+        return tx(message)
+    scheduler = CyclicScheduler(slow_tx, clock=clock)
+    a = scheduler.add("a", b'\x01', 0.01)
+    scheduler.add("c", b'\x03', 0.01)
+    thread = threading.Thread(target=scheduler.poll)
+    thread.start()
+    assert entered.wait(1)
+    start = time.monotonic()
+    scheduler.add("b", b'\x02', 0.01, offset=0.005)
+    scheduler.update("a", b'\x11')
+    scheduler.setPeriod("a", 0.02)
+    scheduler.remove("c")
+    assert time.monotonic() - start < 0.5
+    release.set()
+    thread.join()
+    assert [msg for _, msg in tx.calls] == [b'\x01'] # c was removed while a was being sent
+    assert a.due == pytest.approx(1000.02) # one new period after the send it was in the middle of
+    run(scheduler, clock, 1000.02)
+    assert [msg for _, msg in tx.calls] == [b'\x01', b'\x02', b'\x02', b'\x11']
+
+def test_CyclicScheduler_thread():
+    # real time, so only checks what holds however busy the machine is; the timing itself is
+    # checked with a fake clock above
+    tx = Recorder()
+    scheduler = CyclicScheduler(tx)
+    scheduler.start()
+    assert scheduler.isRunning()
+    added = time.monotonic()
+    scheduler.add("a", b'\x01', 0.01)
+    scheduler.add("b", b'\x02', 0.02, offset=0.005)
+    a, b = scheduler["a"], scheduler["b"]
+    deadline = time.monotonic() + 5
+    while (a.sent < 10 or b.sent < 3) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    assert not scheduler.isRunning()
+    assert a.sent >= 10 and b.sent >= 3
+    times = [t for t, msg in tx.calls if msg == b'\x01']
+    assert all(t >= added + i * 0.01 for i, t in enumerate(times)) # never early
+    count = len(tx.calls)
+    time.sleep(0.03)
+    assert len(tx.calls) == count
+
+def test_CyclicScheduler_stop_timeout():
+    """If tx is stuck, stop() times out but the scheduler still knows it's running, and start() waits for it."""
+    entered, release = threading.Event(), threading.Event()
+    tx = Recorder()
+    def stuck_tx(message):
+        entered.set()
+        release.wait(5)
+        return tx(message)
+    scheduler = CyclicScheduler(stuck_tx)
+    scheduler.add("a", b'\x01', 0.01)
+    scheduler.start()
+    assert entered.wait(1)
+    scheduler.stop(timeout=0.01)
+    assert scheduler.isRunning()
+    threading.Timer(0.05, release.set).start()
+    scheduler.start()
+    assert [thread.name for thread in threading.enumerate()].count("CyclicScheduler") == 1
+    scheduler.stop()
+    assert not scheduler.isRunning()
+    assert tx.calls
+
+def test_CyclicScheduler_hardware():
+    clock = FakeClock(1000.0)
+    tx = Recorder(clock)
+    command = Recorder(clock)
+    scheduler = CyclicScheduler(tx, broadcast=command, clock=clock)
+    eec1 = scheduler.addJ1939(0xF004, bytes(8), 0.01, sa=0x00, hardware=True)
+    scheduler.addJ1939(0xFEF1, bytes(8), 0.1, sa=0x00, hardware=True)
+    scheduler.add("soft", b'\x01', 0.01)
+    eec1_entry = Commands.broadcastEntry(toJ1939Message(0xF004, 6, 0x00, 0xFF, bytes(8)), 10)
+    ccvs_entry = Commands.broadcastEntry(toJ1939Message(0xFEF1, 6, 0x00, 0xFF, bytes(8)), 100)
+    assert [call[1:3] for call in command.calls] == [(BROADCAST_FOR_J1939, Commands.addBroadcastList([eec1_entry])),
+                                                     (BROADCAST_FOR_J1939, Commands.addBroadcastList([ccvs_entry]))]
+    run(scheduler, clock, 1000.1)
+    assert {msg for _, msg in tx.calls} == {b'\x01'} # the adapter sends the others
+    assert eec1.hardware and eec1.sent == 0
+    # only the changed message is removed and added again
+    command.calls.clear()
+    scheduler.update((0xF004, 0x00, 0xFF), b'\xAA' * 8)
+    eec1_entry = Commands.broadcastEntry(toJ1939Message(0xF004, 6, 0x00, 0xFF, b'\xAA' * 8), 10)
+    assert [call[2] for call in command.calls] == [Commands.removeBroadcastEntry(0), Commands.addBroadcastList([eec1_entry])]
+    assert [entry[0] for entry in scheduler.broadcast_list.entries] == [(0xFEF1, 0x00, 0xFF), (0xF004, 0x00, 0xFF)]
+    command.calls.clear()
+    scheduler.setPeriod((0xFEF1, 0x00, 0xFF), 0.2)
+    scheduler.remove((0xF004, 0x00, 0xFF))
+    assert [call[2] for call in command.calls] == [
+        Commands.removeBroadcastEntry(0),
+        Commands.addBroadcastList([Commands.broadcastEntry(toJ1939Message(0xFEF1, 6, 0x00, 0xFF, bytes(8)), 200)]),
+        Commands.removeBroadcastEntry(0)]
+    assert scheduler.broadcast_errors == 0
+
+def test_CyclicScheduler_hardware_fallback():
+    clock = FakeClock(1000.0)
+    tx = Recorder(clock)
+    scheduler = CyclicScheduler(tx, broadcast=Recorder(clock, result=134), broadcast_command=BROADCAST_FOR_CAN,
+                                clock=clock)
+    entry = scheduler.add("can", b'\x01\x18\xFE\xF1\x00\xAA', 0.01, hardware=True)
+    assert not entry.hardware
+    assert scheduler.broadcast_errors == 1
+    run(scheduler, clock, 1000.02)
+    assert entry.sent == 3
+
+def test_CyclicScheduler_invalid_args():
+    scheduler = CyclicScheduler(Recorder())
+    with pytest.raises(ValueError):
+        scheduler.add("a", b'\x01', 0)
+    with pytest.raises(ValueError):
+        scheduler.add("a", b'\x01', 0.01, hardware=True) # no broadcast function
+    scheduler.add("a", b'\x01', 0.01)
+    with pytest.raises(ValueError):
+        scheduler.setPeriod("a", -1)
+    with pytest.raises(KeyError):
+        scheduler.setPeriod("b", 1)
@@ -0,0 +1,248 @@
+"""
+Tests for RP1210.Simulator (SimulatedDLL, VirtualBus, SimulatedConfig).
+"""
+import ctypes
+import time
+import pytest
+from RP1210 import RP1210API, RP1210Client
+from RP1210.Broadcast import BROADCAST_FOR_J1939, BroadcastListManager
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.Scheduler import CyclicScheduler
+from RP1210.Simulator import SIMULATOR_API_NAME, SimulatedConfig, SimulatedDLL, VirtualBus, simulatedClient
+from utilities import FakeClock
+
+def eec1(data = bytes(8), sa = 0x00) -> bytes:
+    return toJ1939Message(0xF004, 3, sa, 0xFF, data)
+
+def connected(dll : SimulatedDLL, protocol = b"J1939:Baud=Auto") -> RP1210Client:
+    client = simulatedClient(dll)
+    assert client.connect(protocol) < 128
+    return client
+
+def test_SimulatedConfig():
+    config = SimulatedConfig()
+    assert config.isValid()
+    assert config.getAPIName() == SIMULATOR_API_NAME
+    assert config.getTimeStampWeight() == 1000
+    assert config.getDeviceIDs() == [1]
+    assert config.getProtocolNames() == ["J1939", "CAN"]
+    assert config.getAPI().isValid()
+    assert config.getAPI().getDLL() is config.dll
+
+def test_loopback():
+    dll = SimulatedDLL()
+    a = connected(dll)
+    b = connected(dll)
+    c = connected(dll, b"CAN:Baud=Auto")
+    assert a.getClientID() != b.getClientID()
+    assert a.tx(eec1(b'\x11' * 8)) == 0
+    msg = J1939Message(b.rx())
+    assert msg.pgn == 0xF004 and msg.data == b'\x11' * 8
+    assert a.rx() == b'' # no echo
+    assert b.rx() == b''
+    assert c.rx() == b'' # different protocol
+    # echo
+    a.setEcho(True)
+    a.tx(eec1())
+    assert a.rx()[4] == 0x01
+    assert b.rx()[4:] == eec1() # b doesn't have echo on, so no echo byte
+    b.setEcho(True)
+    a.tx(eec1())
+    assert b.rx()[4] == 0x00
+    # CAN
+    c2 = connected(dll, b"CAN")
+    can = b'\x01\x18\xFE\xF1\x00' + bytes(8)
+    assert c.tx(can) == 0
+    assert c2.rx()[4:] == can
+    # disconnected clients don't get anything and can't send
+    b.disconnect()
+    a.tx(eec1())
+    assert len(dll.clients) == 3
+    assert dll.RP1210_SendMessage(b.getClientID(), eec1(), 14, 0, 0) == 129
+    assert dll.RP1210_ReadMessage(b.getClientID(), ctypes.create_string_buffer(32), 32, 0) == -129
+
+def test_timestamps_and_latency():
+    clock = FakeClock(100.0)
+    bus = VirtualBus(latency=0.005, clock=clock)
+    dll = SimulatedDLL(bus)
+    a = connected(dll)
+    b = connected(dll)
+    a.tx(eec1())
+    assert b.rx() == b''
+    clock.now += 0.004
+    assert b.rx() == b''
+    clock.now += 0.001
+    msg = b.rx()
+    assert int.from_bytes(msg[0:4], 'big') == 100000 # sent at 100 s, in ms
+    # other buses' weight
+    assert VirtualBus(timestamp_weight=1).timestamp(1.5) == (1500000).to_bytes(4, 'big')
+
+def test_queue_limits():
+    clock = FakeClock(100.0)
+    bus = VirtualBus(latency=0.01, rx_queue_size=5, tx_queue_size=3, clock=clock)
+    dll = SimulatedDLL(bus)
+    a = connected(dll)
+    b = connected(dll)
+    assert [a.tx(eec1()) for _ in range(4)] == [0, 0, 0, 137]
+    clock.now += 0.01
+    assert [a.tx(eec1()) for _ in range(4)] == [0, 0, 0, 137]
+    clock.now += 0.01
+    assert len(b.rxMany()) == 5 # rx queue held 5 of 6
+    assert bus.dropped == 1
+    assert dll.clients[b.getClientID()].overflows == 1
+    # message bigger than the buffer
+    a.tx(eec1())
+    clock.now += 0.01
+    assert dll.RP1210_ReadMessage(b.getClientID(), ctypes.create_string_buffer(8), 8, 0) == -141
+    assert len(b.rx()) == 18 # still there
+    # max clients
+    small = SimulatedDLL(max_clients=1)
+    assert small.RP1210_ClientConnect(0, 1, b"J1939", 0, 0, 0) == 0
+    assert small.RP1210_ClientConnect(0, 1, b"J1939", 0, 0, 0) == 131
+    with pytest.raises(ValueError):
+        VirtualBus(rx_queue_size=0)
+
+def test_filters():
+    dll = SimulatedDLL()
+    a = connected(dll)
+    b = connected(dll)
+    b.setAllFiltersToDiscard()
+    a.tx(eec1())
+    assert b.rx() == b''
+    b.setJ1939Filters(1 + 4, pgn=0xF004, source=0x00)
+    a.tx(eec1())
+    a.tx(eec1(sa=0x01))
+    a.tx(toJ1939Message(0xFEF1, 6, 0x00, 0xFF, bytes(8)))
+    assert [J1939Message(msg).sa for msg in b.rxMany()] == [0x00]
+    b.setAllFiltersToPass()
+    a.tx(eec1(sa=0x01))
+    assert len(b.rxMany()) == 1
+    b.setMessageReceive(False)
+    a.tx(eec1())
+    assert b.rx() == b''
+    # CAN mask/header
+    c = connected(dll, b"CAN")
+    d = connected(dll, b"CAN")
+    d.setAllFiltersToDiscard()
+    d.setCANFilters(1, 0x00FFFF00, 0x00FEF100)
+    c.tx(b'\x01\x18\xFE\xF1\x00' + bytes(8))
+    c.tx(b'\x01\x18\xF0\x04\x00' + bytes(8))
+    c.tx(b'\x00\x07\xDF' + bytes(8))
+    assert [msg[4:9] for msg in d.rxMany()] == [b'\x01\x18\xFE\xF1\x00']
+    assert d.flushBuffers() == 0
+
+def test_traffic():
+    clock = FakeClock(100.0)
+    bus = VirtualBus(clock=clock)
+    dll = SimulatedDLL(bus)
+    a = connected(dll)
+    bus.addTraffic([eec1(b'\x01' * 8), eec1(b'\x02' * 8)], rate=100) # every 10 ms
+    clock.now += 0.0455
+    msgs = a.rxMany()
+    assert [J1939Message(msg).data[0] for msg in msgs] == [1, 2, 1, 2, 1]
+    assert [int.from_bytes(msg[0:4], 'big') for msg in msgs] == [100000, 100010, 100020, 100030, 100040]
+    assert bus.messages == 5
+    # messages sent by clients come in between
+    clock.now += 0.0005
+    a2 = connected(dll)
+    a2.tx(eec1(b'\xAA' * 8))
+    clock.now += 0.01
+    assert [J1939Message(msg).data[0] for msg in a.rxMany()] == [0xAA, 2]
+    bus.clearTraffic()
+    clock.now += 1
+    assert a.rxMany() == []
+    # count
+    bus.inject(eec1(b'\x05' * 8))
+    bus.addTraffic([eec1()], rate=1000, count=3)
+    clock.now += 1
+    assert len(a.rxMany()) == 4
+    with pytest.raises(ValueError):
+        bus.addTraffic([eec1()], rate=0)
+
+def test_blocking_read():
+    dll = SimulatedDLL(VirtualBus(latency=0.02))
+    a = connected(dll)
+    b = connected(dll)
+    b.setBlockingTimeout(10, 3) # 30 ms
+    start = time.monotonic()
+    assert b.rx(blocking=1) == b''
+    assert time.monotonic() - start == pytest.approx(0.03, abs=0.02)
+    a.tx(eec1())
+    start = time.monotonic()
+    assert len(b.rx(blocking=1)) == 18
+    assert time.monotonic() - start == pytest.approx(0.02, abs=0.015)
+    # traffic wakes up a blocked read
+    dll.bus.addTraffic([eec1()], rate=50, start=time.monotonic() + 0.01)
+    assert len(b.rx(blocking=1)) == 18
+
+def test_startReader():
+    bus = VirtualBus()
+    dll = SimulatedDLL(bus)
+    a = connected(dll)
+    b = connected(dll)
+    b.startReader()
+    for i in range(100):
+        a.tx(eec1(bytes([i]) * 8))
+    deadline = time.monotonic() + 2
+    msgs = []
+    while len(msgs) < 100 and time.monotonic() < deadline:
+        msgs += b.rxMany()
+    b.stopReader()
+    assert [J1939Message(msg).data[0] for msg in msgs] == list(range(100))
+
+def test_broadcast_list():
+    clock = FakeClock(100.0)
+    dll = SimulatedDLL(VirtualBus(clock=clock))
+    a = connected(dll)
+    b = connected(dll)
+    manager = BroadcastListManager(a.command)
+    manager.add("eec1", eec1(b'\x01' * 8), 0.01)
+    manager.add("ccvs", toJ1939Message(0xFEF1, 6, 0x00, 0xFF, bytes(8)), 0.1)
+    assert manager.apply() == 0
+    assert manager.queryLength() == 2
+    clock.now += 0.1
+    msgs = [J1939Message(msg) for msg in b.rxMany()]
+    assert len(msgs) == 11 + 2
+    assert a.rxMany() == [] # no echo
+    manager.update("eec1", eec1(b'\x02' * 8))
+    assert manager.apply() == 0
+    assert manager.queryLength() == 2
+    # VIEW_B_LIST
+    view = ctypes.create_string_buffer(b'\x02\x01', 32)
+    assert a.command(BROADCAST_FOR_J1939, view, 2) == 0
+    assert view.raw[2:8] == (14).to_bytes(2, 'little') + (10).to_bytes(4, 'little')
+    assert view.raw[8:22] == eec1(b'\x02' * 8)
+    manager.clear()
+    manager.apply()
+    clock.now += 1
+    b.rxMany()
+    clock.now += 1
+    assert b.rxMany() == []
+    assert a.command(BROADCAST_FOR_J1939, b'\x04\x00', 2) == 144
+
+def test_scheduler():
+    dll = SimulatedDLL()
+    a = connected(dll)
+    b = connected(dll)
+    scheduler = CyclicScheduler(a.tx)
+    scheduler.addJ1939(0xF004, bytes(8), 0.01, sa=0x00)
+    scheduler.start()
+    time.sleep(0.1)
+    scheduler.stop()
+    assert 8 <= len(b.rxMany()) <= 12
+
+def test_versions_and_status():
+    dll = SimulatedDLL(dll_version="2.5", api_version="3.1", firmware_version="4.0")
+    api = RP1210API(SIMULATOR_API_NAME)
+    api.setDLL(dll)
+    assert api.isValid()
+    assert api.ReadVersionDirect() == ("2.5", "3.1")
+    client_id = api.ClientConnect(1, b"J1939")
+    assert api.ReadDetailedVersionDirect(client_id) == ("3.1", "2.5", "4.0")
+    assert api.GetErrorMsg(137) == "ERR_TX_QUEUE_FULL"
+    assert api.GetHardwareStatusDirect(client_id)[0] == 0x03
+    assert dll.RP1210_GetHardwareStatus(client_id, ctypes.create_string_buffer(64), 64, 1) == 155
+    assert dll.RP1210_GetErrorMsg(9999, ctypes.create_string_buffer(80)) == 154
+    client = simulatedClient(dll)
+    client.connect()
+    assert "250000" in client.getBaud()
@@ -0,0 +1,84 @@
+"""
+Tests for RP1210.Timestamps (TimestampConverter).
+"""
+import random
+from types import SimpleNamespace
+import pytest
+from RP1210 import Timestamps
+from RP1210.Timestamps import TimestampConverter, messageTimestamps
+
+NUMPY = [True, False] if Timestamps.numpy is not None else [False]
+
+def wrapped(ticks : list[int]) -> list[int]:
+    return [tick & 0xFFFFFFFF for tick in ticks]
+
+def test_TimestampConverter_unwrap():
+    converter = TimestampConverter()
+    ticks = [0xFFFFFF00, 0xFFFFFFF0, 0x10, 0x08, 0x7FFFFFFF, 0xFFFFFF00, 0x100]
+    assert [converter.unwrap(tick) for tick in ticks] == \
+        [0xFFFFFF00, 0xFFFFFFF0, 0x100000010, 0x100000008, 0x17FFFFFFF, 0x1FFFFFF00, 0x200000100]
+
+@pytest.mark.parametrize("use_numpy", NUMPY)
+def test_TimestampConverter_unwrapMany(use_numpy):
+    rng = random.Random(1)
+    ticks = [0xFFFF0000]
+    for _ in range(2000):
+        ticks.append(ticks[-1] + rng.randrange(-1000, 50_000_000)) # out of order now and then
+    converter = TimestampConverter()
+    first = converter.unwrapMany(wrapped(ticks[:700]), use_numpy)
+    second = converter.unwrapMany(wrapped(ticks[700:]), use_numpy)
+    assert list(first) + list(second) == ticks
+    assert converter.unwrap(ticks[-1] & 0xFFFFFFFF) == ticks[-1]
+    assert len(converter.unwrapMany([], use_numpy)) == 0
+
+@pytest.mark.parametrize("use_numpy", NUMPY)
+def test_TimestampConverter_drift(use_numpy):
+    """Adapter clock runs 50 ppm slow, with 1 ms ticks, and messages arrive 0-5 ms late."""
+    rng = random.Random(2)
+    converter = TimestampConverter(weight=1000, window=1.0, history=30)
+    start = 5000.0
+    device_start = 4_294_900_000 # wraps around in about a minute
+    errors = []
+    for i in range(6000):
+        host = start + i * 0.01
+        ticks = int(device_start + (host - start) * (1 - 50e-6) * 1000) & 0xFFFFFFFF
+        converted = converter.update(ticks, host + rng.uniform(0, 0.005))
+        if i > 3000:
+            errors.append(converted - host)
+    assert converter.drift == pytest.approx(50e-6, abs=5e-6)
+    assert max(abs(error) for error in errors) < 0.002 # 1 ms ticks
+    # batches convert the same way one at a time does
+    ticks = [int(device_start + (t * 0.01) * (1 - 50e-6) * 1000) & 0xFFFFFFFF for t in range(6000, 6100)]
+    copy = TimestampConverter(weight=1000)
+    copy.__dict__.update({key: value for key, value in converter.__dict__.items() if key != '_samples'})
+    batch = converter.convertMany(ticks, use_numpy)
+    assert list(batch) == pytest.approx([copy.convert(tick) for tick in ticks], abs=1e-8)
+
+@pytest.mark.parametrize("use_numpy", NUMPY)
+def test_TimestampConverter_updateMany(use_numpy):
+    converter = TimestampConverter(weight=1000)
+    times = converter.updateMany([10_000, 10_500, 11_000], host_time=100.0, use_numpy=use_numpy)
+    assert list(times) == pytest.approx([99.0, 99.5, 100.0]) # newest one received at host_time
+    assert converter.convert(12_000) == pytest.approx(101.0)
+    converter.reset()
+    assert converter.offset is None
+    assert converter.convert(12_000) == 12.0 # no estimate yet; adapter time in seconds
+
+@pytest.mark.parametrize("use_numpy", NUMPY)
+def test_messageTimestamps(use_numpy):
+    messages = [(1234).to_bytes(4, 'big') + b'\xAA', memoryview(b'\xFF\xFF\xFF\xFF\x00'), b'\x01']
+    assert list(messageTimestamps(messages, use_numpy)) == [1234, 0xFFFFFFFF, 1]
+
+def test_TimestampConverter_fromClient():
+    vendor = SimpleNamespace(getTimeStampWeight=lambda: 1000.0)
+    client = SimpleNamespace(getCurrentVendor=lambda: vendor)
+    converter = TimestampConverter.fromClient(client, window=2.0)
+    assert converter.weight == 1000.0
+    assert converter.scale == pytest.approx(1e-3)
+    assert converter.window == 2.0
+
+def test_TimestampConverter_invalid_args():
+    with pytest.raises(ValueError):
+        TimestampConverter(weight=0)
+    with pytest.raises(ValueError):
+        TimestampConverter(history=1)
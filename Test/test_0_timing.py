@@ -0,0 +1,30 @@
+"""
+Tests for RP1210.Timing.
+"""
+import threading
+import time
+from RP1210.Timing import sleepUntil
+from utilities import FakeClock
+
+def test_sleepUntil():
+    deadline = time.monotonic() + 0.02
+    sleepUntil(deadline)
+    assert deadline <= time.monotonic() < deadline + 0.05
+
+def test_sleepUntil_fake_clock():
+    clock = FakeClock(100.0)
+    sleepUntil(100.3, clock, spin=0, sleep=clock.sleep)
+    assert clock.now == 100.3
+    sleepUntil(99.0, clock, spin=0, sleep=clock.sleep) # already past
+    assert clock.now == 100.3
+
+def test_sleepUntil_stopped():
+    event = threading.Event()
+    threading.Timer(0.01, event.set).start()
+    start = time.monotonic()
+    sleepUntil(start + 5, sleep=event.wait, stopped=event.is_set)
+    assert time.monotonic() - start < 1
+    # while busy-waiting
+    start = time.monotonic()
+    sleepUntil(start + 5, spin=10, stopped=lambda: True)
+    assert time.monotonic() - start < 1
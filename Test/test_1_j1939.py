@@ -1,3 +1,4 @@
+from types import SimpleNamespace
 from typing import Union
 from RP1210 import J1939, Commands, sanitize_msg_param
 import binascii
@@ -87,6 +88,98 @@ def test_toJ1939Message():
     message = J1939.toJ1939Message(pgn, pri, sa, da, data)
     assert message == b'\xCC\xAC\x0A\x00\x16\x1E\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\xDE\xAD\xBE\xEF\x00\x00'
 
+def test_toJ1939Message_matches_sanitize_msg_param():
+    """The struct-based fast path must give the same output as building the message with sanitize_msg_param()."""
+    def expected(pgn, pri, sa, da, data, size = 0, how = 0):
+        how_pri = (sanitize_msg_param(pri, 1)[0] & 0b111) | ((sanitize_msg_param(how, 1)[0] & 0b1) << 7)
+        return (sanitize_msg_param(pgn, 3, 'little') + sanitize_msg_param(how_pri, 1) +
+                sanitize_msg_param(sa, 1) + sanitize_msg_param(da, 1) + sanitize_msg_param(data, size))
+    values = [0, 1, 6, 0x7F, 0x80, 0xFF, 0x100, 0xFECA, 0xFFFFFF, 0x1000000, -1, True, b'\x12', '7', 2.5]
+    for a in values:
+        for b in values:
+            for args in [(a, 6, 0x12, 0xFF, b'\x01'), (0xFECA, a, b, 0xFF, b'\x01\x02', 4),
+                         (0xEF00, b, 0xF9, a, b'', 0, a), (b, a, a, b, b'\xAA' * 9, 0, b)]:
+                try:
+                    result = expected(*args)
+                except Exception as e:
+                    with pytest.raises(type(e)):
+                        J1939.toJ1939Message(*args)
+                    continue
+                assert J1939.toJ1939Message(*args) == result
+
+def test_toJ1939Message_how_pri():
+    """How to send is bit 7 of the how/priority byte; priority is bits 0-2."""
+    assert J1939.toJ1939Message(0xFECA, 6, 0x12, 0xFF, b'', how=1)[3] == 0x86
+    assert J1939.toJ1939Message(0xFECA, b'\x03', 0x12, 0xFF, b'', how=b'\x01')[3] == 0x83
+    assert J1939.toJ1939Message(0xFECA, 0xFF, 0x12, 0xFF, b'', how=0)[3] == 0x07
+    msg = J1939.J1939Message(b'\x00' * 4 + J1939.toJ1939Message(0xFECA, 3, 0x12, 0xFF, b'\x01', how=1))
+    assert (msg.pri, msg.how) == (3, 1)
+
+def test_toJ1939MessageInto():
+    buffer = bytearray(32)
+    assert J1939.toJ1939MessageInto(buffer, 2, 0xFECA, 6, 0x12, 0xFF, b'\x01\x02') == 8
+    assert buffer[:12] == b'\x00\x00' + J1939.toJ1939Message(0xFECA, 6, 0x12, 0xFF, b'\x01\x02') + b'\x00\x00'
+    for args in [(0x0AACCC, 0, 22, 0x1E, 0xDEADBEEF, 6, 1), ('7', b'\x03', '', 5, 'abc', 0, True)]:
+        length = J1939.toJ1939MessageInto(memoryview(buffer), 0, *args)
+        assert buffer[:length] == J1939.toJ1939Message(*args)
+    with pytest.raises(ValueError):
+        J1939.toJ1939MessageInto(buffer, 24, 0xFECA, 6, 0x12, 0xFF, b'\xAA' * 3)
+    with pytest.raises(OverflowError):
+        J1939.toJ1939MessageInto(buffer, 0, 0x1000000, 6, 0x12, 0xFF, b'')
+    assert len(buffer) == 32
+
+def test_toJ1939Request_matches_toJ1939Message():
+    for pgn in [0, 0xFECA, 0x1FEE5, b'\xFE\xCA', '5']:
+        for size in [0, 1, 3, 8]:
+            pgn_request = sanitize_msg_param(pgn, 3, 'little') + b'\xFF' * (size - 3)
+            expected = J1939.toJ1939Message(0xEA00, 6, 0xF9, 0x00, pgn_request, size)
+            assert J1939.toJ1939Request(pgn, 0xF9, 0x00, size=size) == expected
+    with pytest.raises(OverflowError):
+        J1939.toJ1939Request(0x1000000, 0xF9)
+
+def test_J1939TxBatch():
+    with pytest.raises(ValueError):
+        J1939.J1939TxBatch(0)
+    messages = [(0xF004 + x, 3, 0x00, 0xFF, bytes([x]) * (x % 10), 0, x & 1) for x in range(40)]
+    batch = J1939.J1939TxBatch(buffer_size=16) # has to grow
+    assert not batch
+    assert batch.add(*messages[0]) == 0
+    batch.extend(messages[1:])
+    assert len(batch) == 40
+    assert batch.toList() == [J1939.toJ1939Message(*args) for args in messages]
+    assert bytes(batch[-1]) == J1939.toJ1939Message(*messages[-1])
+    assert batch.nbytes == sum(batch.lengths) == batch.offsets[-1] + batch.lengths[-1]
+    buffer = batch.buffer
+    batch.clear()
+    assert not batch
+    batch.add(0xEA00, 6, 0xF9, 0x00, b'\xCA\xFE', size=3)
+    assert batch.buffer is buffer # reused
+    assert batch.toList() == [J1939.toJ1939Message(0xEA00, 6, 0xF9, 0x00, b'\xCA\xFE', size=3)]
+    batch.extend([(0xEB00, 7, 0x00, 0xFF, b'\xAA' * 2000), (0xEB00, 7, 0x00, 0xFF, b'\xBB')])
+    assert batch.lengths.tolist() == [9, 2006, 7]
+    assert bytes(batch[2]) == J1939.toJ1939Message(0xEB00, 7, 0x00, 0xFF, b'\xBB')
+
+def test_RP1210Client_txBatch():
+    import RP1210
+    sent = []
+    def RP1210_SendMessage(ClientID, ClientMessage, MessageSize, NotifyStatusOnTx, BlockOnSend):
+        if len(sent) == 3:
+            return 0x10000 - 137 # ERR_TX_QUEUE_FULL
+        sent.append(bytes(ClientMessage[:MessageSize]))
+        return 0
+    client = RP1210.RP1210Client("Test/test-files/RP121032.ini", "Test/test-files/dlls", "Test/test-files/ini-files")
+    client.setVendor("NULN2R32")
+    client.getAPI().dll = SimpleNamespace(RP1210_SendMessage=RP1210_SendMessage)
+    client.clientID = 1
+    batch = J1939.J1939TxBatch()
+    batch.extend((0xFECA, 6, 0x12, 0xFF, bytes([x]) * 8) for x in range(2))
+    assert client.txBatch(batch) == 2
+    assert batch.error == 0
+    assert sent == batch.toList()
+    batch.extend((0xFECA, 6, 0x12, 0xFF, bytes([x]) * 8) for x in range(2, 4))
+    assert client.txBatch(batch) == 1
+    assert batch.error == 137
+
 @pytest.mark.parametrize("pgn,da", argvalues=[
     (0xB100, 24), (0x0000, 0xFF), (0x1111, 0x00), (0x0000, 0x00), (0xFFFF, 0xFF)
 ])
@@ -380,6 +473,55 @@ def test_J1939Message_parsing_invalid_length():
         assert msg.timestamp == int.from_bytes(msg_bytes_ext[:4], 'big')
         assert msg.timestamp_bytes() == msg_bytes_ext[:4]
 
+@pytest.mark.parametrize("rp1210_bytes, echo", argvalues=[
+    (b'\x00\x00\x12\x34' + b'\xCA\xFE\x00\x06\x12\xFF' + b'\x11\x22\x33\x44\x55\x66\x77\x88', 0),
+    (b'\x00\x00\x12\x34' + b'\x01' + b'\x00\xEA\x00\x06\xF9\x12\xCA\xFE\x00', 1),
+    (b'\x00\x00\x12\x34' + b'\x00' + b'\x00\xEF\x00\x03\xF9\x12', 1),
+    (b'\xFF\xFF\xFF\xFF' + b'\x00\xEA\x00\x86\xF9\x00', 0),
+])
+def test_J1939Message_from_buffer(rp1210_bytes, echo):
+    """J1939Message should parse a memoryview/bytearray the same way it parses bytes."""
+    expected = J1939.J1939Message(rp1210_bytes, echo=echo)
+    for buffer in [bytearray(rp1210_bytes), memoryview(rp1210_bytes), memoryview(bytearray(rp1210_bytes))]:
+        msg = J1939.J1939Message(buffer, echo=echo)
+        assert msg._view is not None # header was parsed without copying msg/data
+        assert msg.timestamp == expected.timestamp
+        assert msg.isEcho() == expected.isEcho()
+        assert (msg.pgn, msg.pri, msg.how, msg.sa, msg.da) == (expected.pgn, expected.pri, expected.how, expected.sa, expected.da)
+        assert msg.size == expected.size
+        assert msg.data == expected.data
+        assert msg._view is None
+        assert isinstance(msg.msg, bytes)
+        assert msg == expected
+
+def test_J1939Message_from_buffer_copies_lazily():
+    """Data is copied out of the buffer on first access, after which the buffer can be reused."""
+    buffer = bytearray(b'\x00\x00\x00\x01' + b'\xCA\xFE\x00\x06\x12\xFF' + b'\x11\x22')
+    msg = J1939.J1939Message(buffer)
+    assert msg.pgn == 0xFECA
+    buffer[10:] = b'\x33\x44' # not accessed yet, so this is what the message sees
+    assert msg.data == b'\x33\x44'
+    buffer[10:] = b'\x55\x66'
+    assert msg.data == b'\x33\x44'
+    assert bytes(msg) == b'\xCA\xFE\x00\x06\x12\xFF\x33\x44'
+
+def test_J1939Message_from_buffer_setters():
+    """Setting properties on a buffer-backed message should behave the same as a bytes-backed one."""
+    raw = b'\x00\x00\x00\x01' + b'\xCA\xFE\x00\x06\x12\xFF' + b'\x11\x22'
+    msg = J1939.J1939Message(bytearray(raw))
+    msg.sa = 0x34
+    assert msg.msg == b'\xCA\xFE\x00\x06\x34\xFF\x11\x22'
+    msg = J1939.J1939Message(bytearray(raw))
+    msg.data = b'\xAB'
+    assert msg.msg == b'\xCA\xFE\x00\x06\x12\xFF\xAB'
+    msg = J1939.J1939Message(bytearray(raw))
+    msg.size = 3
+    assert msg.data == b'\x11\x22\xFF'
+    msg = J1939.J1939Message(bytearray(raw))
+    assert msg[7] == 0x22
+    assert len(msg) == 8
+    assert msg
+
 @pytest.mark.parametrize("pgn, da", argvalues=[
     (0x000000, 0x00), (0x03FFFF, 0xFF), (0x0000FF, 0x00), (0x000000, 0xFF), (0x030000, 0x00),
     (0x030000, 0xFF), (0x00FF00, 0xAA), (0x00FFFF, 0xAA), (0x00F004, 0x1A), (0x00F004, None),
@@ -474,11 +616,11 @@ def test_J1939Message_pri_how(pri, how):
     msg.how = how
     assert msg.pri == int.from_bytes(sanitize_msg_param(pri, 1), 'big')
     assert msg.how == int(how)
-    assert msg.msg[3] == msg[3] == sanitize_msg_param(pri, 1)[0] & 0b111 + ((sanitize_msg_param(how, 1)[0] & 0b1) << 7)
+    assert msg.msg[3] == msg[3] == int.from_bytes(sanitize_msg_param(pri, 1), 'big') | (int(how) << 7)
     msg = J1939.J1939Message(pri=pri, how=how)
     assert msg.pri == int.from_bytes(sanitize_msg_param(pri, 1), 'big')
     assert msg.how == int(how)
-    assert msg.msg[3] == msg[3] == sanitize_msg_param(pri, 1)[0] & 0b111 + ((sanitize_msg_param(how, 1)[0] & 0b1) << 7)
+    assert msg.msg[3] == msg[3] == int.from_bytes(sanitize_msg_param(pri, 1), 'big') | (int(how) << 7)
 
 def test_J1939Message_list():
     """Test J1939Message when treated as a list."""
@@ -508,6 +650,29 @@ def test_J1939Message_eq_noexception():
     assert not msg == []
     assert not msg == b'asdfasf'
 
+def test_J1939Message_slots():
+    """J1939Message shouldn't have a per-instance __dict__."""
+    msg = J1939.J1939Message(b'\x00\x00\x00\x01' + b'\xCA\xFE\x00\x06\x12\xFF' + b'\x11\x22')
+    assert not hasattr(msg, '__dict__')
+    with pytest.raises(AttributeError):
+        msg.some_new_attribute = 1
+
+def test_J1939Message_msg_built_lazily():
+    """Setters shouldn't rebuild msg until it's accessed, and the result should match toJ1939Message."""
+    msg = J1939.J1939Message(b'\x00\x00\x00\x01' + b'\xCA\xFE\x00\x06\x12\xFF' + b'\x11\x22')
+    assert msg._data is None # data is sliced from msg on demand
+    assert msg.size == 2
+    msg.sa = 0x34
+    msg.pgn = 0xEF00
+    msg.da = 0x56
+    assert msg._msg is None
+    assert msg.size == 2
+    assert msg.msg == J1939.toJ1939Message(0xEF56, 6, 0x34, 0x56, b'\x11\x22')
+    assert msg._msg is not None
+    msg.data = b'\x01\x02\x03'
+    assert msg._msg is None
+    assert bytes(msg) == J1939.toJ1939Message(0xEF56, 6, 0x34, 0x56, b'\x01\x02\x03')
+
 @pytest.mark.parametrize("aac, ig, vsi, vs, func, func_inst, ecu_inst, mc, id_n, expected",
                          argvalues=[
                              (0, 0, 0, 0, 0, 0, 0, 0, 0, b'\x00\x00\x00\x00\x00\x00\x00\x00'),
@@ -566,4 +731,52 @@ def test_generateNetMgmtName_invalid_input():
             parameters_range[field]=val
             with pytest.raises(IndexError, match=r".* is not in the range .*"):
                 J1939.generateNetMgmtName(*parameters_range)
-    
\ No newline at end of file
+    
+DECODE_RECORDS = [
+    b'\x00\x00\x00\x01' + b'\xCA\xFE\x00\x06\x12\xFF' + b'\x11\x22\x33\x44\x55\x66\x77\x88',
+    b'\x00\x00\x00\x02' + b'\xCA\xFE\x00\x06\x12\x34' + b'\x11\x22', # PDU2 w/ DA set
+    b'\x00\x01\x00\x00' + b'\x00\xEF\x00\x03\xF9\x12' + bytes(range(20)), # PDU1, long
+    b'\x10\x00\x00\x00' + b'\x34\xEA\x01\x86\xF9\x00', # PDU1 w/ DP bit, ps byte != da, no data
+    b'\xFF\xFF\xFF\xFF' + b'\xFF\xFF\x0F\x07\x00\x00\xAB', # extra PGN bits
+    b'\x01\x02', # too short
+]
+
+def expected_records(records, echo = False):
+    expected = []
+    for record in records:
+        msg = J1939.J1939Message(record, echo=echo)
+        expected.append((msg.timestamp, msg.pgn, msg.pri, msg.sa, msg.da, msg.size,
+                         msg.data[:8].ljust(8, b'\x00')))
+    return expected
+
+@pytest.mark.parametrize("echo", argvalues=[False, True])
+def test_decodeJ1939Records_python(echo):
+    records = DECODE_RECORDS
+    if echo:
+        records = [record[:4] + b'\x01' + record[4:] for record in records[:-1]]
+    assert J1939.decodeJ1939Records(records, echo=echo, use_numpy=False) == expected_records(records, echo)
+    assert J1939.decodeJ1939Records([], use_numpy=False) == []
+
+@pytest.mark.parametrize("echo", argvalues=[False, True])
+def test_decodeJ1939Records_numpy(echo):
+    numpy = pytest.importorskip("numpy")
+    records = DECODE_RECORDS
+    if echo:
+        records = [record[:4] + b'\x01' + record[4:] for record in records[:-1]]
+    decoded = J1939.decodeJ1939Records(iter(records), echo=echo)
+    assert isinstance(decoded, numpy.ndarray)
+    assert decoded.dtype == numpy.dtype(J1939.J1939_RECORD_FIELDS)
+    as_tuples = [tuple(row[:-1]) + (bytes(row[-1]),) for row in decoded.tolist()]
+    assert as_tuples == expected_records(records, echo)
+    assert len(J1939.decodeJ1939Records([])) == 0
+
+def test_decodeJ1939Records_memoryviews():
+    from RP1210.Reader import RxBatch
+    batch = RxBatch(len(DECODE_RECORDS), 64)
+    for i, record in enumerate(DECODE_RECORDS):
+        batch.buffer[batch.offsets[i]:batch.offsets[i] + len(record)] = record
+        batch.lengths[i] = len(record)
+    batch.count = len(DECODE_RECORDS)
+    assert J1939.decodeJ1939Records(batch, use_numpy=False) == expected_records(DECODE_RECORDS)
+    if J1939.numpy is not None:
+        assert (J1939.decodeJ1939Records(batch) == J1939.decodeJ1939Records(DECODE_RECORDS)).all()
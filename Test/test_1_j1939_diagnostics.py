@@ -1,6 +1,6 @@
 import pytest
 from RP1210 import J1939
-from RP1210.J1939 import DTC, DiagnosticMessage, J1939Message, toJ1939Message
+from RP1210.J1939 import DTC, DTCArray, DiagnosticMessage, J1939Message, toJ1939Message
 from RP1210 import sanitize_msg_param
 
 def toDTC(spn : int, fmi : int, oc : int) -> bytes:
@@ -342,4 +342,66 @@ def test_diagnosticmessage_iterate():
         assert dm1[i].spn == i * 23
         assert dm1[i].fmi == i
         assert dm1[i].oc == 1 + i*3
-    
\ No newline at end of file
+    
+DTC_ARRAY_CODES = [(1, 0, 1), (255, 31, 126), (256, 4, 2), (65535, 7, 0), (65536, 1, 1), (100000, 16, 64), (524287, 31, 127)]
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_dtcarray_decode(use_numpy):
+    if use_numpy and J1939.numpy is None:
+        pytest.skip("NumPy isn't installed")
+    dtc_list = [DTC(spn=spn, fmi=fmi, oc=oc) for spn, fmi, oc in DTC_ARRAY_CODES]
+    dtc_list.append(DTC(b'\x10\x27\x05\x81')) # CM bit set
+    dtcs = DTCArray(b''.join(bytes(dtc) for dtc in dtc_list) + b'\x01\x02') # partial DTC ignored
+    assert len(dtcs) == len(dtc_list)
+    assert list(dtcs.spns(use_numpy)) == [dtc.spn for dtc in dtc_list]
+    assert list(dtcs.fmis(use_numpy)) == [dtc.fmi for dtc in dtc_list]
+    assert list(dtcs.ocs(use_numpy)) == [dtc.oc for dtc in dtc_list]
+    assert list(dtcs.cms(use_numpy)) == [dtc.cm() for dtc in dtc_list]
+    assert list(DTCArray().spns(use_numpy)) == []
+
+def test_dtcarray_dtcs():
+    dtc_list = [DTC(spn=spn, fmi=fmi, oc=oc) for spn, fmi, oc in DTC_ARRAY_CODES]
+    data = b''.join(bytes(dtc) for dtc in dtc_list)
+    dtcs = DTCArray(data)
+    assert dtcs[0] == dtc_list[0]
+    assert dtcs[-1] == dtc_list[-1]
+    assert list(dtcs) == dtc_list
+    assert dtcs.toList() == dtc_list
+    assert isinstance(dtcs[1:3], DTCArray)
+    assert dtcs[1:3].toList() == dtc_list[1:3]
+    assert dtc_list[2] in dtcs
+    assert DTC(spn=256, fmi=4, oc=3) not in dtcs
+    assert "DTC" not in dtcs
+    assert bytes(dtcs) == data
+    assert dtcs == data
+    assert dtcs == DTCArray(data)
+    assert dtcs != b'\x00'
+    assert dtcs[:2] + dtcs[2:] == dtcs
+    assert dtcs and not DTCArray()
+    assert repr(DTCArray(data[:4])) == f"DTCArray({data[:4]!r})"
+    with pytest.raises(IndexError):
+        dtcs[len(dtc_list)]
+
+def test_diagnosticmessage_dtcs_lazy():
+    dtc_list = [DTC(spn=spn, fmi=fmi, oc=oc) for spn, fmi, oc in DTC_ARRAY_CODES]
+    data = b'\x04\xFF' + b''.join(bytes(dtc) for dtc in dtc_list)
+    dm2 = DiagnosticMessage()
+    dm2.data = data
+    assert dm2._codes is None # nothing parsed yet
+    assert len(dm2) == dm2.num_dtcs() == len(dtc_list)
+    assert list(dm2.dtcs.spns(False)) == [dtc.spn for dtc in dtc_list]
+    assert dm2.dtcs is dm2.dtcs
+    assert dm2._codes is None
+    dm2 += DTC(spn=5, fmi=5, oc=5) # still not parsed
+    assert dm2._codes is None
+    assert dm2.dtcs[-1] == DTC(spn=5, fmi=5, oc=5)
+    dm2.lamps = b'\x00\xFF'
+    assert dm2.data == b'\x00\xFF' + data[2:] + bytes(DTC(spn=5, fmi=5, oc=5))
+    assert dm2[0] == dtc_list[0] # now it is
+    assert dm2.codes == dtc_list + [DTC(spn=5, fmi=5, oc=5)]
+    dm2[0] = DTC(spn=9, fmi=9, oc=9)
+    assert dm2.dtcs[0] == DTC(spn=9, fmi=9, oc=9)
+    assert dm2.dtcs.toList() == dm2.codes
+    dm2.data = b'\x00\xFF'
+    assert not dm2
+    assert len(dm2.dtcs) == 0
@@ -0,0 +1,169 @@
+"""
+Tests for RP1210.J1939Dispatcher.
+"""
+import pytest
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.J1939Dispatcher import J1939Dispatcher
+from RP1210.Reader import RxBatch
+
+def rx(pgn, sa, da = 0xFF, data = b'\x01\x02\x03', timestamp = 0, echo = None) -> bytes:
+    """Returns a message like one from client.rx()."""
+    echo_byte = b'' if echo is None else bytes([echo])
+    return timestamp.to_bytes(4, 'big') + echo_byte + toJ1939Message(pgn, 6, sa, da, data)
+
+class Recorder():
+    def __init__(self):
+        self.calls = []
+
+    def handler(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def names(self) -> list:
+        return [name for name, _ in self.calls]
+
+def test_J1939Dispatcher_routes():
+    rec = Recorder()
+    dispatcher = J1939Dispatcher()
+    dispatcher.addHandler(rec.handler("pgn"), pgn=0xF004)
+    dispatcher.addHandler(rec.handler("pgn_sa"), pgn=0xF004, sa=0x00)
+    dispatcher.addHandler(rec.handler("sa"), sa=0x03)
+    dispatcher.addHandler(rec.handler("any"))
+    assert len(dispatcher) == 4
+    assert dispatcher.dispatch(rx(0xF004, 0x00)) == 3
+    assert rec.names() == ["pgn", "pgn_sa", "any"] # in the order they were added
+    rec.calls.clear()
+    assert dispatcher.dispatch(rx(0xF004, 0x03)) == 3
+    assert rec.names() == ["pgn", "sa", "any"]
+    rec.calls.clear()
+    assert dispatcher.dispatch(rx(0xFECA, 0x17)) == 1
+    assert rec.names() == ["any"]
+    msg = rec.calls[0][1][0]
+    assert isinstance(msg, J1939Message)
+    assert msg.pgn == 0xFECA and msg.sa == 0x17 and msg.data == b'\x01\x02\x03'
+    assert dispatcher.dispatched == 3
+    assert dispatcher.unhandled == 0
+
+def test_J1939Dispatcher_unhandled():
+    rec = Recorder()
+    dispatcher = J1939Dispatcher()
+    dispatcher.addHandler(rec.handler("pgn"), pgn=0xF004)
+    assert dispatcher.dispatch(rx(0xF003, 0x00)) == 0
+    assert dispatcher.dispatch(b'\x00' * 9) == 0 # too short; ignored
+    assert dispatcher.unhandled == 1
+    assert dispatcher.dispatched == 0
+    assert rec.calls == []
+
+def test_J1939Dispatcher_pdu1():
+    """PDU1 PGNs are routed without the destination address."""
+    rec = Recorder()
+    dispatcher = J1939Dispatcher()
+    dispatcher.addHandler(rec.handler("request"), pgn=0xEA00)
+    dispatcher.addHandler(rec.handler("request_to_me"), pgn=0xEA17, predicate=lambda pgn, sa, da: da == 0x17)
+    dispatcher.dispatch(rx(0xEA00, 0x00, da=0x17))
+    dispatcher.dispatch(rx(0xEA00, 0x00, da=0xFF))
+    assert rec.names() == ["request", "request_to_me", "request"]
+    assert rec.calls[0][1][0].pgn == 0xEA17 # J1939Message still has the DA in it
+
+def test_J1939Dispatcher_lazy_message():
+    built = []
+    class CountingMessage(J1939Message):
+        def __init__(self, *args, **kwargs):
+            built.append(1)
+            super().__init__(*args, **kwargs)
+    import RP1210.J1939Dispatcher as module
+    original = module.J1939Message
+    module.J1939Message = CountingMessage
+    try:
+        rec = Recorder()
+        dispatcher = J1939Dispatcher()
+        dispatcher.addHandler(rec.handler("raw"), pgn=0xF004, raw=True)
+        dispatcher.dispatch(rx(0xF004, 0x00))
+        assert built == [] # raw handlers don't need a J1939Message
+        assert rec.calls[0][1][1:] == (0xF004, 0x00, 0xFF)
+        dispatcher.addHandler(rec.handler("a"), pgn=0xF004)
+        dispatcher.addHandler(rec.handler("b"), sa=0x00)
+        dispatcher.dispatch(rx(0xF004, 0x00))
+        assert len(built) == 1 # one message shared by both handlers
+        assert rec.calls[-1][1][0] is rec.calls[-2][1][0]
+        dispatcher.addHandler(rec.handler("never"), pgn=0xF003, predicate=lambda *args: False)
+        dispatcher.dispatch(rx(0xF003, 0x00))
+        assert len(built) == 2 # "b" still wants it
+    finally:
+        module.J1939Message = original
+
+def test_J1939Dispatcher_predicate():
+    rec = Recorder()
+    dispatcher = J1939Dispatcher()
+    dispatcher.addHandler(rec.handler("low_sa"), predicate=lambda pgn, sa, da: sa < 0x10)
+    dispatcher.dispatch(rx(0xFEF1, 0x00))
+    dispatcher.dispatch(rx(0xFEF1, 0x80))
+    assert rec.names() == ["low_sa"]
+    assert dispatcher.dispatched == 1
+    assert dispatcher.unhandled == 0 # it was routed, just not wanted
+
+def test_J1939Dispatcher_remove():
+    rec = Recorder()
+    dispatcher = J1939Dispatcher()
+    first = dispatcher.addHandler(rec.handler("first"), pgn=0xF004)
+    second = dispatcher.addHandler(rec.handler("second"), sa=0x00)
+    dispatcher.dispatch(rx(0xF004, 0x00))
+    assert dispatcher.removeHandler(first)
+    assert not dispatcher.removeHandler(first)
+    dispatcher.dispatch(rx(0xF004, 0x00)) # cached route has to be rebuilt
+    assert rec.names() == ["first", "second", "second"]
+    dispatcher.clear()
+    assert len(dispatcher) == 0
+    assert dispatcher.dispatch(rx(0xF004, 0x00)) == 0
+    assert not dispatcher.removeHandler(second)
+
+def test_J1939Dispatcher_invalid_args():
+    dispatcher = J1939Dispatcher()
+    with pytest.raises(ValueError):
+        dispatcher.addHandler(print, pgn=0x40000)
+    with pytest.raises(ValueError):
+        dispatcher.addHandler(print, sa=256)
+
+def test_J1939Dispatcher_echo():
+    rec = Recorder()
+    dispatcher = J1939Dispatcher(echo=True)
+    dispatcher.addHandler(rec.handler("pgn"), pgn=0xF004, sa=0x05)
+    dispatcher.dispatch(rx(0xF004, 0x05, echo=1))
+    msg = rec.calls[0][1][0]
+    assert msg.isEcho() and msg.sa == 0x05 and msg.data == b'\x01\x02\x03'
+
+def test_J1939Dispatcher_dispatchMany():
+    rec = Recorder()
+    dispatcher = J1939Dispatcher()
+    dispatcher.addHandler(rec.handler("eec1"), pgn=0xF004)
+    dispatcher.addHandler(rec.handler("raw"), pgn=0xFEF1, raw=True)
+    records = [rx(0xF004, 0x00, data=b'\x10'), rx(0xFEF1, 0x00), rx(0xF003, 0x00), rx(0xF004, 0x01, data=b'\x11')]
+    assert dispatcher.dispatchMany(records) == 3
+    assert rec.names() == ["eec1", "raw", "eec1"]
+    assert [args[0].data for name, args in rec.calls if name == "eec1"] == [b'\x10', b'\x11']
+    assert dispatcher.unhandled == 1
+
+def test_J1939Dispatcher_dispatchMany_RxBatch():
+    """Messages from an RxBatch are copied out before the batch gets reused."""
+    batch = RxBatch(4)
+    for i in range(3):
+        record = rx(0xF004, i, data=bytes([i]))
+        batch.buffer[batch.offsets[i]:batch.offsets[i] + len(record)] = record
+        batch.lengths[i] = len(record)
+    batch.count = 3
+    messages = []
+    dispatcher = J1939Dispatcher()
+    dispatcher.addHandler(messages.append, pgn=0xF004)
+    assert dispatcher.dispatchMany(batch) == 3
+    batch.buffer[:] = bytes(len(batch.buffer))
+    assert [(msg.sa, msg.data) for msg in messages] == [(0, b'\x00'), (1, b'\x01'), (2, b'\x02')]
+
+def test_J1939Dispatcher_dispatchMessage():
+    rec = Recorder()
+    dispatcher = J1939Dispatcher()
+    dispatcher.addHandler(rec.handler("msg"), pgn=0xEA00, sa=0x00)
+    dispatcher.addHandler(rec.handler("raw"), pgn=0xEA00, raw=True)
+    msg = J1939Message(rx(0xEA00, 0x00, da=0x17))
+    assert dispatcher.dispatchMessage(msg) == 2
+    assert rec.calls[0][1][0] is msg
+    assert rec.calls[1][1] == (bytes(msg), 0xEA00, 0x00, 0x17)
+    assert dispatcher.dispatchMessage(J1939Message(rx(0xEA00, 0x01, da=0x17))) == 1
@@ -0,0 +1,97 @@
+"""
+Tests for RP1210.J1939Faults (DM1Tracker).
+"""
+from RP1210.J1939 import DTC, DiagnosticMessage, J1939Message, toJ1939Message
+from RP1210.J1939Faults import DM1Event, DM1Tracker
+from utilities import FakeClock
+
+def dm1_data(lamps, *dtcs) -> bytes:
+    """Returns DM1 data with lamps and DTCs given as (spn, fmi, oc)."""
+    data = bytes((lamps, 0xFF)) + b''.join(DTC.to_bytes(*dtc) for dtc in dtcs)
+    if not dtcs:
+        data += bytes(4) # no active faults
+    return data.ljust(8, b'\xFF')
+
+def dm1(sa, lamps, *dtcs) -> J1939Message:
+    data = dm1_data(lamps, *dtcs)
+    return J1939Message(bytes(4) + toJ1939Message(0xFECA, 6, sa, 0xFF, data, len(data)))
+
+def test_DM1Tracker_appeared_and_cleared():
+    events = []
+    tracker = DM1Tracker(callback=events.append)
+    assert tracker.process(dm1(0x00, 0x00)) == []
+    assert len(tracker) == 0
+    assert tracker.process(dm1(0x00, 0x04, (100, 1, 1), (190, 2, 5))) == \
+        [DM1Event(True, 0x00, 100, 1, 1), DM1Event(True, 0x00, 190, 2, 5)]
+    assert tracker.faults == {(0x00, 100, 1): 1, (0x00, 190, 2): 5}
+    assert tracker.sources[0x00].awl() == 1
+    assert tracker.process(dm1(0x00, 0x04, (190, 2, 6))) == [DM1Event(False, 0x00, 100, 1, 1)]
+    assert tracker.faults == {(0x00, 190, 2): 6} # new occurrence count, but not an event
+    assert tracker.process(dm1(0x00, 0x00)) == [DM1Event(False, 0x00, 190, 2, 6)]
+    assert tracker.faults == {}
+    assert len(events) == 4
+
+def test_DM1Tracker_unchanged_skipped():
+    tracker = DM1Tracker()
+    msg = dm1(0x03, 0x40, (524286, 31, 126)) # biggest SPN and FMI (all 0xFF is padding)
+    tracker.process(msg)
+    for _ in range(10):
+        assert tracker.process(msg) == []
+    assert (tracker.updates, tracker.unchanged) == (1, 10)
+    assert tracker.isActive(0x03, 524286, 31)
+    assert tracker.isActive(0x03, 524286)
+    assert not tracker.isActive(0x03, 524286, 30)
+    assert not tracker.isActive(0x04, 524286)
+    assert tracker.sources[0x03].mil() == 1
+
+def test_DM1Tracker_multiple_sources():
+    tracker = DM1Tracker()
+    tracker.process(dm1(0x00, 0x04, (100, 1, 1)))
+    tracker.process(dm1(0x03, 0x04, (100, 1, 1), (523, 4, 2)))
+    tracker.process(dm1(0x0B, 0x00))
+    tracker.process(J1939Message(bytes(4) + toJ1939Message(0xFECB, 6, 0x00, 0xFF, bytes(8)))) # DM2; ignored
+    assert len(tracker) == 3
+    assert tracker.activeFaults(0x03) == {(100, 1): 1, (523, 4): 2}
+    assert tracker.activeFaults(0x21) == {}
+    assert set(tracker.activeFaults()) == {(0x00, 100, 1), (0x03, 100, 1), (0x03, 523, 4)}
+    assert tracker.removeSource(0x03) == [DM1Event(False, 0x03, 100, 1, 1), DM1Event(False, 0x03, 523, 4, 2)]
+    assert tracker.removeSource(0x03) == []
+    assert set(tracker.activeFaults()) == {(0x00, 100, 1)}
+    tracker.clear()
+    assert tracker.faults == {} and tracker.sources == {}
+
+def test_DM1Tracker_matches_DiagnosticMessage():
+    """Faults decoded from raw data match what DiagnosticMessage gets."""
+    dtcs = [(spn, spn % 32, spn % 127) for spn in (1, 255, 256, 65535, 65536, 100000, 524286)]
+    tracker = DM1Tracker()
+    msg = dm1(0x00, 0x55, *dtcs)
+    tracker.process(bytes(4) + bytes(msg)) # raw RP1210_ReadMessage bytes work too
+    expected = {(0x00, dtc.spn, dtc.fmi): dtc.oc for dtc in DiagnosticMessage(msg).codes if dtc}
+    assert tracker.faults == expected
+    assert len(expected) == len(dtcs)
+
+def test_DM1Tracker_padding_and_short_data():
+    tracker = DM1Tracker()
+    assert tracker.update(0x00, b'') == []
+    assert tracker.update(0x00, b'\x04\xFF\x64\x00') == [] # partial DTC is ignored
+    assert tracker.update(0x00, b'\x04\xFF' + b'\xFF' * 8) == []
+    assert len(tracker) == 0
+    assert tracker.sources[0x00].lamps == 0x04
+
+def test_DM1Tracker_timeout():
+    clock = FakeClock()
+    tracker = DM1Tracker(timeout=3, clock=clock)
+    tracker.process(dm1(0x00, 0x04, (100, 1, 1)))
+    tracker.process(dm1(0x03, 0x04, (110, 3, 1)))
+    clock.now = 2.0
+    tracker.process(dm1(0x03, 0x04, (110, 3, 1))) # unchanged, but still counts as seen
+    clock.now = 3.0
+    assert tracker.checkTimeouts() == [DM1Event(False, 0x00, 100, 1, 1)]
+    assert list(tracker.sources) == [0x03]
+    assert DM1Tracker().checkTimeouts() == []
+
+def test_DM1Event():
+    event = DM1Event(True, 0x00, 523, 4, 2)
+    assert event.dtc() == DTC(spn=523, fmi=4, oc=2)
+    assert repr(event) == "DM1Event(appeared, sa=0x00, spn=523, fmi=4, oc=2)"
+    assert event != "DM1Event"
@@ -0,0 +1,169 @@
+"""
+Tests for RP1210.J1939Filters (J1939FilterSet).
+"""
+import pytest
+from RP1210 import RP1210Client
+from RP1210.J1939 import toJ1939Message
+from RP1210.J1939Filters import J1939FilterSet, FILTER_PGN, FILTER_SOURCE, FILTER_DEST
+
+def rx(pgn, sa, da = 0xFF, echo = None) -> bytes:
+    """Returns a message like one from client.rx()."""
+    echo_byte = b'' if echo is None else bytes([echo])
+    return bytes(4) + echo_byte + toJ1939Message(pgn, 6, sa, da, b'\x01\x02\x03')
+
+class FakeJ1939FilterDLL():
+    """A fake RP1210 DLL that records J1939 filters and runs out of them after max_filters."""
+    def __init__(self, max_filters = 16, support_filter_type = True):
+        self.max_filters = max_filters
+        self.support_filter_type = support_filter_type
+        self.pass_all = True
+        self.filters = [] # (flag, pgn, sa, da)
+        self.RP1210_SendCommand = self.command
+
+    def command(self, CommandNumber, ClientID, ClientCommand, MessageSize):
+        if CommandNumber == 3: # Set All Filter States to Pass
+            self.pass_all = True
+            self.filters = []
+        elif CommandNumber == 17: # Set All Filter States to Discard
+            self.pass_all = False
+            self.filters = []
+        elif CommandNumber == 25: # Set J1939 Filter Type
+            if not self.support_filter_type:
+                return 0x10000 - 143 # ERR_COMMAND_NOT_SUPPORTED
+        elif CommandNumber == 4: # Set Message Filtering for J1939
+            if len(self.filters) >= self.max_filters:
+                return 0x10000 - 161 # ERR_MAX_FILTERS_EXCEEDED
+            cmd = bytes(ClientCommand[:MessageSize])
+            self.filters.append((cmd[0], int.from_bytes(cmd[1:4], 'little'), cmd[5], cmd[6]))
+        return 0
+
+def make_client(dll) -> RP1210Client:
+    client = RP1210Client("Test/test-files/RP121032.ini", "Test/test-files/dlls", "Test/test-files/ini-files")
+    client.setVendor("NULN2R32")
+    client.getAPI().dll = dll
+    return client
+
+def test_J1939FilterSet_empty():
+    filters = J1939FilterSet()
+    assert not filters.matches(0xF004, 0x00)
+    filters.addFilter(0) # passes everything
+    assert filters.matches(0xF004, 0x00)
+    assert filters.matches(0xEA00, 0x17, 0x00)
+
+@pytest.mark.parametrize("filter_flag, pgn, source, dest, passing", argvalues=[
+    (FILTER_PGN, 0xF004, 0, 0, [(0xF004, 0x00, 0xFF), (0xF004, 0x01, 0xFF)]),
+    (FILTER_SOURCE, 0, 0x01, 0, [(0xF004, 0x01, 0xFF), (0xEA00, 0x01, 0x17), (0xEA00, 0x01, 0xFF), (0xFEF1, 0x01, 0xFF)]),
+    (FILTER_DEST, 0, 0, 0x17, [(0xEA00, 0x00, 0x17), (0xEA00, 0x01, 0x17)]),
+    (FILTER_PGN + FILTER_SOURCE, 0xF004, 0x01, 0, [(0xF004, 0x01, 0xFF)]),
+    (FILTER_PGN + FILTER_DEST, 0xEA00, 0, 0x17, [(0xEA00, 0x00, 0x17), (0xEA00, 0x01, 0x17)]),
+    (FILTER_SOURCE + FILTER_DEST, 0, 0x00, 0x17, [(0xEA00, 0x00, 0x17)]),
+    (FILTER_PGN + FILTER_SOURCE + FILTER_DEST, 0xEA17, 0x01, 0x17, [(0xEA00, 0x01, 0x17)]),
+])
+def test_J1939FilterSet_matches(filter_flag, pgn, source, dest, passing):
+    messages = [(pgn, sa, da) for pgn in (0xF004, 0xEA00, 0xFEF1) for sa in (0x00, 0x01) for da in (0x17, 0xFF)
+                if pgn >= 0xF000 and da == 0xFF or pgn < 0xF000]
+    filters = J1939FilterSet()
+    filters.addFilter(filter_flag, pgn, source, dest)
+    assert [msg for msg in messages if filters.matches(*msg)] == passing
+    # same thing on raw messages
+    records = [rx(*msg) for msg in messages]
+    assert filters.filterRecords(records) == [rx(*msg) for msg in passing]
+    assert filters.passed == len(passing)
+    assert filters.sw_rejected == len(messages) - len(passing)
+    assert filters.hw_rejected == 0
+
+def test_J1939FilterSet_many():
+    filters = J1939FilterSet()
+    for pgn in range(0xFF00, 0x10000):
+        filters.addFilter(FILTER_PGN, pgn=pgn)
+    for sa in range(0x80, 0x90):
+        filters.addFilter(FILTER_PGN + FILTER_SOURCE, pgn=0xF004, source=sa)
+    filters.addFilter(FILTER_PGN, pgn=0xFF00) # duplicate
+    assert len(filters) == 256 + 16
+    assert filters.matches(0xFF80, 0x00)
+    assert filters.matches(0xF004, 0x85)
+    assert not filters.matches(0xF004, 0x90)
+    assert not filters.matches(0xFEFF, 0x85)
+    assert filters.removeFilter(FILTER_PGN, pgn=0xFF80)
+    assert not filters.removeFilter(FILTER_PGN, pgn=0xFF80)
+    assert not filters.matches(0xFF80, 0x00)
+    filters.clear()
+    assert not filters.matches(0xFF00, 0x00)
+
+def test_J1939FilterSet_priority_flag_ignored():
+    filters = J1939FilterSet()
+    filters.addFilter(FILTER_PGN + 0x02, pgn=0xF004)
+    assert filters.filters == [(FILTER_PGN, 0xF004, 0, 0)]
+
+def test_J1939FilterSet_invalid_args():
+    filters = J1939FilterSet()
+    with pytest.raises(ValueError):
+        filters.addFilter(0x10)
+    with pytest.raises(ValueError):
+        filters.addFilter(FILTER_PGN, pgn=0x40000)
+    with pytest.raises(ValueError):
+        filters.addFilter(FILTER_SOURCE, source=256)
+    with pytest.raises(ValueError):
+        filters.addFilter(FILTER_DEST, dest=-1)
+    filters.addFilter(FILTER_SOURCE, source=0x00, dest=256) # unused fields aren't checked
+
+def test_J1939FilterSet_check():
+    filters = J1939FilterSet(echo=True)
+    filters.addFilter(FILTER_PGN, pgn=0xF004)
+    assert filters.check(rx(0xF004, 0x00, echo=1))
+    assert not filters.check(rx(0xF003, 0x00, echo=0))
+    assert not filters.check(b'\x00' * 10) # too short with echo
+    assert (filters.passed, filters.sw_rejected) == (1, 2)
+    filters.resetCounters()
+    assert (filters.passed, filters.hw_rejected, filters.sw_rejected) == (0, 0, 0)
+
+def test_J1939FilterSet_hardwareFilters():
+    filters = J1939FilterSet()
+    for sa in range(8):
+        filters.addFilter(FILTER_PGN + FILTER_SOURCE, pgn=0xF004, source=sa)
+        filters.addFilter(FILTER_PGN + FILTER_SOURCE, pgn=0xFEF1, source=sa)
+    assert filters.hardwareFilters() == filters.filters
+    # PGN-only filters pass less than source-only filters
+    assert filters.hardwareFilters(8) == [(FILTER_PGN, 0xF004, 0, 0), (FILTER_PGN, 0xFEF1, 0, 0)]
+    assert filters.hardwareFilters(1) is None
+    filters.addFilter(FILTER_SOURCE, source=0x20)
+    assert filters.hardwareFilters(8) is None # can't drop the source from a source-only filter
+
+def test_J1939FilterSet_apply():
+    dll = FakeJ1939FilterDLL(max_filters=16)
+    client = make_client(dll)
+    filters = J1939FilterSet()
+    for pgn in (0xF004, 0xFEF1, 0xFECA):
+        filters.addFilter(FILTER_PGN, pgn=pgn)
+    assert filters.apply(client)
+    assert dll.filters == filters.filters == filters.hardware_filters
+    assert not dll.pass_all
+
+def test_J1939FilterSet_apply_broadened():
+    """If the adapter runs out of filters, broader ones are set and the rest is checked in software."""
+    dll = FakeJ1939FilterDLL(max_filters=4)
+    client = make_client(dll)
+    filters = J1939FilterSet()
+    for sa in range(8):
+        filters.addFilter(FILTER_PGN + FILTER_SOURCE, pgn=0xF004, source=sa)
+    filters.addFilter(FILTER_PGN + FILTER_SOURCE, pgn=0xFEF1, source=0x00)
+    assert not filters.apply(client)
+    assert dll.filters == filters.hardware_filters == [(FILTER_PGN, 0xF004, 0, 0), (FILTER_PGN, 0xFEF1, 0, 0)]
+    records = [rx(0xF004, 0x00), rx(0xF004, 0x10), rx(0xFEF1, 0x01), rx(0xFECA, 0x00)]
+    assert filters.filterRecords(records) == [rx(0xF004, 0x00)]
+    assert (filters.passed, filters.sw_rejected, filters.hw_rejected) == (1, 2, 1)
+    # max_filters limits it further
+    assert not filters.apply(client, max_filters=1)
+    assert dll.pass_all
+    assert filters.hardware_filters is None
+
+def test_J1939FilterSet_apply_pass_all():
+    dll = FakeJ1939FilterDLL(support_filter_type=False)
+    client = make_client(dll)
+    filters = J1939FilterSet()
+    filters.addFilter(FILTER_PGN, pgn=0xF004)
+    assert not filters.apply(client)
+    assert dll.pass_all
+    assert filters.hardware_filters is None
+    assert filters.filterRecords([rx(0xF004, 0x00), rx(0xFEF1, 0x00)]) == [rx(0xF004, 0x00)]
+    assert (filters.passed, filters.sw_rejected, filters.hw_rejected) == (1, 1, 0)
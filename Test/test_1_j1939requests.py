@@ -0,0 +1,195 @@
+"""
+Tests for RP1210.J1939Requests (J1939Requester).
+"""
+import time
+from concurrent.futures import CancelledError
+import pytest
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.J1939Requests import (J1939Requester, ackControl, ACK_PGN, ACK_NEGATIVE, ACK_POSITIVE)
+from RP1210.J1939Transport import J1939Transmitter
+from utilities import FakeClock
+
+ME = 0xF9
+
+def j1939(pgn, sa, da, data, pri = 6) -> J1939Message:
+    """Returns a J1939Message like one from client.rx()."""
+    return J1939Message(bytes(4) + toJ1939Message(pgn, pri, sa, da, data, len(data)))
+
+def ack(control, sa, pgn, da = ME) -> J1939Message:
+    return j1939(ACK_PGN, sa, da, bytes((control, 0xFF, 0xFF, 0xFF, ME)) + pgn.to_bytes(3, 'little'))
+
+def decode_request(message : bytes) -> tuple:
+    """Returns (requested pgn, sa, da) from a request sent with tx."""
+    assert message[0:3] == b'\x00\xEA\x00'
+    return int.from_bytes(message[6:9], 'little'), message[4], message[5]
+
+def make_requester(**kwargs) -> tuple:
+    sent = []
+    clock = FakeClock()
+    requester = J1939Requester(lambda msg: sent.append(bytes(msg)) or 0, ME, clock=clock, **kwargs)
+    return requester, sent, clock
+
+def test_J1939Requester_invalid_args():
+    with pytest.raises(ValueError):
+        J1939Requester(print, 0xFE)
+    requester, _, _ = make_requester()
+    with pytest.raises(ValueError):
+        requester.request(0x40000)
+    with pytest.raises(ValueError):
+        requester.request(0xFEEB, da=0x100)
+
+def test_J1939Requester_concurrent():
+    """Requests to many ECUs are all in flight at once and answered in any order."""
+    requester, sent, clock = make_requester()
+    futures = {sa: requester.request(0xFEDA, da=sa) for sa in range(10)}
+    assert [decode_request(msg) for msg in sent] == [(0xFEDA, ME, sa) for sa in range(10)]
+    assert len(requester) == 10
+    for sa in reversed(range(0, 10, 2)):
+        requester.process(j1939(0xFEDA, sa, 0xFF, bytes([sa]) * 8))
+    requester.process(j1939(0xFEDB, 1, 0xFF, bytes(8))) # wrong PGN
+    assert [sa for sa, future in futures.items() if future.done()] == [0, 2, 4, 6, 8]
+    assert futures[4].result().data == b'\x04' * 8
+    clock.now = 1.0
+    assert requester.poll() == pytest.approx(0.25)
+    clock.now = 1.25
+    assert requester.poll() is None
+    for sa in range(1, 10, 2):
+        with pytest.raises(TimeoutError):
+            futures[sa].result(timeout=0)
+    assert (requester.sent, requester.answered, requester.timed_out) == (10, 5, 5)
+    assert len(requester) == 0
+
+def test_J1939Requester_pdu1():
+    """PDU1 responses are matched if they're sent to us or to everyone."""
+    requester, sent, _ = make_requester()
+    future = requester.request(0xEF00, da=0x00)
+    assert decode_request(sent[0]) == (0xEF00, ME, 0x00)
+    requester.process(j1939(0xEF00, 0x00, 0x17, bytes(8))) # to someone else
+    assert not future.done()
+    requester.process(j1939(0xEF00, 0x00, ME, bytes(8)))
+    assert future.result().pgn == 0xEFF9
+
+def test_J1939Requester_nack():
+    requester, _, _ = make_requester()
+    future = requester.request(0xFEEB, da=0x03)
+    other = requester.request(0xFEEC, da=0x03)
+    requester.process(ack(ACK_NEGATIVE, 0x03, 0xFEEB))
+    msg = future.result(timeout=0)
+    assert ackControl(msg) == ACK_NEGATIVE
+    assert ackControl(j1939(0xFEEB, 0x03, 0xFF, bytes(8))) is None
+    requester.process(ack(ACK_POSITIVE, 0x03, 0xFEEC))
+    assert ackControl(other.result(timeout=0)) == ACK_POSITIVE
+    assert requester.nacked == 1
+
+def test_J1939Requester_duplicate_requests_share_response():
+    requester, sent, _ = make_requester()
+    first = requester.request(0xFEE5, da=0x00)
+    second = requester.request(0xFEE5, da=0x00)
+    assert len(sent) == 1
+    requester.process(j1939(0xFEE5, 0x00, 0xFF, bytes(8)))
+    assert first.result(timeout=0) is second.result(timeout=0)
+
+def test_J1939Requester_global():
+    requester, sent, clock = make_requester()
+    everyone = requester.request(0xFEDA)
+    known = requester.request(0xFEDA, expected=[0x00, 0x03], timeout=5)
+    assert len(sent) == 1
+    assert decode_request(sent[0]) == (0xFEDA, ME, 0xFF)
+    requester.process(j1939(0xFEDA, 0x00, 0xFF, b'\x00' * 8))
+    requester.process(j1939(0xFEDA, 0x03, 0xFF, b'\x03' * 8))
+    assert sorted(known.result(timeout=0)) == [0x00, 0x03] # didn't wait for the timeout
+    requester.process(j1939(0xFEDA, 0x0B, 0xFF, b'\x0B' * 8))
+    assert not everyone.done()
+    clock.now = 1.25
+    requester.poll()
+    assert sorted(everyone.result(timeout=0)) == [0x00, 0x03, 0x0B]
+    assert requester.timed_out == 0
+
+def test_J1939Requester_multipacket_bam():
+    requester, _, clock = make_requester()
+    future = requester.request(0xFEEB, da=0x00)
+    data = b'MAKE*MODEL*SERIAL*UNIT*'
+    transmitter = J1939Transmitter(lambda msg: requester.process(J1939Message(bytes(4) + msg)), bam_interval=0.5,
+                                   clock=clock)
+    transmitter.send(0xFEEB, 0x00, 0xFF, data)
+    while transmitter.sessions:
+        clock.now += 0.5 # slower than timeout, but the BAM pushes the deadline back
+        requester.poll()
+        transmitter.poll()
+    assert future.result(timeout=0).data == data
+
+def test_J1939Requester_multipacket_rts_cts():
+    requester, sent, clock = make_requester()
+    future = requester.request(0xFEEB, da=0x00)
+    data = bytes(range(40))
+    to_transmitter = []
+    transmitter = J1939Transmitter(lambda msg: requester.process(J1939Message(bytes(4) + msg)), clock=clock)
+    requester.reassembler.tx = lambda msg: to_transmitter.append(J1939Message(bytes(4) + msg))
+    transmitter.send(0xFEEB, 0x00, ME, data)
+    for _ in range(100):
+        while to_transmitter:
+            transmitter.process(to_transmitter.pop(0))
+        transmitter.poll()
+        if future.done():
+            break
+    assert future.result(timeout=0).data == data
+
+def test_J1939Requester_no_reassembler():
+    requester, _, clock = make_requester(timeout=1.0)
+    requester.reassembler = None
+    future = requester.request(0xFEEB, da=0x00)
+    clock.now += 0.9
+    # BAM announcing the response: nothing reassembles it here, but it still pushes the deadline back
+    requester.process(j1939(0xEC00, 0x00, 0xFF, bytes((0x20, 23, 0, 4, 0xFF, 0xEB, 0xFE, 0x00))))
+    clock.now += 0.9
+    requester.poll()
+    assert not future.done()
+    requester.process(j1939(0xFEEB, 0x00, 0xFF, b'MAKE*MODEL*SERIAL*UNIT*')) # reassembled elsewhere
+    assert future.result(timeout=0).data == b'MAKE*MODEL*SERIAL*UNIT*'
+
+def test_J1939Requester_tx_retry():
+    results = [0x10000 - 137, 0] # ERR_TX_QUEUE_FULL, then OK
+    sent = []
+    def tx(msg):
+        sent.append(bytes(msg))
+        return results.pop(0) if results else 0
+    clock = FakeClock()
+    requester = J1939Requester(tx, ME, clock=clock)
+    future = requester.request(0xFEEB, da=0x00)
+    assert requester.sent == 0
+    requester.poll()
+    assert requester.sent == 1
+    assert len(sent) == 2
+    requester.process(j1939(0xFEEB, 0x00, 0xFF, bytes(8)))
+    assert future.done()
+
+def test_J1939Requester_cancel():
+    requester, _, clock = make_requester()
+    future = requester.request(0xFEEB, da=0x00)
+    assert future.cancel()
+    requester.process(j1939(0xFEEB, 0x00, 0xFF, bytes(8)))
+    assert requester.poll() is None
+    with pytest.raises(CancelledError):
+        future.result(timeout=0)
+
+def test_J1939Requester_flush():
+    requester = J1939Requester(lambda msg: 0, ME)
+    futures = [requester.request(0xFEDA, da=sa, timeout=0.05) for sa in range(3)]
+    inbox = [bytes(4) + toJ1939Message(0xFEDA, 6, sa, 0xFF, bytes(8)) for sa in range(2)]
+    rx = lambda: inbox.pop(0) if inbox else b''
+    assert not requester.flush(rx=rx, timeout=0.01)
+    assert [future.done() for future in futures] == [True, True, False]
+    start = time.monotonic()
+    assert requester.flush(rx=rx, timeout=2)
+    assert time.monotonic() - start < 1
+    assert isinstance(futures[2].exception(timeout=0), TimeoutError)
+
+def test_J1939Requester_flush_cpu():
+    # waiting for responses sleeps between rx polls instead of busy-waiting
+    requester = J1939Requester(lambda msg: 0, ME)
+    future = requester.request(0xFEDA, da=0x00, timeout=0.3)
+    start, cpu = time.monotonic(), time.process_time()
+    assert requester.flush(rx=lambda: b'', timeout=2)
+    assert time.monotonic() - start >= 0.3
+    assert time.process_time() - cpu < 0.15
+    assert isinstance(future.exception(timeout=0), TimeoutError)
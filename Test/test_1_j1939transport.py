@@ -0,0 +1,355 @@
+"""
+Tests for RP1210.J1939Transport (J1939Reassembler, J1939Transmitter).
+"""
+import random
+import time
+import pytest
+from RP1210.J1939 import J1939Message, toJ1939Message
+from RP1210.J1939Transport import J1939Reassembler, J1939Transmitter, TP_CM_PGN, TP_DT_PGN, TP_MAX_SIZE, TX_SENDING
+from utilities import FakeClock
+
+def j1939(pgn, sa, da, data, timestamp = 0, pri = 7) -> J1939Message:
+    """Returns a J1939Message like one from client.rx()."""
+    return J1939Message(timestamp.to_bytes(4, 'big') + toJ1939Message(pgn, pri, sa, da, data))
+
+def control(control_byte, size, packets, byte5, pgn) -> bytes:
+    return bytes((control_byte, size & 0xFF, size >> 8, packets, byte5)) + pgn.to_bytes(3, 'little')
+
+def data_packets(sa, da, data, first = 1, count = 255) -> list[J1939Message]:
+    """Returns TP.DT packets first through first + count - 1 for data."""
+    packets = []
+    for seq in range(first, min((len(data) + 6) // 7, first + count - 1) + 1):
+        chunk = data[(seq - 1) * 7:seq * 7]
+        packets.append(j1939(TP_DT_PGN, sa, da, bytes([seq]) + chunk + b'\xFF' * (7 - len(chunk)), timestamp=seq))
+    return packets
+
+def bam(pgn, sa, data) -> list[J1939Message]:
+    packets = (len(data) + 6) // 7
+    return [j1939(TP_CM_PGN, sa, 0xFF, control(32, len(data), packets, 0xFF, pgn))] + data_packets(sa, 0xFF, data)
+
+def decode_cm(message : bytes) -> tuple:
+    """Returns (sa, da, control bytes) from a TP.CM message sent with tx."""
+    assert message[0:3] == b'\x00\xEC\x00'
+    return message[4], message[5], message[6:]
+
+def test_J1939Reassembler_invalid_args():
+    with pytest.raises(ValueError):
+        J1939Reassembler(max_sessions=0)
+    with pytest.raises(ValueError):
+        J1939Reassembler(cts_packets=0)
+
+def test_J1939Reassembler_bam():
+    dm1_data = bytes(range(20))
+    reassembler = J1939Reassembler()
+    results = [reassembler.process(msg) for msg in bam(0xFECA, 0x12, dm1_data)]
+    assert results[:-1] == [None] * 3
+    msg = results[-1]
+    assert (msg.pgn, msg.sa, msg.da, msg.pri) == (0xFECA, 0x12, 0xFF, 7)
+    assert msg.data == dm1_data
+    assert msg.timestamp == 3 # from last packet
+    assert reassembler.completed == 1
+    assert len(reassembler) == 0
+
+def test_J1939Reassembler_ignores_other_messages():
+    reassembler = J1939Reassembler()
+    assert reassembler.process(j1939(0xF004, 0x00, 0xFF, bytes(8))) is None
+    assert reassembler.process(j1939(0x1EB00, 0x00, 0xFF, bytes(8))) is None # data page 1
+    assert reassembler.process(j1939(TP_CM_PGN, 0x00, 0xFF, b'\x20\x09')) is None # too short
+    assert reassembler.process(j1939(TP_DT_PGN, 0x00, 0xFF, bytes(8))) is None
+    assert reassembler.unexpected == 1
+    assert len(reassembler) == 0
+
+def test_J1939Reassembler_many_interleaved_bams():
+    """DM1 BAMs from 40 ECUs at once, packets interleaved."""
+    rng = random.Random(1939)
+    streams = [bam(0xFECA, sa, bytes([sa]) * rng.randint(9, 200)) for sa in range(40)]
+    messages = []
+    while streams:
+        stream = rng.choice(streams)
+        messages.append(stream.pop(0))
+        if not stream:
+            streams.remove(stream)
+    reassembler = J1939Reassembler(max_sessions=40)
+    results = reassembler.processMany(messages)
+    assert sorted(msg.sa for msg in results) == list(range(40))
+    assert all(msg.data == bytes([msg.sa]) * len(msg.data) for msg in results)
+    assert reassembler.completed == 40
+    assert reassembler.rejected == reassembler.aborted == 0
+
+def test_J1939Reassembler_rts_cts_receiver():
+    sent = []
+    reassembler = J1939Reassembler(address=0xF9, tx=sent.append, cts_packets=2)
+    data = bytes(range(30)) # 5 packets
+    packets = data_packets(0x00, 0xF9, data)
+    assert reassembler.process(j1939(TP_CM_PGN, 0x00, 0xF9, control(16, 30, 5, 0xFF, 0xFEE3))) is None
+    assert [decode_cm(msg) for msg in sent] == [(0xF9, 0x00, control(17, 0x0102, 0xFF, 0xFF, 0xFEE3))] # 2 from 1
+    assert reassembler.process(packets[0]) is None
+    assert reassembler.process(packets[0]) is None # duplicate is ignored
+    assert reassembler.process(packets[1]) is None
+    assert decode_cm(sent[-1])[2] == control(17, 0x0302, 0xFF, 0xFF, 0xFEE3) # 2 from 3
+    reassembler.process(packets[2])
+    reassembler.process(packets[3])
+    assert decode_cm(sent[-1])[2] == control(17, 0x0501, 0xFF, 0xFF, 0xFEE3) # 1 from 5
+    msg = reassembler.process(packets[4])
+    assert (msg.pgn, msg.sa, msg.data) == (0xFEE3, 0x00, data)
+    assert decode_cm(sent[-1]) == (0xF9, 0x00, control(19, 30, 5, 0xFF, 0xFEE3)) # EndOfMsgAck
+    assert len(sent) == 4
+
+def test_J1939Reassembler_rts_max_per_cts():
+    sent = []
+    reassembler = J1939Reassembler(address=0xF9, tx=sent.append, cts_packets=16)
+    reassembler.process(j1939(TP_CM_PGN, 0x00, 0xF9, control(16, 30, 5, 3, 0xFEE3)))
+    assert decode_cm(sent[-1])[2] == control(17, 0x0103, 0xFF, 0xFF, 0xFEE3) # 3 from 1
+
+def test_J1939Reassembler_rts_cts_passive():
+    """Sessions between other nodes are followed, including retransmissions requested by CTS."""
+    reassembler = J1939Reassembler(address=0xF9, tx=lambda msg: pytest.fail("nothing should be sent"))
+    data = bytes(range(100, 121)) # 3 packets
+    packets = data_packets(0x00, 0x17, data)
+    reassembler.process(j1939(TP_CM_PGN, 0x00, 0x17, control(16, 21, 3, 0xFF, 0xEF00)))
+    reassembler.process(j1939(TP_CM_PGN, 0x17, 0x00, control(17, 0x0102, 0xFF, 0xFF, 0xEF00)))
+    reassembler.process(packets[0])
+    reassembler.process(packets[1])
+    # receiver asks for packet 2 again
+    reassembler.process(j1939(TP_CM_PGN, 0x17, 0x00, control(17, 0x0202, 0xFF, 0xFF, 0xEF00)))
+    assert reassembler.process(packets[1]) is None
+    msg = reassembler.process(packets[2])
+    assert (msg.pgn, msg.sa, msg.da, msg.data) == (0xEF17, 0x00, 0x17, data) # PDU1: PS byte = DA
+
+def test_J1939Reassembler_bad_sequence():
+    sent = []
+    reassembler = J1939Reassembler(address=0xF9, tx=sent.append)
+    packets = data_packets(0x00, 0xF9, bytes(21))
+    reassembler.process(j1939(TP_CM_PGN, 0x00, 0xF9, control(16, 21, 3, 0xFF, 0xFEE3)))
+    reassembler.process(packets[0])
+    assert reassembler.process(packets[2]) is None
+    assert reassembler.aborted == 1
+    assert len(reassembler) == 0
+    assert decode_cm(sent[-1])[2] == bytes((255, 7, 0xFF, 0xFF, 0xFF)) + b'\xE3\xFE\x00'
+    # BAM with a missing packet
+    messages = bam(0xFECA, 0x12, bytes(30))
+    del messages[2]
+    assert reassembler.processMany(messages) == []
+    assert reassembler.aborted == 2
+
+def test_J1939Reassembler_abort():
+    reassembler = J1939Reassembler()
+    packets = data_packets(0x00, 0x17, bytes(21))
+    reassembler.process(j1939(TP_CM_PGN, 0x00, 0x17, control(16, 21, 3, 0xFF, 0xFEE5)))
+    reassembler.process(packets[0])
+    reassembler.process(j1939(TP_CM_PGN, 0x17, 0x00, control(255, 0xFF03, 0xFF, 0xFF, 0xFEE4))) # wrong PGN
+    assert len(reassembler) == 1
+    reassembler.process(j1939(TP_CM_PGN, 0x17, 0x00, control(255, 0xFF03, 0xFF, 0xFF, 0xFEE5)))
+    assert len(reassembler) == 0
+    assert reassembler.aborted == 1
+    assert reassembler.process(packets[1]) is None
+    assert reassembler.unexpected == 1
+
+def test_J1939Reassembler_new_session_replaces_old():
+    reassembler = J1939Reassembler()
+    first, second = bam(0xFECA, 0x12, b'\x01' * 20), bam(0xFECB, 0x12, b'\x02' * 10)
+    reassembler.processMany(first[:2])
+    results = reassembler.processMany(second + first[2:])
+    assert [(msg.pgn, msg.data) for msg in results] == [(0xFECB, b'\x02' * 10)]
+    assert reassembler.aborted == 1
+
+def test_J1939Reassembler_timeouts():
+    clock = FakeClock()
+    sent = []
+    reassembler = J1939Reassembler(address=0xF9, tx=sent.append, clock=clock)
+    reassembler.processMany(bam(0xFECA, 0x12, bytes(30))[:2])
+    reassembler.process(j1939(TP_CM_PGN, 0x00, 0xF9, control(16, 21, 3, 0xFF, 0xFEE3)))
+    clock.now = 1.0 # past T1 for BAM, but not T2 for RTS/CTS
+    reassembler.process(j1939(0xF004, 0x00, 0xFF, bytes(8)))
+    assert reassembler.timed_out == 1
+    assert len(reassembler) == 1
+    clock.now = 2.0
+    expired = reassembler.checkTimeouts()
+    assert [(session.sa, session.da, session.pgn) for session in expired] == [(0x00, 0xF9, 0xFEE3)]
+    assert decode_cm(sent[-1])[2] == bytes((255, 3, 0xFF, 0xFF, 0xFF)) + b'\xE3\xFE\x00'
+    assert reassembler.timed_out == 2
+    assert len(reassembler) == 0
+
+def test_J1939Reassembler_rejected():
+    sent = []
+    reassembler = J1939Reassembler(address=0xF9, tx=sent.append, max_sessions=1)
+    reassembler.process(j1939(TP_CM_PGN, 0x00, 0xF9, control(16, TP_MAX_SIZE + 1, 255, 0xFF, 0xFEE3)))
+    assert decode_cm(sent[-1])[2] == bytes((255, 9, 0xFF, 0xFF, 0xFF)) + b'\xE3\xFE\x00'
+    reassembler.process(j1939(TP_CM_PGN, 0x12, 0xFF, control(32, 20, 3, 0xFF, 0xFECA)))
+    reassembler.process(j1939(TP_CM_PGN, 0x00, 0xF9, control(16, 21, 3, 0xFF, 0xFEE3))) # no free buffer
+    assert decode_cm(sent[-1])[2] == bytes((255, 1, 0xFF, 0xFF, 0xFF)) + b'\xE3\xFE\x00'
+    assert reassembler.rejected == 2
+    reassembler.clear()
+    assert len(reassembler) == 0
+    assert reassembler.processMany(bam(0xFECA, 0x12, bytes(20)))[0].data == bytes(20) # buffer is reused
+
+def test_J1939Transmitter_invalid_args():
+    with pytest.raises(ValueError):
+        J1939Transmitter(print, max_sessions=0)
+    with pytest.raises(ValueError):
+        J1939Transmitter(print, max_per_cts=256)
+    transmitter = J1939Transmitter(print)
+    with pytest.raises(ValueError):
+        transmitter.send(0xFECA, 0x00, 0xFF, bytes(8))
+    with pytest.raises(ValueError):
+        transmitter.send(0xFECA, 0x00, 0xFF, bytes(TP_MAX_SIZE + 1))
+
+def test_J1939Transmitter_bam():
+    clock = FakeClock()
+    sent = []
+    done = []
+    transmitter = J1939Transmitter(sent.append, bam_interval=0.05, clock=clock)
+    data = bytes(range(20))
+    session = transmitter.send(0xFECA, 0x12, 0xFF, data, pri=6, callback=done.append)
+    assert sent == [toJ1939Message(TP_CM_PGN, 6, 0x12, 0xFF, control(32, 20, 3, 0xFF, 0xFECA))]
+    assert transmitter.poll() == pytest.approx(0.05)
+    times = []
+    while not session.done():
+        clock.now += transmitter.poll()
+        count = len(sent)
+        transmitter.poll()
+        times += [clock.now] * (len(sent) - count)
+    assert times == pytest.approx([0.05, 0.10, 0.15])
+    assert transmitter.poll() is None
+    assert done == [session]
+    assert session.error == 0
+    assert transmitter.completed == 1
+    assert transmitter.packets_sent == 4
+    # and it reassembles
+    reassembler = J1939Reassembler()
+    msg = reassembler.processMany(J1939Message(bytes(4) + msg) for msg in sent)[0]
+    assert (msg.pgn, msg.sa, msg.data) == (0xFECA, 0x12, data)
+
+def connect(transmitter, reassembler) -> tuple[list, list]:
+    """Connects transmitter and reassembler to each other. Returns (reassembled, to_transmitter)."""
+    reassembled = []
+    to_transmitter = []
+    transmitter.tx = lambda msg: reassembled.extend(reassembler.processMany([J1939Message(bytes(4) + msg)]))
+    reassembler.tx = lambda msg: to_transmitter.append(J1939Message(bytes(4) + msg))
+    return reassembled, to_transmitter
+
+def run(transmitter, to_transmitter, clock, max_steps = 10000):
+    """Runs transmitter until it's done, advancing clock to whenever the next packet is due."""
+    for _ in range(max_steps):
+        while to_transmitter:
+            transmitter.process(to_transmitter.pop(0))
+        wait = transmitter.poll()
+        if not transmitter:
+            return
+        if wait and not to_transmitter:
+            clock.now += wait
+    raise AssertionError("transmitter didn't finish")
+
+def test_J1939Transmitter_rts_cts():
+    clock = FakeClock()
+    transmitter = J1939Transmitter(None, clock=clock)
+    reassembler = J1939Reassembler(address=0x00, cts_packets=3, clock=clock)
+    received, to_transmitter = connect(transmitter, reassembler)
+    data = bytes(range(256)) * 6 + bytes(100) # 1636 bytes, 234 packets
+    session = transmitter.send(0xEF00, 0xF9, 0x00, data)
+    run(transmitter, to_transmitter, clock)
+    assert [(msg.pgn, msg.sa, msg.da, msg.data) for msg in received] == [(0xEF00, 0xF9, 0x00, data)]
+    assert session.error == 0
+    assert clock.now == 0 # rts_interval = 0, so it's all sent at once
+    assert transmitter.packets_sent == 1 + 234
+
+def test_J1939Transmitter_concurrent_sessions():
+    clock = FakeClock()
+    transmitter = J1939Transmitter(None, max_sessions=3, bam_interval=0.05, clock=clock)
+    reassembler = J1939Reassembler(address=0x00, clock=clock)
+    received, to_transmitter = connect(transmitter, reassembler)
+    messages = [(0xEF00, 0xF9, 0x00, b'\x01' * 100), (0xEF00, 0xF9, 0x00, b'\x02' * 50), # same DA; queued
+                (0xFECA, 0xF9, 0xFF, b'\x03' * 30), (0xFECA, 0xFA, 0xFF, b'\x04' * 30),
+                (0xEF00, 0xFB, 0x00, b'\x05' * 500)] # past max_sessions; queued
+    sessions = [transmitter.send(*args) for args in messages]
+    assert len(transmitter) == 5
+    assert len(transmitter.sessions) == 3
+    run(transmitter, to_transmitter, clock)
+    assert sorted(msg.data for msg in received) == sorted(args[3] for args in messages)
+    assert all(session.done() and session.error == 0 for session in sessions)
+    assert transmitter.completed == 5
+    assert clock.now == pytest.approx(0.25) # BAMs: 5 packets, 50 ms apart
+
+def test_J1939Transmitter_timeout():
+    clock = FakeClock()
+    sent = []
+    transmitter = J1939Transmitter(sent.append, clock=clock)
+    session = transmitter.send(0xEF00, 0xF9, 0x00, bytes(20))
+    clock.now = 1.0
+    assert transmitter.poll() == pytest.approx(0.25)
+    clock.now = 1.25
+    transmitter.poll()
+    assert session.done()
+    assert session.error == 3
+    assert transmitter.timed_out == 1
+    assert sent[-1] == toJ1939Message(TP_CM_PGN, 7, 0xF9, 0x00, bytes((255, 3, 0xFF, 0xFF, 0xFF)) + b'\x00\xEF\x00')
+
+def test_J1939Transmitter_cts_hold_resend_and_abort():
+    clock = FakeClock()
+    sent = []
+    transmitter = J1939Transmitter(sent.append, clock=clock)
+    session = transmitter.send(0xEF00, 0xF9, 0x00, bytes(range(21)))
+    cts = lambda count, next_seq, pgn = 0xEF00: j1939(TP_CM_PGN, 0x00, 0xF9, control(17, count | (next_seq << 8), 0xFF, 0xFF, pgn))
+    transmitter.process(cts(0, 1)) # hold
+    clock.now = 1.0
+    transmitter.poll()
+    assert not session.done() # hold_timeout is 1.05 s
+    transmitter.process(cts(2, 1, pgn=0xEF01)) # wrong PGN; ignored
+    transmitter.process(cts(2, 1))
+    transmitter.poll()
+    assert [msg[6] for msg in sent[1:]] == [1, 2]
+    transmitter.process(cts(1, 2)) # resend packet 2
+    transmitter.poll()
+    assert sent[-1][6:] == bytes([2]) + bytes(range(7, 14))
+    transmitter.process(j1939(TP_CM_PGN, 0x00, 0xF9, control(255, 0xFF02, 0xFF, 0xFF, 0xEF00)))
+    assert session.done()
+    assert session.error == 2
+    assert transmitter.aborted == 1
+    assert transmitter.poll() is None
+
+def test_J1939Transmitter_tx_retry():
+    clock = FakeClock()
+    results = [0, 137, 137, 0, 0, 0] # ERR_TX_QUEUE_FULL twice
+    sent = []
+    def tx(msg):
+        ret_val = results.pop(0)
+        if not ret_val:
+            sent.append(msg)
+        return ret_val
+    transmitter = J1939Transmitter(tx, bam_interval=0.05, retry_interval=0.001, clock=clock)
+    session = transmitter.send(0xFECA, 0x12, 0xFF, bytes(20))
+    while not session.done():
+        clock.now += transmitter.poll()
+        transmitter.poll()
+    assert transmitter.tx_errors == 2
+    assert [msg[6] for msg in sent[1:]] == [1, 2, 3]
+    assert clock.now == pytest.approx(0.152)
+
+def test_J1939Transmitter_flush():
+    sent = []
+    transmitter = J1939Transmitter(sent.append, bam_interval=0.002)
+    transmitter.send(0xFECA, 0x12, 0xFF, bytes(70))
+    start = time.monotonic()
+    assert transmitter.flush(timeout=2)
+    assert 0.018 <= time.monotonic() - start < 1
+    assert len(sent) == 11
+    # RTS/CTS without anyone answering times out
+    transmitter = J1939Transmitter(sent.append, timeout=0.01)
+    session = transmitter.send(0xEF00, 0x12, 0x00, bytes(70))
+    assert transmitter.flush(rx=lambda: b'', timeout=2)
+    assert session.error == 3
+    transmitter.send(0xEF00, 0x12, 0x00, bytes(70))
+    assert not transmitter.flush(timeout=0.001)
+
+def test_J1939Transmitter_flush_waiting_for_cts():
+    # polling rx for a CTS sleeps between polls instead of busy-waiting
+    transmitter = J1939Transmitter(lambda msg: 0)
+    transmitter.send(0xEF00, 0x12, 0x00, bytes(70))
+    start, cpu = time.monotonic(), time.process_time()
+    assert not transmitter.flush(rx=lambda: b'', timeout=0.3)
+    assert time.monotonic() - start >= 0.3
+    assert time.process_time() - cpu < 0.15
+    # raw RP1210_ReadMessage bytes are accepted too
+    cts = bytes(4) + toJ1939Message(TP_CM_PGN, 7, 0x00, 0x12, bytes((17, 10, 1, 0xFF, 0xFF, 0x00, 0xEF, 0x00)))
+    transmitter.process(cts)
+    assert next(iter(transmitter.sessions.values())).state == TX_SENDING
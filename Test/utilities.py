@@ -1,4 +1,5 @@
 import configparser
+import time
 
 class RP1210ConfigTestUtility():
 
@@ -67,3 +68,29 @@ class RP1210ConfigTestUtility():
     def verifyprotocoldata(self, func, protocol_id, field, fallback=None):
         section = "ProtocolInformation" + str(protocol_id)
         return self.verifydata(func, section, field, fallback)
+
+class FakeClock():
+    """A clock you set yourself, for the `clock` arguments of the time-based classes."""
+    def __init__(self, now : float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds : float) -> None:
+        self.now += seconds
+
+class Recorder():
+    """Stands in for client.tx or client.command; records what it was called with, and when."""
+    def __init__(self, clock = time.monotonic, result = 0, delay : float = 0.0):
+        self.calls = [] #type: list[tuple] # (time, *args), with buffers copied to bytes
+        self.clock = clock
+        self.result = result
+        self.delay = delay
+
+    def __call__(self, *args) -> int:
+        self.calls.append((self.clock(),) + tuple(bytes(arg) if isinstance(arg, (bytearray, memoryview)) else arg
+                                                  for arg in args))
+        if self.delay:
+            time.sleep(self.delay)
+        return self.result